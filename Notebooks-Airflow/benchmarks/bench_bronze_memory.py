@@ -0,0 +1,94 @@
+# Teste de teto de memória da ingestão bronze em lotes (etl/bronze.py).
+#
+# Gera CSVs no formato do data.csv original com 1x e Nx o volume atual,
+# executa a ingestão em um processo separado para cada um e compara o pico de
+# RSS (ru_maxrss). Com a leitura em lotes, o pico precisa ficar praticamente
+# igual entre os tamanhos e abaixo do teto configurado; a leitura completa com
+# pd.read_csv é medida como referência.
+#
+# Uso:
+#   python benchmarks/bench_bronze_memory.py --escala 5 --batch-size 50000 --teto-mb 600
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags')
+BRONZE_PADRAO = os.path.join(DAGS_DIR, 'data', 'bronze', 'dados_brutos.parquet')
+
+COLUNAS_CSV = ['InvoiceNo', 'StockCode', 'Description', 'Quantity',
+               'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
+
+# Código executado no processo filho; imprime o pico de RSS em MB
+FILHO = """
+import resource, sys
+sys.path.insert(0, {dags!r})
+modo, csv_path, destino, batch_size = sys.argv[1:5]
+if modo == 'lotes':
+    from etl.bronze import iter_csv_batches, stream_to_parquet
+    stream_to_parquet(iter_csv_batches(csv_path, int(batch_size)), destino)
+else:
+    import pandas as pd
+    from etl.bronze import add_ingestion_metadata
+    df = add_ingestion_metadata(pd.read_csv(csv_path, encoding='ISO-8859-1'))
+    df.to_parquet(destino, index=False)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def gerar_csv(base, escala, destino):
+    with open(destino, 'w', encoding='ISO-8859-1', newline='') as f:
+        for i in range(escala):
+            base.to_csv(f, index=False, header=(i == 0))
+
+
+def pico_rss_mb(modo, csv_path, batch_size, pasta):
+    destino = os.path.join(pasta, f'{modo}.parquet')
+    saida = subprocess.run(
+        [sys.executable, '-c', FILHO.format(dags=DAGS_DIR), modo, csv_path, destino, str(batch_size)],
+        check=True, capture_output=True, text=True,
+    )
+    return float(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teto de memória da ingestão bronze')
+    parser.add_argument('--bronze', default=BRONZE_PADRAO)
+    parser.add_argument('--escala', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    parser.add_argument('--teto-mb', type=float, default=600,
+                        help='pico de RSS máximo aceito para a ingestão em lotes')
+    parser.add_argument('--tolerancia', type=float, default=0.15,
+                        help='variação relativa máxima do pico entre 1x e Nx')
+    args = parser.parse_args()
+
+    base = pd.read_parquet(args.bronze, columns=COLUNAS_CSV)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = {}
+        for escala in (1, args.escala):
+            csv_path = os.path.join(pasta, f'data_{escala}x.csv')
+            gerar_csv(base, escala, csv_path)
+            tamanho_mb = os.path.getsize(csv_path) / 1024 ** 2
+            lotes = pico_rss_mb('lotes', csv_path, args.batch_size, pasta)
+            completo = pico_rss_mb('completo', csv_path, args.batch_size, pasta)
+            resultados[escala] = lotes
+            print(f"{escala:>3}x  CSV {tamanho_mb:8.1f} MB | pico em lotes {lotes:8.1f} MB"
+                  f" | pico read_csv completo {completo:8.1f} MB")
+            os.remove(csv_path)
+
+    variacao = resultados[args.escala] / resultados[1] - 1
+    print(f"Variação do pico entre 1x e {args.escala}x: {variacao:+.1%}")
+    assert resultados[args.escala] <= args.teto_mb, (
+        f"pico {resultados[args.escala]:.1f} MB acima do teto de {args.teto_mb} MB")
+    assert variacao <= args.tolerancia, (
+        f"pico cresce com o tamanho do arquivo ({variacao:+.1%})")
+    print("OK: pico de memória limitado pelo tamanho do lote")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Benchmark dos cubos agregados da gold (etl.gold.build_cubes).
+#
+# 1. Atualização: cubos recalculados sobre toda a fact_all x atualização
+#    incremental só do último mês (cubos anteriores montados sem ele). Os dois
+#    resultados precisam ser iguais.
+# 2. Com --dw: as consultas do 05_SQL_queries / dashboard sobre a fact_all x
+#    as mesmas consultas sobre os cubos carregados no DW (create_database.py
+#    e 04_load_database.py já executados). Os resultados precisam bater.
+#
+# Uso:
+#   python benchmarks/bench_cubes.py [--gold caminho/da/gold] [--dw]
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.gold import CUBES, build_cubes, fact_periods  # noqa: E402
+
+GOLD_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'gold')
+
+# consulta -> (SQL sobre a fact_all, SQL sobre os cubos), mesmas colunas e ordem
+CONSULTAS = {
+    'vendas por dia': (
+        """SELECT d.invoicedate::date AS dia, COUNT(DISTINCT f.invoiceno) AS pedidos,
+                  ROUND(SUM(f.total_value), 2) AS receita
+           FROM fact_all f JOIN dim_date d ON d.dateid = f.dateid
+           WHERE f.transactiontype = 'Sale' GROUP BY 1 ORDER BY 1""",
+        """SELECT invoiceday AS dia, SUM(invoices) AS pedidos, ROUND(SUM(revenue), 2) AS receita
+           FROM cube_daily_country WHERE transactiontype = 'Sale' GROUP BY 1 ORDER BY 1""",
+    ),
+    'top 10 produtos por receita': (
+        """SELECT stockcode, ROUND(SUM(total_value), 2) AS receita, SUM(quantity) AS unidades
+           FROM fact_all WHERE transactiontype = 'Sale'
+           GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 10""",
+        """SELECT stockcode, ROUND(SUM(revenue), 2) AS receita, SUM(quantity) AS unidades
+           FROM cube_monthly_product WHERE transactiontype = 'Sale'
+           GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 10""",
+    ),
+    'clientes por país no mês': (
+        """SELECT date_trunc('month', d.invoicedate)::date AS mes, c.country,
+                  COUNT(DISTINCT NULLIF(f.customerid, 'Unknown')) AS clientes,
+                  ROUND(SUM(f.total_value), 2) AS receita
+           FROM fact_all f JOIN dim_date d ON d.dateid = f.dateid
+           JOIN dim_country c ON c.countryid = f.countryid
+           WHERE f.transactiontype = 'Sale'
+           GROUP BY 1, 2 ORDER BY 1, 2""",
+        """SELECT m.invoicemonth AS mes, c.country, m.customers AS clientes, ROUND(m.revenue, 2) AS receita
+           FROM cube_monthly_country m JOIN dim_country c ON c.countryid = m.countryid
+           WHERE m.transactiontype = 'Sale'
+           ORDER BY 1, 2""",
+    ),
+}
+
+
+def cronometrar(func, repeticoes=3):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def conferir_cubos(esperado, obtido):
+    for nome in CUBES:
+        pd.testing.assert_frame_equal(esperado[nome], obtido[nome], check_dtype=False)
+
+
+def bench_atualizacao(gold_path):
+    fact_all = pd.read_parquet(os.path.join(gold_path, 'fact_all.parquet'))
+    dim_date = pd.read_parquet(os.path.join(gold_path, 'dim_date.parquet'))
+    _, mes = fact_periods(fact_all, dim_date)
+    ultimo = mes.max()
+
+    # Estado da execução anterior: tudo antes do último mês
+    anteriores = build_cubes(fact_all[(mes < ultimo).to_numpy()], dim_date)
+    t_completo, completo = cronometrar(lambda: build_cubes(fact_all, dim_date))
+    t_incremental, incremental = cronometrar(lambda: build_cubes(fact_all, dim_date, anteriores, [ultimo]))
+    conferir_cubos(completo, incremental)
+
+    print(f"fact_all: {len(fact_all)} linhas | mês alterado: {ultimo:%Y-%m} ({(mes == ultimo).sum()} linhas)")
+    for nome, cubo in completo.items():
+        print(f"  {nome}: {len(cubo)} linhas")
+    print(f"{'atualização':<12} {'tempo (ms)':>11} {'speedup':>8}")
+    print(f"{'completa':<12} {t_completo * 1000:11.1f} {1:7.1f}x")
+    print(f"{'incremental':<12} {t_incremental * 1000:11.1f} {t_completo / t_incremental:7.1f}x")
+    print("Cubos incrementais iguais aos completos.")
+
+
+def bench_consultas():
+    from sqlalchemy import text
+
+    from etl.warehouse import get_engine
+
+    engine = get_engine()
+    print()
+    print(f"{'consulta':<28} {'fact_all (ms)':>14} {'cubo (ms)':>10} {'speedup':>8}")
+    with engine.connect() as conn:
+        for nome, (sql_fato, sql_cubo) in CONSULTAS.items():
+            t_fato, fato = cronometrar(lambda: conn.execute(text(sql_fato)).fetchall())
+            t_cubo, cubo = cronometrar(lambda: conn.execute(text(sql_cubo)).fetchall())
+            assert fato == cubo, f"{nome}: resultados diferentes"
+            print(f"{nome:<28} {t_fato * 1000:14.1f} {t_cubo * 1000:10.1f} {t_fato / t_cubo:7.1f}x")
+    print("Consultas nos cubos iguais às da fact_all.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos cubos agregados da gold')
+    parser.add_argument('--gold', default=GOLD_PADRAO)
+    parser.add_argument('--dw', action='store_true', help='também compara as consultas no DW')
+    args = parser.parse_args()
+
+    bench_atualizacao(args.gold)
+    if args.dw:
+        bench_consultas()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Benchmark da impressão digital das linhas (hash_linha, etl/schema.py).
+#
+# Replica a bronze 1x, 5x... e compara:
+# - duplicatas: df.duplicated() do notebook (hasheia todas as colunas a cada
+#   chamada) contra hash_linha.duplicated(), com o custo de calcular a
+#   impressão uma vez na bronze (row_fingerprint) e de atualizá-la depois do
+#   preenchimento de Description (refresh_fingerprint)
+# - ingestão incremental: reexecutar o mesmo lote com a marca d'água perdida,
+#   que só é barrado pelo conjunto de impressões (_fingerprints.parquet)
+# Confere que as contagens de duplicatas são iguais e que a reexecução não
+# acrescenta nenhuma linha.
+#
+# Uso:
+#   python benchmarks/bench_fingerprint.py [--bronze caminho/dados_brutos.parquet]
+#                                          [--escalas 1 5] [--dir /tmp/ecommerce_fingerprint]
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.bronze import WATERMARK_FILE, ingest_incremental  # noqa: E402
+from etl.schema import (  # noqa: E402
+    FINGERPRINT_COLUMN,
+    SOURCE_COLUMNS,
+    apply_schema,
+    refresh_fingerprint,
+    row_fingerprint,
+)
+from etl.silver import duplicated_rows, fill_descriptions  # noqa: E402
+
+BRONZE_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'bronze', 'dados_brutos.parquet'
+)
+
+
+def medir(func, *args):
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def lotes(df, tamanho=100_000):
+    return [df.iloc[inicio:inicio + tamanho].copy() for inicio in range(0, len(df), tamanho)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da impressão digital das linhas')
+    parser.add_argument('--bronze', default=BRONZE_PADRAO)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--dir', default='/tmp/ecommerce_fingerprint')
+    args = parser.parse_args()
+
+    # Sem a hash_linha gravada: cada etapa a calcula como na primeira ingestão
+    bruto = pd.read_parquet(args.bronze).drop(columns=FINGERPRINT_COLUMN, errors='ignore')
+    print(f"{'escala':>6} {'linhas':>11} {'duplicated (s)':>14} {'impressão (s)':>13} {'refresh (s)':>11} "
+          f"{'hash_linha (s)':>14} {'reingestão (s)':>14}")
+    for escala in args.escalas:
+        df_raw = bruto if escala == 1 else pd.concat([bruto] * escala, ignore_index=True)
+        # apply_schema já calcula a hash_linha da bronze
+        df = apply_schema(df_raw.copy())
+        anterior = df['Description']
+        df['Description'] = fill_descriptions(df)
+
+        dados = df.drop(columns=FINGERPRINT_COLUMN)
+        esperado, t_duplicated = medir(lambda: int(dados.duplicated().sum()))
+        del dados
+        # Impressão calculada do zero (bronze) e atualizada só em Description (silver)
+        _, t_impressao = medir(row_fingerprint, df[SOURCE_COLUMNS])
+        df[FINGERPRINT_COLUMN], t_refresh = medir(refresh_fingerprint, df, 'Description', anterior)
+        obtido, t_hash = medir(duplicated_rows, df)
+        assert obtido == esperado, f"duplicatas: duplicated() {esperado} x hash_linha {obtido}"
+
+        destino = os.path.join(args.dir, f'bronze_{escala}x')
+        shutil.rmtree(destino, ignore_errors=True)
+        ingest_incremental(lotes(df_raw), destino)
+        os.remove(os.path.join(destino, WATERMARK_FILE))
+        (novas, _), t_reingestao = medir(ingest_incremental, lotes(df_raw), destino)
+        assert novas == 0, f"reingestão acrescentou {novas} linhas"
+
+        print(f"{escala:>5}x {len(df):>11,} {t_duplicated:14.3f} {t_impressao:13.3f} {t_refresh:11.3f} "
+              f"{t_hash:14.3f} {t_reingestao:14.2f}")
+
+
+if __name__ == '__main__':
+    main()
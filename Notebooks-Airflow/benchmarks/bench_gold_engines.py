@@ -0,0 +1,93 @@
+# Paridade e benchmark dos backends da camada gold: pandas x Polars.
+#
+# Replica a silver 1x, 5x, 10x..., monta a gold com cada backend
+# (etl.gold.build_gold(engine=...)), confere que todas as tabelas são iguais
+# (somas em float com tolerância relativa de 1e-9, pela ordem de soma
+# paralela do Polars) e imprime o tempo de cada um.
+#
+# Uso:
+#   python benchmarks/bench_gold_engines.py [--silver caminho/dados_limpos.parquet]
+#                                           [--escalas 1 5 10] [--rfm-incremental]
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.gold import build_gold  # noqa: E402
+
+SILVER_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'silver', 'dados_limpos.parquet'
+)
+
+
+def normalizar(df):
+    df = df.reset_index(drop=True).copy()
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype) or df[coluna].dtype == object:
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), None)
+    return df
+
+
+def conferir_paridade(esperado, obtido):
+    """Levanta AssertionError com o nome da primeira tabela diferente."""
+    assert esperado.keys() == obtido.keys(), f"tabelas diferentes: {esperado.keys()} x {obtido.keys()}"
+    for nome in esperado:
+        try:
+            pd.testing.assert_frame_equal(
+                normalizar(esperado[nome]), normalizar(obtido[nome]), check_dtype=False, rtol=1e-9
+            )
+        except AssertionError as erro:
+            raise AssertionError(f"{nome}: {erro}") from None
+
+
+def replicar(df, escala):
+    if escala == 1:
+        return df
+    return pd.concat([df] * escala, ignore_index=True)
+
+
+def medir(silver, engine, rfm_estado, meses, repeticoes=2):
+    # Melhor de `repeticoes`: a primeira chamada do Polars inclui a inicialização
+    melhor, tabelas = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        tabelas = build_gold(silver, rfm_estado=rfm_estado, engine=engine, meses=meses)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return tabelas, melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Paridade e benchmark dos backends da gold')
+    parser.add_argument('--silver', default=SILVER_PADRAO)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--rfm-incremental', action='store_true',
+                        help='também confere o RFM incremental (estado sem o último mês + o último mês reagregado)')
+    args = parser.parse_args()
+
+    base = pd.read_parquet(args.silver)
+    print(f"threads do Polars: {pl.thread_pool_size()}")
+    print(f"{'escala':>6} {'linhas':>12} {'pandas (s)':>11} {'polars (s)':>11} {'speedup':>8}")
+    for escala in args.escalas:
+        silver = replicar(base, escala)
+        rfm_estado = meses = None
+        if args.rfm_incremental:
+            # Estado anterior: tudo menos o último mês, que é reagregado
+            mes = pd.to_datetime(silver['InvoiceDate']).dt.to_period('M').dt.to_timestamp()
+            meses = [mes.max()]
+            rfm_estado = build_gold(silver[mes < mes.max()])['rfm_state']
+
+        pandas_gold, t_pandas = medir(silver, 'pandas', rfm_estado, meses)
+        polars_gold, t_polars = medir(silver, 'polars', rfm_estado, meses)
+        conferir_paridade(pandas_gold, polars_gold)
+        print(f"{escala:>5}x {len(silver):>12,} {t_pandas:11.2f} {t_polars:11.2f} {t_pandas / t_polars:7.1f}x")
+    print("Saídas idênticas nos dois backends.")
+
+
+if __name__ == '__main__':
+    main()
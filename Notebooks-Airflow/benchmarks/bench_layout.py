@@ -0,0 +1,132 @@
+# Benchmark do layout dos parquets da gold (etl/layout.py).
+#
+# Regrava a fact_all da --data em --dir nos layouts:
+# - plain: DataFrame.to_parquet padrão (um row group por 1M de linhas)
+# - clustered: ordenada por DateID, um row group por tipo e mês
+# e mede, pelo read_table de etl/dataset.py, consultas por período (um mês,
+# uma semana: faixa de DateID) e por cliente (CustomerID = valor). Para cada
+# consulta imprime os row groups lidos do total, os MB lidos do disco (rchar
+# de /proc/self/io) e o tempo, e confere que todos os layouts devolvem as
+# mesmas linhas. Também imprime o tamanho do arquivo em cada layout e
+# confere que pd.read_parquet devolve as categorias do DataFrame gravado.
+#
+# Uso:
+#   python benchmarks/bench_layout.py [--data caminho/da/pasta/data] [--repeticoes 5]
+#                                     [--compression snappy] [--dir /tmp/ecommerce_layout]
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.dataset import read_table, table_path  # noqa: E402
+from etl.gold import fact_row_group_cuts  # noqa: E402
+from etl.layout import ROW_GROUP_SIZE_PADRAO, write_table  # noqa: E402
+
+DATA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data')
+
+LAYOUTS = {
+    'plain': {'layout': 'plain'},
+    'clustered': {'layout': 'clustered'},
+}
+
+
+def bytes_lidos():
+    with open('/proc/self/io') as f:
+        return int(dict(linha.split(': ') for linha in f.read().splitlines())['rchar'])
+
+
+def medir(func, *args):
+    """(resultado, melhor tempo, bytes lidos) em `repeticoes` execuções."""
+    melhor, lidos, resultado = None, None, None
+    for _ in range(medir.repeticoes):
+        io0, inicio = bytes_lidos(), time.perf_counter()
+        resultado = func(*args)
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+        lidos = bytes_lidos() - io0
+    return resultado, melhor, lidos
+
+
+def row_groups_lidos(caminho, filtros):
+    """(row groups que o scanner lê pelo min/max, total)."""
+    fragmento = next(ds.dataset(caminho, format='parquet').get_fragments())
+    total = fragmento.metadata.num_row_groups
+    grupos = fragmento.split_by_row_group(pq.filters_to_expression(filtros))
+    return len(grupos), total
+
+
+def consultas(fact_all, dim_date):
+    """{nome: filtros} de período e de cliente sobre a fact_all."""
+    datas = dim_date.set_index('DateID')['InvoiceDate']
+    meses = datas.dt.to_period('M')
+    mes = meses.unique()[len(meses.unique()) // 2]
+    ids_mes = meses.index[meses == mes]
+    inicio_semana = datas.loc[ids_mes.min()]
+    ids_semana = datas.index[(datas >= inicio_semana) & (datas < inicio_semana + pd.Timedelta(days=7))]
+    # Clientes comuns (mediana de linhas) e um dos maiores
+    linhas = fact_all['CustomerID'].value_counts()
+    linhas = linhas[~linhas.index.isin(['Unknown', 'nan'])]
+    return {
+        f'mês {mes}': [('DateID', '>=', int(ids_mes.min())), ('DateID', '<=', int(ids_mes.max()))],
+        'semana': [('DateID', '>=', int(ids_semana.min())), ('DateID', '<=', int(ids_semana.max()))],
+        'cliente (mediana)': [('CustomerID', '=', str(linhas.index[len(linhas) // 2]))],
+        'cliente (maior)': [('CustomerID', '=', str(linhas.index[0]))],
+        '3 clientes': [('CustomerID', 'in', [str(cliente) for cliente in linhas.index[len(linhas) // 2:][:3]])],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do layout dos parquets da gold')
+    parser.add_argument('--data', default=DATA_PADRAO, help='pasta data com gold/')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--compression', default='snappy')
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE_PADRAO)
+    parser.add_argument('--dir', default='/tmp/ecommerce_layout')
+    args = parser.parse_args()
+    medir.repeticoes = args.repeticoes
+
+    fact_all = read_table(table_path(args.data, 'fact_all'))
+    dim_date = read_table(table_path(args.data, 'dim_date'))
+    # Mesma ordem da gold (tipo, DateID) em todos os layouts: só a gravação muda
+    cortes = fact_row_group_cuts(fact_all, dim_date)
+
+    shutil.rmtree(args.dir, ignore_errors=True)
+    os.makedirs(args.dir)
+    caminhos = {}
+    for nome, layout in LAYOUTS.items():
+        caminhos[nome] = os.path.join(args.dir, f"{nome}.parquet")
+        layout = {**layout, 'compression': args.compression, 'row_group_size': args.row_group_size}
+        write_table(fact_all, caminhos[nome], layout, cortes)
+        # Mesmo dicionário em todos os row groups: as categorias voltam iguais em qualquer leitor
+        lido = pd.read_parquet(caminhos[nome])
+        for coluna in fact_all.select_dtypes('category'):
+            pd.testing.assert_index_equal(lido[coluna].cat.categories, fact_all[coluna].cat.categories)
+        print(f"{nome:<16} {os.path.getsize(caminhos[nome]) / 1024 ** 2:6.2f} MB, "
+              f"{pq.ParquetFile(caminhos[nome]).metadata.num_row_groups} row groups")
+
+    print(f"\n{'consulta':<18} {'layout':<16} {'linhas':>8} {'row groups':>10} {'MB lidos':>8} {'tempo (s)':>9} "
+          f"{'speedup':>8}")
+    for consulta, filtros in consultas(fact_all, dim_date).items():
+        esperado, t_plain = None, None
+        for nome, caminho in caminhos.items():
+            df, tempo, lidos = medir(read_table, caminho, None, filtros)
+            if esperado is None:
+                esperado, t_plain = df, tempo
+            else:
+                pd.testing.assert_frame_equal(df, esperado)
+            grupos, total = row_groups_lidos(caminho, filtros)
+            print(f"{consulta:<18} {nome:<16} {len(df):>8,} {f'{grupos}/{total}':>10} {lidos / 1024 ** 2:8.2f} "
+                  f"{tempo:9.4f} {t_plain / tempo:7.1f}x")
+    print("\nResultados idênticos em todos os layouts.")
+
+
+if __name__ == '__main__':
+    main()
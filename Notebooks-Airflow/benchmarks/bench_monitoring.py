@@ -0,0 +1,110 @@
+# Benchmark do monitoramento incremental (etl/monitoring.py).
+#
+# Gera um logs_pipeline.csv sintético com anos de execuções (4 camadas, N
+# execuções por dia), processa o histórico inteiro uma vez e depois mede o
+# custo de cada atualização com poucas linhas novas, que deve ficar estável
+# com o histórico crescendo. Confere os rollups diários contra um groupby do
+# pandas sobre o CSV inteiro e que uma execução lenta e uma falha injetadas
+# geram alerta.
+#
+# Uso:
+#   python benchmarks/bench_monitoring.py [--anos 3] [--por-dia 4] [--dir /tmp/bench_monitoring]
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.monitoring import daily_rollups, format_alert, update_monitoring  # noqa: E402
+from etl.telemetry import LOG_FILE  # noqa: E402
+
+# tempo médio (s) e registros por camada
+CAMADAS = {'bronze': (3.0, 541909), 'silver': (2.5, 541909), 'gold': (1.8, 541909), 'load': (4.0, 539273)}
+
+
+def gerar_log(caminho, inicio, dias, por_dia, rng):
+    with open(caminho, 'a', newline='') as f:
+        escritor = csv.writer(f)
+        for dia in range(dias):
+            for execucao in range(por_dia):
+                momento = inicio + timedelta(days=dia, hours=execucao * 24 / por_dia)
+                for camada, (tempo, registros) in CAMADAS.items():
+                    escritor.writerow([momento, camada, 'sucesso', round(tempo * rng.lognormal(0, 0.1), 2),
+                                       registros])
+
+
+def conferir(base_dir):
+    """Rollups do monitoramento x groupby do pandas sobre o CSV inteiro."""
+    log = pd.read_csv(os.path.join(base_dir, LOG_FILE), header=None,
+                      names=['data_execucao', 'camada', 'status', 'tempo_segundos', 'registros'])
+    log['dia'] = log['data_execucao'].str[:10]
+    log = log[log['status'] == 'sucesso']
+    log['linhas_por_s'] = log['registros'] / log['tempo_segundos']
+    esperado = log.groupby(['dia', 'camada']).agg(
+        tempo_p50=('tempo_segundos', 'median'),
+        tempo_p95=('tempo_segundos', lambda s: np.percentile(s, 95)),
+        tempo_max=('tempo_segundos', 'max'),
+        linhas_por_s_p50=('linhas_por_s', 'median'),
+    ).reset_index()
+    # Dias/camadas só com falhas não têm percentis
+    obtido = daily_rollups(base_dir).dropna(subset=['tempo_p50'])[esperado.columns]
+    pd.testing.assert_frame_equal(obtido.reset_index(drop=True), esperado, check_dtype=False)
+    return len(obtido)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do monitoramento incremental')
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--por-dia', type=int, default=4, help='execuções do pipeline por dia')
+    parser.add_argument('--dir', default='/tmp/bench_monitoring')
+    args = parser.parse_args()
+
+    shutil.rmtree(args.dir, ignore_errors=True)
+    os.makedirs(args.dir)
+    caminho = os.path.join(args.dir, LOG_FILE)
+    rng = np.random.default_rng(42)
+    inicio = datetime(2020, 1, 1)
+    dias = 365 * args.anos
+    gerar_log(caminho, inicio, dias, args.por_dia, rng)
+
+    t0 = time.perf_counter()
+    novas, alertas = update_monitoring(args.dir)
+    print(f"histórico: {novas:,} execuções processadas em {time.perf_counter() - t0:.2f}s "
+          f"({len(alertas)} alertas)")
+
+    # Atualizações com um dia novo de cada vez: custo independe do histórico
+    tempos = []
+    for dia in range(dias, dias + 10):
+        gerar_log(caminho, inicio + timedelta(days=dia), 1, args.por_dia, rng)
+        t0 = time.perf_counter()
+        novas, _ = update_monitoring(args.dir)
+        tempos.append(time.perf_counter() - t0)
+        assert novas == args.por_dia * len(CAMADAS), novas
+    print(f"atualização incremental ({args.por_dia * len(CAMADAS)} linhas novas): "
+          f"mediana {np.median(tempos) * 1000:.1f} ms")
+
+    # Execução lenta e falha injetadas
+    momento = inicio + timedelta(days=dias + 10)
+    with open(caminho, 'a', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow([momento, 'gold', 'sucesso', 9.5, 541909])
+        escritor.writerow([momento, 'load', 'falha', 0.4, 0])
+    _, alertas = update_monitoring(args.dir)
+    for alerta in alertas:
+        print(f"  ALERTA {format_alert(alerta)}")
+    assert sorted((alerta[2], alerta[3]) for alerta in alertas) == [
+        ('gold', 'tempo'), ('gold', 'vazao'), ('load', 'falha')], alertas
+
+    print(f"rollups diários conferidos com o pandas: {conferir(args.dir):,} (dia, camada)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Curva de escala da execução particionada (etl/parallel.py).
+#
+# Replica a bronze --escalas vezes e, para cada número de workers, roda a
+# silver (etl.silver.clean) e a gold (etl.gold.build_gold) com partições por
+# mês e por hash do CustomerID. Confere que todas as tabelas são iguais às
+# da execução serial (somas em float com tolerância relativa de 1e-9, pela
+# ordem das somas parciais) e imprime tempo, speedup e eficiência por
+# worker. O speedup é limitado pelos núcleos da máquina (os.cpu_count()) e
+# pela parte que continua serial (esquema, chaves, dimensões, fact_all).
+#
+# Uso:
+#   python benchmarks/bench_parallel.py [--bronze caminho/dados_brutos.parquet]
+#                                       [--escalas 1 5] [--workers 1 2 4]
+#                                       [--particoes month customer]
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.gold import build_gold  # noqa: E402
+from etl.keys import read_registries  # noqa: E402
+from etl.silver import clean  # noqa: E402
+
+BRONZE_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'bronze', 'dados_brutos.parquet'
+)
+
+
+def conferir_paridade(esperado, obtido):
+    """Levanta AssertionError com o nome da primeira tabela diferente."""
+    assert esperado.keys() == obtido.keys(), f"tabelas diferentes: {esperado.keys()} x {obtido.keys()}"
+    for nome in esperado:
+        try:
+            pd.testing.assert_frame_equal(esperado[nome], obtido[nome], check_exact=False, rtol=1e-9)
+        except AssertionError as erro:
+            raise AssertionError(f"{nome}: {erro}") from None
+
+
+def executar(bronze, workers, particao):
+    # Registros de chaves vazios: as chaves são numeradas a partir de 1 em toda execução
+    inicio = time.perf_counter()
+    silver = clean(bronze, workers, particao)
+    meio = time.perf_counter()
+    gold = build_gold(silver, registros=read_registries(), workers=workers, particao=particao)
+    fim = time.perf_counter()
+    return meio - inicio, fim - meio, dict(gold, silver=silver)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Curva de escala da execução particionada')
+    parser.add_argument('--bronze', default=BRONZE_PADRAO)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--particoes', nargs='+', choices=['month', 'customer'], default=['month', 'customer'])
+    args = parser.parse_args()
+
+    bronze = pd.read_parquet(args.bronze)
+    print(f"núcleos disponíveis: {os.cpu_count()}")
+    print(f"{'escala':>6} {'linhas':>11} {'partição':>9} {'workers':>7} {'silver (s)':>10} "
+          f"{'gold (s)':>9} {'total (s)':>9} {'speedup':>8} {'eficiência':>10}")
+    for escala in args.escalas:
+        df = bronze if escala == 1 else pd.concat([bronze] * escala, ignore_index=True)
+        t_silver, t_gold, serial = executar(df, 1, 'month')
+        t_serial = t_silver + t_gold
+        print(f"{escala:>5}x {len(df):>11,} {'serial':>9} {1:>7} {t_silver:10.2f} {t_gold:9.2f} "
+              f"{t_serial:9.2f} {1:7.2f}x {1:10.0%}")
+        for particao in args.particoes:
+            for workers in args.workers:
+                if workers <= 1:
+                    continue
+                t_silver, t_gold, tabelas = executar(df, workers, particao)
+                conferir_paridade(serial, tabelas)
+                total = t_silver + t_gold
+                print(f"{escala:>5}x {len(df):>11,} {particao:>9} {workers:>7} {t_silver:10.2f} {t_gold:9.2f} "
+                      f"{total:9.2f} {t_serial / total:7.2f}x {t_serial / total / workers:10.0%}")
+
+
+if __name__ == '__main__':
+    main()
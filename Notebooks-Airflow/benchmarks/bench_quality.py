@@ -0,0 +1,123 @@
+# Benchmark do relatório de qualidade: passadas exatas do
+# 06_quality_report.ipynb contra o perfil em uma passada de etl/quality.py.
+#
+# Replica a bronze 1x, 5x..., roda a silver (etl.silver.clean) e grava o
+# parquet em --dir (o tempo da silver inclui a gravação). Sobre esse parquet
+# mede a versão do notebook (lê a tabela inteira e faz uma passada por
+# métrica: count, duplicated, quantile por coluna...) e o perfil em lotes.
+# Confere que contagens e duplicatas são
+# iguais, que os quartis ficam dentro do erro relativo do sketch e que os
+# outliers diferem em no máximo --tolerancia das linhas, e imprime o tempo
+# de cada versão, o custo do perfil em relação à silver e a memória das
+# impressões das linhas no fim do perfil (QualityProfile.hash_bytes: a
+# contagem exata de duplicatas guarda 8 bytes por linha distinta; o pico
+# de cada compactação é umas 5 vezes isso, ver etl/quality.py).
+#
+# Uso:
+#   python benchmarks/bench_quality.py [--bronze caminho/dados_brutos.parquet]
+#                                      [--escalas 1 5] [--dir /tmp/ecommerce_quality]
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.quality import ALPHA_PADRAO, OUTLIER_COLUMNS, profile_parquet, quality_tables  # noqa: E402
+from etl.schema import FINGERPRINT_COLUMN, apply_schema, invoice_no  # noqa: E402
+from etl.silver import STOCKCODE_FEES, clean  # noqa: E402
+
+BRONZE_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'bronze', 'dados_brutos.parquet'
+)
+
+
+def qualidade_legado(caminho):
+    """Células do 06_quality_report.ipynb, mantidas apenas para comparação."""
+    # Só as colunas de dados, como na silver lida pelo notebook
+    df = pd.read_parquet(caminho).drop(columns=FINGERPRINT_COLUMN, errors='ignore')
+    metricas = {
+        'Linhas': len(df),
+        'Células preenchidas': df.count().sum(),
+        'Duplicatas': df.duplicated().sum(),
+        'Quantity <= 0': (df['Quantity'] <= 0).sum(),
+        'UnitPrice <= 0': (df['UnitPrice'] <= 0).sum(),
+    }
+    invoice = invoice_no(df).astype(str)
+    metricas['Cancelamentos'] = invoice.str.startswith('C').sum()
+    metricas['Ajustes'] = invoice.str.startswith('A').sum()
+    metricas['Tarifas'] = df['StockCode'].isin(STOCKCODE_FEES).sum()
+    for coluna in OUTLIER_COLUMNS:
+        q1 = df[df[coluna] > 0][coluna].quantile(0.25)
+        q3 = df[df[coluna] > 0][coluna].quantile(0.75)
+        iqr = q3 - q1
+        metricas[f'Q1 {coluna}'] = q1
+        metricas[f'Q3 {coluna}'] = q3
+        metricas[f'Outliers {coluna}'] = ((df[coluna] < (q1 - 1.5 * iqr)) | (df[coluna] > (q3 + 1.5 * iqr))).sum()
+    return metricas
+
+
+def qualidade_stream(caminho):
+    perfil = profile_parquet(caminho)
+    tabelas = quality_tables(perfil)
+    return dict(zip(tabelas['quality_metrics']['Metric'], tabelas['quality_metrics']['Value'])), perfil.hash_bytes()
+
+
+def conferir(exato, aproximado, tolerancia):
+    """Levanta AssertionError com a primeira métrica fora da tolerância."""
+    for metrica, valor in exato.items():
+        obtido = aproximado[metrica]
+        if metrica.startswith(('Q1', 'Q3')):
+            # quantil interpolado x representante do balde do sketch
+            ok = abs(obtido - valor) <= 2 * ALPHA_PADRAO * abs(valor)
+        elif metrica.startswith('Outliers'):
+            ok = abs(obtido - valor) <= tolerancia * exato['Linhas']
+        else:
+            ok = obtido == valor
+        assert ok, f"{metrica}: exato {valor} x uma passada {obtido}"
+
+
+def silver(df, caminho):
+    # Etapa silver sem a leitura da bronze: limpeza + gravação do parquet
+    clean(df).to_parquet(caminho, index=False)
+
+
+def medir(func, *args):
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do relatório de qualidade')
+    parser.add_argument('--bronze', default=BRONZE_PADRAO)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--dir', default='/tmp/ecommerce_quality')
+    parser.add_argument('--tolerancia', type=float, default=0.001,
+                        help='diferença aceita nos outliers, em fração das linhas')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    bronze = apply_schema(pd.read_parquet(args.bronze))
+    print(f"{'escala':>6} {'linhas':>11} {'silver (s)':>10} {'notebook (s)':>12} {'1 passada (s)':>13} "
+          f"{'speedup':>8} {'% silver':>8} {'hashes (MB)':>11}")
+    for escala in args.escalas:
+        df = bronze if escala == 1 else pd.concat([bronze] * escala, ignore_index=True)
+        caminho = os.path.join(args.dir, f'silver_{escala}x.parquet')
+        _, t_silver = medir(silver, df, caminho)
+
+        (stream, hashes), t_stream = medir(qualidade_stream, caminho)
+        exato, t_legado = medir(qualidade_legado, caminho)
+        conferir(exato, stream, args.tolerancia)
+        print(f"{escala:>5}x {len(df):>11,} {t_silver:10.2f} {t_legado:12.2f} {t_stream:13.2f} "
+              f"{t_legado / t_stream:7.1f}x {t_stream / t_silver:8.0%} {hashes / 1024 ** 2:11.1f}")
+    # ru_maxrss em KB no Linux; inclui a versão do notebook, que lê a tabela inteira
+    print(f"pico de memória do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Benchmark do cache de consultas versionado por snapshot (etl/cache.py).
+#
+# Executa as consultas do dashboard / 05_SQL_queries várias vezes: a primeira
+# passada calcula (miss) e as seguintes vêm do cache (hit). Depois publica um
+# snapshot novo da origem e confere que a passada seguinte recalcula tudo.
+# Sem --dw usa só leituras de parquet da gold; com --dw também consultas SQL
+# no DW (create_database.py e 04_load_database.py já executados).
+#
+# Uso:
+#   python benchmarks/bench_query_cache.py [--gold caminho/da/gold] [--dw] [--passadas 5]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.cache import GOLD_SNAPSHOT, WAREHOUSE_SNAPSHOT, QueryCache, publish_snapshot  # noqa: E402
+
+GOLD_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'gold')
+
+# Leituras da gold feitas pelo dashboard: (tabela, colunas)
+LEITURAS_GOLD = [
+    ('metrics', None),
+    ('rfm', None),
+    ('most_purchased_products', ['CustomerID', 'Criterion', 'Rank', 'StockCode']),
+    ('fact_all', ['DateID', 'CountryID', 'TransactionType', 'total_value']),
+]
+
+# Consultas do 05_SQL_queries.ipynb, escritas sobre o modelo do DW
+CONSULTAS_DW = [
+    """SELECT COUNT(*) AS total_registros FROM fact_all""",
+    """SELECT p.productdescription AS produto, SUM(f.quantity) AS quantidade_total_vendida,
+              ROUND(SUM(f.total_value), 2) AS receita_total
+       FROM fact_all f JOIN dim_product p ON p.stockcode = f.stockcode
+       WHERE f.transactiontype = 'Sale'
+       GROUP BY 1 ORDER BY receita_total DESC LIMIT 10""",
+    """SELECT d.invoicedate::date AS data, COUNT(DISTINCT f.invoiceno) AS total_vendas,
+              ROUND(SUM(f.total_value), 2) AS receita_total
+       FROM fact_all f JOIN dim_date d ON d.dateid = f.dateid
+       GROUP BY 1 ORDER BY 1""",
+    """SELECT c.country AS pais, COUNT(DISTINCT f.customerid) AS total_clientes,
+              ROUND(AVG(f.total_value), 2) AS ticket_medio
+       FROM fact_all f JOIN dim_country c ON c.countryid = f.countryid
+       WHERE f.customerid NOT IN ('Unknown', 'nan')
+       GROUP BY 1 ORDER BY total_clientes DESC""",
+]
+
+
+def passada(cache, dw):
+    inicio = time.perf_counter()
+    for tabela, colunas in LEITURAS_GOLD:
+        cache.read_gold(tabela, colunas)
+    if dw:
+        for sql in CONSULTAS_DW:
+            cache.read_sql(sql)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do cache de consultas da gold/DW')
+    parser.add_argument('--gold', default=GOLD_PADRAO)
+    parser.add_argument('--dw', action='store_true', help='também executa as consultas SQL no DW')
+    parser.add_argument('--passadas', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = None
+    if args.dw:
+        from etl.warehouse import get_engine
+
+        engine = get_engine()
+    cache = QueryCache(args.gold, engine)
+
+    fria = passada(cache, args.dw)
+    quentes = [passada(cache, args.dw) for _ in range(args.passadas - 1)]
+    quente = sum(quentes) / len(quentes)
+    print(f"{'passada':<22} {'tempo (ms)':>11}")
+    print(f"{'fria (miss)':<22} {fria * 1000:11.1f}")
+    print(f"{'quente (hit, média)':<22} {quente * 1000:11.1f}   ({fria / quente:,.0f}x)")
+    print(cache.stats())
+
+    # Snapshot novo: a próxima passada recalcula tudo
+    publish_snapshot(os.path.join(args.gold, GOLD_SNAPSHOT))
+    if args.dw:
+        publish_snapshot(os.path.join(args.gold, WAREHOUSE_SNAPSHOT))
+    antes = cache.stats()
+    apos = passada(cache, args.dw)
+    depois = cache.stats()
+    consultas = len(LEITURAS_GOLD) + (len(CONSULTAS_DW) if args.dw else 0)
+    assert depois['misses'] - antes['misses'] == consultas, depois
+    assert depois['invalidations'] - antes['invalidations'] == consultas, depois
+    print(f"{'após snapshot novo':<22} {apos * 1000:11.1f}")
+    print(depois)
+
+    # Limite de entradas: as menos usadas saem primeiro
+    pequeno = QueryCache(args.gold, engine, max_entries=2)
+    passada(pequeno, args.dw)
+    print("max_entries=2:", pequeno.stats())
+
+
+if __name__ == '__main__':
+    main()
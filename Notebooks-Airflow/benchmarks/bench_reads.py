@@ -0,0 +1,111 @@
+# Benchmark das leituras com projeção e filtros (etl/dataset.py).
+#
+# Para cada consumidor de READS compara o pd.read_parquet de cada tabela
+# inteira (como antes) com read_inputs, que só lê as colunas e linhas
+# declaradas. Mede tempo e bytes lidos do disco (rchar de /proc/self/io) e
+# confere que read_inputs devolve as mesmas linhas e colunas que a leitura
+# inteira depois de filtrada em pandas.
+#
+# Com --row-group-size a gold é regravada em --dir com row groups desse
+# tamanho: como a fact_all fica agrupada por TransactionType, o filtro das
+# vendas passa a pular os row groups de tarifas e cancelamentos.
+#
+# Uso:
+#   python benchmarks/bench_reads.py [--data caminho/da/pasta/data] [--repeticoes 3]
+#                                    [--row-group-size 50000] [--dir /tmp/ecommerce_reads]
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.dataset import READS, read_inputs, table_path  # noqa: E402
+
+DATA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data')
+
+# Consumidores medidos (a carga lê todas as colunas e linhas)
+CONSUMIDORES = ['gold', 'gold_rfm', 'gold_most_purchased_products', 'gold_metrics', 'gold_cubes']
+
+OPERADORES = {'=': '__eq__', '==': '__eq__', '!=': '__ne__', '<': '__lt__', '<=': '__le__',
+              '>': '__gt__', '>=': '__ge__'}
+
+
+def bytes_lidos():
+    with open('/proc/self/io') as f:
+        return int(dict(linha.split(': ') for linha in f.read().splitlines())['rchar'])
+
+
+def medir(func, *args):
+    """(resultado, melhor tempo, bytes lidos) em `repeticoes` execuções."""
+    melhor, lidos, resultado = None, None, None
+    for _ in range(medir.repeticoes):
+        io0, inicio = bytes_lidos(), time.perf_counter()
+        resultado = func(*args)
+        tempo = time.perf_counter() - inicio
+        melhor = tempo if melhor is None else min(melhor, tempo)
+        lidos = bytes_lidos() - io0
+    return resultado, melhor, lidos
+
+
+def leitura_inteira(data_path, consumidor):
+    return {tabela: pd.read_parquet(table_path(data_path, tabela)) for tabela in READS[consumidor]}
+
+
+def filtrar(df, colunas, filtros):
+    # Mesma seleção de read_inputs, feita em pandas sobre a tabela inteira
+    for coluna, operador, valor in filtros or []:
+        mascara = df[coluna].isin(valor) if operador == 'in' else getattr(df[coluna], OPERADORES[operador])(valor)
+        df = df[mascara]
+    return df[colunas if colunas is not None else list(df.columns)].reset_index(drop=True)
+
+
+def conferir(inteiras, lidas, consumidor):
+    for tabela, (colunas, filtros) in READS[consumidor].items():
+        colunas = [coluna for coluna in colunas or inteiras[tabela].columns if coluna in inteiras[tabela].columns]
+        esperado = filtrar(inteiras[tabela], colunas, filtros)
+        pd.testing.assert_frame_equal(lidas[tabela], esperado, check_categorical=False)
+
+
+def regravar(data_path, destino, tamanho):
+    """Cópia das tabelas lidas pelos consumidores com row groups de `tamanho` linhas."""
+    shutil.rmtree(destino, ignore_errors=True)
+    tabelas = {tabela for consumidor in CONSUMIDORES for tabela in READS[consumidor]}
+    for tabela in tabelas:
+        caminho = table_path(destino, tabela)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        pq.write_table(pq.read_table(table_path(data_path, tabela)), caminho, row_group_size=tamanho)
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das leituras com projeção e filtros')
+    parser.add_argument('--data', default=DATA_PADRAO, help='pasta data com silver/ e gold/')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--row-group-size', type=int, help='regrava a gold com row groups deste tamanho')
+    parser.add_argument('--dir', default='/tmp/ecommerce_reads')
+    args = parser.parse_args()
+    medir.repeticoes = args.repeticoes
+
+    data_path = args.data
+    if args.row_group_size:
+        data_path = regravar(args.data, args.dir, args.row_group_size)
+
+    print(f"{'consumidor':<30} {'inteira (s)':>11} {'MB':>7} {'projeção (s)':>12} {'MB':>7} {'linhas':>10} "
+          f"{'speedup':>8}")
+    for consumidor in CONSUMIDORES:
+        inteiras, t_inteira, b_inteira = medir(leitura_inteira, data_path, consumidor)
+        lidas, t_projecao, b_projecao = medir(read_inputs, data_path, consumidor)
+        conferir(inteiras, lidas, consumidor)
+        linhas = sum(len(df) for df in lidas.values())
+        print(f"{consumidor:<30} {t_inteira:11.3f} {b_inteira / 1024 ** 2:7.1f} {t_projecao:12.3f} "
+              f"{b_projecao / 1024 ** 2:7.1f} {linhas:>10,} {t_inteira / t_projecao:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
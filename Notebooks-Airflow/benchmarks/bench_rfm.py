@@ -0,0 +1,104 @@
+# Benchmark do RFM da camada gold: versão antiga (merge com dim_date + lambda
+# por cliente) x agregação vetorizada x atualização incremental do estado.
+#
+# O incremental monta o estado sem os últimos --meses-novos meses e reagrega
+# só as vendas desses meses, como numa execução com esses meses alterados na
+# bronze. Os três resultados precisam ser iguais.
+#
+# Uso:
+#   python benchmarks/bench_rfm.py [--silver caminho/dados_limpos.parquet] [--meses-novos 1]
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.gold import (  # noqa: E402
+    build_dim_date,
+    build_facts,
+    build_rfm,
+    build_rfm_state,
+    fact_periods,
+    prepare,
+    resolve_keys,
+    rfm_from_state,
+    update_rfm_state,
+)
+from etl.keys import read_registries  # noqa: E402
+
+SILVER_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'silver', 'dados_limpos.parquet'
+)
+
+
+def rfm_legado(fact_sales, dim_date):
+    """RFM como era calculado no 03_gold_layer.py original."""
+    fact_sales = fact_sales.merge(dim_date[['DateID', 'InvoiceDate']], on='DateID', how='left')
+    fact_sales['InvoiceDate'] = pd.to_datetime(fact_sales['InvoiceDate'])
+    latest_date = fact_sales['InvoiceDate'].max()
+    return (
+        fact_sales.groupby('CustomerID', observed=True)
+        .agg(
+            Recency=('InvoiceDate', lambda x: (latest_date - x.max()).days),
+            Frequency=('InvoiceNo', 'nunique'),
+            Monetary=('total_value', 'sum')
+        )
+        .reset_index()
+    )
+
+
+def cronometrar(func, repeticoes=3):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def normalizar(rfm):
+    rfm = rfm.astype({'CustomerID': str}).sort_values('CustomerID').reset_index(drop=True)
+    return rfm[['CustomerID', 'Recency', 'Frequency', 'Monetary']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do RFM da camada gold')
+    parser.add_argument('--silver', default=SILVER_PADRAO)
+    parser.add_argument('--meses-novos', type=int, default=1,
+                        help='meses finais reagregados no incremental')
+    args = parser.parse_args()
+
+    df_clean, cancelada = prepare(pd.read_parquet(args.silver))
+    df_clean = resolve_keys(df_clean, read_registries())
+    dim_date = build_dim_date(df_clean)
+    fact_sales, _, _ = build_facts(df_clean, cancelada)
+
+    _, mes = fact_periods(fact_sales, dim_date)
+    meses = sorted(mes.unique())[-args.meses_novos:]
+    novas = mes.isin(meses)
+    estado_anterior = build_rfm_state(fact_sales[~novas], dim_date)
+    print(f"vendas: {len(fact_sales)} | nos meses reagregados ({len(meses)}): {novas.sum()}")
+
+    t_legado, legado = cronometrar(lambda: rfm_legado(fact_sales, dim_date))
+    t_vetorizado, vetorizado = cronometrar(lambda: build_rfm(fact_sales, dim_date))
+    t_incremental, incremental = cronometrar(
+        lambda: rfm_from_state(update_rfm_state(estado_anterior, fact_sales, dim_date, meses))
+    )
+
+    esperado = normalizar(legado)
+    for nome, resultado in [('vetorizado', vetorizado), ('incremental', incremental)]:
+        pd.testing.assert_frame_equal(esperado, normalizar(resultado), check_dtype=False)
+        print(f"{nome}: igual ao legado")
+
+    print()
+    print(f"{'versão':<12} {'tempo (ms)':>11} {'speedup':>8}")
+    for nome, tempo in [('legado', t_legado), ('vetorizado', t_vetorizado), ('incremental', t_incremental)]:
+        print(f"{nome:<12} {tempo * 1000:11.1f} {t_legado / tempo:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
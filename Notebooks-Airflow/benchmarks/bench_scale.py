@@ -0,0 +1,176 @@
+# Benchmark de escala do pipeline com dados sintéticos (synthetic_data.py).
+#
+# Para cada escala (1x, 10x, 100x do arquivo do Kaggle) gera o CSV uma vez,
+# executa cada etapa do runner (etl/runner.py) em um processo separado e
+# registra tempo, linhas/s e pico de memória (ru_maxrss do processo da
+# etapa). O resultado é comparado com o baseline gravado: linhas diferentes
+# ou tempo/memória acima da tolerância são regressões e o script termina com
+# código 1.
+#
+# A etapa load só roda com --dw e esvazia as tabelas do DW antes de cada
+# escala: use um banco descartável (DW_CONNECTION_STRING).
+#
+# Uso:
+#   python benchmarks/bench_scale.py [--escalas 1 10 100] [--dir /tmp/ecommerce_escala]
+#                                    [--dw] [--tolerancia 0.25] [--salvar-baseline]
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'dags'))
+
+from etl.runner import STAGES, run_pipeline  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+BASELINE_PADRAO = os.path.join(BENCH_DIR, 'baseline_escala.json')
+
+
+def medir_etapa(etapa, base_dir, csv_path):
+    """Executa uma etapa neste processo e devolve as medidas (modo --etapa)."""
+    resultado = run_pipeline(base_dir, [etapa], True, csv_path, bronze_mode='full')
+    registros, segundos = resultado[etapa]
+    # ru_maxrss em KB no Linux
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        'registros': int(registros),
+        'segundos': round(segundos, 3),
+        'linhas_por_s': round(registros / segundos) if segundos > 0 else None,
+        'pico_mb': round(pico_mb, 1),
+    }
+
+
+def rodar_etapa(etapa, base_dir, csv_path):
+    """Executa a etapa em um subprocesso (pico de memória isolado por etapa)."""
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--etapa', etapa,
+         '--base-dir', base_dir, '--csv', csv_path],
+        capture_output=True, text=True,
+    )
+    if saida.returncode != 0:
+        print(saida.stderr[-3000:], file=sys.stderr)
+        raise SystemExit(f"etapa {etapa} falhou em {base_dir}")
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def limpar_dw():
+    from sqlalchemy import text
+
+    from etl.load import FACT_DIGEST_TABLE, GOLD_TABLES
+    from etl.warehouse import SQL_CREATE_CUBES, SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS, get_engine
+
+    with get_engine().begin() as conn:
+        for sql in [SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS, SQL_CREATE_CUBES]:
+            conn.execute(text(sql))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FACT_DIGEST_TABLE}"))
+        conn.execute(text(f"TRUNCATE {', '.join(GOLD_TABLES)} CASCADE"))
+
+
+def preparar_escala(diretorio, escala):
+    base_dir = os.path.join(diretorio, f'escala_{escala:g}')
+    os.makedirs(os.path.join(base_dir, 'data'), exist_ok=True)
+    csv_path = os.path.join(base_dir, 'ecommerce_sintetico.csv')
+    if not os.path.exists(csv_path):
+        inicio = time.perf_counter()
+        linhas = generate(csv_path, escala)
+        print(f"  CSV sintético {escala:g}x: {linhas:,} linhas em {time.perf_counter() - inicio:.1f}s")
+    return base_dir, csv_path
+
+
+def comparar(medida, base, tolerancia, tolerancia_memoria):
+    """Lista de regressões da medida em relação ao baseline."""
+    problemas = []
+    if medida['registros'] != base['registros']:
+        problemas.append(f"registros {medida['registros']} != {base['registros']}")
+    if medida['segundos'] > base['segundos'] * (1 + tolerancia):
+        problemas.append(f"tempo {medida['segundos']:.2f}s > {base['segundos']:.2f}s (+{tolerancia:.0%})")
+    if medida['pico_mb'] > base['pico_mb'] * (1 + tolerancia_memoria):
+        problemas.append(f"memória {medida['pico_mb']:.0f} MB > {base['pico_mb']:.0f} MB "
+                         f"(+{tolerancia_memoria:.0%})")
+    return problemas
+
+
+def variacao(atual, anterior):
+    return f"{(atual / anterior - 1):+.0%}" if anterior else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escala do pipeline com dados sintéticos')
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1, 10])
+    parser.add_argument('--dir', default='/tmp/ecommerce_escala', help='onde ficam CSVs e camadas de cada escala')
+    parser.add_argument('--dw', action='store_true', help='inclui a etapa load (esvazia as tabelas do DW)')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true', help='grava as medidas como novo baseline')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='aumento de tempo aceito')
+    parser.add_argument('--tolerancia-memoria', type=float, default=0.15, help='aumento de pico de memória aceito')
+    # Modo interno: mede uma etapa e imprime o JSON
+    parser.add_argument('--etapa', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--base-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.etapa:
+        # A saída do runner vai para stderr; a última linha do stdout é o JSON
+        sys.stdout, saida = sys.stderr, sys.stdout
+        medida = medir_etapa(args.etapa, args.base_dir, args.csv)
+        print(json.dumps(medida), file=saida)
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    etapas = [etapa for etapa in STAGES if etapa != 'load' or args.dw]
+
+    medidas, regressoes, comparadas = {}, [], 0
+    print(f"{'escala':>6} {'etapa':<7} {'registros':>12} {'tempo (s)':>10} {'linhas/s':>11} {'pico (MB)':>10} "
+          f"{'Δ tempo':>8} {'Δ memória':>10}")
+    for escala in args.escalas:
+        chave = f'{escala:g}'
+        base_dir, csv_path = preparar_escala(args.dir, escala)
+        medidas[chave] = {}
+        for etapa in etapas:
+            if etapa == 'load':
+                limpar_dw()
+            medida = rodar_etapa(etapa, base_dir, csv_path)
+            medidas[chave][etapa] = medida
+            base = baseline.get('escalas', {}).get(chave, {}).get(etapa)
+            print(f"{chave + 'x':>6} {etapa:<7} {medida['registros']:>12,} {medida['segundos']:10.2f} "
+                  f"{medida['linhas_por_s'] or 0:>11,} {medida['pico_mb']:10.0f} "
+                  f"{variacao(medida['segundos'], base and base['segundos']):>8} "
+                  f"{variacao(medida['pico_mb'], base and base['pico_mb']):>10}")
+            if base:
+                comparadas += 1
+                regressoes += [f"{chave}x {etapa}: {problema}"
+                               for problema in comparar(medida, base, args.tolerancia, args.tolerancia_memoria)]
+
+    if args.salvar_baseline:
+        baseline.setdefault('escalas', {}).update(medidas)
+        baseline['ambiente'] = {
+            'python': platform.python_version(),
+            'maquina': platform.machine(),
+            'cpus': os.cpu_count(),
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline gravado em {args.baseline}")
+    elif not baseline:
+        print(f"Sem baseline em {args.baseline}: rode com --salvar-baseline para criar.")
+
+    if regressoes:
+        print("\nREGRESSÕES:")
+        for regressao in regressoes:
+            print(f"  ✗ {regressao}")
+        sys.exit(1)
+    if comparadas:
+        print(f"Sem regressões em relação ao baseline ({comparadas} medidas comparadas).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Relatório de memória e tempo de groupby: tipos antigos (object/int64) x
+# schema compacto de etl/schema.py, para as camadas bronze, silver e gold.
+#
+# Uso:
+#   python benchmarks/bench_schema.py [--data caminho/para/dags/data]
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.schema import apply_schema, compact_gold, invoice_key  # noqa: E402
+
+DATA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data')
+
+
+def para_tipos_antigos(df):
+    """Volta uma tabela para a representação original (textos object, int64, float)."""
+    df = df.copy()
+    if 'InvoicePrefix' in df.columns:
+        df.insert(0, 'InvoiceNo', df['InvoicePrefix'].astype(str) + df['InvoiceNum'].astype(str))
+        df = df.drop(columns=['InvoicePrefix', 'InvoiceNum'])
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(object)
+    if 'Quantity' in df.columns:
+        df['Quantity'] = df['Quantity'].astype('int64')
+    if 'CustomerID' in df.columns and pd.api.types.is_integer_dtype(df['CustomerID']):
+        df['CustomerID'] = df['CustomerID'].astype('float64')
+    return df
+
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True, index=False).sum() / 1024 ** 2
+
+
+def cronometrar(func, repeticoes=3):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def groupbys_linhas(df):
+    """Agregações típicas da silver/gold sobre a tabela de linhas."""
+    chave_fatura = df['InvoiceNo'] if 'InvoiceNo' in df.columns else invoice_key(df)
+    return {
+        'Quantity por Country': lambda: df.groupby('Country', observed=True)['Quantity'].sum(),
+        'Quantity por StockCode': lambda: df.groupby('StockCode', observed=True)['Quantity'].sum(),
+        'faturas por CustomerID': lambda: chave_fatura.groupby(df['CustomerID']).nunique(),
+    }
+
+
+def groupbys_fato(df):
+    return {
+        'total_value por CustomerID': lambda: df.groupby('CustomerID', observed=True)['total_value'].sum(),
+        'Quantity por Cliente x Produto': lambda: df.groupby(['CustomerID', 'StockCode'], observed=True)['Quantity'].sum(),
+        'faturas por TransactionType': lambda: df.groupby('TransactionType', observed=True)['InvoiceNo'].nunique(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatório do schema compacto')
+    parser.add_argument('--data', default=DATA_PADRAO)
+    args = parser.parse_args()
+
+    camadas = {
+        'bronze': (f'{args.data}/bronze/dados_brutos.parquet', apply_schema, groupbys_linhas),
+        'silver': (f'{args.data}/silver/dados_limpos.parquet', apply_schema, groupbys_linhas),
+        'gold (fact_all)': (f'{args.data}/gold/fact_all.parquet', compact_gold, groupbys_fato),
+    }
+
+    print(f"{'camada':<16} {'antigo (MB)':>12} {'compacto (MB)':>14} {'redução':>8}")
+    tempos = []
+    for camada, (caminho, converter, groupbys) in camadas.items():
+        if not os.path.exists(caminho):
+            print(f"{camada:<16} arquivo não encontrado: {caminho}")
+            continue
+        compacto = converter(pd.read_parquet(caminho))
+        antigo = para_tipos_antigos(compacto)
+        mb_antigo, mb_compacto = memoria_mb(antigo), memoria_mb(compacto)
+        print(f"{camada:<16} {mb_antigo:12.1f} {mb_compacto:14.1f} {1 - mb_compacto / mb_antigo:8.0%}")
+
+        operacoes_antigo = groupbys(antigo)
+        for nome, operacao in groupbys(compacto).items():
+            tempos.append((camada, nome, cronometrar(operacoes_antigo[nome]), cronometrar(operacao)))
+
+    print()
+    print(f"{'camada':<16} {'groupby':<32} {'antigo (ms)':>12} {'compacto (ms)':>14} {'speedup':>8}")
+    for camada, nome, t_antigo, t_compacto in tempos:
+        print(f"{camada:<16} {nome:<32} {t_antigo * 1000:12.1f} {t_compacto * 1000:14.1f} {t_antigo / t_compacto:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
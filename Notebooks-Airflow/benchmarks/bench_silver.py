@@ -0,0 +1,99 @@
+# Benchmark da camada Silver: versão original (apply por linha + lambdas por grupo)
+# contra as funções vetorizadas de etl/silver.py.
+#
+# Replica a camada bronze 1x, 10x, 50x..., confere que as duas versões geram a
+# mesma saída e imprime o tempo e o custo por linha. Se o custo por linha da
+# versão vetorizada ficar estável entre as escalas, o estágio escala linearmente.
+#
+# Uso:
+#   python benchmarks/bench_silver.py --escalas 1 10 50 --legado-ate 1
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.schema import apply_schema, invoice_key  # noqa: E402
+from etl.silver import clean, null_mix_by_key  # noqa: E402
+
+BRONZE_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'bronze', 'dados_brutos.parquet'
+)
+
+
+def silver_legado(df):
+    """Trecho original do 02_silver_layer.py, mantido apenas para comparação."""
+    invoice_null = df.groupby('InvoiceNo')['CustomerID'].apply(lambda x: x.isnull().any())
+    invoice_notnull = df.groupby('InvoiceNo')['CustomerID'].apply(lambda x: x.notnull().any())
+    stock_null = df.groupby('StockCode')['Description'].apply(lambda x: x.isnull().any())
+    stock_notnull = df.groupby('StockCode')['Description'].apply(lambda x: x.notnull().any())
+
+    df_clean = df.copy()
+    mapa_descricoes = df_clean.dropna(subset=['Description']).groupby('StockCode')['Description'].first().to_dict()
+    df_clean['Description'] = df_clean.apply(
+        lambda row: mapa_descricoes.get(row['StockCode'], row['Description']),
+        axis=1
+    )
+    contagens = (invoice_null.sum(), invoice_notnull.sum(), stock_null.sum(), stock_notnull.sum())
+    return df_clean, contagens
+
+
+def silver_vetorizado(df):
+    # Recebe a bronze já no schema compacto (etl/schema.py)
+    invoice_null, invoice_notnull = null_mix_by_key(df, invoice_key(df), 'CustomerID')
+    stock_null, stock_notnull = null_mix_by_key(df, 'StockCode', 'Description')
+    df_clean = clean(df)
+    contagens = (invoice_null.sum(), invoice_notnull.sum(), stock_null.sum(), stock_notnull.sum())
+    return df_clean, contagens
+
+
+def texto(serie):
+    serie = serie.astype(object)
+    return serie.where(serie.notna(), None)
+
+
+def replicar(df, escala):
+    if escala == 1:
+        return df
+    return pd.concat([df] * escala, ignore_index=True)
+
+
+def medir(func, df):
+    inicio = time.perf_counter()
+    resultado = func(df)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da camada Silver')
+    parser.add_argument('--bronze', default=BRONZE_PADRAO)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--legado-ate', type=int, default=1,
+                        help='maior escala em que a versão original (lenta) também é executada')
+    args = parser.parse_args()
+
+    base = pd.read_parquet(args.bronze)
+    print(f"{'escala':>6} {'linhas':>12} {'legado (s)':>11} {'vetor. (s)':>11} {'ns/linha':>9} {'speedup':>8}")
+
+    for escala in args.escalas:
+        df = replicar(base, escala)
+        (novo, contagens_novo), t_novo = medir(silver_vetorizado, apply_schema(df.copy()))
+
+        t_legado = None
+        if escala <= args.legado_ate:
+            (antigo, contagens_antigo), t_legado = medir(silver_legado, df)
+            pd.testing.assert_series_equal(texto(antigo['Description']), texto(novo['Description']))
+            assert contagens_antigo == contagens_novo, (contagens_antigo, contagens_novo)
+
+        ns_linha = t_novo / len(df) * 1e9
+        legado_txt = f"{t_legado:11.2f}" if t_legado is not None else f"{'-':>11}"
+        speedup = f"{t_legado / t_novo:7.1f}x" if t_legado is not None else f"{'-':>8}"
+        print(f"{escala:>6} {len(df):>12,} {legado_txt} {t_novo:11.2f} {ns_linha:9.0f} {speedup}")
+
+
+if __name__ == '__main__':
+    main()
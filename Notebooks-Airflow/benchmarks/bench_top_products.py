@@ -0,0 +1,102 @@
+# Benchmark de most_purchased_products: versão antiga (dois groupby + sort
+# global + drop_duplicates + merge) x passada única com seleção parcial do
+# top N por cliente.
+#
+# Para simular um catálogo maior, cada StockCode é dividido em --catalogo
+# variantes (sufixo aleatório), mantendo o número de vendas. O top 1 da
+# versão nova precisa bater com o valor máximo da antiga por cliente.
+#
+# Uso:
+#   python benchmarks/bench_top_products.py [--silver caminho/dados_limpos.parquet]
+#                                           [--catalogo 1 4 16] [--top-n 3]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from etl.gold import TOP_N_PADRAO, build_facts, build_most_purchased_products, prepare, resolve_keys  # noqa: E402
+from etl.keys import read_registries  # noqa: E402
+
+SILVER_PADRAO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dags', 'data', 'silver', 'dados_limpos.parquet'
+)
+
+
+def top_legado(fact_sales):
+    """most_purchased_products como era calculado no 03_gold_layer.py original."""
+    most_quantity_product = (
+        fact_sales.groupby(['CustomerID', 'StockCode'], observed=True)
+        .agg(UnitsSold=('Quantity', 'sum'))
+        .reset_index()
+        .sort_values(['CustomerID', 'UnitsSold'], ascending=[True, False])
+        .drop_duplicates('CustomerID')
+    )
+    most_transaction_product = (
+        fact_sales.groupby(['CustomerID', 'StockCode'], observed=True)
+        .agg(Transactions=('InvoiceNo', 'nunique'))
+        .reset_index()
+        .sort_values(['CustomerID', 'Transactions'], ascending=[True, False])
+        .drop_duplicates('CustomerID')
+    )
+    return most_quantity_product, most_transaction_product, most_quantity_product.merge(
+        most_transaction_product,
+        on=['CustomerID', 'StockCode']
+    )
+
+
+def ampliar_catalogo(fact_sales, fator, seed=0):
+    if fator == 1:
+        return fact_sales
+    sufixo = np.random.default_rng(seed).integers(0, fator, len(fact_sales)).astype(str)
+    fact_sales = fact_sales.copy()
+    fact_sales['StockCode'] = (fact_sales['StockCode'].astype(str) + '-' + sufixo).astype('category')
+    return fact_sales
+
+
+def cronometrar(func, repeticoes=3):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def conferir(legado_quantidade, legado_transacoes, novo):
+    """O top 1 novo tem o mesmo valor máximo por cliente que a versão antiga."""
+    for criterio, legado in [('UnitsSold', legado_quantidade), ('Transactions', legado_transacoes)]:
+        top1 = novo[(novo['Criterion'] == criterio) & (novo['Rank'] == 1)]
+        esperado = legado.set_index(legado['CustomerID'].astype(str))[criterio].sort_index()
+        obtido = top1.set_index(top1['CustomerID'].astype(str))[criterio].sort_index()
+        pd.testing.assert_series_equal(esperado, obtido, check_dtype=False, check_names=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do top N de produtos por cliente')
+    parser.add_argument('--silver', default=SILVER_PADRAO)
+    parser.add_argument('--catalogo', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--top-n', type=int, default=TOP_N_PADRAO)
+    args = parser.parse_args()
+
+    df_clean, cancelada = prepare(pd.read_parquet(args.silver))
+    fact_sales, _, _ = build_facts(resolve_keys(df_clean, read_registries()), cancelada)
+
+    print(f"{'catálogo':>9} {'produtos':>9} {'legado (ms)':>12} {'novo (ms)':>10} {'speedup':>8} "
+          f"{'clientes legado':>16} {'clientes novo':>14}")
+    for fator in args.catalogo:
+        vendas = ampliar_catalogo(fact_sales, fator)
+        t_legado, (quantidade, transacoes, legado) = cronometrar(lambda: top_legado(vendas))
+        t_novo, novo = cronometrar(lambda: build_most_purchased_products(vendas, args.top_n))
+        conferir(quantidade, transacoes, novo)
+        print(f"{fator:>8}x {vendas['StockCode'].nunique():>9} {t_legado * 1000:12.1f} {t_novo * 1000:10.1f} "
+              f"{t_legado / t_novo:7.1f}x {legado['CustomerID'].nunique():>16} {novo['CustomerID'].nunique():>14}")
+
+
+if __name__ == '__main__':
+    main()
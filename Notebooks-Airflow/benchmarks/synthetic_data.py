@@ -0,0 +1,278 @@
+# Gerador determinístico de dados sintéticos no formato do CSV do Kaggle
+# (carrie1/ecommerce-data), para medir o pipeline além das ~541 mil linhas
+# do arquivo original, sem acesso à internet.
+#
+# Mantém a forma do dataset original (proporções medidas no arquivo real):
+# - ~21 linhas por fatura (cauda longa), faturas em ordem de InvoiceDate,
+#   de 1/12/2010 a 9/12/2011, sem sábados, das 6h às 20h, com mais vendas no
+#   fim do ano;
+# - prefixo 'C' em ~15% das faturas (cancelamentos, quantidades negativas)
+#   e raríssimas faturas 'A' (ajuste de dívida, StockCode 'B');
+# - linhas de tarifas (POST, DOT, C2, AMAZONFEE) e manuais (M);
+# - ~25% das linhas sem CustomerID, ~91% das linhas no Reino Unido;
+# - Quantity assimétrica (pacotes 1, 2, 12, 6... e outliers de milhares),
+#   UnitPrice log-normal por produto, linhas com preço 0 e sem Description,
+#   linhas duplicadas.
+#
+# A mesma semente e escala geram sempre o mesmo arquivo. As faturas são
+# sorteadas de uma vez e as linhas são geradas e gravadas em blocos, então
+# a memória não cresce com a escala.
+#
+# Uso:
+#   python benchmarks/synthetic_data.py saida.csv [--escala 10] [--seed 42]
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+LINHAS_BASE = 541_909
+CLIENTES_BASE = 4_372
+PRODUTOS_BASE = 4_070
+PRIMEIRA_FATURA = 536_365
+
+INICIO = pd.Timestamp('2010-12-01')
+FIM = pd.Timestamp('2011-12-09')
+
+# Faturas por bloco gravado no CSV
+FATURAS_POR_BLOCO = 50_000
+
+# Pesos medidos no arquivo original (linhas por mês e por hora)
+PESO_MES = {1: 35, 2: 28, 3: 37, 4: 30, 5: 37, 6: 37, 7: 40, 8: 35, 9: 50, 10: 61, 11: 85, 12: 68}
+PESO_HORA = {6: 0.1, 7: 0.4, 8: 9, 9: 34, 10: 49, 11: 58, 12: 79, 13: 72, 14: 67, 15: 78, 16: 55,
+             17: 29, 18: 8, 19: 4, 20: 1}
+
+# Países (fração dos clientes; o restante dividido entre os demais)
+PAISES = {
+    'United Kingdom': 0.90, 'Germany': 0.022, 'France': 0.020, 'EIRE': 0.004, 'Spain': 0.007,
+    'Netherlands': 0.002, 'Belgium': 0.006, 'Switzerland': 0.005, 'Portugal': 0.004, 'Australia': 0.002,
+    'Norway': 0.002, 'Italy': 0.003, 'Channel Islands': 0.002, 'Finland': 0.003, 'Cyprus': 0.002,
+    'Sweden': 0.002, 'Austria': 0.002, 'Denmark': 0.002, 'Japan': 0.002, 'Poland': 0.001,
+    'USA': 0.001, 'Israel': 0.001, 'Unspecified': 0.001, 'Singapore': 0.0005, 'Iceland': 0.0005,
+    'Canada': 0.001, 'Greece': 0.001, 'Malta': 0.0005, 'United Arab Emirates': 0.0005,
+    'European Community': 0.0005, 'RSA': 0.0005, 'Lebanon': 0.0005, 'Lithuania': 0.0005,
+    'Brazil': 0.0005, 'Czech Republic': 0.0005, 'Bahrain': 0.0005, 'Saudi Arabia': 0.0005,
+    'Hong Kong': 0.0005,
+}
+
+# Quantidades mais comuns nas vendas (valor: peso)
+PACOTES = {1: 148, 2: 82, 12: 61, 6: 41, 4: 38, 3: 37, 24: 24, 10: 22, 8: 13, 5: 12, 48: 6,
+           25: 5, 20: 5, 16: 4, 36: 4, 72: 2, 96: 2, 100: 2, 144: 1, 7: 2, 9: 1, 18: 1, 32: 1}
+
+# Linhas extras por fatura de venda: (StockCode, Description, preço típico, probabilidade)
+TARIFAS = [
+    ('POST', 'POSTAGE', 18.0, 0.045),
+    ('DOT', 'DOTCOM POSTAGE', 120.0, 0.027),
+    ('C2', 'CARRIAGE', 50.0, 0.0055),
+    ('M', 'Manual', 3.0, 0.018),
+]
+
+# Frações por linha / fatura
+FATURAS_CANCELADAS = 0.148
+FATURAS_AJUSTE = 0.0001
+FATURAS_SEM_CLIENTE = 0.075
+LINHAS_SEM_DESCRICAO = 0.0027
+LINHAS_PRECO_ZERO = 0.002
+LINHAS_DUPLICADAS = 0.004
+LINHAS_OUTLIER = 0.004
+
+
+def _pesos(dicionario):
+    valores = np.array(list(dicionario.values()), dtype='float64')
+    return np.array(list(dicionario)), valores / valores.sum()
+
+
+def _dias_uteis():
+    dias = pd.date_range(INICIO, FIM, freq='D')
+    dias = dias[dias.dayofweek != 5]
+    peso = dias.month.map(PESO_MES).to_numpy(dtype='float64')
+    return dias, peso / peso.sum()
+
+
+def _catalogo(rng, n_produtos):
+    """StockCode, Description e preço base de cada produto."""
+    base = 10_000 + np.arange(n_produtos)
+    sufixo = np.where(rng.random(n_produtos) < 0.1, rng.choice(list('ABCDEFGHJKLMNP'), n_produtos), '')
+    codigos = pd.Index(base.astype(str)) + sufixo
+    descricoes = 'ITEM SINTETICO ' + pd.Index(np.arange(n_produtos).astype(str)).str.zfill(6)
+    precos = np.round(np.exp(rng.normal(np.log(2.08), 0.85, n_produtos)), 2).clip(0.01, 650)
+    # Popularidade tipo Zipf: poucos produtos concentram a maior parte das vendas
+    popularidade = 1.0 / np.arange(1, n_produtos + 1) ** 0.7
+    return codigos.to_numpy(), descricoes.to_numpy(), precos, popularidade / popularidade.sum()
+
+
+def _clientes(rng, n_clientes):
+    """CustomerID (texto '12346.0') e país de cada cliente, e a atividade de cada um."""
+    ids = 12_346 + np.arange(n_clientes)
+    nomes, pesos = _pesos(PAISES)
+    paises = rng.choice(nomes, n_clientes, p=pesos)
+    atividade = rng.pareto(1.6, n_clientes) + 1
+    rotulos = pd.Index(ids.astype(str)) + '.0'
+    return rotulos.to_numpy(), paises, atividade / atividade.sum()
+
+
+def _faturas(rng, linhas, clientes, paises, atividade):
+    """Tabela de faturas em ordem cronológica, com o número de linhas de cada uma."""
+    n = int(linhas / 19) + 1
+    tipo = rng.choice(np.array(['', 'C', 'A']), n,
+                      p=[1 - FATURAS_CANCELADAS - FATURAS_AJUSTE, FATURAS_CANCELADAS, FATURAS_AJUSTE])
+    sem_cliente = rng.random(n) < FATURAS_SEM_CLIENTE
+    tamanho = np.where(
+        tipo == '',
+        np.exp(rng.normal(2.45, 1.15, n)).clip(1, 1_200),
+        np.exp(rng.normal(0.5, 0.9, n)).clip(1, 100),
+    ).astype('int64')
+    # Faturas sem cliente são maiores (lançamentos manuais e de balcão)
+    tamanho = np.where(sem_cliente & (tipo == ''), tamanho * 4, tamanho)
+    tamanho[tipo == 'A'] = 1
+
+    dias, peso_dia = _dias_uteis()
+    horas, peso_hora = _pesos(PESO_HORA)
+    instante = (
+        dias.to_numpy()[rng.choice(len(dias), n, p=peso_dia)]
+        + rng.choice(horas, n, p=peso_hora).astype('timedelta64[h]')
+        + rng.integers(0, 60, n).astype('timedelta64[m]')
+    )
+    cliente = rng.choice(len(clientes), n, p=atividade)
+
+    # Corta no total de linhas pedido
+    acumulado = np.cumsum(tamanho)
+    n = int(np.searchsorted(acumulado, linhas)) + 1
+    tamanho = tamanho[:n].copy()
+    tamanho[-1] -= acumulado[n - 1] - linhas
+    ordem = np.argsort(instante[:n], kind='stable')
+    tipo, sem_cliente, tamanho = tipo[ordem], sem_cliente[ordem], tamanho[ordem]
+    instante, cliente = instante[ordem], cliente[ordem]
+
+    datas = pd.DatetimeIndex(instante)
+    texto_data = (
+        datas.month.astype(str) + '/' + datas.day.astype(str) + '/' + datas.year.astype(str) + ' '
+        + datas.hour.astype(str) + ':' + pd.Index(datas.minute.astype(str)).str.zfill(2)
+    )
+    numero = tipo + pd.Index((PRIMEIRA_FATURA + np.arange(n)).astype(str))
+    return pd.DataFrame({
+        'InvoiceNo': numero,
+        'InvoiceDate': texto_data,
+        'CustomerID': np.where(sem_cliente, None, clientes[cliente]),
+        'Country': np.where(sem_cliente, 'United Kingdom', paises[cliente]),
+        'tipo': tipo,
+        'tamanho': tamanho,
+    })
+
+
+def _quantidades(rng, n):
+    valores, pesos = _pesos(PACOTES)
+    quantidade = rng.choice(valores, n, p=pesos).astype('int64')
+    outlier = rng.random(n) < LINHAS_OUTLIER
+    quantidade[outlier] = np.exp(rng.normal(5.5, 1.3, outlier.sum())).clip(1, 80_995).astype('int64')
+    return quantidade
+
+
+def _linhas(rng, faturas, catalogo):
+    """Linhas de um bloco de faturas: produtos, tarifas, preços e anomalias."""
+    codigos, descricoes, precos, popularidade = catalogo
+    fatura = np.repeat(np.arange(len(faturas)), faturas['tamanho'].to_numpy())
+    n = len(fatura)
+    produto = rng.choice(len(codigos), n, p=popularidade)
+    tipo = faturas['tipo'].to_numpy()[fatura]
+
+    stock = codigos[produto].astype(object)
+    descricao = descricoes[produto].astype(object)
+    preco = precos[produto] * np.where(rng.random(n) < 0.05, 0.85, 1.0)
+    quantidade = _quantidades(rng, n)
+    quantidade[tipo == 'C'] *= -1
+
+    ajuste = tipo == 'A'
+    stock[ajuste], descricao[ajuste] = 'B', 'Adjust bad debt'
+    quantidade[ajuste] = 1
+    preco[ajuste] = np.round(np.exp(rng.normal(8.5, 0.5, ajuste.sum())), 2)
+
+    # Linhas sem Description: preço 0 e, às vezes, quantidade negativa (avarias)
+    sem_descricao = (rng.random(n) < LINHAS_SEM_DESCRICAO) & (tipo == '')
+    descricao[sem_descricao] = None
+    preco[sem_descricao] = 0.0
+    quantidade[sem_descricao & (rng.random(n) < 0.6)] *= -1
+    preco[(rng.random(n) < LINHAS_PRECO_ZERO) & (tipo == '')] = 0.0
+
+    linhas = pd.DataFrame({
+        '_fatura': fatura,
+        'StockCode': stock,
+        'Description': descricao,
+        'Quantity': quantidade,
+        'UnitPrice': np.round(preco, 2),
+    })
+
+    # Tarifas: uma linha ao fim de algumas faturas (as canceladas cancelam a tarifa também)
+    tipo_fatura = faturas['tipo'].to_numpy()
+    extras = []
+    for codigo, nome, preco_tipico, probabilidade in TARIFAS:
+        escolhidas = np.flatnonzero((rng.random(len(faturas)) < probabilidade) & (tipo_fatura != 'A'))
+        sinal = np.where(tipo_fatura[escolhidas] == 'C', -1, 1)
+        extras.append(pd.DataFrame({
+            '_fatura': escolhidas,
+            'StockCode': codigo,
+            'Description': nome,
+            'Quantity': sinal * rng.integers(1, 4, len(escolhidas)),
+            'UnitPrice': np.round(preco_tipico * np.exp(rng.normal(0, 0.3, len(escolhidas))), 2),
+        }))
+    amazon = np.flatnonzero((rng.random(len(faturas)) < 0.0013) & (tipo_fatura == 'C'))
+    extras.append(pd.DataFrame({
+        '_fatura': amazon, 'StockCode': 'AMAZONFEE', 'Description': 'AMAZON FEE',
+        'Quantity': -1, 'UnitPrice': np.round(np.exp(rng.normal(8, 0.6, len(amazon))), 2),
+    }))
+
+    # Duplicatas exatas (a silver remove)
+    duplicadas = linhas[rng.random(n) < LINHAS_DUPLICADAS]
+    linhas = pd.concat([linhas, duplicadas, *extras], ignore_index=True)
+    linhas = linhas.sort_values('_fatura', kind='stable', ignore_index=True)
+
+    cabecalho = faturas.iloc[linhas['_fatura'].to_numpy()].reset_index(drop=True)
+    return pd.DataFrame({
+        'InvoiceNo': cabecalho['InvoiceNo'],
+        'StockCode': linhas['StockCode'],
+        'Description': linhas['Description'],
+        'Quantity': linhas['Quantity'],
+        'InvoiceDate': cabecalho['InvoiceDate'],
+        'UnitPrice': linhas['UnitPrice'],
+        'CustomerID': cabecalho['CustomerID'],
+        'Country': cabecalho['Country'],
+    })
+
+
+def generate(caminho, escala=1, seed=42):
+    """Grava o CSV sintético com ~541.909 * `escala` linhas; retorna o total de linhas."""
+    rng = np.random.default_rng(seed)
+    alvo = int(round(LINHAS_BASE * escala))
+    # Base de clientes cresce com a escala; o catálogo cresce mais devagar
+    catalogo = _catalogo(rng, max(100, int(PRODUTOS_BASE * escala ** 0.5)))
+    clientes, paises, atividade = _clientes(rng, max(50, int(CLIENTES_BASE * escala)))
+    # Linhas de fatura sem contar tarifas e duplicatas (~0,8% a mais)
+    faturas = _faturas(rng, int(alvo / 1.008), clientes, paises, atividade)
+
+    total = 0
+    for bloco, inicio in enumerate(range(0, len(faturas), FATURAS_POR_BLOCO)):
+        # Uma semente por bloco: o conteúdo não depende do tamanho dos blocos anteriores
+        rng_bloco = np.random.default_rng([seed, bloco])
+        linhas = _linhas(rng_bloco, faturas.iloc[inicio:inicio + FATURAS_POR_BLOCO].reset_index(drop=True),
+                         catalogo)
+        linhas.to_csv(caminho, mode='w' if bloco == 0 else 'a', header=bloco == 0,
+                      index=False, encoding='ISO-8859-1')
+        total += len(linhas)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um CSV sintético no formato do dataset do Kaggle')
+    parser.add_argument('saida')
+    parser.add_argument('--escala', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    linhas = generate(args.saida, args.escala, args.seed)
+    print(f"{linhas:,} linhas gravadas em {args.saida} ({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
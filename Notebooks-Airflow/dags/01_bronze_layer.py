@@ -15,57 +15,66 @@ import pandas as pd
 import kagglehub
 import os 
 from datetime import datetime
-import time
-import csv
 
-# medir tempo
-inicio = time.time()
+from etl.bronze import (
+    BATCH_SIZE_PADRAO,
+    add_ingestion_metadata,
+    ingest_incremental,
+    iter_csv_batches,
+    stream_to_parquet,
+)
+from etl.telemetry import StageTelemetry
 
 # Definindo o diretório base para os dados
 BASE_DIR = "/opt/airflow/dags"
 DATA_PATH = f"{BASE_DIR}/data"
 
+# medir tempo, memória e I/O de cada passo (etl/telemetry.py)
+telemetria = StageTelemetry("bronze", BASE_DIR)
+
+# Modo de ingestão:
+# - "full": reescreve dados_brutos.parquet com o histórico completo (padrão)
+# - "incremental": acrescenta só as linhas após a marca d'água no dataset
+#   particionado bronze/dataset/year=/month=
+MODO_INGESTAO = os.environ.get("BRONZE_MODE", "full")
+
+# Linhas lidas do CSV por lote: o pico de memória da ingestão depende deste
+# valor, não do tamanho do arquivo
+BATCH_SIZE = int(os.environ.get("BRONZE_BATCH_SIZE", BATCH_SIZE_PADRAO))
+FONTE = "carrie1/ecommerce-data"
+
 # Criar estrutura de pastas 
 os.makedirs(f"{DATA_PATH}/bronze", exist_ok=True)
 os.makedirs(f"{DATA_PATH}/silver", exist_ok=True)
 os.makedirs(f"{DATA_PATH}/gold", exist_ok=True)
 
 # Carregar dados da fonte original 
-path = kagglehub.dataset_download("carrie1/ecommerce-data")
+with telemetria.step("download"):
+    path = kagglehub.dataset_download("carrie1/ecommerce-data")
 csv_path = os.path.join(path, "data.csv")
-df_raw = pd.read_csv(csv_path, encoding="ISO-8859-1")
-
-print(f"Dados carregados {df_raw.shape[0]} linhas, {df_raw.shape[1]} colunas")
+lotes = iter_csv_batches(csv_path, batch_size=BATCH_SIZE, encoding="ISO-8859-1")
 
-# Adicionar informações adicionais
-df_raw["data_ingestao"] = datetime.now()
-df_raw["fonte_arquivos"] = "carrie1/ecommerce-data"
-
-# Salvando camada bronze
-df_raw.to_parquet(f"{DATA_PATH}/bronze/dados_brutos.parquet", index=False)
+# Adicionar informações adicionais (em cada lote) e salvar a camada bronze
+# (leitura e escrita acontecem juntas, lote a lote: um único passo)
+with telemetria.step("ingest") as passo:
+    if MODO_INGESTAO == "incremental":
+        data_ingestao = datetime.now()
+        registros, particoes = ingest_incremental(
+            (add_ingestion_metadata(lote, FONTE, data_ingestao) for lote in lotes),
+            f"{DATA_PATH}/bronze",
+        )
+        print(f"Linhas novas: {registros} | Partições alteradas: {particoes}")
+    else:
+        registros = stream_to_parquet(lotes, f"{DATA_PATH}/bronze/dados_brutos.parquet", FONTE)
+        print(f"Dados carregados {registros} linhas (lotes de {BATCH_SIZE})")
+    passo.linhas_saida = registros
 print("Dados salvos na camada bronze")
 
 # =============================
 # LOG DO PIPELINE (bronze)
 # =============================
 
-fim = time.time()
-duracao = fim - inicio
-registros = df_raw.shape[0]
-
-log_file = f"{BASE_DIR}/logs_pipeline.csv"
-
-log = [
-    datetime.now(),   # data_execucao
-    "bronze",         # camada
-    "sucesso",        # status
-    round(duracao, 2),
-    registros
-]
-
-# salva o log
-with open(log_file, "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(log)
+# telemetry.db (passos + etapa) e a linha de sempre no logs_pipeline.csv
+telemetria.finish(registros)
 
-print("Log registrado no arquivo logs_pipeline.csv")
+print("Log registrado em telemetry.db e logs_pipeline.csv")
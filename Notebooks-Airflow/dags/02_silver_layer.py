@@ -13,22 +13,63 @@
 # Os dados da camada Bronze são carregados, tratados e salvos na camada Silver em formato otimizado.
 
 
-import pandas as pd
 import os
-from datetime import datetime
-import time
-import csv
-
-# medir tempo
-inicio = time.time()
+import sys
+
+from etl.bronze import read_bronze
+from etl.dataset import read_inputs
+from etl.schema import FINGERPRINT_COLUMN, apply_schema, invoice_key, memory_report, refresh_fingerprint
+from etl.silver import (
+    STOCKCODE_FEES,
+    description_map,
+    duplicated_rows,
+    extend_description_map,
+    fill_descriptions,
+    incremental_partitions,
+    inconsistency_mask,
+    iqr_outlier_mask,
+    null_mix_by_key,
+    read_description_map,
+    write_description_map,
+    write_silver_partitions,
+)
+from etl.telemetry import StageTelemetry
 
 # Definindo o diretório base para os dados (deve ser o mesmo do 01_bronze_layer.py)
 BASE_DIR = "/opt/airflow/dags"
 DATA_PATH = f"{BASE_DIR}/data"
 
+# Processos para montar o mapeamento de descrições por partição (mês ou
+# hash do CustomerID); 1 = serial. Ver etl/parallel.py
+WORKERS = int(os.environ.get("PIPELINE_WORKERS", 1))
+PARTICAO = os.environ.get("PIPELINE_PARTITION", "month")
+
+# No modo incremental a silver também é um dataset particionado e só as
+# partições alteradas pelo último lote da bronze são limpas (etl/silver.py)
+INCREMENTAL = os.environ.get("BRONZE_MODE", "full") == "incremental"
+SILVER_PATH = f"{DATA_PATH}/silver"
+
+# medir tempo, memória e I/O de cada passo (etl/telemetry.py)
+telemetria = StageTelemetry("silver", BASE_DIR)
+
 # Carregar  dados da camada bronze
-df = pd.read_parquet(f"{DATA_PATH}/bronze/dados_brutos.parquet")
+# (no modo incremental a bronze é um dataset particionado por year=/month=:
+# só as partições alteradas pelo último lote, ou todas na primeira execução)
+with telemetria.step("read_bronze") as passo:
+    if INCREMENTAL:
+        particoes = incremental_partitions(f"{DATA_PATH}/bronze", SILVER_PATH)
+        df = read_bronze(f"{DATA_PATH}/bronze", particoes)
+    else:
+        df = read_inputs(DATA_PATH, 'silver')['bronze']
+    # Tipos compactos compartilhados (bronze antigas, gravadas como texto, também são convertidas)
+    df = apply_schema(df)
+    passo.linhas_saida = len(df)
 print(f"Dados originais {df.shape}")
+if df.empty:
+    # Lote da bronze sem linhas novas: a silver fica como está
+    telemetria.finish(0, 0)
+    print("Nenhuma partição alterada na bronze")
+    sys.exit(0)
 df_clean = df.copy()
 
 
@@ -48,8 +89,7 @@ df_clean = df.copy()
 
 
 # Contar quantos InvoiceNo possuem pelo menos um CustomerID nulo
-invoice_null = df.groupby('InvoiceNo')['CustomerID'].apply(lambda x: x.isnull().any())
-invoice_notnull = df.groupby('InvoiceNo')['CustomerID'].apply(lambda x: x.notnull().any())
+invoice_null, invoice_notnull = null_mix_by_key(df, invoice_key(df), 'CustomerID')
 
 # Quantos têm mistura (nulo e não nulo)?
 mixed_invoice = (invoice_null & invoice_notnull)
@@ -79,8 +119,7 @@ print(f"Total de linhas com CustomerID nulo: {df['CustomerID'].isnull().sum()}")
 # Cada produto possui o seu StockCode. Muitos Description (nome do produto) estão NaN ou preenchidos de forma errada, porém possuem StockCode iguais
 
 # Contar quantos StockCode possuem pelo menos um Description nulo
-StockCode_null = df.groupby('StockCode')['Description'].apply(lambda x: x.isnull().any())
-StockCode_notnull = df.groupby('StockCode')['Description'].apply(lambda x: x.notnull().any())
+StockCode_null, StockCode_notnull = null_mix_by_key(df, 'StockCode', 'Description')
 
 # Quantos têm mistura (nulo e não nulo)?
 mixed_StockCode = (StockCode_null & StockCode_notnull)
@@ -102,14 +141,19 @@ print(f"Quantidade de Description NaN do StockCode 35965: {df[df['StockCode'] ==
 # Verificamos se é possível recuperar descrições de produtos usando o StockCode como referência. Como cada StockCode representa um produto específico, podemos usar o primeiro valor válido encontrado para preencher os demais.
 
 
-# Criar mapeamento de StockCode  Description válida
-mapa_descricoes = df_clean.dropna(subset=['Description']).groupby('StockCode')['Description'].first().to_dict()
+with telemetria.step("fill_descriptions", len(df_clean)):
+    # Criar mapeamento de StockCode  Description válida
+    mapa_descricoes = description_map(df_clean, WORKERS, PARTICAO)
+    if INCREMENTAL:
+        # Mapa do histórico: só os StockCodes novos entram nele
+        anterior = read_description_map(SILVER_PATH) if particoes is not None else None
+        mapa_descricoes = extend_description_map(anterior, mapa_descricoes)
 
-# Preencher Description de acordo com o primeiro valor
-df_clean['Description'] = df_clean.apply(
-    lambda row: mapa_descricoes.get(row['StockCode'], row['Description']),
-    axis=1
-)
+    # Preencher Description de acordo com o primeiro valor
+    df_clean['Description'] = fill_descriptions(df_clean, mapa_descricoes)
+
+    # Impressão digital da linha (calculada na bronze): só o hash de Description muda
+    df_clean[FINGERPRINT_COLUMN] = refresh_fingerprint(df_clean, 'Description', df['Description'])
 
 print(f"Descriptions recuperados: {df['Description'].isnull().sum() - df_clean['Description'].isnull().sum()}")
 print(f"Descriptions não recuperados: {df_clean['Description'].isnull().sum()}")
@@ -126,8 +170,9 @@ print(f"Quantidade de Descriptions erradas corrigidas: {df['Description'].nuniqu
 
 
 
-print(f"Quantidade de linhas duplicadas: {df_clean.duplicated().sum()}")
-# display(df_clean[df_clean.duplicated()]) # Comentado para evitar erro de display em ambiente não-notebook
+# Pela hash_linha: não re-hasheia todas as colunas de todas as linhas
+print(f"Quantidade de linhas duplicadas: {duplicated_rows(df_clean)}")
+# display(df_clean[df_clean[FINGERPRINT_COLUMN].duplicated()]) # Comentado para evitar erro de display em ambiente não-notebook
 
 
 # #### Verificação de Duplicatas Completas
@@ -140,15 +185,11 @@ print(f"Quantidade de linhas duplicadas: {df_clean.duplicated().sum()}")
 
 
 # Linhas de tarifas
-stockcode_fees = ['C2', 'DOT', 'POST','AMAZONFEE']
+stockcode_fees = STOCKCODE_FEES
 
 # Filtrar DataFrame para mostrar Inconsistências:
 #(InvoiceNo que começam com 'C','A)'| Quantity <= 0 | UnitPrice <= 0 e StockCode de tarifas
-df_inconsistencias = df_clean[
-   (df_clean['InvoiceNo'].astype(str).str.startswith('C')) |
-    (df_clean['InvoiceNo'].astype(str).str.startswith('A')) |
-     (df_clean['Quantity'] <= 0) | (df_clean['UnitPrice'] <= 0) | (df_clean['StockCode'].isin(stockcode_fees))
-]
+df_inconsistencias = df_clean[inconsistency_mask(df_clean, stockcode_fees)]
 
 # display(df_inconsistencias) # Comentado para evitar erro de display em ambiente não-notebook
 print("Dados serão divididos na camada gold")
@@ -201,11 +242,7 @@ print("Foram feitos cancelamenos das compras Outliers")
 
 
 # Testar outliers usando IQR para a coluna 'Quantity'
-Q1 = df_clean['Quantity'].quantile(0.25)
-Q3 = df_clean['Quantity'].quantile(0.75)
-IQR = Q3 - Q1
-
-outliers_iqr = df_clean[(df_clean['Quantity'] < (Q1 - 1.5 * IQR)) | (df_clean['Quantity'] > (Q3 + 1.5 * IQR))]
+outliers_iqr = df_clean[iqr_outlier_mask(df_clean['Quantity'])]
 print(f"Quantidade de outliers detectados pelo IQR em Quantity: {outliers_iqr.shape[0]}")
 # display(outliers_iqr) # Comentado para evitar erro de display em ambiente não-notebook
 
@@ -234,8 +271,15 @@ print(f"Quantidade de outliers detectados pelo IQR em Quantity: {outliers_iqr.sh
 # In[10]:
 
 
-df_clean.to_parquet(f"{DATA_PATH}/silver/dados_limpos.parquet",index=False)
+with telemetria.step("write_silver", len(df_clean)):
+    if INCREMENTAL:
+        # Substitui só as partições limpas; o mapa de descrições vem depois delas
+        write_silver_partitions(df_clean, SILVER_PATH)
+        write_description_map(mapa_descricoes, SILVER_PATH)
+    else:
+        df_clean.to_parquet(f"{DATA_PATH}/silver/dados_limpos.parquet",index=False)
 print("Dados salvos na camada Silver")
+print(f"Memória da camada Silver: {memory_report(df_clean, 'silver')['MB'].iloc[-1]} MB")
 
 
 # ### Salvamento dos Dados Limpos
@@ -245,23 +289,9 @@ print("Dados salvos na camada Silver")
 # LOG DO PIPELINE (silver)
 # =============================
 
-fim = time.time()
-duracao = fim - inicio
 registros = df_clean.shape[0]
 
-log_file = f"{BASE_DIR}/logs_pipeline.csv"
-
-log = [
-    datetime.now(),   # data_execucao
-    "silver",         # camada
-    "sucesso",        # status
-    round(duracao, 2),
-    registros
-]
-
-# salva o log
-with open(log_file, "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(log)
+# telemetry.db (passos + etapa) e a linha de sempre no logs_pipeline.csv
+telemetria.finish(registros, df.shape[0])
 
-print("Log registrado no arquivo logs_pipeline.csv")
\ No newline at end of file
+print("Log registrado em telemetry.db e logs_pipeline.csv")
@@ -12,142 +12,74 @@
 # Implementamos um modelo dimensional estrela (star schema) 
 # com dimensões desnormalizadas para melhor performance analítica.
 
-import pandas as pd
 import os
-from datetime import datetime
-import time
-import csv
 
-# medir tempo
-inicio = time.time()
+from etl.bronze import changed_months, read_changed_partitions
+from etl.dataset import READS, read_inputs
+from etl.gold import TOP_N_PADRAO, build_gold, read_cubes, read_rfm_state, read_star_schema, write_gold
+from etl.keys import KEYS_DIR, read_registries, write_registries
+from etl.schema import memory_report
+from etl.silver import read_silver
+from etl.telemetry import StageTelemetry
 
 # Definindo o diretório base para os dados (deve ser o mesmo dos scripts anteriores)
 BASE_DIR = "/opt/airflow/dags"
 DATA_PATH = f"{BASE_DIR}/data"
 
-# Carregar dados da camada silver
-df_clean = pd.read_parquet(f'{DATA_PATH}/silver/dados_limpos.parquet')
-
-# Linhas stockcode de tarifas
-stockcode_fees = ['C2', 'DOT', 'POST','AMAZONFEE']
-df_clean['total_value'] = df_clean['Quantity'] * df_clean['UnitPrice']
-
-# =========================================
-#               CRIAÇÃO DE TABELAS
-# =========================================
-
-# --------- Dimensao Country -----------
-dim_country = (
-    df_clean[['Country']]
-    .drop_duplicates()
-    .copy()
-)
-dim_country = dim_country.reset_index(drop=True)
-dim_country['CountryID'] = dim_country.index + 1
-
-# --------- Dimensao Date -----------
-dim_date = (
-    df_clean[['InvoiceDate']]
-    .drop_duplicates(subset=['InvoiceDate'])
-    .copy()
-)
-dim_date = dim_date.reset_index(drop=True)
-dim_date['InvoiceDate'] = pd.to_datetime(dim_date['InvoiceDate'])
-dim_date['DateID'] = dim_date.index + 1
-dim_date['Year'] = dim_date['InvoiceDate'].dt.year
-dim_date['Month'] = dim_date['InvoiceDate'].dt.month
-dim_date['Day'] = dim_date['InvoiceDate'].dt.day
-dim_date['Weekday'] = dim_date['InvoiceDate'].dt.day_name()
-dim_date['Hour'] = dim_date['InvoiceDate'].dt.hour
-
-# Mapeamentos para substituição
-country_map = dict(zip(dim_country['Country'], dim_country['CountryID']))
-date_map = dict(zip(dim_date['InvoiceDate'], dim_date['DateID']))
+# medir tempo, memória e I/O de cada passo (etl/telemetry.py); as funções de
+# etl/gold.py marcam os seus próprios passos (prepare, facts, rfm, cubes...)
+telemetria = StageTelemetry("gold", BASE_DIR)
 
-# --------- Fato Vendas -----------
-fact_sales = df_clean[
-    (~df_clean['InvoiceNo'].astype(str).str.startswith(('C', 'A'))) &
-    (df_clean['Quantity'] > 0) &
-    (df_clean['UnitPrice'] > 0) &
-    (~df_clean['StockCode'].isin(stockcode_fees))
-].copy()
-
-# Converter CustomerID para string
-fact_sales['CustomerID'] = fact_sales['CustomerID'].fillna('Unknown').astype(str)
-fact_sales['CountryID'] = fact_sales['Country'].map(country_map)
-fact_sales['DateID'] = pd.to_datetime(fact_sales['InvoiceDate']).map(date_map)
-
-fact_sales = fact_sales[[
-    'InvoiceNo', 'StockCode', 'CustomerID', 'DateID',
-    'Quantity', 'UnitPrice', 'total_value', 'CountryID'
-]]
-
-# --------- Fato Tarifas -----------
-fact_fees = df_clean[
-    (df_clean['StockCode'].isin(stockcode_fees)) &
-    (~df_clean['InvoiceNo'].astype(str).str.startswith(('C', 'A')))].copy()
-fact_fees['CustomerID'] = fact_fees['CustomerID'].astype(str)
-fact_fees['CountryID'] = fact_fees['Country'].map(country_map)
-fact_fees['DateID'] = pd.to_datetime(fact_fees['InvoiceDate']).map(date_map)
-fact_fees = fact_fees[[
-    'InvoiceNo', 'StockCode', 'CustomerID', 'DateID',
-    'Quantity', 'UnitPrice', 'total_value', 'CountryID'
-]]
+# No modo incremental só os meses das partições alteradas na bronze são
+# lidos da silver: o modelo estrela desses meses é emendado ao da execução
+# anterior e o RFM (estado por cliente e mês) e os cubos dos dashboards só
+# reagregam esses meses; no modo full tudo é recalculado sobre todo o histórico
+INCREMENTAL = os.environ.get("BRONZE_MODE", "full") == "incremental"
+gold_path = f'{DATA_PATH}/gold/'
+anterior = rfm_estado = cubos = meses = None
+with telemetria.step("read_state"):
+    if INCREMENTAL:
+        anterior = read_star_schema(gold_path)
+        rfm_estado = read_rfm_state(gold_path)
+        cubos = read_cubes(gold_path)
+        meses = changed_months(f'{DATA_PATH}/bronze')
 
-# --------- Fato Cancelamentos -----------
-fact_cancellations = df_clean[
-    (df_clean['InvoiceNo'].astype(str).str.startswith(('C', 'A'))) &
-    (~df_clean['StockCode'].isin(['C2', 'DOT', 'POST']))
-].copy()
-fact_cancellations['CustomerID'] = fact_cancellations['CustomerID'].astype(str)
-fact_cancellations['CountryID'] = fact_cancellations['Country'].map(country_map)
-fact_cancellations['DateID'] = pd.to_datetime(fact_cancellations['InvoiceDate']).map(date_map)
-fact_cancellations = fact_cancellations[[
-    'InvoiceNo', 'StockCode', 'CustomerID', 'DateID',
-    'Quantity', 'UnitPrice', 'total_value', 'CountryID'
-]]
+# Carregar dados da camada silver
+# (só as colunas usadas pela gold, declaradas em etl/dataset.py)
+with telemetria.step("read_silver") as passo:
+    if INCREMENTAL:
+        # Sem gold anterior, todas as partições da silver
+        particoes = read_changed_partitions(f'{DATA_PATH}/bronze') if anterior is not None else None
+        df_clean = read_silver(f'{DATA_PATH}/silver', particoes, READS['gold']['silver'][0])
+    else:
+        df_clean = read_inputs(DATA_PATH, 'gold')['silver']
+    passo.linhas_saida = len(df_clean)
 
 # =========================================
-#               TABELAS DIMENSAO
+#               CRIAÇÃO DE TABELAS
 # =========================================
+# A lógica de cada tabela está em etl/gold.py
 
-# --------- Dim Clientes -----------
-all_customers = pd.concat([
-    fact_sales[['CustomerID', 'CountryID']],
-    fact_fees[['CustomerID', 'CountryID']],
-    fact_cancellations[['CustomerID', 'CountryID']]
-], ignore_index=True)
-
-dim_customer = (
-    all_customers
-    .drop_duplicates(subset=['CustomerID'])
-    .copy()
-)
-dim_customer = dim_customer.reset_index(drop=True)
+# IDs das dimensões vêm do registro persistente de chaves: membros já
+# conhecidos mantêm o ID das execuções anteriores (e do DW)
+keys_path = f'{DATA_PATH}/{KEYS_DIR}'
+registros = read_registries(keys_path)
 
-# Garante existencia do cliente 'Unknown'
-if 'Unknown' not in dim_customer['CustomerID'].values:
-    # A lógica original para encontrar 'Desconhecido' em dim_country foi removida
-    # para simplificar, pois 'Unknown' não tem um país definido.
-    dim_customer.loc[len(dim_customer)] = ['Unknown', None] 
+# Quantos produtos por cliente entram no ranking de most_purchased_products
+TOP_N = int(os.environ.get("GOLD_TOP_N", TOP_N_PADRAO))
 
-# --------- Dim Produtos -----------
-dim_product = (
-    df_clean[['StockCode', 'Description']]
-    .drop_duplicates(subset=['StockCode'])
-    .rename(columns={'Description': 'ProductDescription'})
-    .copy()
-)
+# Backend da gold: "pandas" (padrão) ou "polars" (plano lazy multi-thread,
+# mesmas tabelas de saída; ver etl/gold_polars.py)
+GOLD_ENGINE = os.environ.get("GOLD_ENGINE", "pandas")
 
-# --------- Dim Date -----------
-# Já criada acima como dim_date, apenas reordenar colunas
-dim_date = dim_date[[
-    'DateID', 'InvoiceDate', 'Year', 'Month', 'Day', 'Weekday', 'Hour'
-]]
-
-# --------- Dim Country -----------
-dim_country = dim_country[['CountryID', 'Country']]
+# Processos para as agregações (RFM, produtos mais comprados, métricas e
+# cubos) por partição de mês ou de hash do CustomerID; 1 = serial. Ver
+# etl/parallel.py
+WORKERS = int(os.environ.get("PIPELINE_WORKERS", 1))
+PARTICAO = os.environ.get("PIPELINE_PARTITION", "month")
 
+tabelas_gold = build_gold(df_clean, rfm_estado, registros, TOP_N, GOLD_ENGINE, cubos, meses, WORKERS, PARTICAO,
+                          anterior)
 
 # ### Criação das Tabelas Dimensionais e Fato
 # 
@@ -165,107 +97,11 @@ dim_country = dim_country[['CountryID', 'Country']]
 # - **fact_cancellations**: Cancelamentos e ajustes
 # 
 # Cada tabela fato contém chaves estrangeiras para as dimensões e medidas numéricas (Quantity, UnitPrice, total_value).
-
-# In[2]:
-
-
-# Classificando vendas/tarifas/cancelamentos
-fact_sales['TransactionType'] = 'Sale'
-fact_fees['TransactionType'] = 'Fee'
-fact_cancellations['TransactionType'] = 'Cancellation'
-
-# Unindo tabelas fatos em uma só
-fact_all = pd.concat(
-    [fact_sales, fact_fees, fact_cancellations],
-    ignore_index=True
-)
-
-
+#
 # ### Consolidação das Tabelas Fato
 # 
 # Unificamos as três tabelas fato (vendas, tarifas e cancelamentos) em uma única tabela `fact_all` com uma coluna adicional `TransactionType` que identifica o tipo de transação. Isso facilita análises consolidadas mantendo a separação lógica dos dados.
-
-# # 2. Agregando dados
-
-# In[3]:
-
-
-# =========================================
-#            MÉTRICAS GOLD
-# =========================================
-# ----------- Análise RFM -----------
-
-# Junte fact_sales com dim_date para obter a data real
-fact_sales = fact_sales.merge(
-    dim_date[['DateID', 'InvoiceDate']],
-    on='DateID',
-    how='left'
-)
-
-# Garanta que InvoiceDate está em datetime
-fact_sales['InvoiceDate'] = pd.to_datetime(fact_sales['InvoiceDate'])
-
-# Última data de compra
-latest_date = fact_sales['InvoiceDate'].max()
-
-# RFM com InvoiceDate
-rfm = (
-    fact_sales.groupby('CustomerID')
-    .agg(
-        Recency=('InvoiceDate', lambda x: (latest_date - x.max()).days),
-        Frequency=('InvoiceNo', 'nunique'),
-        Monetary=('total_value', 'sum')
-    )
-    .reset_index()
-)
-
-# ----------- Análise de produtos ----------- 
-
-# Mais vendido por quantidade
-most_quantity_product = (
-    fact_sales.groupby(['CustomerID', 'StockCode'])
-    .agg(UnitsSold=('Quantity', 'sum'))
-    .reset_index()
-    .sort_values(['CustomerID', 'UnitsSold'], ascending=[True, False])
-    .drop_duplicates('CustomerID')
-)
-
-# Mais vendido por transação
-most_transaction_product = (
-    fact_sales.groupby(['CustomerID', 'StockCode'])
-    .agg(Transactions=('InvoiceNo', 'nunique'))
-    .reset_index()
-    .sort_values(['CustomerID', 'Transactions'], ascending=[True, False])
-    .drop_duplicates('CustomerID')
-)
-
-# Combinando resultados
-most_purchased_products = most_quantity_product.merge(
-    most_transaction_product,
-    on=['CustomerID', 'StockCode']
-)
-
-# ----------- Metricas gerais -----------
-
-# Vendas bruta
-gross_sales = fact_sales['total_value'].sum()
-
-# Vendas liquidas
-net_sales = gross_sales + fact_cancellations['total_value'].sum() - fact_fees['total_value'].sum()
-
-# Total de pedidos
-metric_total_orders = fact_sales['InvoiceNo'].nunique()
-
-# Clientes distintos
-distinct_customers = dim_customer['CustomerID'].nunique()
-
-# Produtos distintos
-distinct_products = dim_product['StockCode'].nunique()
-
-# Unidades vendidas
-product_units_sold = fact_sales['Quantity'].sum()
-
-
+#
 # ### Cálculo de Métricas de Negócio
 # 
 # Criamos várias análises agregadas importantes para o negócio:
@@ -276,99 +112,45 @@ product_units_sold = fact_sales['Quantity'].sum()
 # - **Monetary**: Quanto o cliente gastou no total
 # 
 # **Análise de Produtos Mais Comprados:**
-# - Produto mais comprado por quantidade
-# - Produto mais comprado por número de transações
+# - Top N produtos de cada cliente por quantidade
+# - Top N produtos de cada cliente por número de transações
+# (tabela longa com Criterion e Rank; N em GOLD_TOP_N)
 # 
 # **Métricas Gerais:**
 # - Vendas brutas e líquidas
 # - Total de pedidos
 # - Clientes e produtos distintos
 # - Unidades vendidas
-
-# In[4]:
-
-
-# ------- visualizar metricas ------- 
-import pandas as pd
-
-# Exibir RFM e produtos mais comprados
-# display(rfm) # Comentado para evitar erro de display em ambiente não-notebook
-# display(most_purchased_products) # Comentado para evitar erro de display em ambiente não-notebook
-
-# Exibir métricas gerais em tabela
-metrics = pd.DataFrame({
-    'Metrics': [
-        'Gross Sales',
-        'Net Sales',
-        'Total Orders',
-        'Distinct Customers',
-        'Distinct Products',
-        'Product Units Sold'
-    ],
-    'Value': [
-        gross_sales,
-        net_sales,
-        metric_total_orders,
-        distinct_customers,
-        distinct_products,
-        product_units_sold
-    ]
-})
-# display(metrics) # Comentado para evitar erro de display em ambiente não-notebook
-
-
-# ### Visualização das Métricas
-# 
-# Exibimos as métricas calculadas em formato tabular para validação e análise preliminar.
+#
+# **Cubos para os dashboards:**
+# - **cube_daily_country**: dia x país x TransactionType
+# - **cube_monthly_country**: mês x país x TransactionType
+# - **cube_monthly_product**: mês x produto x TransactionType
+# Cada um com receita, unidades, faturas distintas, clientes distintos e linhas
 
 # Salvar tabelas finais (camada Gold)
-gold_path = f'{DATA_PATH}/gold/'
-
-dim_country.to_parquet(f'{gold_path}dim_country.parquet', index=False)
-dim_date.to_parquet(f'{gold_path}dim_date.parquet', index=False)
-dim_customer.to_parquet(f'{gold_path}dim_customer.parquet', index=False)
-dim_product.to_parquet(f'{gold_path}dim_product.parquet', index=False)
-fact_all.to_parquet(f'{gold_path}fact_all.parquet', index=False)
-rfm.to_parquet(f'{gold_path}rfm.parquet', index=False)
-most_purchased_products.to_parquet(f'{gold_path}most_purchased_products.parquet', index=False)
-metrics.to_parquet(f'{gold_path}metrics.parquet', index=False)
+write_gold(tabelas_gold, gold_path)
+# O registro só é gravado depois da gold
+with telemetria.step("write_registries"):
+    write_registries(registros, keys_path)
+print("Chaves novas por dimensão:", {dimensao: r.novos for dimensao, r in registros.items()})
 
 print("Tabelas salvas na camada Gold.")
+print(f"Memória da fact_all: {memory_report(tabelas_gold['fact_all'], 'gold')['MB'].iloc[-1]} MB")
 
-# =============================
-# LOG DO PIPELINE (gold)
-# =============================
-
-fim = time.time()
-duracao = fim - inicio
-registros = df_clean.shape[0]
-
-log_file = f"{BASE_DIR}/logs_pipeline.csv"
-
-log = [
-    datetime.now(),   # data_execucao
-    "gold",         # camada
-    "sucesso",        # status
-    round(duracao, 2),
-    registros
-]
-
-# salva o log
-with open(log_file, "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(log)
-
-print("Log registrado no arquivo logs_pipeline.csv")
 # ### Salvamento na Camada Gold
 # 
 # Todas as tabelas dimensionais, fatos e métricas agregadas são salvas em formato Parquet na camada Gold. Estes arquivos estão prontos para serem carregados em um banco de dados ou ferramenta de visualização.
 
-# In[6]:
-
+# =============================
+# LOG DO PIPELINE (gold)
+# =============================
 
-# display(fact_sales['total_value'].sum()) # Comentado para evitar erro de display em ambiente não-notebook
+# `registros` é o registro de chaves: as linhas da silver ficam em `linhas`
+linhas = df_clean.shape[0]
 
+# telemetry.db (passos + etapa) e a linha de sempre no logs_pipeline.csv:
+# saída = linhas da fact_all gravada, entrada = linhas da silver
+telemetria.finish(len(tabelas_gold['fact_all']), linhas)
 
-# ### Validação
-# 
-# Verificação do total de vendas calculado para garantir a integridade dos dados.
+print("Log registrado em telemetry.db e logs_pipeline.csv")
@@ -1,14 +1,12 @@
 # Importar bibliotecas necessárias
-import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import warnings
 import os
-from datetime import datetime
-import time
-import csv
 
-#medir tempo
-inicio = time.time()
+from etl.cache import WAREHOUSE_SNAPSHOT, publish_snapshot
+from etl.load import GOLD_TABLES, load_gold
+from etl.telemetry import StageTelemetry
+from etl.warehouse import DB_TYPE, get_engine, masked_connection_string
 
 warnings.filterwarnings('ignore')
 
@@ -20,29 +18,34 @@ BASE_DIR = "/opt/airflow/dags"
 DATA_PATH = f"{BASE_DIR}/data"
 GOLD_PATH = f"{DATA_PATH}/gold/"
 
-DB_TYPE = 'postgresql'
-DB_HOST = 'postgres_dw'
-DB_USER = 'postgres'
-DB_PASSWORD = 'postgres'
-DB_PORT = '5432'
-DB_NAME = 'ecommerce_dw'
+# medir tempo, memória e I/O de cada passo (etl/telemetry.py)
+telemetria = StageTelemetry("load", BASE_DIR)
 
-if DB_TYPE == 'postgresql':
-    connection_string = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
-else:
-    raise ValueError("DB_TYPE deve ser 'postgresql'.")
+# Modo de carga:
+# - "merge" (padrão): staging UNLOGGED + merge pelas chaves naturais; rodar
+#   de novo com os mesmos dados não duplica nada
+# - "append": acrescenta tudo, pelo método LOAD_METHOD
+LOAD_MODE = os.environ.get("LOAD_MODE", "merge")
+
+# Método do modo append: "copy" (COPY FROM STDIN em lotes, padrão), "parallel"
+# (fact_all em pedaços paralelos, índices e FKs recriados no fim) ou "to_sql"
+LOAD_METHOD = os.environ.get("LOAD_METHOD", "copy")
+
+# Conexões simultâneas do método "parallel" (uma por worker, do pool do engine)
+LOAD_WORKERS = int(os.environ.get("LOAD_WORKERS", 4))
 
 print(f"✓ Configuração definida para: {DB_TYPE.upper()}")
-print(f"✓ String de conexão: {connection_string.replace(DB_PASSWORD, '***')}")
+print(f"✓ String de conexão: {masked_connection_string()}")
 
 # ==========================================
 #     TESTE DE CONEXÃO
 # ==========================================
 
 try:
-    engine = create_engine(connection_string)
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
+    with telemetria.step("connect"):
+        engine = get_engine(pool_size=LOAD_WORKERS)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
     print("✓ Conexão estabelecida com sucesso!")
 except Exception as e:
     print("✗ Erro ao conectar ao banco:")
@@ -54,45 +57,19 @@ except Exception as e:
 #     CARREGAR DADOS DA CAMADA GOLD (LOAD)
 # ==========================================
 
-tables_to_load = {
-    'dim_country': f'{GOLD_PATH}dim_country.parquet',
-    'dim_date': f'{GOLD_PATH}dim_date.parquet',
-    'dim_customer': f'{GOLD_PATH}dim_customer.parquet',
-    'dim_product': f'{GOLD_PATH}dim_product.parquet',
-    'fact_all': f'{GOLD_PATH}fact_all.parquet',
-    'metrics': f'{GOLD_PATH}metrics.parquet'
-}
-
 # Ordem correta: dimensões primeiro, fatos depois
-load_order = ['dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'metrics']
+load_order = GOLD_TABLES
 
 try:
-    with engine.connect() as conn:
-        for table_name in load_order:
-            file_path = tables_to_load.get(table_name)
-
-            if not os.path.exists(file_path):
-                print(f"AVISO: Arquivo {file_path} não encontrado. Pulando {table_name}.")
-                continue
-
-            print(f"Carregando {table_name} de {file_path}...")
-            df = pd.read_parquet(file_path)
-            df.columns = df.columns.str.lower()
+    resultados = load_gold(engine, GOLD_PATH, LOAD_MODE, LOAD_METHOD, load_order, LOAD_WORKERS)
 
-            if table_name == 'metrics':
-                df_metrics = pd.DataFrame({
-                    'metric_name': df['metrics'],
-                    'metric_value': df['value']
-                })
-                df_metrics.to_sql(table_name, conn, if_exists='append', index=False)
-            else:
-                df.to_sql(table_name, conn, if_exists='append', index=False)
+    # Novo snapshot do DW: o cache de consultas (etl/cache.py) descarta os
+    # resultados calculados sobre a carga anterior
+    publish_snapshot(f"{GOLD_PATH}{WAREHOUSE_SNAPSHOT}")
 
-            print(f"✓ {table_name} carregada com sucesso ({len(df)} linhas).")
-
-        print("\n" + "="*60)
-        print("✓✓✓ TODOS OS DADOS CARREGADOS NO BANCO DE DADOS! ✓✓✓")
-        print("="*60)
+    print("\n" + "="*60)
+    print("✓✓✓ TODOS OS DADOS CARREGADOS NO BANCO DE DADOS! ✓✓✓")
+    print("="*60)
 
 except Exception as e:
     print(f"✗ Erro ao carregar dados: {str(e)}")
@@ -103,24 +80,10 @@ except Exception as e:
 #     LOG DO PIPELINE
 # ==========================================
 
-fim = time.time()
-duracao = fim - inicio
-
-fact_all_path = tables_to_load['fact_all']
-registros = pd.read_parquet(fact_all_path).shape[0]
-
-log_file = f"{BASE_DIR}/logs_pipeline.csv"
-
-log = [
-    datetime.now(),
-    "load",
-    "sucesso",
-    round(duracao, 2),
-    registros
-]
+# linhas da fact_all lidas na carga (sem reler o parquet)
+registros = resultados.get('fact_all', (0,))[0]
 
-with open(log_file, "a", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(log)
+# telemetry.db (passos + etapa) e a linha de sempre no logs_pipeline.csv
+telemetria.finish(registros)
 
-print("✓ Log registrado em logs_pipeline.csv")
+print("✓ Log registrado em telemetry.db e logs_pipeline.csv")
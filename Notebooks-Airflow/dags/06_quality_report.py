@@ -0,0 +1,115 @@
+# # Relatório de Qualidade - Silver
+#
+# Etapa do pipeline entre a Silver e a Gold, com as métricas do
+# 06_quality_report.ipynb (completude, unicidade, consistência e validade).
+#
+# ## Processo:
+# O parquet da Silver é lido uma única vez, em lotes: contagens, hashes das
+# linhas (duplicatas) e sketches de quantis (outliers pelo IQR) são
+# atualizados a cada lote, sem carregar a tabela inteira (etl/quality.py).
+# As métricas e o score ponderado são salvos em data/quality e, se alguma
+# dimensão ficar abaixo do mínimo (QUALITY_MIN_SCORE / QUALITY_THRESHOLDS),
+# a etapa falha e a Gold não roda.
+
+import os
+import sys
+
+from etl.bronze import read_changed_partitions
+from etl.quality import (
+    SCORE_FINAL,
+    classification,
+    profile_parquet,
+    quality_gate,
+    quality_tables,
+    read_thresholds,
+    write_quality,
+)
+from etl.silver import silver_files
+from etl.telemetry import StageTelemetry
+
+# Definindo o diretório base para os dados (deve ser o mesmo dos scripts anteriores)
+BASE_DIR = "/opt/airflow/dags"
+DATA_PATH = f"{BASE_DIR}/data"
+
+# Linhas por lote lidas da silver
+BATCH_SIZE = int(os.environ.get("QUALITY_BATCH_SIZE", 100_000))
+
+# medir tempo, memória e I/O de cada passo (etl/telemetry.py)
+telemetria = StageTelemetry("quality", BASE_DIR)
+
+# Perfil da silver em uma passada (no modo incremental, das partições da
+# silver reprocessadas pelo último lote da bronze)
+if os.environ.get("BRONZE_MODE", "full") == "incremental":
+    silver = silver_files(f"{DATA_PATH}/silver", read_changed_partitions(f"{DATA_PATH}/bronze"))
+else:
+    silver = f"{DATA_PATH}/silver/dados_limpos.parquet"
+perfil = profile_parquet(silver, BATCH_SIZE)
+if not perfil.linhas and os.environ.get("BRONZE_MODE", "full") == "incremental":
+    # Lote da bronze sem linhas novas: nada a avaliar
+    telemetria.finish(0, 0)
+    print("Nenhuma partição alterada na silver")
+    sys.exit(0)
+tabelas = quality_tables(perfil, read_thresholds())
+metricas = dict(zip(tabelas['quality_metrics']['Metric'], tabelas['quality_metrics']['Value']))
+
+# =========================================
+#          1. COMPLETUDE DOS DADOS
+# =========================================
+print("\n1. COMPLETUDE DOS DADOS")
+print("-" * 50)
+print(f"Completude Geral: {metricas['Completude (%)']:.2f}%")
+print("\nCompletude por coluna:")
+for coluna in perfil.preenchidas:
+    print(f" {coluna}: {metricas[f'Completude {coluna} (%)']:.2f}%")
+
+# =========================================
+#          2. UNICIDADE DOS DADOS
+# =========================================
+print("\n2. UNICIDADE DOS DADOS")
+print("-" * 50)
+score = tabelas['quality_score'].set_index('Dimension')
+print(f"Linhas únicas: {score.loc['Unicidade', 'Score']:.2f}%")
+print(f"Duplicatas encontradas: {metricas['Duplicatas']:.0f}")
+
+# =========================================
+#          3. CONSISTÊNCIA DOS DADOS
+# =========================================
+print("\n3. CONSISTÊNCIA DOS DADOS")
+print("-" * 50)
+print(f"Quantity negativos/zero: {metricas['Quantity <= 0']:.0f}")
+print(f"UnitPrice negativos/zero: {metricas['UnitPrice <= 0']:.0f}")
+print(f"Cancelamentos (InvoiceNo 'C'): {metricas['Cancelamentos']:.0f}")
+print(f"Ajustes (InvoiceNo 'A'): {metricas['Ajustes']:.0f}")
+print(f"Linhas de tarifas: {metricas['Tarifas']:.0f}")
+
+# =========================================
+#          4. VALIDADE DOS DADOS
+# =========================================
+# Quartis aproximados (erro relativo <= 0,5%) sobre os valores > 0
+print("\n4. VALIDADE DOS DADOS")
+print("-" * 50)
+print(f"Outliers em Quantity: {metricas['Outliers Quantity']:.0f}")
+print(f"Outliers em UnitPrice: {metricas['Outliers UnitPrice']:.0f}")
+
+# =========================================
+#               SCORE FINAL
+# =========================================
+print("\nSCORE GERAL DE QUALIDADE")
+print("=" * 50)
+print(score[['Score', 'Weight', 'Threshold', 'Passed']].to_string(float_format=lambda valor: f"{valor:.2f}"))
+print(f"\nClassificação: {classification(score.loc[SCORE_FINAL, 'Score'])}")
+
+caminho = write_quality(tabelas, DATA_PATH)
+print(f"Tabelas de qualidade salvas em {caminho}")
+
+# =============================
+# LOG DO PIPELINE (quality)
+# =============================
+
+# Abaixo do mínimo: a exceção registra a etapa como falha (telemetria) e
+# interrompe o DAG antes da gold
+quality_gate(tabelas['quality_score'])
+
+telemetria.finish(perfil.linhas, perfil.linhas)
+
+print("Log registrado em telemetry.db e logs_pipeline.csv")
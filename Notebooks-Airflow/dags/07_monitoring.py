@@ -1,47 +1,66 @@
-import pandas as pd
+import os
+
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+from etl.monitoring import daily_rollups, format_alert, recent_alerts, update_monitoring
+
 print("="*50)
 print("MONITORAMENTO DO PIPELINE")
 print("="*50)
 
-# lê o log real gerado pelas tasks
-df_log = pd.read_csv(
-    "C:\\airflow\\dags\\logs_pipeline.csv",
-    header=None,
-    names=[
-        "data_execucao",
-        "camada",
-        "status",
-        "tempo_segundos",
-        "registros_processados",
-    ]
-)
+# Mesmo diretório dos scripts 01..04 (onde ficam logs_pipeline.csv e telemetry.db)
+BASE_DIR = os.environ.get("PIPELINE_BASE_DIR", "/opt/airflow/dags")
+
+# Dias exibidos no resumo e nos gráficos
+DIAS = int(os.environ.get("MONITORING_DAYS", 30))
+
+# processa só as linhas novas do log (rollups diários e alertas em telemetry.db)
+novas, alertas = update_monitoring(BASE_DIR)
+print(f"\nExecuções novas no log: {novas}")
+for alerta in alertas:
+    print(f"ALERTA {format_alert(alerta)}")
+
+diario = daily_rollups(BASE_DIR, DIAS)
+if diario.empty:
+    print("Sem execuções em logs_pipeline.csv")
+    raise SystemExit
 
 # Taxa de sucesso
-taxa_sucesso = (df_log['status'] == 'sucesso').sum() / len(df_log) * 100
-print(f"\nTaxa de Sucesso: {taxa_sucesso:.2f}%")
+taxa_sucesso = (1 - diario['falhas'].sum() / diario['execucoes'].sum()) * 100
+print(f"\nTaxa de Sucesso (últimos {DIAS} dias): {taxa_sucesso:.2f}%")
+
+# Tempo e vazão do último dia por camada
+ultimo_dia = diario[diario['dia'] == diario['dia'].max()]
+print(f"\nTempo e vazão por camada em {ultimo_dia['dia'].iloc[0]}:")
+print(ultimo_dia[['camada', 'execucoes', 'falhas', 'tempo_p50', 'tempo_p95', 'tempo_max',
+                  'linhas_por_s_p50']].to_string(index=False))
 
-# Tempo médio por camada
-print("\nTempo Médio por Camada:")
-print(df_log.groupby('camada')['tempo_segundos'].mean())
+print("\nÚltimos alertas:")
+for alerta in recent_alerts(BASE_DIR, 10).itertuples(index=False):
+    print(f"  {format_alert(alerta)}")
 
 # Visualização
 plt.figure(figsize=(12, 4))
 
 # gráfico 1
 plt.subplot(1, 2, 1)
-df_log['status'].value_counts().plot(kind='bar')
-plt.title('Status das Execuções')
+diario.groupby('dia')[['execucoes', 'falhas']].sum().plot(kind='bar', ax=plt.gca())
+plt.title('Execuções e Falhas por Dia')
 plt.ylabel('Quantidade')
 
 # gráfico 2
 plt.subplot(1, 2, 2)
-df_log.groupby('camada')['tempo_segundos'].mean().plot(kind='bar')
-plt.title('Tempo Médio por Camada')
+for camada, grupo in diario.groupby('camada'):
+    linha, = plt.plot(grupo['dia'], grupo['tempo_p50'], marker='o', label=f'{camada} p50')
+    plt.plot(grupo['dia'], grupo['tempo_p95'], linestyle='--', color=linha.get_color(), label=f'{camada} p95')
+plt.title('Tempo por Camada (p50 / p95)')
 plt.ylabel('Segundos')
+plt.xticks(rotation=45)
+plt.legend(fontsize=7)
 
 plt.tight_layout()
-plt.savefig('pipeline_monitoring.png')
+plt.savefig(os.path.join(BASE_DIR, 'pipeline_monitoring.png'))
 
-print("\nGráficos salvos em: pipeline_monitoring.png")
+print(f"\nGráficos salvos em: {os.path.join(BASE_DIR, 'pipeline_monitoring.png')}")
@@ -1,22 +1,27 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import warnings
 import time
 
+from etl.keys import KEYS_DIR, seed_from_warehouse
+from etl.partitions import create_fact_table
+from etl.warehouse import (
+    SQL_CREATE_CUBES,
+    SQL_CREATE_DIMENSIONS,
+    SQL_CREATE_METRICS,
+    get_engine,
+)
+
 warnings.filterwarnings('ignore')
 
+BASE_DIR = "/opt/airflow/dags"
+KEYS_PATH = f"{BASE_DIR}/data/{KEYS_DIR}"
+
 # ==========================================
 #     CONFIGURAÇÃO DA CONEXÃO
 # ==========================================
 
-DB_TYPE = 'postgresql'
-DB_HOST = 'postgres_dw'
-DB_USER = 'postgres'
-DB_PASSWORD = 'postgres'
-DB_PORT = '5432'
-DB_NAME = 'ecommerce_dw'
-
-connection_string = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
-engine = create_engine(connection_string)
+# Credenciais e host em etl/warehouse.py (padrão: serviço postgres_dw)
+engine = get_engine()
 
 print("✓ Conectado ao banco para criar o SCHEMA")
 
@@ -25,91 +30,42 @@ print("✓ Conectado ao banco para criar o SCHEMA")
 #     SQL PARA CRIAÇÃO DO SCHEMA
 # ==========================================
 
-sql_create_dimensions = """
-CREATE TABLE IF NOT EXISTS dim_country (
-    CountryID SERIAL PRIMARY KEY,
-    Country VARCHAR(100) NOT NULL UNIQUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS dim_customer (
-    CustomerID VARCHAR(50) PRIMARY KEY,
-    CountryID INT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_country_customer FOREIGN KEY (CountryID)
-        REFERENCES dim_country(CountryID)
-        ON DELETE SET NULL
-);
-
-CREATE TABLE IF NOT EXISTS dim_date (
-    DateID SERIAL PRIMARY KEY,
-    InvoiceDate TIMESTAMP NOT NULL UNIQUE,
-    year INT NOT NULL,
-    month INT NOT NULL,
-    day INT NOT NULL,
-    hour INT NOT NULL,
-    Weekday VARCHAR(20) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS dim_product (
-    StockCode VARCHAR(50) PRIMARY KEY,
-    productdescription VARCHAR(500),
-    UnitPrice DECIMAL(10, 2),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-"""
-
-sql_create_fact = """
-CREATE TABLE IF NOT EXISTS fact_all (
-    fact_id SERIAL PRIMARY KEY,
-    InvoiceNo VARCHAR(50) NOT NULL,
-    StockCode VARCHAR(50) NOT NULL,
-    CustomerID VARCHAR(50),
-    CountryID INT,
-    DateID INT NOT NULL,
-    Quantity INT NOT NULL,
-    UnitPrice DECIMAL(10, 2) NOT NULL,
-    total_value DECIMAL(12, 2) NOT NULL,
-    TransactionType VARCHAR(20) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-
-    CONSTRAINT fk_product FOREIGN KEY (StockCode) REFERENCES dim_product(StockCode),
-    CONSTRAINT fk_customer FOREIGN KEY (CustomerID) REFERENCES dim_customer(CustomerID),
-    CONSTRAINT fk_country FOREIGN KEY (CountryID) REFERENCES dim_country(CountryID),
-    CONSTRAINT fk_date FOREIGN KEY (DateID) REFERENCES dim_date(DateID)
-);
-
-CREATE INDEX IF NOT EXISTS idx_fact_invoice ON fact_all(InvoiceNo);
-CREATE INDEX IF NOT EXISTS idx_fact_stock_code ON fact_all(StockCode);
-CREATE INDEX IF NOT EXISTS idx_fact_customer ON fact_all(CustomerID);
-CREATE INDEX IF NOT EXISTS idx_fact_country ON fact_all(CountryID);
-CREATE INDEX IF NOT EXISTS idx_fact_date ON fact_all(DateID);
-"""
-
-sql_create_metrics = """
-CREATE TABLE IF NOT EXISTS metrics (
-    metric_name VARCHAR(100) PRIMARY KEY,
-    metric_value DECIMAL(20, 2),
-    calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(metric_name);
-"""
+# SQL em etl/warehouse.py (SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS,
+# SQL_CREATE_CUBES). A fact_all é particionada por mês de InvoiceDate
+# (etl/partitions.py); uma fact_all antiga, sem partições, é migrada aqui.
 
 
 # ==========================================
 #     EXECUTAR SQL
 # ==========================================
 
-with engine.connect() as conn:
+with engine.begin() as conn:
     print("→ Criando tabelas dimensionais...")
-    conn.execute(text(sql_create_dimensions))
+    conn.execute(text(SQL_CREATE_DIMENSIONS))
 
-    print("→ Criando tabela fato...")
-    conn.execute(text(sql_create_fact))
+    print("→ Criando tabela fato (particionada por mês)...")
+    with conn.connection.cursor() as cursor:
+        migradas = create_fact_table(cursor)
+    if migradas:
+        print(f"→ fact_all migrada para as partições mensais ({migradas} linhas)")
 
     print("→ Criando tabela metrics...")
-    conn.execute(text(sql_create_metrics))
+    conn.execute(text(SQL_CREATE_METRICS))
+
+    print("→ Criando cubos dos dashboards...")
+    conn.execute(text(SQL_CREATE_CUBES))
 
 print("\n✓✓✓ SCHEMA CRIADO COM SUCESSO ✓✓✓\n")
+
+
+# ==========================================
+#     REGISTRO DE CHAVES DAS DIMENSÕES
+# ==========================================
+
+# Se o DW já tem dimensões carregadas e o registro ainda não existe, a gold
+# passa a reutilizar os IDs do banco (ver etl/keys.py)
+with engine.connect() as conn:
+    importados = seed_from_warehouse(conn, KEYS_PATH)
+
+for dimensao, linhas in importados.items():
+    print(f"→ Registro de chaves '{dimensao}' criado a partir do DW ({linhas} membros)")
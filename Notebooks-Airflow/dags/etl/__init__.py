@@ -0,0 +1,5 @@
+# Funções reutilizáveis das camadas do pipeline (Bronze > Silver > Gold > Load).
+#
+# Os scripts numerados em dags/ (01_bronze_layer.py, 02_silver_layer.py, ...)
+# continuam sendo o ponto de entrada das tasks; a lógica fica neste pacote
+# para poder ser importada, testada e medida isoladamente.
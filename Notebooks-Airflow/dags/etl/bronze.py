@@ -0,0 +1,376 @@
+# # Camada Bronze - ingestão incremental particionada
+#
+# No modo incremental a camada bronze guarda uma marca d'água (maior InvoiceDate
+# já ingerida + id do lote) e só acrescenta as linhas novas, em um dataset
+# particionado no estilo Hive:
+#
+#   bronze/dataset/year=2011/month=12/lote-000007.parquet
+#
+# As partições alteradas em cada lote ficam registradas para que as camadas
+# seguintes possam processar apenas elas.
+#
+# Cada linha carrega a impressão digital hash_linha (etl/schema.py). A marca
+# d'água é só um pré-filtro barato (antes de aplicar o schema) e inclui o
+# próprio minuto: o CSV só tem a data até o minuto, então linhas atrasadas
+# podem ter a mesma InvoiceDate da marca d'água. As impressões já ingeridas
+# ficam em _fingerprints.parquet e uma linha cuja impressão já está lá nunca
+# é acrescentada de novo, mesmo que a marca d'água se perca ou seja
+# restaurada de um backup antigo.
+#
+# A leitura do CSV é feita em lotes de tamanho fixo com schema explícito e cada
+# lote vira um row group do parquet, então o pico de memória depende do tamanho
+# do lote e não do tamanho do arquivo.
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.dataset import read_table
+from etl.schema import FINGERPRINT_COLUMN, ROW_SCHEMA, apply_schema
+from etl.telemetry import span
+
+FONTE_PADRAO = "carrie1/ecommerce-data"
+
+# Formato de InvoiceDate no CSV original (ex.: 12/1/2010 8:26)
+FORMATO_DATA = "%m/%d/%Y %H:%M"
+
+DATASET_DIR = "dataset"
+WATERMARK_FILE = "_watermark.json"
+CHANGED_PARTITIONS_FILE = "_changed_partitions.json"
+FINGERPRINTS_FILE = "_fingerprints.parquet"
+
+# Linhas por lote na leitura do CSV
+BATCH_SIZE_PADRAO = 100_000
+
+# Tipos das colunas do CSV (sem inferência)
+CSV_DTYPES = {
+    "InvoiceNo": "object",
+    "StockCode": "object",
+    "Description": "object",
+    "Quantity": "int32",
+    "InvoiceDate": "object",
+    "UnitPrice": "float64",
+    "CustomerID": "float64",
+    "Country": "object",
+}
+
+# Schema da camada bronze (colunas do CSV + metadados de ingestão, já nos
+# tipos compactos de etl/schema.py)
+BRONZE_SCHEMA = ROW_SCHEMA
+
+
+def add_ingestion_metadata(df, fonte=FONTE_PADRAO, data_ingestao=None):
+    """Adiciona as colunas de metadados de ingestão (data e fonte)."""
+    df["data_ingestao"] = data_ingestao or datetime.now()
+    df["fonte_arquivos"] = fonte
+    return df
+
+
+def iter_csv_batches(csv_path, batch_size=BATCH_SIZE_PADRAO, encoding="ISO-8859-1"):
+    """Lê o CSV de origem em lotes de `batch_size` linhas com tipos fixos."""
+    yield from pd.read_csv(
+        csv_path,
+        encoding=encoding,
+        dtype=CSV_DTYPES,
+        usecols=list(CSV_DTYPES),
+        chunksize=batch_size,
+    )
+
+
+def _as_batches(dados):
+    # Aceita um DataFrame único ou um iterável de lotes
+    if isinstance(dados, pd.DataFrame):
+        return [dados]
+    return dados
+
+
+def prepare_batches(lotes, fonte=FONTE_PADRAO, data_ingestao=None):
+    """Adiciona os metadados de ingestão e aplica o schema compacto a cada lote."""
+    data_ingestao = data_ingestao or datetime.now()
+    for lote in _as_batches(lotes):
+        yield apply_schema(add_ingestion_metadata(lote, fonte, data_ingestao))
+
+
+def stream_to_parquet(lotes, destino, fonte=FONTE_PADRAO, data_ingestao=None):
+    """Grava os lotes como row groups de um único parquet, sem concatená-los.
+
+    Todos os lotes recebem a mesma data de ingestão. O arquivo é escrito em um
+    temporário e só substitui o destino no final. Retorna o total de linhas.
+    """
+    return write_batches(prepare_batches(lotes, fonte, data_ingestao), destino)
+
+
+def write_batches(lotes, destino):
+    """Grava lotes já preparados (prepare_batches) como row groups de um parquet."""
+    tmp = f"{destino}.tmp"
+    writer = None
+    total = 0
+    try:
+        for lote in lotes:
+            tabela = pa.Table.from_pandas(lote, schema=BRONZE_SCHEMA, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, tabela.schema)
+            writer.write_table(tabela)
+            total += tabela.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # CSV vazio: grava um arquivo só com o schema
+        pq.write_table(BRONZE_SCHEMA.empty_table(), tmp)
+    os.replace(tmp, destino)
+    return total
+
+
+def parse_invoice_date(serie):
+    """Converte InvoiceDate (texto do CSV ou datetime) para datetime64."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, format=FORMATO_DATA)
+
+
+def _write_json(path, conteudo):
+    # Escreve em arquivo temporário e troca, para não deixar estado pela metade
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(conteudo, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _read_json(path, padrao):
+    if not os.path.exists(path):
+        return padrao
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_watermark(bronze_path):
+    """Estado da última ingestão: maior InvoiceDate e id do lote (ou None)."""
+    estado = _read_json(os.path.join(bronze_path, WATERMARK_FILE), None)
+    if estado is None:
+        return None
+    estado["max_invoice_date"] = pd.Timestamp(estado["max_invoice_date"])
+    return estado
+
+
+def read_changed_partitions(bronze_path):
+    """Partições (ex.: 'year=2011/month=12') alteradas pelo último lote."""
+    return _read_json(os.path.join(bronze_path, CHANGED_PARTITIONS_FILE), {}).get("partitions", [])
+
+
+def read_fingerprints(bronze_path):
+    """Impressões digitais (hash_linha) já ingeridas, ordenadas e sem repetição.
+
+    Um dataset gravado antes de _fingerprints.parquet existir tem o conjunto
+    montado a partir das suas linhas.
+    """
+    caminho = os.path.join(bronze_path, FINGERPRINTS_FILE)
+    if os.path.exists(caminho):
+        return pq.read_table(caminho).column(FINGERPRINT_COLUMN).to_numpy()
+    if os.path.isdir(os.path.join(bronze_path, DATASET_DIR)):
+        df = read_bronze(bronze_path)
+        if len(df):
+            return np.unique(df[FINGERPRINT_COLUMN].to_numpy())
+    return np.empty(0, dtype="uint64")
+
+
+def write_fingerprints(impressoes, bronze_path):
+    caminho = os.path.join(bronze_path, FINGERPRINTS_FILE)
+    tmp = f"{caminho}.tmp"
+    pq.write_table(pa.table({FINGERPRINT_COLUMN: pa.array(impressoes, pa.uint64())}), tmp)
+    os.replace(tmp, caminho)
+
+
+def already_ingested(impressoes, conhecidas):
+    """Máscara das impressões presentes em `conhecidas` (ordenada; busca binária)."""
+    if not len(conhecidas):
+        return np.zeros(len(impressoes), dtype=bool)
+    posicoes = np.minimum(np.searchsorted(conhecidas, impressoes), len(conhecidas) - 1)
+    return conhecidas[posicoes] == impressoes
+
+
+def changed_months(bronze_path):
+    """Primeiro dia de cada mês com partição alterada pelo último lote."""
+    return [
+        pd.Timestamp(year=ano, month=mes, day=1)
+        for ano, mes in map(_partition_key, read_changed_partitions(bronze_path))
+    ]
+
+
+def partition_name(year, month):
+    return f"year={int(year)}/month={int(month)}"
+
+
+def _partition_key(particao):
+    # 'year=2011/month=2' -> (2011, 2), para ordenar cronologicamente
+    return tuple(int(parte.split("=")[1]) for parte in particao.split("/"))
+
+
+def ingest_incremental(lotes, bronze_path):
+    """Acrescenta ao dataset particionado apenas as linhas a partir da marca
+    d'água (inclusive o próprio minuto) cuja hash_linha ainda não foi
+    ingerida (read_fingerprints).
+
+    Linhas repetidas dentro do próprio CSV são mantidas, como no modo full.
+    `lotes` pode ser um DataFrame ou um iterável de lotes (ver
+    iter_csv_batches); cada lote gera um arquivo por partição. Retorna
+    (linhas_novas, particoes_alteradas). A marca d'água e as impressões só
+    são gravadas depois que todos os arquivos do lote foram escritos.
+    """
+    estado = read_watermark(bronze_path)
+    batch_id = (estado["batch_id"] + 1) if estado else 1
+    conhecidas = read_fingerprints(bronze_path)
+
+    particoes = set()
+    linhas_novas = 0
+    max_data = None
+    novas_impressoes = []
+    dataset_path = os.path.join(bronze_path, DATASET_DIR)
+    for parte, df_raw in enumerate(_as_batches(lotes)):
+        datas = parse_invoice_date(df_raw["InvoiceDate"])
+        if estado is not None:
+            # >=: o minuto da marca d'água pode ter linhas novas; as já
+            # ingeridas saem pelas impressões digitais
+            novos = datas >= estado["max_invoice_date"]
+            df_raw = df_raw[novos]
+            datas = datas[novos]
+        if df_raw.empty:
+            continue
+        # apply_schema calcula a hash_linha
+        df_raw = apply_schema(df_raw)
+        novos = ~already_ingested(df_raw[FINGERPRINT_COLUMN].to_numpy(), conhecidas)
+        df_raw = df_raw[novos]
+        datas = datas[novos]
+        if df_raw.empty:
+            continue
+        novas_impressoes.append(df_raw[FINGERPRINT_COLUMN].to_numpy())
+
+        for (ano, mes), df_part in df_raw.groupby([datas.dt.year, datas.dt.month], sort=True):
+            particao = partition_name(ano, mes)
+            destino = os.path.join(dataset_path, particao)
+            os.makedirs(destino, exist_ok=True)
+            df_part.to_parquet(os.path.join(destino, f"lote-{batch_id:06d}-{parte:04d}.parquet"), index=False)
+            particoes.add(particao)
+
+        linhas_novas += len(df_raw)
+        max_data = datas.max() if max_data is None else max(max_data, datas.max())
+
+    particoes = sorted(particoes, key=_partition_key)
+    if particoes:
+        write_fingerprints(np.union1d(conhecidas, np.concatenate(novas_impressoes)), bronze_path)
+        _write_json(os.path.join(bronze_path, WATERMARK_FILE), {
+            "max_invoice_date": max_data.isoformat(),
+            "batch_id": batch_id,
+            "updated_at": datetime.now().isoformat(),
+        })
+    # Mesmo sem linhas novas a lista é reescrita (vazia), para o downstream não
+    # reprocessar as partições do lote anterior
+    _write_json(os.path.join(bronze_path, CHANGED_PARTITIONS_FILE), {
+        "batch_id": batch_id if particoes else (estado or {}).get("batch_id"),
+        "partitions": particoes,
+    })
+    return linhas_novas, particoes
+
+
+def dataset_partitions(dataset_path):
+    """Partições ('year=2011/month=12') de um dataset no estilo Hive, em ordem cronológica."""
+    if not os.path.isdir(dataset_path):
+        return []
+    return sorted((
+        f"{ano}/{mes}"
+        for ano in os.listdir(dataset_path) if ano.startswith("year=")
+        for mes in os.listdir(os.path.join(dataset_path, ano)) if mes.startswith("month=")
+    ), key=_partition_key)
+
+
+def dataset_files(dataset_path, partitions=None):
+    """Parquets das partições informadas (padrão: todas), na ordem das partições."""
+    if partitions is None:
+        partitions = dataset_partitions(dataset_path)
+    return [
+        os.path.join(dataset_path, particao, nome)
+        for particao in partitions
+        if os.path.isdir(os.path.join(dataset_path, particao))
+        for nome in sorted(os.listdir(os.path.join(dataset_path, particao)))
+        if nome.endswith(".parquet")
+    ]
+
+
+def read_dataset(dataset_path, partitions=None, colunas=None, nome=None):
+    """DataFrame das partições informadas (padrão: todas) de um dataset particionado.
+
+    `nome` é o passo da telemetria (padrão: a camada, pasta acima de dataset/).
+    """
+    arquivos = dataset_files(dataset_path, partitions)
+    if not arquivos:
+        return pd.DataFrame()
+    if nome is None:
+        nome = os.path.basename(os.path.dirname(os.path.normpath(dataset_path)))
+    # Um único scan sobre os arquivos, na ordem cronológica das partições.
+    # O Arrow unifica os dicionários de cada arquivo na ordem em que aparecem;
+    # as categorias voltam à ordem alfabética de cada arquivo
+    df = read_table(arquivos, colunas, nome=nome)
+    for coluna in df.select_dtypes('category').columns:
+        df[coluna] = df[coluna].cat.reorder_categories(sorted(df[coluna].cat.categories))
+    return df
+
+
+def read_bronze(bronze_path, partitions=None):
+    """Lê o dataset particionado (todas as partições ou apenas as informadas)."""
+    return apply_schema(read_dataset(os.path.join(bronze_path, DATASET_DIR), partitions, nome="bronze"))
+
+
+def download_source():
+    """Baixa o dataset do Kaggle e devolve o caminho do data.csv."""
+    import kagglehub
+
+    path = kagglehub.dataset_download(FONTE_PADRAO)
+    return os.path.join(path, "data.csv")
+
+
+def run_bronze(csv_path, bronze_path, modo="full", batch_size=BATCH_SIZE_PADRAO,
+               fonte=FONTE_PADRAO, checkpoint=True):
+    """Estágio bronze para o runner em memória.
+
+    Devolve (df_bronze, linhas_ingeridas). No modo "full" os lotes são
+    mantidos em memória e, com `checkpoint`, também gravados em
+    dados_brutos.parquet; no modo "incremental" o dataset particionado é a
+    própria camada bronze e df_bronze é None: a silver lê dele só as
+    partições que precisa processar (etl.silver.incremental_partitions).
+    """
+    lotes = iter_csv_batches(csv_path, batch_size=batch_size)
+    if modo == "incremental":
+        data_ingestao = datetime.now()
+        with span("ingest") as passo:
+            registros, _ = ingest_incremental(
+                (add_ingestion_metadata(lote, fonte, data_ingestao) for lote in lotes), bronze_path
+            )
+            passo.linhas_saida = registros
+        return None, registros
+
+    coletados = []
+
+    def _guardar(preparados):
+        for lote in preparados:
+            coletados.append(lote)
+            yield lote
+
+    preparados = _guardar(prepare_batches(lotes, fonte))
+    # Leitura do CSV e escrita do parquet acontecem juntas, lote a lote
+    with span("ingest") as passo:
+        if checkpoint:
+            os.makedirs(bronze_path, exist_ok=True)
+            write_batches(preparados, os.path.join(bronze_path, "dados_brutos.parquet"))
+        else:
+            for _ in preparados:
+                pass
+        passo.linhas_saida = sum(len(lote) for lote in coletados)
+    # Categorias diferem entre lotes; apply_schema unifica depois do concat
+    with span("concat", len(coletados)):
+        df = apply_schema(pd.concat(coletados, ignore_index=True)) if coletados else pd.DataFrame()
+    return df, len(df)
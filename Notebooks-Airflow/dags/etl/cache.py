@@ -0,0 +1,210 @@
+# Cache de consultas sobre a camada gold e o DW, versionado por snapshot.
+#
+# A gold muda no máximo uma vez por execução do pipeline, mas o dashboard e o
+# 05_SQL_queries refazem as mesmas agregações a cada abertura. Cada escrita
+# completa da gold (etl.gold.write_gold) publica um novo snapshot em
+# <gold>/_snapshot.json, e cada carga do DW publica <gold>/_snapshot_dw.json
+# (a versão de cada snapshot é única por publicação, ver publish_snapshot).
+# As entradas do cache são chaveadas pelo texto normalizado da consulta e
+# pela versão do snapshot da sua origem: quando um snapshot novo é publicado
+# as entradas antigas deixam de ser usadas e são descartadas.
+#
+# O cache fica na memória do processo (LRU com limite de entradas e de
+# bytes), então vale para um servidor do dashboard ou um kernel de notebook
+# (o notebooks/05_SQL_queries.ipynb faz as suas consultas por ele).
+#
+# Uso:
+#   cache = QueryCache(GOLD_PATH, engine)
+#   cache.read_sql("SELECT ... FROM cube_daily_country ...")
+#   cache.read_gold('rfm', columns=['CustomerID', 'Recency'])
+#   cache.read_gold('fact_all', ['DateID', 'total_value'], [('TransactionType', '=', 'Sale')])
+#   cache.stats()
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from etl.dataset import read_table
+
+GOLD_SNAPSHOT = "_snapshot.json"
+WAREHOUSE_SNAPSHOT = "_snapshot_dw.json"
+
+MAX_ENTRIES_PADRAO = 256
+MAX_BYTES_PADRAO = 256 * 1024 * 1024
+
+# Trechos mantidos como estão pela normalização: literais ('' escapa uma
+# aspa; em E'...' a barra invertida também escapa), identificadores entre
+# aspas duplas (maiúsculas fazem diferença) e strings com $$ / $tag$
+_PRESERVADOS = re.compile(
+    r"\b[eE]'(?:[^'\\]|''|\\.)*'"
+    r"|'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"'
+    r"|(\$\w*\$).*?\1",
+    re.S,
+)
+
+
+def read_snapshot(caminho):
+    """Versão do snapshot publicado em `caminho` (0 se nunca foi publicado)."""
+    try:
+        with open(caminho) as f:
+            return json.load(f)["version"]
+    except FileNotFoundError:
+        return 0
+
+
+def publish_snapshot(caminho):
+    """Publica um snapshot novo e devolve a versão.
+
+    A versão é o relógio em nanossegundos (time.time_ns), não a anterior + 1:
+    tasks do DAG em leque que publicam ao mesmo tempo leriam a mesma versão
+    e publicariam o mesmo número, e um cache que já viu esse número não
+    seria invalidado pela segunda escrita.
+    """
+    versao = time.time_ns()
+    # Um temporário por processo: tasks do DAG em leque publicam ao mesmo tempo
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": versao, "published_at": datetime.now().isoformat()}, f)
+    os.replace(tmp, caminho)
+    return versao
+
+
+def _normalizar_trecho(trecho):
+    return re.sub(r"\s+", " ", trecho).lower()
+
+
+def normalize_query(sql):
+    """Texto da consulta sem diferenças de espaços, maiúsculas e ';' final.
+
+    Literais e identificadores entre aspas não mudam (ver _PRESERVADOS).
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    partes, inicio = [], 0
+    for trecho in _PRESERVADOS.finditer(sql):
+        partes.append(_normalizar_trecho(sql[inicio:trecho.start()]))
+        partes.append(trecho.group(0))
+        inicio = trecho.end()
+    partes.append(_normalizar_trecho(sql[inicio:]))
+    return "".join(partes)
+
+
+def params_key(params):
+    """Chave dos parâmetros de read_sql: dict pela ordem das chaves, lista/tupla como veio.
+
+    repr em vez de uma tupla dos valores: listas (ex.: IN %(ids)s) não são hashable.
+    """
+    if isinstance(params, dict):
+        return repr(sorted(params.items()))
+    return repr(params)
+
+
+def _tamanho(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return int(resultado.memory_usage(index=True, deep=True).sum())
+    return 0
+
+
+class QueryCache:
+    """Resultados de consultas à gold e ao DW, por versão do snapshot.
+
+    Os DataFrames devolvidos são cópias rasas das entradas: trocar ou
+    adicionar colunas não altera o cache, mas alterar valores in-place sim.
+    """
+
+    def __init__(self, gold_path, engine=None, max_entries=MAX_ENTRIES_PADRAO, max_bytes=MAX_BYTES_PADRAO):
+        self.gold_path = gold_path
+        self.engine = engine
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._versoes = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _versao(self, origem):
+        arquivo = GOLD_SNAPSHOT if origem == "gold" else WAREHOUSE_SNAPSHOT
+        return read_snapshot(os.path.join(self.gold_path, arquivo))
+
+    def _invalidar(self, origem, versao):
+        # Snapshot novo publicado: as entradas das versões anteriores saem
+        if self._versoes.get(origem, versao) != versao:
+            for chave in [chave for chave in self._entradas if chave[0] == origem]:
+                self._remover(chave)
+                self.invalidations += 1
+        self._versoes[origem] = versao
+
+    def _remover(self, chave):
+        _, tamanho = self._entradas.pop(chave)
+        self._bytes -= tamanho
+
+    def get(self, origem, consulta, calcular):
+        """Resultado de `consulta` na origem ('gold' ou 'dw'), calculado só em miss."""
+        versao = self._versao(origem)
+        chave = (origem, versao, consulta)
+        with self._lock:
+            self._invalidar(origem, versao)
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.hits += 1
+                return self._entradas[chave][0].copy(deep=False)
+            self.misses += 1
+
+        resultado = calcular()
+        tamanho = _tamanho(resultado)
+        with self._lock:
+            # Um snapshot publicado durante o cálculo torna o resultado obsoleto
+            atual = self._versoes.get(origem) == versao
+            if atual and tamanho <= self.max_bytes and chave not in self._entradas:
+                self._entradas[chave] = (resultado, tamanho)
+                self._bytes += tamanho
+                while len(self._entradas) > self.max_entries or self._bytes > self.max_bytes:
+                    self._remover(next(iter(self._entradas)))
+                    self.evictions += 1
+        return resultado.copy(deep=False)
+
+    def read_sql(self, sql, params=None):
+        """pd.read_sql no DW, com cache pela consulta normalizada e parâmetros.
+
+        `params` pode ser um dict (%(nome)s) ou uma lista/tupla (%s ou ?).
+        """
+        return self.get(
+            "dw", (normalize_query(sql), params_key(params)),
+            lambda: pd.read_sql(sql, self.engine, params=params),
+        )
+
+    def read_gold(self, tabela, columns=None, filters=None):
+        """Parquet da gold (opcionalmente só algumas colunas e as linhas de `filters`), com cache.
+
+        `filters` segue o formato do pyarrow ([('DateID', '>=', 100)]) e é
+        aplicado no scanner (etl/dataset.py).
+        """
+        colunas = tuple(columns) if columns is not None else None
+        return self.get(
+            "gold", (tabela, colunas, repr(filters)),
+            lambda: read_table(os.path.join(self.gold_path, f"{tabela}.parquet"), columns, filters),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Contadores de hits/misses, evicções e invalidações, entradas e bytes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entradas),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,140 @@
+# # Leitura dos parquets das camadas (projeção de colunas e filtros)
+#
+# Cada consumidor declara em READS as tabelas que lê, as colunas de que
+# precisa e os filtros de linhas, no formato de filtros do pyarrow
+# ([('TransactionType', '=', 'Sale')], ver pyarrow.parquet.filters_to_expression).
+# A leitura passa pelo scanner do pyarrow.dataset: só as colunas pedidas
+# são lidas e decodificadas, e row groups cujas estatísticas (min/max) não
+# satisfazem o filtro são pulados sem serem lidos.
+#
+# Cada leitura é um passo da telemetria com o nome da tabela (linhas do
+# arquivo na entrada, linhas lidas na saída, bytes lidos do disco), com os
+# subpassos "decode" (scanner: leitura, descompressão e decodificação) e
+# "to_pandas" (conversão para DataFrame).
+#
+# Uso:
+#   tabelas = read_inputs(data_path, 'gold_rfm')
+#   fact_sales = tabelas['fact_all']
+
+import os
+
+from etl.schema import FINGERPRINT_COLUMN, SOURCE_COLUMNS
+from etl.telemetry import span
+
+# Linhas por lote em iter_batches
+BATCH_SIZE_PADRAO = 100_000
+
+# Tabelas fora da camada gold: nome -> caminho relativo ao data_path
+LAYER_FILES = {
+    'bronze': 'bronze/dados_brutos.parquet',
+    'silver': 'silver/dados_limpos.parquet',
+}
+
+# Só as vendas da fact_all (as linhas estão agrupadas por TransactionType)
+SALES = [('TransactionType', '=', 'Sale')]
+
+# Tabelas carregadas no DW e os digests das faturas (carga por merge)
+LOAD_INPUTS = [
+    'dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'fact_all_digest', 'metrics',
+    'cube_daily_country', 'cube_monthly_country', 'cube_monthly_product',
+]
+
+# Consumidor -> {tabela: (colunas, filtros)}; None = todas as colunas / linhas
+READS = {
+    'silver': {'bronze': (None, None)},
+    # A gold não usa os metadados de ingestão (data_ingestao, fonte_arquivos)
+    'gold': {'silver': (SOURCE_COLUMNS + [FINGERPRINT_COLUMN], None)},
+    'gold_rfm': {
+        'fact_all': (['CustomerID', 'InvoiceNo', 'DateID', 'total_value'], SALES),
+        'dim_date': (['DateID', 'InvoiceDate'], None),
+    },
+    'gold_most_purchased_products': {
+        'fact_all': (['CustomerID', 'StockCode', 'InvoiceNo', 'Quantity'], SALES),
+    },
+    'gold_metrics': {
+        'fact_all': (['InvoiceNo', 'Quantity', 'total_value', 'TransactionType'], None),
+        'dim_customer': (['CustomerID'], None),
+        'dim_product': (['StockCode'], None),
+    },
+    'gold_cubes': {
+        'fact_all': (
+            ['InvoiceNo', 'StockCode', 'CustomerID', 'DateID', 'Quantity', 'total_value', 'CountryID',
+             'TransactionType'],
+            None,
+        ),
+        'dim_date': (['DateID', 'InvoiceDate'], None),
+    },
+    'load': {tabela: (None, None) for tabela in LOAD_INPUTS},
+}
+
+
+def table_path(data_path, tabela):
+    """Parquet de uma tabela: bronze/silver (LAYER_FILES) ou <data_path>/gold/<tabela>.parquet."""
+    return os.path.join(data_path, LAYER_FILES.get(tabela, f'gold/{tabela}.parquet'))
+
+
+def _dataset(caminho, dicionario=None):
+    # `caminho` pode ser uma lista de arquivos, lidos nessa ordem
+    import pyarrow.dataset as ds
+
+    formato = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=dicionario or []))
+    return ds.dataset(caminho, format=formato)
+
+
+def _scan_args(dataset, colunas, filtros):
+    import pyarrow.parquet as pq
+
+    if colunas is not None:
+        # Tabelas gravadas antes de uma coluna existir (ex.: silver sem
+        # hash_linha): a coluna é omitida e quem lê a recalcula
+        colunas = [coluna for coluna in colunas if coluna in dataset.schema.names]
+    filtro = pq.filters_to_expression(filtros) if filtros else None
+    return colunas, filtro
+
+
+def read_table(caminho, colunas=None, filtros=None, nome=None):
+    """DataFrame de um parquet (ou lista de parquets) só com `colunas` e as linhas de `filtros`.
+
+    Os tipos pandas gravados nos metadados (category, Int32...) voltam iguais.
+    `nome` é o passo da telemetria (padrão: nome do arquivo).
+    """
+    dataset = _dataset(caminho)
+    colunas, filtro = _scan_args(dataset, colunas, filtros)
+    if nome is None:
+        nome = os.path.splitext(os.path.basename(caminho))[0]
+    with span(nome, dataset.count_rows()) as passo:
+        with span("decode"):
+            tabela = dataset.to_table(columns=colunas, filter=filtro)
+        with span("to_pandas", tabela.num_rows):
+            df = tabela.to_pandas()
+        passo.linhas_saida = len(df)
+    return df
+
+
+def iter_batches(caminho, colunas=None, filtros=None, batch_size=BATCH_SIZE_PADRAO, dicionario=None):
+    """(nomes das colunas, iterador de lotes Arrow) com a mesma projeção/filtros de read_table.
+
+    `dicionario` lista colunas de texto lidas como dicionário (categóricas).
+    Só um lote fica em memória por vez.
+    """
+    dataset = _dataset(caminho, dicionario)
+    colunas, filtro = _scan_args(dataset, colunas, filtros)
+    scanner = dataset.scanner(columns=colunas, filter=filtro, batch_size=batch_size)
+    return scanner.projected_schema.names, scanner.to_batches()
+
+
+def read_inputs(data_path, consumidor, filtros=None, tabelas=None):
+    """{tabela: DataFrame} com as tabelas, colunas e filtros declarados em READS[consumidor].
+
+    `filtros` ({tabela: filtros}) acrescenta condições conhecidas só na
+    execução, como os DateID de alguns meses. `tabelas` restringe a leitura
+    a parte das tabelas declaradas.
+    """
+    extras = filtros or {}
+    lidas = {}
+    for tabela, (colunas, declarados) in READS[consumidor].items():
+        if tabelas is not None and tabela not in tabelas:
+            continue
+        condicoes = (declarados or []) + extras.get(tabela, [])
+        lidas[tabela] = read_table(table_path(data_path, tabela), colunas, condicoes or None, tabela)
+    return lidas
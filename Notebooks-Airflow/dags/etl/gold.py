@@ -0,0 +1,825 @@
+# # Camada Gold - Modelagem Dimensional e Métricas
+#
+# Funções que montam o modelo estrela (dim_*, fact_all) e as análises
+# agregadas (RFM, produtos mais comprados, métricas gerais) a partir da
+# tabela da camada Silver. Usadas pelo 03_gold_layer.py e pelo runner
+# em memória (etl/runner.py).
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from etl.bronze import parse_invoice_date
+from etl.cache import GOLD_SNAPSHOT, publish_snapshot
+from etl.dataset import read_table
+from etl.keys import read_registries
+from etl.layout import read_layout, write_table
+from etl.schema import (
+    FINGERPRINT_COLUMN,
+    GOLD_CATEGORICAL_COLUMNS,
+    apply_schema,
+    compact_gold,
+    customer_id_labels,
+    invoice_key,
+    invoice_labels,
+    invoice_no,
+)
+from etl.silver import STOCKCODE_FEES, invoice_prefix_mask
+from etl.telemetry import span
+
+# Tabelas gravadas na camada gold, na ordem de escrita
+GOLD_OUTPUTS = [
+    'dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'fact_all_digest',
+    'rfm', 'most_purchased_products', 'metrics',
+    'cube_daily_country', 'cube_monthly_country', 'cube_monthly_product',
+]
+
+# Estado acumulado do RFM (gravado junto da gold, mas não carregado no DW)
+RFM_STATE = 'rfm_state'
+
+# Tabelas de build_star_schema (dimensões, fact_all e digests)
+STAR_SCHEMA = ['dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'fact_all_digest']
+
+# Digest das linhas de cada fatura da fact_all, usado pela carga por merge
+# para achar as faturas novas ou alteradas (etl/load.py)
+FACT_DIGEST = 'fact_all_digest'
+
+# Produtos por cliente em most_purchased_products e critérios do ranking
+TOP_N_PADRAO = 3
+TOP_N_CRITERIA = ['UnitsSold', 'Transactions']
+
+# Cubos agregados para os dashboards: nome -> colunas do grão. As medidas
+# (CUBE_MEASURES) são exatas no grão de cada cubo; as contagens distintas
+# (Invoices, Customers) não podem ser somadas entre meses
+CUBES = {
+    'cube_daily_country': ['InvoiceDay', 'CountryID', 'TransactionType'],
+    'cube_monthly_country': ['InvoiceMonth', 'CountryID', 'TransactionType'],
+    'cube_monthly_product': ['InvoiceMonth', 'StockCode', 'TransactionType'],
+}
+CUBE_MEASURES = ['Revenue', 'Quantity', 'Invoices', 'Customers', 'Lines']
+
+FACT_COLUMNS = [
+    'InvoiceNo', 'StockCode', 'CustomerID', 'DateID',
+    'Quantity', 'UnitPrice', 'total_value', 'CountryID',
+]
+
+# Tipos de transação na ordem em que aparecem na fact_all
+TRANSACTION_TYPES = ['Sale', 'Fee', 'Cancellation']
+
+# Tarifas que, canceladas, não entram em fact_cancellations
+CANCELLATION_EXCLUDED_STOCKCODES = ['C2', 'DOT', 'POST']
+
+
+def prepare(df_clean):
+    """Adiciona total_value e InvoiceNo textual; devolve também a máscara de cancelamentos."""
+    # Cópia rasa: as colunas novas não vazam para o DataFrame de quem chamou
+    df_clean = apply_schema(df_clean).copy(deep=False)
+    df_clean['total_value'] = df_clean['Quantity'] * df_clean['UnitPrice']
+    # InvoiceNo textual e máscara de cancelamentos/ajustes, calculados uma única vez
+    df_clean['InvoiceNo'] = invoice_no(df_clean)
+    return df_clean, invoice_prefix_mask(df_clean)
+
+
+def resolve_keys(df_clean, registros):
+    """Adiciona CountryID e DateID a todas as linhas, registrando membros novos.
+
+    As chaves vêm do registro persistente (etl/keys.py) e são resolvidas uma
+    única vez para a tabela inteira, antes da divisão em vendas, tarifas e
+    cancelamentos. InvoiceDate é convertida só para as datas distintas.
+    """
+    df_clean['CountryID'] = registros['country'].assign(df_clean['Country'])
+    codigos, datas = pd.factorize(df_clean['InvoiceDate'])
+    datas = parse_invoice_date(datas)
+    df_clean['DateID'] = registros['date'].assign(datas)[codigos]
+    return df_clean
+
+
+# =========================================
+#               CRIAÇÃO DE TABELAS
+# =========================================
+
+def build_dim_country(df_clean):
+    dim_country = (
+        df_clean[['Country', 'CountryID']]
+        .drop_duplicates(subset=['Country'])
+        .astype({'Country': object})
+    )
+    return dim_country.reset_index(drop=True)
+
+
+def build_dim_date(df_clean):
+    dim_date = (
+        df_clean[['InvoiceDate', 'DateID']]
+        .drop_duplicates(subset=['DateID'])
+        .copy()
+    )
+    dim_date = dim_date.reset_index(drop=True)
+    dim_date['InvoiceDate'] = parse_invoice_date(dim_date['InvoiceDate'])
+    dim_date['Year'] = dim_date['InvoiceDate'].dt.year
+    dim_date['Month'] = dim_date['InvoiceDate'].dt.month
+    dim_date['Day'] = dim_date['InvoiceDate'].dt.day
+    dim_date['Weekday'] = dim_date['InvoiceDate'].dt.day_name()
+    dim_date['Hour'] = dim_date['InvoiceDate'].dt.hour
+    return dim_date
+
+
+def _in_categories(serie, valores):
+    # serie.isin(valores) avaliado só nas categorias distintas; código -1
+    # (nulo) cai no False acrescentado ao fim
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        dentro = np.append(serie.cat.categories.isin(valores), False)
+        return dentro[serie.cat.codes.to_numpy()]
+    return serie.isin(valores).to_numpy()
+
+
+def classify_transactions(df_clean, cancelada, stockcode_fees=STOCKCODE_FEES):
+    """Tipo de transação de cada linha, em uma única passada.
+
+    Devolve um array int8 com a posição em TRANSACTION_TYPES (0 venda,
+    1 tarifa, 2 cancelamento) ou -1 para linhas que não entram nas fatos
+    (Quantity/UnitPrice <= 0 fora de cancelamentos, tarifas C2/DOT/POST
+    canceladas).
+    """
+    cancelada = np.asarray(cancelada)
+    tarifa = _in_categories(df_clean['StockCode'], stockcode_fees)
+    excluida = _in_categories(df_clean['StockCode'], CANCELLATION_EXCLUDED_STOCKCODES)
+    venda = (
+        ~cancelada & ~tarifa &
+        (df_clean['Quantity'].to_numpy() > 0) &
+        (df_clean['UnitPrice'].to_numpy() > 0)
+    )
+    tipos = np.full(len(df_clean), -1, dtype=np.int8)
+    tipos[venda] = 0
+    tipos[tarifa & ~cancelada] = 1
+    tipos[cancelada & ~excluida] = 2
+    return tipos
+
+
+def _fact_customer_labels(cliente, tipos):
+    # Rótulos de customer_id_labels ('17850.0'), com o ausente de cada tipo,
+    # montados direto nos códigos: categorias só dos valores presentes, em
+    # ordem alfabética (como as de compact_gold)
+    codigos, clientes = pd.factorize(cliente)
+    rotulos = [str(float(c)) for c in clientes]
+    ausente = codigos < 0
+    if ausente.any():
+        rotulos += sorted({'nan' if tipo else 'Unknown' for tipo in np.unique(tipos[ausente])})
+    categorias = sorted(rotulos)
+    posicao = {rotulo: i for i, rotulo in enumerate(categorias)}
+    codigos = np.array([posicao[rotulo] for rotulo in rotulos])[codigos]
+    if ausente.any():
+        # Vendas sem cliente: 'Unknown'; tarifas e cancelamentos: 'nan'
+        codigos[ausente] = np.where(tipos[ausente] == 0, posicao.get('Unknown', -1), posicao.get('nan', -1))
+    return pd.Categorical.from_codes(codigos, categorias)
+
+
+def build_fact_all(df_clean, tipos):
+    """fact_all com a coluna TransactionType, a partir de classify_transactions.
+
+    As linhas ficam agrupadas por tipo (vendas, tarifas, cancelamentos) e,
+    dentro de cada tipo, ordenadas por DateID (ordenação estável: a ordem
+    original é mantida na mesma data), e são copiadas uma única vez. A
+    ordem por data é a que permite pular row groups em consultas por
+    período (etl/layout.py); o concat das três fatos, na ordem da silver,
+    deixava os meses espalhados. splice_star_schema mantém a mesma ordem,
+    então a gold incremental tem as linhas na ordem da completa. O fact_id
+    do DW não depende dela (ver etl/partitions.py).
+    Vendas sem cliente ficam como 'Unknown'; tarifas e cancelamentos, 'nan'.
+    """
+    linhas = np.flatnonzero(tipos >= 0)
+    linhas = linhas[np.lexsort((df_clean['DateID'].to_numpy()[linhas], tipos[linhas]))]
+    tipos = tipos[linhas]
+    fact_all = pd.DataFrame({coluna: df_clean[coluna].array.take(linhas) for coluna in FACT_COLUMNS})
+
+    fact_all['CustomerID'] = _fact_customer_labels(fact_all['CustomerID'], tipos)
+
+    # Categorias em ordem alfabética, como as de compact_gold
+    categorias = sorted(TRANSACTION_TYPES)
+    posicao = np.array([categorias.index(tipo) for tipo in TRANSACTION_TYPES], dtype=np.int8)
+    fact_all['TransactionType'] = pd.Categorical.from_codes(posicao[tipos], categorias)
+    return fact_all
+
+
+def split_fact_all(fact_all):
+    """fact_sales, fact_fees e fact_cancellations como fatias contíguas da fact_all (sem cópia)."""
+    tipos = fact_all['TransactionType']
+    limites = np.cumsum([0] + [int((tipos == tipo).sum()) for tipo in TRANSACTION_TYPES])
+    return tuple(fact_all.iloc[inicio:fim] for inicio, fim in zip(limites[:-1], limites[1:]))
+
+
+def build_facts(df_clean, cancelada, stockcode_fees=STOCKCODE_FEES):
+    """Fatos de vendas, tarifas e cancelamentos (chaves já resolvidas em resolve_keys)."""
+    return split_fact_all(build_fact_all(df_clean, classify_transactions(df_clean, cancelada, stockcode_fees)))
+
+
+# =========================================
+#               TABELAS DIMENSAO
+# =========================================
+
+def invoice_digests(df_clean):
+    """InvoiceNo e Digest de cada fatura: soma das hash_linha das suas linhas (mod 2**64).
+
+    A soma não depende da ordem das linhas, mas muda se alguma linha da
+    fatura entra, sai ou é alterada. Cada linha da silver vira uma linha da
+    fact_all com as chaves estáveis do registro, então o digest identifica o
+    conteúdo da fatura na fato sem re-hashear as colunas.
+    """
+    soma = df_clean[FINGERPRINT_COLUMN].groupby(invoice_key(df_clean), sort=False).sum()
+    return pd.DataFrame({
+        'InvoiceNo': invoice_labels(soma.index),
+        'Digest': [f'{digest:016x}' for digest in soma.tolist()],
+    })
+
+
+def build_dim_customer(fact_sales, fact_fees, fact_cancellations, registro):
+    all_customers = pd.concat([
+        fact_sales[['CustomerID', 'CountryID']],
+        fact_fees[['CustomerID', 'CountryID']],
+        fact_cancellations[['CustomerID', 'CountryID']]
+    ], ignore_index=True)
+
+    dim_customer = (
+        all_customers
+        .drop_duplicates(subset=['CustomerID'])
+        .copy()
+    )
+    dim_customer = dim_customer.reset_index(drop=True)
+
+    # Garante existencia do cliente 'Unknown' ('Unknown' não tem um país definido)
+    if 'Unknown' not in dim_customer['CustomerID'].values:
+        dim_customer.loc[len(dim_customer)] = ['Unknown', None]
+    dim_customer['CustomerKey'] = registro.assign(dim_customer['CustomerID'])
+    return dim_customer
+
+
+def build_dim_product(df_clean, registro):
+    dim_product = (
+        df_clean[['StockCode', 'Description']]
+        .drop_duplicates(subset=['StockCode'])
+        .rename(columns={'Description': 'ProductDescription'})
+        .copy()
+    )
+    dim_product['ProductKey'] = registro.assign(dim_product['StockCode'])
+    return dim_product
+
+
+# =========================================
+#            MÉTRICAS GOLD
+# =========================================
+
+def sales_dates(fact_sales, dim_date):
+    """InvoiceDate de cada venda, recuperada pelo DateID (sem merge com dim_date)."""
+    datas = pd.Series(pd.to_datetime(dim_date['InvoiceDate']).to_numpy(), index=dim_date['DateID'])
+    return fact_sales['DateID'].map(datas)
+
+
+def build_rfm_state(fact_sales, dim_date):
+    """Estado acumulado do RFM por cliente e mês.
+
+    LastPurchase (última compra), Frequency (faturas distintas) e Monetary
+    (soma de total_value) de cada cliente em cada mês (InvoiceMonth). Cada
+    fatura tem uma única InvoiceDate, então os meses se somam sem contar
+    uma fatura duas vezes e um mês alterado é reagregado sozinho
+    (update_rfm_state), sem reagregar o histórico.
+    """
+    _, mes = fact_periods(fact_sales, dim_date)
+    vendas = pd.DataFrame({
+        # fact_sales é fatia da fact_all: só as categorias de clientes com vendas
+        'CustomerID': fact_sales['CustomerID'].cat.remove_unused_categories(),
+        'InvoiceMonth': mes,
+        'InvoiceNo': fact_sales['InvoiceNo'],
+        'InvoiceDate': sales_dates(fact_sales, dim_date),
+        'total_value': fact_sales['total_value'],
+    })
+    return (
+        vendas.groupby(['CustomerID', 'InvoiceMonth'], observed=True)
+        .agg(
+            LastPurchase=('InvoiceDate', 'max'),
+            Frequency=('InvoiceNo', 'nunique'),
+            Monetary=('total_value', 'sum')
+        )
+        .reset_index()
+    )
+
+
+def fold_rfm_state(estado, novo, meses):
+    """Substitui no estado os `meses` (primeiro dia de cada mês) pelo estado `novo`.
+
+    `novo` é o build_rfm_state das vendas desses meses; clientes que não
+    têm mais vendas em um mês saem dele.
+    """
+    mantidos = estado[~estado['InvoiceMonth'].isin(pd.DatetimeIndex(meses))]
+    combinado = pd.concat([
+        mantidos.astype({'CustomerID': object}),
+        novo.astype({'CustomerID': object}),
+    ], ignore_index=True)
+    return combinado.sort_values(['CustomerID', 'InvoiceMonth'], ignore_index=True)
+
+
+def rfm_from_state(estado):
+    """Recency (dias desde a última compra), Frequency (faturas) e Monetary por cliente."""
+    por_cliente = (
+        estado.groupby('CustomerID', observed=True)
+        .agg(
+            LastPurchase=('LastPurchase', 'max'),
+            Frequency=('Frequency', 'sum'),
+            Monetary=('Monetary', 'sum')
+        )
+        .reset_index()
+    )
+    # Última data de compra de toda a base
+    latest_date = por_cliente['LastPurchase'].max()
+    return pd.DataFrame({
+        'CustomerID': por_cliente['CustomerID'],
+        'Recency': (latest_date - por_cliente['LastPurchase']).dt.days,
+        'Frequency': por_cliente['Frequency'],
+        'Monetary': por_cliente['Monetary'],
+    })
+
+
+def update_rfm_state(estado, fact_sales, dim_date, meses=None):
+    """Estado do RFM com os `meses` alterados reagregados a partir de fact_sales.
+
+    Com o estado da execução anterior (read_rfm_state) e a lista `meses`
+    (primeiro dia de cada mês alterado, ver etl.bronze.changed_months), só
+    as vendas desses meses são agregadas e substituem as antigas, como nos
+    cubos (build_cubes): vendas atrasadas, de qualquer data, e correções
+    entram. Sem eles, o estado é montado com todas as vendas.
+    """
+    if estado is None or meses is None:
+        return build_rfm_state(fact_sales, dim_date)
+    vendas = fact_sales[fact_sales['DateID'].isin(month_date_ids(dim_date, meses))]
+    return fold_rfm_state(estado, build_rfm_state(vendas, dim_date), meses)
+
+
+def build_rfm(fact_sales, dim_date):
+    """RFM recalculado sobre todo o histórico de vendas."""
+    return rfm_from_state(build_rfm_state(fact_sales, dim_date))
+
+
+def read_rfm_state(gold_path):
+    """Estado do RFM gravado pela execução anterior, ou None.
+
+    Um estado antigo, só por cliente (sem InvoiceMonth), não pode ter meses
+    substituídos: também devolve None e o estado é refeito inteiro.
+    """
+    caminho = os.path.join(gold_path, f'{RFM_STATE}.parquet')
+    if not os.path.exists(caminho):
+        return None
+    estado = read_table(caminho)
+    return estado if 'InvoiceMonth' in estado.columns else None
+
+
+def top_n_per_group(df, grupo, coluna, n):
+    """As `n` linhas de maior `coluna` em cada grupo, com a coluna Rank (1 = maior).
+
+    Seleção parcial: cada rodada pega o máximo de cada grupo
+    (np.maximum.at) e marca as linhas escolhidas, sem ordenar a tabela. O
+    custo é n passadas lineares, independente de quantos produtos cada
+    cliente tem. Empates ficam com a primeira linha do grupo.
+    """
+    codigos = pd.factorize(df[grupo])[0]
+    n_grupos = codigos.max() + 1 if len(codigos) else 0
+    valores = df[coluna].to_numpy(dtype='float64', copy=True)
+
+    posicoes, ranks = [], []
+    for rank in range(1, n + 1):
+        maximos = np.full(n_grupos, -np.inf)
+        np.maximum.at(maximos, codigos, valores)
+        candidatos = np.flatnonzero((valores == maximos[codigos]) & (valores > -np.inf))
+        if not len(candidatos):
+            break
+        # Primeira linha candidata de cada grupo
+        primeira = np.full(n_grupos, len(df))
+        np.minimum.at(primeira, codigos[candidatos], candidatos)
+        escolhidas = primeira[primeira < len(df)]
+        valores[escolhidas] = -np.inf
+        posicoes.append(escolhidas)
+        ranks.append(np.full(len(escolhidas), rank))
+
+    if not posicoes:
+        return df.iloc[:0].assign(Rank=pd.Series(dtype='int64'))
+    top = df.iloc[np.concatenate(posicoes)].reset_index(drop=True)
+    top['Rank'] = np.concatenate(ranks)
+    return top
+
+
+def customer_product_totals(fact_sales):
+    """Unidades e faturas distintas por cliente x produto, em uma única passada.
+
+    Cliente, produto e fatura viram códigos inteiros; cada par cliente x
+    produto é um inteiro e as somas saem de np.bincount, sem groupby sobre
+    colunas de texto.
+    """
+    cliente, clientes = pd.factorize(fact_sales['CustomerID'])
+    # fact_sales é fatia da fact_all: só as categorias de clientes com vendas
+    clientes = clientes.remove_unused_categories()
+    produto, produtos = pd.factorize(fact_sales['StockCode'])
+    fatura, faturas = pd.factorize(fact_sales['InvoiceNo'])
+
+    par, pares = pd.factorize(cliente.astype('int64') * len(produtos) + produto)
+    unidades = np.bincount(par, weights=fact_sales['Quantity'].to_numpy(), minlength=len(pares))
+    # Faturas distintas: pares (par, fatura) únicos contados por par
+    distintos = pd.unique(par.astype('int64') * len(faturas) + fatura)
+    transacoes = np.bincount(distintos // len(faturas), minlength=len(pares))
+
+    return pd.DataFrame({
+        'CustomerID': clientes.take(pares // len(produtos)),
+        'StockCode': produtos.take(pares % len(produtos)),
+        'UnitsSold': unidades.astype('int64'),
+        'Transactions': transacoes,
+    })
+
+
+def build_most_purchased_products(fact_sales, top_n=TOP_N_PADRAO):
+    """Top N produtos por cliente, por quantidade e por número de transações.
+
+    Tabela longa: Criterion indica o critério do ranking ('UnitsSold' ou
+    'Transactions') e Rank a posição do produto (1 = mais comprado). Os dois
+    agregados saem de uma única passada (customer_product_totals).
+    """
+    return rank_customer_products(customer_product_totals(fact_sales), top_n)
+
+
+def rank_customer_products(agregado, top_n=TOP_N_PADRAO):
+    """Ranking de build_most_purchased_products a partir de customer_product_totals.
+
+    Empates ficam com o par cliente x produto que aparece primeiro nas vendas.
+    """
+    rankings = [
+        top_n_per_group(agregado, 'CustomerID', criterio, top_n).assign(Criterion=criterio)
+        for criterio in TOP_N_CRITERIA
+    ]
+    top = pd.concat(rankings, ignore_index=True)
+    top['Criterion'] = pd.Categorical(top['Criterion'], categories=TOP_N_CRITERIA)
+    return (
+        top[['CustomerID', 'Criterion', 'Rank', 'StockCode', 'UnitsSold', 'Transactions']]
+        .sort_values(['CustomerID', 'Criterion', 'Rank'], ignore_index=True)
+    )
+
+
+def build_metrics(fact_sales, fact_fees, fact_cancellations, dim_customer, dim_product):
+    """Vendas brutas/líquidas, pedidos, clientes e produtos distintos e unidades vendidas."""
+    gross_sales = fact_sales['total_value'].sum()
+    net_sales = gross_sales + fact_cancellations['total_value'].sum() - fact_fees['total_value'].sum()
+    return metrics_table(
+        gross_sales,
+        net_sales,
+        fact_sales['InvoiceNo'].nunique(),
+        dim_customer['CustomerID'].nunique(),
+        dim_product['StockCode'].nunique(),
+        fact_sales['Quantity'].sum()
+    )
+
+
+def metrics_table(gross_sales, net_sales, orders, customers, products, units):
+    """Tabela metrics a partir dos valores já agregados."""
+    return pd.DataFrame({
+        'Metrics': [
+            'Gross Sales',
+            'Net Sales',
+            'Total Orders',
+            'Distinct Customers',
+            'Distinct Products',
+            'Product Units Sold'
+        ],
+        'Value': [gross_sales, net_sales, orders, customers, products, units]
+    })
+
+
+# =========================================
+#            CUBOS DOS DASHBOARDS
+# =========================================
+
+def _truncar(datas, unidade):
+    # Trunca no dia ('D') ou no mês ('M') pela conversão de unidade do numpy
+    return datas.astype(f'datetime64[{unidade}]').astype('datetime64[ns]')
+
+
+def date_periods(dim_date):
+    """Dia e primeiro dia do mês de cada DateID (Series indexadas pelo DateID)."""
+    datas = dim_date['InvoiceDate'].to_numpy(dtype='datetime64[ns]')
+    dias = pd.Series(_truncar(datas, 'D'), index=dim_date['DateID'])
+    meses = pd.Series(_truncar(datas, 'M'), index=dim_date['DateID'])
+    return dias, meses
+
+
+def month_date_ids(dim_date, meses):
+    """DateID das datas que caem nos `meses` (primeiro dia de cada mês)."""
+    _, mes_data = date_periods(dim_date)
+    return mes_data.index[mes_data.isin(pd.DatetimeIndex(meses))]
+
+
+def fact_periods(fact_all, dim_date):
+    """Dia e primeiro dia do mês de cada linha da fato, resolvidos pelo DateID."""
+    dias, meses = date_periods(dim_date)
+    return fact_all['DateID'].map(dias), fact_all['DateID'].map(meses)
+
+
+def build_cube(fatos, grao):
+    """Receita, unidades, faturas e clientes distintos e linhas por `grao`."""
+    cubo = (
+        fatos.groupby(grao, observed=True)
+        .agg(
+            Revenue=('total_value', 'sum'),
+            Quantity=('Quantity', 'sum'),
+            Invoices=('InvoiceNo', 'nunique'),
+            Customers=('_cliente', 'nunique'),
+            Lines=('total_value', 'size')
+        )
+        .reset_index()
+    )
+    # Chaves como texto: a ordem não depende das categorias de cada execução
+    return cubo.astype({coluna: object for coluna in grao if coluna in GOLD_CATEGORICAL_COLUMNS})
+
+
+def build_cubes(fact_all, dim_date, anteriores=None, meses=None):
+    """Cubos de CUBES a partir da fact_all.
+
+    Com os cubos da execução anterior (read_cubes) e a lista `meses` (primeiro
+    dia de cada mês alterado, ver etl.bronze.changed_months), só as linhas
+    desses meses são reagregadas e substituem as antigas; os demais meses
+    vêm prontos de `anteriores`. Sem eles, tudo é recalculado.
+    """
+    incremental = anteriores is not None and meses is not None
+    if incremental:
+        # Filtra pelos DateID dos meses alterados antes de montar as colunas
+        fact_all = fact_all[fact_all['DateID'].isin(month_date_ids(dim_date, meses))]
+
+    fatos = cube_facts(fact_all, dim_date)
+    cubos = {nome: build_cube(fatos, grao) for nome, grao in CUBES.items()}
+    return combine_cubes(cubos, anteriores if incremental else None, meses)
+
+
+def cube_facts(fact_all, dim_date):
+    """Colunas da fact_all usadas pelos cubos, com dia e mês de cada linha."""
+    dia, mes = fact_periods(fact_all, dim_date)
+    cliente = fact_all['CustomerID']
+    return pd.DataFrame({
+        'InvoiceDay': dia,
+        'InvoiceMonth': mes,
+        'CountryID': fact_all['CountryID'],
+        'StockCode': fact_all['StockCode'],
+        'TransactionType': fact_all['TransactionType'],
+        'InvoiceNo': fact_all['InvoiceNo'],
+        'Quantity': fact_all['Quantity'].astype('int64'),
+        'total_value': fact_all['total_value'],
+        # Clientes sem CustomerID não entram na contagem de clientes
+        '_cliente': cliente.where(~cliente.isin(['Unknown', 'nan'])),
+    })
+
+
+def combine_cubes(cubos, anteriores=None, meses=None):
+    """Junta os cubos recalculados aos meses não alterados de `anteriores` e ordena pelo grão."""
+    if anteriores is not None:
+        meses = pd.DatetimeIndex(meses)
+    combinados = {}
+    for nome, grao in CUBES.items():
+        cubo = cubos[nome]
+        if anteriores is not None:
+            anterior = anteriores[nome]
+            mes_anterior = _truncar(anterior[grao[0]].to_numpy(dtype='datetime64[ns]'), 'M')
+            anterior = anterior[~np.isin(mes_anterior, meses.to_numpy())].astype(
+                {coluna: object for coluna in grao if coluna in GOLD_CATEGORICAL_COLUMNS}
+            )
+            cubo = pd.concat([anterior, cubo], ignore_index=True)
+        combinados[nome] = cubo[grao + CUBE_MEASURES].sort_values(grao, ignore_index=True)
+    return combinados
+
+
+def read_cubes(gold_path):
+    """Cubos gravados pela execução anterior, ou None se algum não existe."""
+    caminhos = {nome: os.path.join(gold_path, f'{nome}.parquet') for nome in CUBES}
+    if not all(os.path.exists(caminho) for caminho in caminhos.values()):
+        return None
+    return {nome: read_table(caminho) for nome, caminho in caminhos.items()}
+
+
+def build_gold(df_clean, rfm_estado=None, registros=None, top_n=TOP_N_PADRAO, engine='pandas',
+               cubos=None, meses=None, workers=1, particao='month', anterior=None):
+    """Monta todas as tabelas da camada gold a partir da silver.
+
+    Com `rfm_estado` (read_rfm_state) e `meses` o RFM só reagrega as vendas
+    dos meses alterados (update_rfm_state). `registros` são os registros
+    de chaves (etl.keys.read_registries), atualizados in-place com os membros
+    novos; sem eles as chaves são numeradas a partir de 1. `top_n` é o número
+    de produtos por cliente em most_purchased_products. `engine="polars"`
+    usa o backend de etl/gold_polars.py, com as mesmas saídas. Com `cubos`
+    (read_cubes) e `meses` os cubos só são reagregados nos meses alterados
+    (build_cubes). Com `workers` > 1 o RFM, most_purchased_products, metrics
+    e os cubos são agregados por partição (`particao`: 'month' ou
+    'customer') em um pool de processos (etl/parallel.py). Com o modelo
+    estrela da execução anterior (`anterior`, read_star_schema) e `meses`,
+    `df_clean` é só a silver desses meses (etl.silver.read_silver): o modelo
+    dos meses é emendado ao anterior (splice_star_schema) e as agregações
+    rodam sobre o resultado, pelo backend pandas. Retorna um dict
+    {nome: DataFrame} com GOLD_OUTPUTS e o estado do RFM.
+    """
+    if anterior is not None and meses is not None:
+        registros = registros if registros is not None else read_registries()
+        with span("splice", len(df_clean)):
+            modelo = anterior
+            if len(df_clean):
+                modelo = splice_star_schema(anterior, build_star_schema(df_clean, registros), meses, registros)
+        tabelas = {**modelo, **build_aggregates(modelo, rfm_estado, top_n, workers, particao, meses)}
+    elif engine == 'polars':
+        # Import tardio: o polars só é necessário para este backend
+        from etl.gold_polars import build_gold_polars
+
+        with span("polars", len(df_clean)):
+            tabelas = build_gold_polars(df_clean, rfm_estado, registros, top_n, meses)
+        tabelas[FACT_DIGEST] = compact_gold(invoice_digests(apply_schema(df_clean)))
+    elif engine == 'pandas':
+        tabelas = build_gold_pandas(df_clean, rfm_estado, registros, top_n, workers, particao, meses)
+    else:
+        raise ValueError(f"engine deve ser 'pandas' ou 'polars', não {engine!r}")
+
+    # Cubos saem da fact_all já pronta: a mesma agregação para os dois backends
+    with span("cubes", len(tabelas['fact_all'])) as passo:
+        if workers > 1:
+            from etl.parallel import build_cubes_partitioned
+
+            cubos = build_cubes_partitioned(tabelas['fact_all'], tabelas['dim_date'], cubos, meses, workers)
+        else:
+            cubos = build_cubes(tabelas['fact_all'], tabelas['dim_date'], cubos, meses)
+        tabelas.update({nome: compact_gold(cubo) for nome, cubo in cubos.items()})
+        passo.linhas_saida = sum(len(cubo) for cubo in cubos.values())
+    return tabelas
+
+
+def build_gold_pandas(df_clean, rfm_estado=None, registros=None, top_n=TOP_N_PADRAO, workers=1,
+                      particao='month', meses=None):
+    """Backend pandas de build_gold (todas as tabelas menos os cubos)."""
+    tabelas = build_star_schema(df_clean, registros)
+    tabelas.update(build_aggregates(tabelas, rfm_estado, top_n, workers, particao, meses))
+    return tabelas
+
+
+def build_star_schema(df_clean, registros=None):
+    """Dimensões e fact_all, já nos tipos compactos da gold.
+
+    É a única parte da gold que resolve chaves (e registra membros novos em
+    `registros`); as agregações (build_aggregates, build_cubes) só leem as
+    tabelas devolvidas aqui.
+    """
+    registros = registros if registros is not None else read_registries()
+    with span("prepare", len(df_clean)):
+        df_clean, cancelada = prepare(df_clean)
+        df_clean = resolve_keys(df_clean, registros)
+
+    with span("facts") as passo:
+        # Uma classificação e uma cópia para a fact_all; as três fatos são fatias dela
+        fact_all = build_fact_all(df_clean, classify_transactions(df_clean, cancelada))
+        fact_sales, fact_fees, fact_cancellations = split_fact_all(fact_all)
+        fact_digest = invoice_digests(df_clean)
+        passo.linhas_saida = len(fact_all)
+    with span("dimensions"):
+        dim_country = build_dim_country(df_clean)
+        dim_date = build_dim_date(df_clean)
+        dim_customer = build_dim_customer(fact_sales, fact_fees, fact_cancellations, registros['customer'])
+        dim_product = build_dim_product(df_clean, registros['product'])
+
+    tabelas = {
+        'dim_country': dim_country[['CountryID', 'Country']],
+        'dim_date': dim_date[['DateID', 'InvoiceDate', 'Year', 'Month', 'Day', 'Weekday', 'Hour']],
+        'dim_customer': dim_customer,
+        'dim_product': dim_product,
+        'fact_all': fact_all,
+        FACT_DIGEST: fact_digest,
+    }
+    # Tipos compactos (category / int32) também na camada gold
+    with span("compact"):
+        return {nome: compact_gold(tabela) for nome, tabela in tabelas.items()}
+
+
+def read_star_schema(gold_path):
+    """Modelo estrela (STAR_SCHEMA) gravado pela execução anterior, ou None se alguma tabela não existe."""
+    caminhos = {nome: os.path.join(gold_path, f'{nome}.parquet') for nome in STAR_SCHEMA}
+    if not all(os.path.exists(caminho) for caminho in caminhos.values()):
+        return None
+    return {nome: read_table(caminho) for nome, caminho in caminhos.items()}
+
+
+def concat_gold(partes):
+    """pd.concat das tabelas da gold com as colunas category unificadas.
+
+    As categorias ficam em ordem alfabética, como as de compact_gold.
+    """
+    # Partes vazias não entram: não definem o tipo das colunas
+    partes = [parte for parte in partes if len(parte)] or partes[:1]
+    combinado = pd.concat(partes, ignore_index=True)
+    for coluna in combinado.columns:
+        series = [parte[coluna] for parte in partes]
+        if all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+            combinado[coluna] = union_categoricals(series, sort_categories=True)
+    return combinado
+
+
+def splice_star_schema(anterior, novo, meses, registros=None):
+    """Modelo estrela do histórico (`anterior`) com os `meses` substituídos por `novo`.
+
+    `novo` é o build_star_schema da silver só desses meses, com o mesmo
+    registro de chaves, então os IDs batem com os de `anterior`. Na
+    fact_all as linhas dos meses saem e as de `novo` entram, na ordem de
+    build_fact_all (tipo de transação, DateID). A bronze só recebe linhas
+    novas e cada fatura fica em um único mês, então `novo` tem todas as
+    faturas desses meses e os seus digests substituem os antigos. A
+    dim_date troca as datas dos meses, dim_country e dim_product ganham os
+    membros novos e a dim_customer é refeita a partir da fact_all.
+    """
+    registros = registros if registros is not None else read_registries()
+    datas = month_date_ids(anterior['dim_date'], meses)
+
+    fact_all = anterior['fact_all']
+    fact_all = concat_gold([fact_all[~fact_all['DateID'].isin(datas)], novo['fact_all']])
+    tipo = fact_all['TransactionType'].astype(object).map({tipo: i for i, tipo in enumerate(TRANSACTION_TYPES)})
+    # lexsort é estável: a ordem de cada mês é a de novo
+    fact_all = fact_all.take(np.lexsort((fact_all['DateID'].to_numpy(), tipo.to_numpy())))
+    fact_all = fact_all.reset_index(drop=True)
+
+    dim_date = anterior['dim_date']
+    dim_date = concat_gold([dim_date[~dim_date['DateID'].isin(datas)], novo['dim_date']])
+    digests, novos_digests = anterior[FACT_DIGEST], novo[FACT_DIGEST]
+    digests = concat_gold([digests[~digests['InvoiceNo'].isin(novos_digests['InvoiceNo'])], novos_digests])
+
+    def com_novos(tabela, chave):
+        anteriores = anterior[tabela]
+        return concat_gold([anteriores, novo[tabela][~novo[tabela][chave].isin(anteriores[chave])]])
+
+    tabelas = {
+        'dim_country': com_novos('dim_country', 'CountryID'),
+        'dim_date': dim_date.sort_values('DateID', ignore_index=True),
+        'dim_customer': build_dim_customer(*split_fact_all(fact_all), registros['customer']),
+        'dim_product': com_novos('dim_product', 'StockCode'),
+        'fact_all': fact_all,
+        FACT_DIGEST: digests,
+    }
+    with span("compact"):
+        return {nome: compact_gold(tabela) for nome, tabela in tabelas.items()}
+
+
+def build_aggregates(modelo, rfm_estado=None, top_n=TOP_N_PADRAO, workers=1, particao='month', meses=None):
+    """RFM (e o seu estado), most_purchased_products e metrics a partir de build_star_schema.
+
+    Com `rfm_estado` e `meses` o estado do RFM só tem esses meses reagregados.
+    """
+    fact_all, dim_date = modelo['fact_all'], modelo['dim_date']
+    dim_customer, dim_product = modelo['dim_customer'], modelo['dim_product']
+    fact_sales, fact_fees, fact_cancellations = split_fact_all(fact_all)
+    if workers > 1:
+        # Import tardio: o pool de processos só é usado no modo particionado
+        from etl.parallel import partitioned_aggregates
+
+        with span("partitioned_aggregates", len(fact_all)):
+            rfm_estado, most_purchased_products, metrics = partitioned_aggregates(
+                fact_all, dim_date, dim_customer, dim_product, rfm_estado, top_n, workers, particao, meses
+            )
+            rfm = rfm_from_state(rfm_estado)
+    else:
+        with span("rfm", len(fact_sales)) as passo:
+            rfm_estado = update_rfm_state(rfm_estado, fact_sales, dim_date, meses)
+            rfm = rfm_from_state(rfm_estado)
+            passo.linhas_saida = len(rfm)
+        with span("most_purchased_products", len(fact_sales)) as passo:
+            most_purchased_products = build_most_purchased_products(fact_sales, top_n)
+            passo.linhas_saida = len(most_purchased_products)
+        with span("metrics"):
+            metrics = build_metrics(fact_sales, fact_fees, fact_cancellations, dim_customer, dim_product)
+
+    tabelas = {
+        'rfm': rfm,
+        'most_purchased_products': most_purchased_products,
+        'metrics': metrics,
+        RFM_STATE: rfm_estado,
+    }
+    with span("compact"):
+        return {nome: compact_gold(tabela) for nome, tabela in tabelas.items()}
+
+
+def fact_row_group_cuts(fact_all, dim_date):
+    """Posições da fact_all em que muda o tipo de transação ou o mês (início de um row group)."""
+    _, mes = fact_periods(fact_all, dim_date)
+    mes = mes.to_numpy()
+    tipo = fact_all['TransactionType'].cat.codes.to_numpy()
+    return np.flatnonzero((mes[1:] != mes[:-1]) | (tipo[1:] != tipo[:-1])) + 1
+
+
+def write_gold(tabelas, gold_path, layout=None):
+    """Grava cada tabela como <gold_path>/<nome>.parquet e publica o snapshot.
+
+    `layout` é o de etl.layout.read_layout() (padrão: o do ambiente); com a
+    dim_date junto, os row groups da fact_all não atravessam meses.
+    """
+    layout = layout or read_layout()
+    os.makedirs(gold_path, exist_ok=True)
+    with span("write_gold"):
+        for nome, tabela in tabelas.items():
+            with span(nome, len(tabela)):
+                cortes = ()
+                if nome == 'fact_all' and 'dim_date' in tabelas:
+                    cortes = fact_row_group_cuts(tabela, tabelas['dim_date'])
+                write_table(tabela, os.path.join(gold_path, f'{nome}.parquet'), layout, cortes)
+    # Só depois de todas as tabelas: invalida o cache de consultas (etl/cache.py)
+    return publish_snapshot(os.path.join(gold_path, GOLD_SNAPSHOT))
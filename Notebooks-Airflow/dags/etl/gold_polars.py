@@ -0,0 +1,204 @@
+# Backend Polars da camada gold (GOLD_ENGINE=polars).
+#
+# Gera as mesmas tabelas de etl/gold.py (dim_*, fact_all, rfm,
+# most_purchased_products, metrics e o estado do RFM; os cubos são montados
+# depois, em etl.gold.build_cubes, sobre a fact_all). A preparação por
+# valores distintos (InvoiceNo textual, chaves das dimensões, rótulos de
+# CustomerID) reaproveita as funções pandas de etl/gold.py; o trabalho por
+# linha (filtros das fatos, drop_duplicates das dimensões, RFM, top N de
+# produtos e métricas) vira um plano lazy do Polars, executado em paralelo
+# e com as subconsultas comuns calculadas uma vez por pl.collect_all.
+#
+# O polars é opcional: só é importado quando este backend é escolhido.
+
+import pandas as pd
+import polars as pl
+
+from etl.gold import (
+    FACT_COLUMNS,
+    RFM_STATE,
+    TOP_N_CRITERIA,
+    TOP_N_PADRAO,
+    build_dim_country,
+    build_dim_date,
+    fold_rfm_state,
+    prepare,
+    resolve_keys,
+    rfm_from_state,
+)
+from etl.keys import read_registries
+from etl.schema import compact_gold, customer_id_labels
+from etl.silver import STOCKCODE_FEES
+
+# Colunas da silver preparada que entram no plano Polars
+COLUNAS_PLANO = [
+    'InvoiceNo', 'StockCode', 'Description', 'Quantity', 'UnitPrice',
+    'total_value', 'CountryID', 'DateID',
+]
+
+
+def _lazy_silver(df_clean, cancelada):
+    """Silver preparada (etl.gold.prepare + resolve_keys) como LazyFrame."""
+    plano = df_clean[COLUNAS_PLANO].copy(deep=False)
+    plano['cancelada'] = cancelada.to_numpy()
+    # CustomerID numérico (para ordenar como o backend pandas) e os dois
+    # rótulos usados nas fatos: 'Unknown' nas vendas, 'nan' nas demais
+    plano['_cliente'] = df_clean['CustomerID']
+    plano['_rotulo_venda'] = customer_id_labels(df_clean['CustomerID'], 'Unknown')
+    plano['_rotulo'] = customer_id_labels(df_clean['CustomerID'], 'nan')
+    return pl.from_pandas(plano).lazy().with_row_index('_linha')
+
+
+def _top_products(fact_sales, top_n):
+    # Par cliente x produto como um único inteiro (códigos das categorias):
+    # agrupar por ele é bem mais barato que por duas colunas categóricas
+    par = pl.col('CustomerID').to_physical().cast(pl.Int64) * 2**32 + pl.col('StockCode').to_physical()
+    pares = (
+        fact_sales.group_by(par.alias('_par'))
+        .agg(
+            pl.col('CustomerID').first(),
+            pl.col('StockCode').first(),
+            pl.col('_cliente').first(),
+            _primeira=pl.col('_linha').min(),
+            UnitsSold=pl.col('Quantity').cast(pl.Int64).sum(),
+            Transactions=pl.col('InvoiceNo').to_physical().n_unique().cast(pl.Int64),
+        )
+        # Ordem de primeira aparição: empates ficam com o primeiro produto, como no pandas
+        .sort('_primeira')
+    )
+    rankings = [
+        pares.with_columns(
+            Criterion=pl.lit(criterio),
+            _criterio=pl.lit(ordem),
+            Rank=pl.col(criterio).rank('ordinal', descending=True).over('CustomerID').cast(pl.Int64),
+        ).filter(pl.col('Rank') <= top_n)
+        for ordem, criterio in enumerate(TOP_N_CRITERIA)
+    ]
+    return (
+        pl.concat(rankings)
+        .sort(['_cliente', '_criterio', 'Rank'], nulls_last=True)
+        .select(['CustomerID', 'Criterion', 'Rank', 'StockCode', 'UnitsSold', 'Transactions'])
+    )
+
+
+def _rfm_state(fact_sales):
+    return (
+        fact_sales.group_by(['CustomerID', 'InvoiceMonth'])
+        .agg(
+            pl.col('_cliente').first(),
+            LastPurchase=pl.col('_data').max(),
+            Frequency=pl.col('InvoiceNo').n_unique().cast(pl.Int64),
+            Monetary=pl.col('total_value').sum(),
+        )
+        .sort(['_cliente', 'InvoiceMonth'], nulls_last=True)
+        .select(['CustomerID', 'InvoiceMonth', 'LastPurchase', 'Frequency', 'Monetary'])
+    )
+
+
+def build_gold_polars(df_clean, rfm_estado=None, registros=None, top_n=TOP_N_PADRAO, meses=None):
+    """Mesmo contrato de etl.gold.build_gold_pandas, executado pelo Polars."""
+    registros = registros if registros is not None else read_registries()
+    df_clean, cancelada = prepare(df_clean)
+    df_clean = resolve_keys(df_clean, registros)
+    dim_country = build_dim_country(df_clean)
+    dim_date = build_dim_date(df_clean)
+
+    datas = pl.from_pandas(dim_date[['DateID', 'InvoiceDate']].rename(columns={'InvoiceDate': '_data'})).lazy()
+    lf = _lazy_silver(df_clean, cancelada)
+    del df_clean
+
+    taxa = pl.col('StockCode').is_in(STOCKCODE_FEES)
+    fact_sales = lf.filter(
+        ~pl.col('cancelada') & (pl.col('Quantity') > 0) & (pl.col('UnitPrice') > 0) & ~taxa
+    ).with_columns(CustomerID=pl.col('_rotulo_venda'), TransactionType=pl.lit('Sale', dtype=pl.Categorical))
+    fact_fees = lf.filter(taxa & ~pl.col('cancelada')).with_columns(
+        CustomerID=pl.col('_rotulo'), TransactionType=pl.lit('Fee', dtype=pl.Categorical)
+    )
+    fact_cancellations = lf.filter(
+        pl.col('cancelada') & ~pl.col('StockCode').is_in(['C2', 'DOT', 'POST'])
+    ).with_columns(CustomerID=pl.col('_rotulo'), TransactionType=pl.lit('Cancellation', dtype=pl.Categorical))
+    # Cada fato ordenada por DateID, mantendo a ordem original na mesma data
+    # (mesma ordem da fact_all do backend pandas); _linha passa a ser a
+    # posição na fato, que desempata o ranking de produtos como no pandas
+    fatos = [
+        fato.sort('DateID', maintain_order=True).drop('_linha').with_row_index('_linha')
+        for fato in (fact_sales, fact_fees, fact_cancellations)
+    ]
+    fact_sales, fact_fees, fact_cancellations = fatos
+
+    # Incremental: só as vendas dos meses alterados (etl.gold.update_rfm_state)
+    vendas_rfm = fact_sales.join(datas, on='DateID', how='left').with_columns(
+        InvoiceMonth=pl.col('_data').dt.truncate('1mo')
+    )
+    if rfm_estado is not None and meses is not None:
+        vendas_rfm = vendas_rfm.filter(pl.col('InvoiceMonth').is_in(list(pd.DatetimeIndex(meses))))
+
+    consultas = {
+        'dim_customer': pl.concat([fato.select(['CustomerID', 'CountryID']) for fato in fatos])
+        .unique(subset='CustomerID', keep='first', maintain_order=True),
+        'dim_product': lf.select(['StockCode', pl.col('Description').alias('ProductDescription')])
+        .unique(subset='StockCode', keep='first', maintain_order=True),
+        'fact_all': pl.concat([fato.select(FACT_COLUMNS + ['TransactionType']) for fato in fatos]),
+        'rfm_novo': _rfm_state(vendas_rfm),
+        'most_purchased_products': _top_products(fact_sales, top_n),
+        'vendas': fact_sales.select(
+            gross=pl.col('total_value').sum(),
+            orders=pl.col('InvoiceNo').n_unique(),
+            units=pl.col('Quantity').cast(pl.Int64).sum(),
+        ),
+        'tarifas': fact_fees.select(total=pl.col('total_value').sum()),
+        'cancelamentos': fact_cancellations.select(total=pl.col('total_value').sum()),
+    }
+    resultados = dict(zip(consultas, pl.collect_all(list(consultas.values()))))
+
+    dim_customer = resultados['dim_customer'].to_pandas()
+    if 'Unknown' not in dim_customer['CustomerID'].values:
+        dim_customer['CustomerID'] = dim_customer['CustomerID'].astype(object)
+        dim_customer.loc[len(dim_customer)] = ['Unknown', None]
+    dim_customer['CustomerKey'] = registros['customer'].assign(dim_customer['CustomerID'])
+    dim_product = resultados['dim_product'].to_pandas()
+    dim_product['ProductKey'] = registros['product'].assign(dim_product['StockCode'])
+    most_purchased_products = resultados['most_purchased_products'].to_pandas()
+    most_purchased_products['Criterion'] = pd.Categorical(
+        most_purchased_products['Criterion'], categories=TOP_N_CRITERIA
+    )
+
+    estado = resultados['rfm_novo'].to_pandas()
+    estado = estado.astype({'InvoiceMonth': 'datetime64[ns]', 'LastPurchase': 'datetime64[ns]'})
+    if rfm_estado is not None and meses is not None:
+        estado = fold_rfm_state(rfm_estado, estado, meses)
+
+    vendas = resultados['vendas'].row(0, named=True)
+    gross_sales = vendas['gross']
+    net_sales = gross_sales + resultados['cancelamentos']['total'][0] - resultados['tarifas']['total'][0]
+    metrics = pd.DataFrame({
+        'Metrics': [
+            'Gross Sales',
+            'Net Sales',
+            'Total Orders',
+            'Distinct Customers',
+            'Distinct Products',
+            'Product Units Sold'
+        ],
+        'Value': [
+            gross_sales,
+            net_sales,
+            vendas['orders'],
+            dim_customer['CustomerID'].nunique(),
+            dim_product['StockCode'].nunique(),
+            vendas['units']
+        ]
+    })
+
+    tabelas = {
+        'dim_country': dim_country[['CountryID', 'Country']],
+        'dim_date': dim_date[['DateID', 'InvoiceDate', 'Year', 'Month', 'Day', 'Weekday', 'Hour']],
+        'dim_customer': dim_customer,
+        'dim_product': dim_product,
+        'fact_all': resultados['fact_all'].to_pandas(),
+        'rfm': rfm_from_state(estado),
+        'most_purchased_products': most_purchased_products,
+        'metrics': metrics,
+        RFM_STATE: estado,
+    }
+    return {nome: compact_gold(tabela) for nome, tabela in tabelas.items()}
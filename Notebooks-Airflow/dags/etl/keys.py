@@ -0,0 +1,119 @@
+# Registro persistente de chaves substitutas das dimensões da camada gold.
+#
+# Cada dimensão (país, data, cliente, produto) guarda em data/keys/<nome>.parquet
+# os pares (member, key) já atribuídos. A cada execução só os membros novos
+# recebem chaves (max + 1, na ordem de primeira aparição) e os IDs das
+# execuções anteriores não mudam, ficando iguais aos que já estão no DW.
+# As consultas usam Index.get_indexer (hash join vetorizado) e, para colunas
+# categóricas, resolvem só as categorias e expandem pelos códigos.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+KEYS_DIR = "keys"
+
+# dimensão -> (tabela no DW, coluna da chave, coluna do membro)
+DIMENSIONS = {
+    "country": ("dim_country", "countryid", "country"),
+    "date": ("dim_date", "dateid", "invoicedate"),
+    "customer": ("dim_customer", "customerkey", "customerid"),
+    "product": ("dim_product", "productkey", "stockcode"),
+}
+
+
+class KeyRegistry:
+    """Chaves inteiras estáveis para os membros de uma dimensão."""
+
+    def __init__(self, members=(), keys=()):
+        self.members = pd.Index(members)
+        self.keys = np.asarray(keys, dtype="int64")
+        self.novos = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def _resolve(self, valores):
+        posicoes = self.members.get_indexer(valores)
+        return np.where(posicoes >= 0, self.keys[posicoes], -1)
+
+    def lookup(self, valores):
+        """Chave de cada valor (-1 para membros não registrados ou nulos)."""
+        if isinstance(getattr(valores, "dtype", None), pd.CategoricalDtype):
+            # Resolve só as categorias e expande pelos códigos
+            por_categoria = self._resolve(valores.cat.categories)
+            codigos = valores.cat.codes.to_numpy()
+            return np.where(codigos >= 0, por_categoria[codigos], -1)
+        return self._resolve(valores)
+
+    def assign(self, valores):
+        """Registra os membros novos e devolve a chave de cada valor."""
+        unicos = pd.Index(pd.unique(valores)).dropna()
+        novos = unicos[self.members.get_indexer(unicos) < 0] if len(self.members) else unicos
+        if len(novos):
+            inicio = int(self.keys.max()) + 1 if len(self.keys) else 1
+            self.members = self.members.append(novos) if len(self.members) else novos
+            self.keys = np.concatenate([self.keys, np.arange(inicio, inicio + len(novos), dtype="int64")])
+            self.novos += len(novos)
+        return self.lookup(valores)
+
+    @classmethod
+    def read(cls, caminho):
+        if not os.path.exists(caminho):
+            return cls()
+        df = pd.read_parquet(caminho)
+        return cls(df["member"], df["key"])
+
+    def write(self, caminho):
+        # Temporário + os.replace: um registro pela metade nunca substitui o anterior
+        tmp = f"{caminho}.tmp"
+        pd.DataFrame({"member": self.members, "key": self.keys}).to_parquet(tmp, index=False)
+        os.replace(tmp, caminho)
+
+
+def registry_path(keys_path, dimensao):
+    return os.path.join(keys_path, f"{dimensao}.parquet")
+
+
+def read_registries(keys_path=None):
+    """Registros de todas as dimensões; vazios se `keys_path` é None ou não existe."""
+    return {
+        dimensao: KeyRegistry.read(registry_path(keys_path, dimensao)) if keys_path else KeyRegistry()
+        for dimensao in DIMENSIONS
+    }
+
+
+def write_registries(registros, keys_path):
+    os.makedirs(keys_path, exist_ok=True)
+    for dimensao, registro in registros.items():
+        registro.write(registry_path(keys_path, dimensao))
+
+
+def seed_from_warehouse(conn, keys_path):
+    """Cria os registros ausentes a partir das chaves que já estão no DW.
+
+    Usado pelo create_database.py: se o banco já foi carregado antes de o
+    registro existir, a gold passa a reutilizar os IDs do banco em vez de
+    numerar tudo de novo. Registros existentes não são alterados.
+    Retorna {dimensao: membros importados}.
+    """
+    from sqlalchemy import text
+
+    os.makedirs(keys_path, exist_ok=True)
+    importados = {}
+    for dimensao, (tabela, chave, membro) in DIMENSIONS.items():
+        caminho = registry_path(keys_path, dimensao)
+        if os.path.exists(caminho):
+            continue
+        linhas = conn.execute(text(
+            f"SELECT {membro}, {chave} FROM {tabela} WHERE {chave} IS NOT NULL ORDER BY {chave}"
+        )).fetchall()
+        if not linhas:
+            continue
+        membros, chaves = zip(*linhas)
+        if dimensao == "date":
+            membros = pd.to_datetime(list(membros))
+        KeyRegistry(membros, chaves).write(caminho)
+        importados[dimensao] = len(linhas)
+    return importados
@@ -0,0 +1,75 @@
+# # Layout dos parquets da camada Gold
+#
+# Com GOLD_LAYOUT=clustered (padrão) cada tabela é gravada com:
+# - row groups de até GOLD_ROW_GROUP_SIZE linhas, com estatísticas min/max
+#   por coluna; a fact_all (agrupada por TransactionType e ordenada por
+#   DateID, ver etl.gold.build_fact_all) tem um row group novo a cada
+#   mudança de tipo ou de mês, então cada row group é de um único mês: uma
+#   consulta por período lê só os row groups dos meses pedidos
+# - codificação por dicionário: StockCode, Country e as demais colunas
+#   categóricas vão como dicionário Arrow, o mesmo (o do DataFrame) em
+#   todos os row groups. Um dicionário só com os valores de cada row group
+#   deixava o arquivo menor, mas qualquer leitor (pd.read_parquet) juntava
+#   as categorias na ordem em que apareciam; com o dicionário inteiro as
+#   categorias e a ordem voltam iguais, ao custo de um arquivo maior (a
+#   fact_all, com o InvoiceNo, fica perto de 2,5x). Nas numéricas de baixa
+#   cardinalidade (DateID, Quantity, UnitPrice) o dicionário também é o
+#   menor formato (o writer volta para plain se o dicionário fica grande)
+# - compressão GOLD_COMPRESSION (snappy, zstd, gzip, lz4, brotli ou none)
+#
+# Sem filtros de Bloom: o scanner do pyarrow não os lê, e as leituras do
+# pipeline (etl/dataset.py) só pulam row groups pelo min/max.
+#
+# GOLD_LAYOUT=plain grava como o DataFrame.to_parquet padrão (um row group
+# por tabela pequena, snappy, dicionário em todas as colunas).
+
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+LAYOUTS = ['clustered', 'plain']
+ROW_GROUP_SIZE_PADRAO = 64 * 1024
+COMPRESSION_PADRAO = 'snappy'
+
+
+def read_layout():
+    """Layout de escrita da gold a partir do ambiente (GOLD_LAYOUT, GOLD_COMPRESSION...)."""
+    layout = {
+        'layout': os.environ.get('GOLD_LAYOUT', 'clustered'),
+        'compression': os.environ.get('GOLD_COMPRESSION', COMPRESSION_PADRAO),
+        'row_group_size': int(os.environ.get('GOLD_ROW_GROUP_SIZE', ROW_GROUP_SIZE_PADRAO)),
+    }
+    if layout['layout'] not in LAYOUTS:
+        raise ValueError(f"GOLD_LAYOUT deve ser um de {LAYOUTS}, não {layout['layout']!r}")
+    return layout
+
+
+def _segmentos(linhas, cortes, tamanho):
+    # (início, fim) de cada row group: novo a cada corte e a cada `tamanho` linhas
+    limites = sorted({0, linhas, *(int(corte) for corte in cortes if 0 < corte < linhas)})
+    for inicio, fim in zip(limites[:-1], limites[1:]):
+        for parte in range(inicio, fim, tamanho):
+            yield parte, min(parte + tamanho, fim)
+
+
+def write_table(df, caminho, layout=None, cortes=()):
+    """Grava um DataFrame no `layout` (read_layout()).
+
+    `cortes` são posições de linha onde um row group novo deve começar
+    (ex.: mudança de mês na fact_all). Os tipos pandas vão nos metadados,
+    como em DataFrame.to_parquet.
+    """
+    layout = layout or read_layout()
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    if layout['layout'] == 'plain':
+        pq.write_table(tabela, caminho)
+        return
+    compressao = layout['compression'] if layout['compression'] != 'none' else None
+    with pq.ParquetWriter(caminho, tabela.schema, compression=compressao, use_dictionary=True,
+                          write_statistics=True) as writer:
+        for inicio, fim in _segmentos(tabela.num_rows, cortes, layout['row_group_size']):
+            writer.write_table(tabela.slice(inicio, fim - inicio), row_group_size=fim - inicio)
+        if tabela.num_rows == 0:
+            writer.write_table(tabela)
+
@@ -0,0 +1,510 @@
+# # Carga da camada Gold no Data Warehouse
+#
+# Dois métodos:
+# - "copy" (padrão): cada parquet é lido em lotes Arrow, convertido para CSV
+#   pelo próprio Arrow e enviado ao Postgres com um único COPY ... FROM STDIN
+#   por tabela, sem materializar a tabela como objetos Python.
+# - "to_sql": o caminho original com DataFrame.to_sql (INSERTs em lotes).
+#
+# Com a fact_all particionada por mês (etl/partitions.py) a fato passa
+# sempre por uma staging, e cada mês carregado substitui a sua partição.
+
+import io
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from etl.dataset import iter_batches, read_table
+from etl.partitions import FACT_TABLE, invoice_months, is_partitioned, replace_partitions
+from etl.telemetry import span
+
+# Linhas por lote Arrow lidas do parquet durante o COPY
+COPY_BATCH_SIZE = 100_000
+
+GOLD_TABLES = [
+    'dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'metrics',
+    'cube_daily_country', 'cube_monthly_country', 'cube_monthly_product',
+]
+
+# Colunas do parquet com nome diferente no banco (após lower())
+COLUMN_RENAMES = {
+    'metrics': {'metrics': 'metric_name', 'value': 'metric_value'},
+}
+
+
+def gold_files(gold_path, tables=GOLD_TABLES):
+    """Caminho do parquet de cada tabela, na ordem de carga (dimensões antes dos fatos)."""
+    return {table: os.path.join(gold_path, f'{table}.parquet') for table in tables}
+
+
+def gold_sources(gold, tables=GOLD_TABLES):
+    """Origem de cada tabela a carregar: caminho do parquet ou DataFrame em memória.
+
+    `gold` é o diretório da camada gold ou o dict devolvido por etl.gold.build_gold.
+    Tabelas sem arquivo/DataFrame são avisadas e puladas.
+    """
+    if isinstance(gold, dict):
+        candidatos = {table: gold.get(table) for table in tables}
+    else:
+        candidatos = gold_files(gold, tables)
+    fontes = {}
+    for table, fonte in candidatos.items():
+        if fonte is None or (isinstance(fonte, str) and not os.path.exists(fonte)):
+            print(f"AVISO: {table} não encontrada na camada gold. Pulando {table}.")
+            continue
+        fontes[table] = fonte
+    return fontes
+
+
+def source_batches(fonte, batch_size=COPY_BATCH_SIZE, filtros=None):
+    """(nomes das colunas, iterador de lotes Arrow) de um parquet ou DataFrame.
+
+    O parquet é aberto uma única vez: os nomes vêm do mesmo scanner dos lotes.
+    `filtros` está no formato de etl.dataset.
+    """
+    if isinstance(fonte, pd.DataFrame):
+        tabela = pa.Table.from_pandas(fonte, preserve_index=False)
+        if filtros:
+            tabela = tabela.filter(pq.filters_to_expression(filtros))
+        return tabela.schema.names, iter(tabela.to_batches(max_chunksize=batch_size))
+    return iter_batches(fonte, filtros=filtros, batch_size=batch_size)
+
+
+def _source_names(fonte):
+    if isinstance(fonte, pd.DataFrame):
+        return list(fonte.columns)
+    return iter_batches(fonte)[0]
+
+
+def target_columns(table, names):
+    """Nomes das colunas no banco para as colunas do parquet."""
+    renames = COLUMN_RENAMES.get(table, {})
+    return [renames.get(nome.lower(), nome.lower()) for nome in names]
+
+
+def _plain_batch(batch):
+    # Colunas categóricas (dictionary) viram texto simples para o writer CSV
+    colunas = [
+        coluna.dictionary_decode() if pa.types.is_dictionary(coluna.type) else coluna
+        for coluna in batch.columns
+    ]
+    return pa.RecordBatch.from_arrays(colunas, names=batch.schema.names)
+
+
+class ArrowCsvStream(io.RawIOBase):
+    """Arquivo somente-leitura que gera CSV sob demanda a partir de lotes Arrow.
+
+    O cursor do psycopg2 chama read() durante o COPY; só um lote fica em
+    memória por vez.
+    """
+
+    def __init__(self, batches):
+        self._batches = iter(batches)
+        self._buffer = b''
+        self._posicao = 0
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        for batch in self._batches:
+            if batch.num_rows == 0:
+                continue
+            self.rows += batch.num_rows
+            saida = io.BytesIO()
+            pacsv.write_csv(
+                _plain_batch(batch), saida,
+                write_options=pacsv.WriteOptions(include_header=False),
+            )
+            return saida.getvalue()
+        return b''
+
+    def read(self, size=-1):
+        # Só busca o próximo lote quando o atual foi todo consumido
+        if self._posicao >= len(self._buffer):
+            self._buffer, self._posicao = self._next_chunk(), 0
+        if size is None or size < 0:
+            size = len(self._buffer) - self._posicao
+        dados = self._buffer[self._posicao:self._posicao + size]
+        self._posicao += len(dados)
+        return dados
+
+
+def copy_parquet(raw_conn, table, fonte, batch_size=COPY_BATCH_SIZE, target=None):
+    """Envia um parquet (ou DataFrame) para `target` (padrão: `table`) via COPY FROM STDIN.
+
+    `raw_conn` é uma conexão DBAPI do psycopg2 (engine.raw_connection()).
+    Não faz commit. Retorna o número de linhas copiadas.
+    """
+    return copy_batches(raw_conn, table, *source_batches(fonte, batch_size), target=target)
+
+
+def copy_batches(raw_conn, table, nomes, lotes, target=None):
+    """COPY FROM STDIN dos lotes Arrow já abertos (ver copy_parquet)."""
+    colunas = ', '.join(target_columns(table, nomes))
+    stream = ArrowCsvStream(lotes)
+    with raw_conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {target or table} ({colunas}) FROM STDIN WITH (FORMAT csv)",
+            stream,
+            size=1024 * 1024,
+        )
+    return stream.rows
+
+
+def to_sql_parquet(conn, table, fonte, target=None):
+    """Caminho original: lê o parquet inteiro e usa DataFrame.to_sql (append em `target`)."""
+    df = fonte.copy() if isinstance(fonte, pd.DataFrame) else read_table(fonte)
+    df.columns = target_columns(table, df.columns)
+    df.to_sql(target or table, conn, if_exists='append', index=False)
+    return len(df)
+
+
+def load_gold_copy(engine, gold, tables=GOLD_TABLES, batch_size=COPY_BATCH_SIZE):
+    """Carrega as tabelas gold com COPY em uma única transação.
+
+    `gold` é o diretório da camada gold ou um dict de DataFrames (ver gold_sources).
+    Retorna {tabela: (linhas, segundos)}; tabelas ausentes são puladas.
+    """
+    resultados = {}
+    raw_conn = engine.raw_connection()
+    try:
+        for table, fonte in gold_sources(gold, tables).items():
+            inicio = time.perf_counter()
+            with span(table) as passo:
+                with raw_conn.cursor() as cursor:
+                    particionada = table == FACT_TABLE and is_partitioned(cursor)
+                if particionada:
+                    linhas = load_fact_partitions(raw_conn, fonte, batch_size)
+                else:
+                    linhas = copy_parquet(raw_conn, table, fonte, batch_size)
+                passo.linhas_saida = linhas
+            resultados[table] = (linhas, time.perf_counter() - inicio)
+            report_table(table, *resultados[table])
+        with span("commit"):
+            raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return resultados
+
+
+def report_table(table, linhas, segundos):
+    taxa = linhas / segundos if segundos > 0 else float('inf')
+    print(f"✓ {table} carregada com sucesso ({linhas} linhas em {segundos:.2f}s, {taxa:,.0f} linhas/s).")
+
+
+# ==========================================
+#     CARGA INCREMENTAL (STAGING + MERGE)
+# ==========================================
+#
+# Cada tabela é copiada para uma tabela UNLOGGED de staging (stg_<tabela>) e
+# só as linhas novas ou alteradas chegam ao destino, pelas chaves naturais.
+# O Postgres do docker-compose é a versão 13, sem MERGE: dimensões e métricas
+# usam INSERT ... ON CONFLICT e a fato é substituída por fatura.
+
+# chaves naturais e colunas atualizáveis de cada tabela
+MERGE_KEYS = {
+    'dim_country': (['country'], []),
+    'dim_date': (['invoicedate'], []),
+    'dim_customer': (['customerid'], ['countryid', 'customerkey']),
+    'dim_product': (['stockcode'], ['productdescription', 'productkey']),
+    'metrics': (['metric_name'], ['metric_value']),
+    'cube_daily_country': (
+        ['invoiceday', 'countryid', 'transactiontype'],
+        ['revenue', 'quantity', 'invoices', 'customers', 'lines'],
+    ),
+    'cube_monthly_country': (
+        ['invoicemonth', 'countryid', 'transactiontype'],
+        ['revenue', 'quantity', 'invoices', 'customers', 'lines'],
+    ),
+    'cube_monthly_product': (
+        ['invoicemonth', 'stockcode', 'transactiontype'],
+        ['revenue', 'quantity', 'invoices', 'customers', 'lines'],
+    ),
+}
+
+# Tabelas que a gold envia inteiras: linhas do banco que não estão mais na
+# staging são apagadas (os cubos são pequenos e só as células alteradas
+# chegam ao upsert)
+PRUNE_TABLES = ['cube_daily_country', 'cube_monthly_country', 'cube_monthly_product']
+
+# A fato não tem chave única por linha (uma fatura pode repetir o mesmo
+# StockCode); as linhas de cada InvoiceNo são tratadas como um bloco e
+# comparadas por um digest guardado em fact_all_invoice_digest.
+FACT_DIGEST_TABLE = 'fact_all_invoice_digest'
+
+# Digests calculados pela gold a partir das hash_linha (etl.gold.FACT_DIGEST);
+# sem eles (gold antiga) o digest é calculado no banco, com md5 das linhas
+FACT_DIGEST_SOURCE = 'fact_all_digest'
+
+
+def create_staging(cursor, table, colunas, staging=None):
+    """Recria `staging` (padrão: stg_<tabela>; UNLOGGED, sem índices) com `colunas` de `table`."""
+    staging = staging or f'stg_{table}'
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    cursor.execute(f"CREATE UNLOGGED TABLE {staging} AS SELECT {', '.join(colunas)} FROM {table} WITH NO DATA")
+    return staging
+
+
+def stage_parquet(raw_conn, table, fonte, batch_size=COPY_BATCH_SIZE, filtros=None):
+    """Recria stg_<tabela> e copia o parquet/DataFrame (só as linhas de `filtros`) para ela."""
+    nomes, lotes = source_batches(fonte, batch_size, filtros)
+    colunas = target_columns(table, nomes)
+    with raw_conn.cursor() as cursor:
+        staging = create_staging(cursor, table, colunas)
+    linhas = copy_batches(raw_conn, table, nomes, lotes, target=staging)
+    return staging, colunas, linhas
+
+
+def load_fact_partitions(raw_conn, fonte, batch_size=COPY_BATCH_SIZE):
+    """Modo append na fact_all particionada: staging + substituição dos meses carregados."""
+    staging, colunas, linhas = stage_parquet(raw_conn, FACT_TABLE, fonte, batch_size)
+    with raw_conn.cursor() as cursor:
+        replace_partitions(cursor, staging, colunas)
+        cursor.execute(f"DROP TABLE {staging}")
+    return linhas
+
+
+def upsert_from_staging(cursor, table, staging, colunas, keys, updatable):
+    """INSERT ... ON CONFLICT a partir da staging; atualiza só o que mudou.
+
+    Chaves repetidas na staging: fica a primeira linha na ordem de todas as
+    colunas, a mesma em qualquer execução.
+    """
+    lista = ', '.join(colunas)
+    chaves = ', '.join(keys)
+    sql = (
+        f"INSERT INTO {table} ({lista}) SELECT DISTINCT ON ({chaves}) {lista} FROM {staging} "
+        f"ORDER BY {chaves}, {lista}"
+    )
+    if updatable:
+        atribuicoes = ', '.join(f"{coluna} = EXCLUDED.{coluna}" for coluna in updatable)
+        atuais = ', '.join(f"{table}.{coluna}" for coluna in updatable)
+        novos = ', '.join(f"EXCLUDED.{coluna}" for coluna in updatable)
+        sql += (
+            f" ON CONFLICT ({chaves}) DO UPDATE SET {atribuicoes}"
+            f" WHERE ({atuais}) IS DISTINCT FROM ({novos})"
+        )
+    else:
+        # Sem colunas a atualizar: ignora qualquer conflito (chave natural ou ID)
+        sql += " ON CONFLICT DO NOTHING"
+    cursor.execute(sql)
+    return cursor.rowcount
+
+
+def prune_from_staging(cursor, table, staging, keys):
+    """Apaga do destino as linhas cuja chave não está na staging."""
+    condicao = ' AND '.join(f"s.{coluna} = t.{coluna}" for coluna in keys)
+    cursor.execute(f"DELETE FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE {condicao})")
+    return cursor.rowcount
+
+
+def create_digest_table(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {FACT_DIGEST_TABLE} ("
+        " invoiceno VARCHAR(50) PRIMARY KEY,"
+        " digest TEXT NOT NULL)"
+    )
+
+
+def digest_source(gold):
+    """Digests por fatura da gold (parquet ou DataFrame), ou None se a gold não os tem."""
+    if isinstance(gold, dict):
+        return gold.get(FACT_DIGEST_SOURCE)
+    caminho = gold_files(gold, [FACT_DIGEST_SOURCE])[FACT_DIGEST_SOURCE]
+    return caminho if os.path.exists(caminho) else None
+
+
+def digest_query(staging, colunas):
+    """Digest de cada fatura calculado no banco sobre a staging da fato (gold sem digests)."""
+    conteudo = ', '.join(c for c in colunas if c != 'invoiceno')
+    return (
+        f"(SELECT invoiceno, md5(string_agg(concat_ws('|', {conteudo}), ',' ORDER BY {conteudo})) AS digest"
+        f" FROM {staging} GROUP BY invoiceno)"
+    )
+
+
+def find_changed_invoices(cursor, digests):
+    """Cria changed_invoices com as faturas novas, alteradas ou removidas.
+
+    `digests` (tabela ou subconsulta com invoiceno e digest) tem todas as
+    faturas da gold. Faturas de fact_all_invoice_digest que não estão nela
+    (removidas da gold) entram com digest nulo. Retorna as faturas novas ou
+    alteradas, as únicas cujas linhas precisam ir para a staging da fato.
+    """
+    create_digest_table(cursor)
+    cursor.execute(
+        "CREATE TEMP TABLE changed_invoices ON COMMIT DROP AS "
+        f"SELECT s.invoiceno, s.digest FROM {digests} s "
+        f"LEFT JOIN {FACT_DIGEST_TABLE} d USING (invoiceno) "
+        "WHERE d.digest IS DISTINCT FROM s.digest "
+        f"UNION ALL SELECT d.invoiceno, NULL FROM {FACT_DIGEST_TABLE} d "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {digests} s WHERE s.invoiceno = d.invoiceno)"
+    )
+    cursor.execute("ANALYZE changed_invoices")
+    cursor.execute("SELECT invoiceno FROM changed_invoices WHERE digest IS NOT NULL")
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def replace_changed_invoices(cursor, staging, colunas):
+    """Substitui na fact_all as faturas de changed_invoices (find_changed_invoices).
+
+    As linhas novas vêm da staging, que pode ter só as faturas alteradas. As
+    faturas com digest nulo (removidas da gold) só são apagadas. Com a
+    fact_all particionada, as partições dos meses dessas faturas são
+    remontadas com as demais linhas do mês (mesmo fact_id) e as da staging;
+    os outros meses não são tocados. Retorna (inseridas, removidas).
+    """
+    lista = ', '.join(colunas)
+    if is_partitioned(cursor):
+        cursor.execute("SELECT count(*) FROM fact_all f JOIN changed_invoices c USING (invoiceno)")
+        removidas = cursor.fetchone()[0]
+        cursor.execute(f"SELECT count(*) FROM {staging} s JOIN changed_invoices c USING (invoiceno)")
+        inseridas = cursor.fetchone()[0]
+        meses = invoice_months(cursor, staging, 'changed_invoices')
+        replace_partitions(cursor, staging, colunas, meses, faturas='changed_invoices')
+    else:
+        cursor.execute("DELETE FROM fact_all f USING changed_invoices c WHERE f.invoiceno = c.invoiceno")
+        removidas = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO fact_all ({lista}) "
+            f"SELECT {', '.join('s.' + c for c in colunas)} FROM {staging} s JOIN changed_invoices c USING (invoiceno)"
+        )
+        inseridas = cursor.rowcount
+    cursor.execute(
+        f"DELETE FROM {FACT_DIGEST_TABLE} d USING changed_invoices c "
+        "WHERE d.invoiceno = c.invoiceno AND c.digest IS NULL"
+    )
+    cursor.execute(
+        f"INSERT INTO {FACT_DIGEST_TABLE} (invoiceno, digest) SELECT invoiceno, digest FROM changed_invoices "
+        "WHERE digest IS NOT NULL ON CONFLICT (invoiceno) DO UPDATE SET digest = EXCLUDED.digest"
+    )
+    return inseridas, removidas
+
+
+def merge_fact_all(raw_conn, fonte, digests=None, batch_size=COPY_BATCH_SIZE):
+    """Merge da fact_all por fatura. Retorna (linhas na staging, linhas inseridas).
+
+    Com os digests da gold (`digests`, parquet ou DataFrame) as faturas
+    alteradas são encontradas antes da cópia da fato, e só as linhas delas
+    vão para a staging: a carga cresce com o que mudou, não com o
+    histórico. Sem eles a fato inteira vai para a staging e o digest de
+    cada fatura é calculado no banco.
+    """
+    if digests is None:
+        staging, colunas, linhas = stage_parquet(raw_conn, FACT_TABLE, fonte, batch_size)
+        with raw_conn.cursor() as cursor:
+            find_changed_invoices(cursor, digest_query(staging, colunas))
+    else:
+        with span("staging_digest"):
+            with raw_conn.cursor() as cursor:
+                create_digest_table(cursor)
+            digests = stage_parquet(raw_conn, FACT_DIGEST_TABLE, digests, batch_size)[0]
+        with raw_conn.cursor() as cursor:
+            faturas = find_changed_invoices(cursor, digests)
+            cursor.execute(f"DROP TABLE {digests}")
+        with span("staging") as copia:
+            if faturas:
+                staging, colunas, linhas = stage_parquet(
+                    raw_conn, FACT_TABLE, fonte, batch_size, [('InvoiceNo', 'in', faturas)]
+                )
+            else:
+                # Só remoções (ou nada): staging vazia
+                colunas = target_columns(FACT_TABLE, _source_names(fonte))
+                with raw_conn.cursor() as cursor:
+                    staging, linhas = create_staging(cursor, FACT_TABLE, colunas), 0
+            copia.linhas_saida = linhas
+    with span("merge", linhas), raw_conn.cursor() as cursor:
+        inseridas, _ = replace_changed_invoices(cursor, staging, colunas)
+        cursor.execute(f"DROP TABLE {staging}")
+    return linhas, inseridas
+
+
+def load_gold_merge(engine, gold, tables=GOLD_TABLES, batch_size=COPY_BATCH_SIZE):
+    """Carga idempotente: staging + merge pelas chaves naturais, em uma transação.
+
+    `gold` é o diretório da camada gold ou um dict de DataFrames (ver gold_sources).
+    Retorna {tabela: (linhas_staging, linhas_alteradas, segundos)}.
+    """
+    resultados = {}
+    raw_conn = engine.raw_connection()
+    try:
+        for table, fonte in gold_sources(gold, tables).items():
+            inicio = time.perf_counter()
+            with span(table) as passo:
+                if table == FACT_TABLE:
+                    # Só as faturas com digest diferente vão para a staging
+                    linhas, alteradas = merge_fact_all(raw_conn, fonte, digest_source(gold), batch_size)
+                    passo.linhas_entrada = linhas
+                else:
+                    with span("staging") as copia:
+                        staging, colunas, linhas = stage_parquet(raw_conn, table, fonte, batch_size)
+                        copia.linhas_saida = passo.linhas_entrada = linhas
+                    with span("merge", linhas), raw_conn.cursor() as cursor:
+                        keys, updatable = MERGE_KEYS[table]
+                        alteradas = upsert_from_staging(cursor, table, staging, colunas, keys, updatable)
+                        if table in PRUNE_TABLES:
+                            alteradas += prune_from_staging(cursor, table, staging, keys)
+                        cursor.execute(f"DROP TABLE {staging}")
+                passo.linhas_saida = alteradas
+            resultados[table] = (linhas, alteradas, time.perf_counter() - inicio)
+            print(f"✓ {table}: {linhas} linhas na staging, {alteradas} novas/alteradas "
+                  f"({resultados[table][2]:.2f}s).")
+        with span("commit"):
+            raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return resultados
+
+
+def load_gold(engine, gold, mode='merge', method='copy', tables=GOLD_TABLES, workers=None):
+    """Carrega a camada gold no DW pelo modo escolhido.
+
+    - mode="merge": staging + merge (load_gold_merge)
+    - mode="append" e method="copy": COPY direto nas tabelas (load_gold_copy)
+    - mode="append" e method="parallel": fact_all em pedaços paralelos, com
+      índices e FKs recriados no fim (etl.parallel_load, `workers` conexões)
+    - mode="append" e method="to_sql": DataFrame.to_sql, o caminho original
+
+    Retorna {tabela: (linhas, ...)}, com o número de linhas lidas na primeira posição.
+    """
+    if mode == 'merge':
+        return load_gold_merge(engine, gold, tables)
+    if method == 'copy':
+        return load_gold_copy(engine, gold, tables)
+    if method == 'parallel':
+        # Import tardio: etl.parallel_load importa este módulo
+        from etl.parallel_load import WORKERS_PADRAO, load_gold_parallel
+
+        return load_gold_parallel(engine, gold, tables, workers or WORKERS_PADRAO)
+
+    resultados = {}
+    with engine.begin() as conn:
+        for table, fonte in gold_sources(gold, tables).items():
+            print(f"Carregando {table}...")
+            inicio = time.perf_counter()
+            with span(table) as passo:
+                with conn.connection.cursor() as cursor:
+                    particionada = table == FACT_TABLE and is_partitioned(cursor)
+                    if particionada:
+                        colunas = target_columns(table, _source_names(fonte))
+                        staging = create_staging(cursor, table, colunas)
+                linhas = passo.linhas_saida = to_sql_parquet(conn, table, fonte, staging if particionada else None)
+                if particionada:
+                    with conn.connection.cursor() as cursor:
+                        replace_partitions(cursor, staging, colunas)
+                        cursor.execute(f"DROP TABLE {staging}")
+            resultados[table] = (linhas, time.perf_counter() - inicio)
+            report_table(table, *resultados[table])
+    return resultados
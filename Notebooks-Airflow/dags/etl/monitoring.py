@@ -0,0 +1,263 @@
+# Monitoramento incremental do pipeline a partir do logs_pipeline.csv.
+#
+# Cada etapa (scripts 01..04 ou runner, via etl/telemetry.py) acrescenta uma
+# linha ao logs_pipeline.csv. Em vez de reler o arquivo inteiro a cada
+# execução, update_monitoring() lê só os bytes depois do último offset
+# processado e mantém no telemetry.db:
+# - monitor_execucoes: uma linha por execução de etapa, com linhas/s
+# - monitor_diario: por dia e camada, execuções, falhas e p50/p95/máximo
+#   do tempo e das linhas/s (recalculado só nos dias/camadas que mudaram)
+# - monitor_alertas: falhas e execuções cujo tempo ou linhas/s se afastam
+#   da mediana das últimas JANELA execuções com sucesso da mesma camada
+#
+# O custo de cada atualização depende das linhas novas, não do tamanho do
+# histórico. Se o CSV for truncado ou substituído, tudo é reconstruído.
+#
+# Uso:
+#   novas, alertas = update_monitoring("/opt/airflow/dags")
+#   daily_rollups("/opt/airflow/dags", dias=30)
+
+import csv
+import hashlib
+import io
+import os
+import sqlite3
+import statistics
+
+import numpy as np
+
+from etl.telemetry import LOG_FILE, TELEMETRY_DB
+
+# Execuções com sucesso usadas como referência para os alertas
+JANELA = 20
+# Mínimo de execuções de referência antes de emitir alertas de desvio
+MINIMO_REFERENCIA = 5
+# Desvio aceito em relação à mediana: tempo acima de (1 + t) x mediana ou
+# linhas/s abaixo de (1 - t) x mediana geram alerta
+TOLERANCIA_PADRAO = 0.5
+
+SQL_CREATE_MONITORING = """
+CREATE TABLE IF NOT EXISTS monitor_estado (
+    fonte TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    cabecalho TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS monitor_execucoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_execucao TEXT NOT NULL,
+    dia TEXT NOT NULL,
+    camada TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tempo_segundos REAL NOT NULL,
+    registros INTEGER NOT NULL,
+    linhas_por_s REAL
+);
+CREATE INDEX IF NOT EXISTS idx_monitor_execucoes_camada ON monitor_execucoes(camada, id);
+CREATE INDEX IF NOT EXISTS idx_monitor_execucoes_dia ON monitor_execucoes(dia, camada);
+CREATE TABLE IF NOT EXISTS monitor_diario (
+    dia TEXT NOT NULL,
+    camada TEXT NOT NULL,
+    execucoes INTEGER NOT NULL,
+    falhas INTEGER NOT NULL,
+    registros INTEGER NOT NULL,
+    tempo_p50 REAL,
+    tempo_p95 REAL,
+    tempo_max REAL,
+    linhas_por_s_p50 REAL,
+    linhas_por_s_p95 REAL,
+    linhas_por_s_max REAL,
+    PRIMARY KEY (dia, camada)
+);
+CREATE TABLE IF NOT EXISTS monitor_alertas (
+    execucao_id INTEGER NOT NULL,
+    data_execucao TEXT NOT NULL,
+    camada TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    valor REAL,
+    referencia REAL,
+    desvio REAL
+);
+CREATE INDEX IF NOT EXISTS idx_monitor_alertas_data ON monitor_alertas(data_execucao);
+"""
+
+# Quantos bytes do início do CSV identificam o arquivo (detecta substituição)
+_BYTES_CABECALHO = 256
+
+
+def _conectar(base_dir):
+    conn = sqlite3.connect(os.path.join(base_dir, TELEMETRY_DB), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SQL_CREATE_MONITORING)
+    return conn
+
+
+def _percentis(valores):
+    if not valores:
+        return None, None, None
+    p50, p95 = np.percentile(valores, [50, 95])
+    return float(p50), float(p95), float(max(valores))
+
+
+def _ler_novas(caminho, offset):
+    """Linhas completas do CSV a partir de `offset` e o offset do fim da última."""
+    with open(caminho, "rb") as f:
+        f.seek(offset)
+        conteudo = f.read()
+    # Uma linha sem '\n' ainda pode estar sendo escrita: fica para a próxima
+    fim = conteudo.rfind(b"\n") + 1
+    texto = conteudo[:fim].decode("utf-8", errors="replace")
+    return list(csv.reader(io.StringIO(texto))), offset + fim
+
+
+def _execucao(linha):
+    # [data_execucao, camada, status, tempo_segundos, registros]; linhas
+    # fora do formato são ignoradas
+    if len(linha) != 5:
+        return None
+    data_execucao, camada, status, tempo, registros = linha
+    try:
+        tempo, registros = float(tempo), int(float(registros))
+    except ValueError:
+        return None
+    linhas_por_s = registros / tempo if tempo > 0 else None
+    return data_execucao, data_execucao[:10], camada, status, tempo, registros, linhas_por_s
+
+
+def _referencia(conn, camada, antes_de, janela=JANELA):
+    """Medianas de tempo e linhas/s das últimas `janela` execuções com sucesso."""
+    linhas = conn.execute(
+        "SELECT tempo_segundos, linhas_por_s FROM monitor_execucoes "
+        "WHERE camada = ? AND id < ? AND status = 'sucesso' ORDER BY id DESC LIMIT ?",
+        (camada, antes_de, janela),
+    ).fetchall()
+    if len(linhas) < MINIMO_REFERENCIA:
+        return None, None
+    vazoes = [vazao for _, vazao in linhas if vazao is not None]
+    return statistics.median(tempo for tempo, _ in linhas), statistics.median(vazoes) if vazoes else None
+
+
+def detect_anomalies(conn, execucao_id, execucao, tolerancia=TOLERANCIA_PADRAO):
+    """Alertas de uma execução: falha, tempo alto ou linhas/s baixas."""
+    data_execucao, _, camada, status, tempo, _, linhas_por_s = execucao
+    if status != "sucesso":
+        return [(execucao_id, data_execucao, camada, "falha", tempo, None, None)]
+    tempo_ref, vazao_ref = _referencia(conn, camada, execucao_id)
+    alertas = []
+    if tempo_ref and tempo > tempo_ref * (1 + tolerancia):
+        alertas.append((execucao_id, data_execucao, camada, "tempo", tempo, tempo_ref, tempo / tempo_ref - 1))
+    if vazao_ref and linhas_por_s is not None and linhas_por_s < vazao_ref * (1 - tolerancia):
+        alertas.append((execucao_id, data_execucao, camada, "vazao", linhas_por_s, vazao_ref,
+                        linhas_por_s / vazao_ref - 1))
+    return alertas
+
+
+def _atualizar_diario(conn, grupos):
+    """Recalcula monitor_diario só para os (dia, camada) que receberam execuções."""
+    for dia, camada in grupos:
+        linhas = conn.execute(
+            "SELECT status, tempo_segundos, registros, linhas_por_s FROM monitor_execucoes "
+            "WHERE dia = ? AND camada = ?",
+            (dia, camada),
+        ).fetchall()
+        sucesso = [linha for linha in linhas if linha[0] == "sucesso"]
+        tempos = _percentis([linha[1] for linha in sucesso])
+        vazoes = _percentis([linha[3] for linha in sucesso if linha[3] is not None])
+        conn.execute(
+            "INSERT OR REPLACE INTO monitor_diario VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (dia, camada, len(linhas), len(linhas) - len(sucesso), sum(linha[2] for linha in sucesso),
+             *tempos, *vazoes),
+        )
+
+
+def _reiniciar(conn):
+    for tabela in ["monitor_execucoes", "monitor_diario", "monitor_alertas", "monitor_estado"]:
+        conn.execute(f"DELETE FROM {tabela}")
+
+
+def update_monitoring(base_dir, tolerancia=TOLERANCIA_PADRAO):
+    """Processa as linhas novas do logs_pipeline.csv.
+
+    Retorna (execuções novas, alertas novos), com os alertas como tuplas
+    (execucao_id, data_execucao, camada, tipo, valor, referencia, desvio).
+    """
+    caminho = os.path.join(base_dir, LOG_FILE)
+    if not os.path.exists(caminho):
+        return 0, []
+    with open(caminho, "rb") as f:
+        cabecalho = hashlib.md5(f.read(_BYTES_CABECALHO)).hexdigest()
+
+    conn = _conectar(base_dir)
+    try:
+        with conn:
+            estado = conn.execute(
+                "SELECT offset, cabecalho FROM monitor_estado WHERE fonte = ?", (LOG_FILE,)
+            ).fetchone()
+            offset = 0
+            if estado is not None:
+                offset, cabecalho_anterior = estado
+                # CSV truncado, rotacionado ou substituído: reconstrói do zero
+                if offset > os.path.getsize(caminho) or (
+                        cabecalho_anterior != cabecalho and offset >= _BYTES_CABECALHO):
+                    _reiniciar(conn)
+                    offset = 0
+
+            linhas, offset = _ler_novas(caminho, offset)
+            novas, alertas, grupos = 0, [], set()
+            for linha in linhas:
+                execucao = _execucao(linha)
+                if execucao is None:
+                    continue
+                cursor = conn.execute(
+                    "INSERT INTO monitor_execucoes (data_execucao, dia, camada, status, tempo_segundos, "
+                    "registros, linhas_por_s) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    execucao,
+                )
+                alertas += detect_anomalies(conn, cursor.lastrowid, execucao, tolerancia)
+                grupos.add((execucao[1], execucao[2]))
+                novas += 1
+            conn.executemany("INSERT INTO monitor_alertas VALUES (?, ?, ?, ?, ?, ?, ?)", alertas)
+            _atualizar_diario(conn, grupos)
+            conn.execute(
+                "INSERT OR REPLACE INTO monitor_estado (fonte, offset, cabecalho) VALUES (?, ?, ?)",
+                (LOG_FILE, offset, cabecalho),
+            )
+    finally:
+        conn.close()
+    return novas, alertas
+
+
+def daily_rollups(base_dir, dias=None):
+    """monitor_diario como DataFrame (opcionalmente só os últimos `dias` dias com execuções)."""
+    import pandas as pd
+
+    conn = _conectar(base_dir)
+    try:
+        sql = "SELECT * FROM monitor_diario"
+        if dias is not None:
+            sql += (" WHERE dia >= (SELECT MIN(dia) FROM"
+                    f" (SELECT DISTINCT dia FROM monitor_diario ORDER BY dia DESC LIMIT {int(dias)}))")
+        return pd.read_sql(sql + " ORDER BY dia, camada", conn)
+    finally:
+        conn.close()
+
+
+def recent_alerts(base_dir, limite=20):
+    """Últimos alertas como DataFrame."""
+    import pandas as pd
+
+    conn = _conectar(base_dir)
+    try:
+        return pd.read_sql(
+            "SELECT * FROM monitor_alertas ORDER BY execucao_id DESC LIMIT ?", conn, params=(limite,)
+        )
+    finally:
+        conn.close()
+
+
+def format_alert(alerta):
+    _, data_execucao, camada, tipo, valor, referencia, desvio = alerta
+    if tipo == "falha":
+        return f"{data_execucao} {camada}: falha após {valor:.2f}s"
+    unidade = "s" if tipo == "tempo" else " linhas/s"
+    return (f"{data_execucao} {camada}: {tipo} {valor:,.2f}{unidade} "
+            f"({desvio:+.0%} sobre a mediana {referencia:,.2f}{unidade})")
@@ -0,0 +1,290 @@
+# Execução particionada (vários processos) da silver e das agregações da gold.
+#
+# As linhas são divididas em partições por mês da InvoiceDate ('month') ou
+# por hash do CustomerID ('customer'). Cada partição é processada por um
+# processo do pool; os workers são criados por fork e herdam os arrays do
+# processo pai, sem serializar o DataFrame. Cada worker devolve estados
+# parciais que se combinam por soma, máximo, mínimo ou união:
+# - silver: primeira Description válida por StockCode e a posição global
+#   da linha (vence a menor posição)
+# - RFM: última compra e soma de total_value por cliente e mês + trios
+#   distintos (cliente, mês, fatura)
+# - most_purchased_products: unidades e primeira posição de cada par
+#   cliente x produto + pares distintos (par, fatura)
+# - metrics: soma de total_value por tipo de transação, unidades vendidas e
+#   faturas de venda distintas
+# - cubos: sempre por mês; o grão de todos inclui o dia ou o mês, então as
+#   células de meses diferentes nunca se juntam
+#
+# Contagens distintas, datas, somas inteiras e a ordem das linhas saem
+# iguais às da execução serial; somas em float (Monetary, Revenue, Gross/Net
+# Sales) podem diferir na última casa decimal pela ordem das somas. No
+# particionamento por cliente o Monetary de cada cliente é somado em uma
+# única partição. Chaves, dimensões e a fact_all continuam sendo montadas
+# no processo pai.
+#
+# Uso:
+#   build_gold(df_clean, ..., workers=4, particao='month')
+#   clean(df_bronze, workers=4, particao='customer')
+# (PIPELINE_WORKERS / PIPELINE_PARTITION nos scripts e no runner)
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from etl.bronze import parse_invoice_date
+from etl.gold import (
+    CUBES,
+    TOP_N_PADRAO,
+    TRANSACTION_TYPES,
+    build_cube,
+    combine_cubes,
+    cube_facts,
+    date_periods,
+    fold_rfm_state,
+    metrics_table,
+    rank_customer_products,
+)
+
+PARTICOES = ['month', 'customer']
+
+# Partições por worker no particionamento por hash do CustomerID
+PARTICOES_POR_WORKER = 4
+
+# Dados da agregação em andamento, herdados pelos workers no fork
+_DADOS = {}
+
+
+def _executar(tarefa, dados, n_particoes, workers):
+    """Aplica `tarefa` a cada partição; devolve os resultados na ordem das partições."""
+    global _DADOS
+    _DADOS = dados
+    try:
+        if workers <= 1 or n_particoes <= 1:
+            return [tarefa(p) for p in range(n_particoes)]
+        # fork: os workers são criados depois de _DADOS preenchido e o herdam
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(min(workers, n_particoes), mp_context=contexto) as pool:
+            return list(pool.map(tarefa, range(n_particoes)))
+    finally:
+        _DADOS = {}
+
+
+def _particionar(chave, n_particoes):
+    """Posições das linhas agrupadas por partição (ordem original dentro de cada uma) e limites."""
+    ordem = np.argsort(chave, kind='stable')
+    limites = np.searchsorted(chave[ordem], np.arange(n_particoes + 1))
+    return {'ordem': ordem, 'limites': limites}
+
+
+def _linhas(p):
+    return _DADOS['ordem'][_DADOS['limites'][p]:_DADOS['limites'][p + 1]]
+
+
+def _codigos(serie):
+    # Códigos inteiros e valores distintos (as categorias, se já for categórica)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    return pd.factorize(serie)
+
+
+def _chave_mes(datas):
+    """Partição de cada linha pelo mês de `datas`; datas inválidas ficam na última."""
+    meses = pd.DatetimeIndex(np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[M]'))
+    chave, distintos = pd.factorize(meses, sort=True)
+    chave[chave < 0] = len(distintos)
+    return chave, len(distintos) + 1
+
+
+def _chave_cliente(cliente, n_particoes):
+    """Partição de cada linha pelo hash do CustomerID; clientes ausentes ficam na primeira."""
+    codigos, clientes = pd.factorize(cliente)
+    particao = pd.util.hash_array(np.asarray(clientes, dtype=object)) % n_particoes
+    return np.append(particao, 0)[codigos].astype('int64'), n_particoes
+
+
+def _chave(particao, datas, cliente, workers):
+    if particao == 'month':
+        return _chave_mes(datas)
+    if particao == 'customer':
+        return _chave_cliente(cliente, workers * PARTICOES_POR_WORKER)
+    raise ValueError(f"particao deve ser um de {PARTICOES}, não {particao!r}")
+
+
+# =========================================
+#            SILVER
+# =========================================
+
+def _descricoes_particao(p):
+    linhas = _linhas(p)
+    descricao = _DADOS['descricao'][linhas]
+    valida = descricao >= 0
+    # Linhas em ordem crescente: drop_duplicates fica com a primeira de cada produto
+    return pd.DataFrame({
+        'produto': _DADOS['produto'][linhas][valida],
+        'descricao': descricao[valida],
+        'posicao': linhas[valida],
+    }).drop_duplicates('produto')
+
+
+def partitioned_description_map(df, workers=2, particao='month'):
+    """build_description_map com as partições processadas em um pool de processos."""
+    produto, produtos = _codigos(df['StockCode'])
+    descricao, descricoes = _codigos(df['Description'])
+    codigos, datas = pd.factorize(df['InvoiceDate'])
+    datas = parse_invoice_date(datas).to_numpy(dtype='datetime64[ns]')[codigos]
+    chave, n_particoes = _chave(particao, datas, df['CustomerID'], workers)
+
+    dados = _particionar(chave, n_particoes)
+    dados.update(produto=produto, descricao=descricao)
+    partes = _executar(_descricoes_particao, dados, n_particoes, workers)
+
+    # A primeira Description válida de cada produto é a de menor posição global
+    primeiras = pd.concat(partes, ignore_index=True).sort_values('posicao').drop_duplicates('produto')
+    return pd.Series(
+        descricoes.take(primeiras['descricao']), index=produtos.take(primeiras['produto']), name='Description'
+    )
+
+
+# =========================================
+#            GOLD
+# =========================================
+
+def _agregados_particao(p):
+    d = _DADOS
+    linhas = _linhas(p)
+    tipo = d['tipo'][linhas]
+    total = d['total'][linhas]
+    venda = linhas[tipo == 0]
+    cliente, fatura = d['cliente'][venda], d['fatura'][venda]
+
+    # RFM: só as vendas dos meses a reagregar (todas sem estado anterior)
+    nova = d['rfm'][venda]
+    rfm = pd.DataFrame({
+        'cliente': cliente[nova], 'mes': d['meses'][venda][nova],
+        'data': d['datas'][venda][nova], 'valor': d['total'][venda][nova],
+    })
+    par = cliente.astype('int64') * d['n_produtos'] + d['produto'][venda]
+    totais = pd.DataFrame({'par': par, 'unidades': d['quantidade'][venda], 'posicao': venda})
+    return {
+        'rfm': rfm.groupby(['cliente', 'mes']).agg({'data': 'max', 'valor': 'sum'}),
+        'rfm_faturas': rfm[['cliente', 'mes']].assign(fatura=fatura[nova]).drop_duplicates(),
+        'totais': totais.groupby('par').agg({'unidades': 'sum', 'posicao': 'min'}),
+        'totais_faturas': pd.DataFrame({'par': par, 'fatura': fatura}).drop_duplicates(),
+        'somas': [total[tipo == codigo].sum() for codigo in range(len(TRANSACTION_TYPES))],
+        'unidades': d['quantidade'][venda].sum(),
+        'faturas': pd.unique(fatura),
+    }
+
+
+def _rfm_combinado(partes, clientes, estado, meses):
+    rfm = (
+        pd.concat([parte['rfm'] for parte in partes])
+        .groupby(level=[0, 1]).agg({'data': 'max', 'valor': 'sum'})
+    )
+    faturas = pd.concat([parte['rfm_faturas'] for parte in partes]).drop_duplicates()
+    frequencia = faturas.groupby(['cliente', 'mes']).size().reindex(rfm.index)
+    novo = pd.DataFrame({
+        'CustomerID': pd.Categorical.from_codes(
+            rfm.index.get_level_values(0), clientes
+        ).remove_unused_categories(),
+        'InvoiceMonth': rfm.index.get_level_values(1).to_numpy().astype('datetime64[ns]'),
+        'LastPurchase': rfm['data'].to_numpy().astype('datetime64[ns]'),
+        'Frequency': frequencia.to_numpy(),
+        'Monetary': rfm['valor'].to_numpy(),
+    })
+    if estado is None or meses is None:
+        return novo
+    return fold_rfm_state(estado, novo, meses)
+
+
+def _totais_combinados(partes, clientes, produtos):
+    # Ordem do primeiro aparecimento de cada par nas vendas, como em
+    # customer_product_totals (desempates do ranking)
+    totais = (
+        pd.concat([parte['totais'] for parte in partes])
+        .groupby(level=0).agg({'unidades': 'sum', 'posicao': 'min'})
+        .sort_values('posicao')
+    )
+    faturas = pd.concat([parte['totais_faturas'] for parte in partes]).drop_duplicates()
+    par = totais.index.to_numpy()
+    return pd.DataFrame({
+        'CustomerID': pd.Categorical.from_codes(par // len(produtos), clientes).remove_unused_categories(),
+        'StockCode': pd.Categorical.from_codes(par % len(produtos), produtos),
+        'UnitsSold': totais['unidades'].to_numpy().astype('int64'),
+        'Transactions': np.bincount(totais.index.get_indexer(faturas['par']), minlength=len(totais)),
+    })
+
+
+def partitioned_aggregates(fact_all, dim_date, dim_customer, dim_product, rfm_estado=None,
+                           top_n=TOP_N_PADRAO, workers=2, particao='month', meses=None):
+    """Estado do RFM, most_purchased_products e metrics agregados por partição da fact_all.
+
+    Com `rfm_estado` e `meses` só as vendas desses meses entram no estado do
+    RFM (etl.gold.update_rfm_state).
+    """
+    posicao_data = pd.Index(dim_date['DateID']).get_indexer(fact_all['DateID'])
+    datas = dim_date['InvoiceDate'].to_numpy(dtype='datetime64[ns]')[posicao_data]
+    cliente, clientes = _codigos(fact_all['CustomerID'])
+    produto, produtos = _codigos(fact_all['StockCode'])
+    fatura, _ = _codigos(fact_all['InvoiceNo'])
+    # fact_all agrupada por tipo, na ordem de TRANSACTION_TYPES
+    contagens = [int((fact_all['TransactionType'] == tipo).sum()) for tipo in TRANSACTION_TYPES]
+    meses_linha = datas.astype('datetime64[M]').astype('datetime64[ns]')
+    # RFM incremental: só entram as vendas dos meses alterados
+    rfm_linha = np.ones(len(fact_all), dtype=bool)
+    if rfm_estado is not None and meses is not None:
+        rfm_linha = np.isin(meses_linha, pd.DatetimeIndex(meses).to_numpy())
+
+    chave, n_particoes = _chave(particao, datas, fact_all['CustomerID'], workers)
+    dados = _particionar(chave, n_particoes)
+    dados.update(
+        cliente=cliente, produto=produto, fatura=fatura, n_produtos=len(produtos),
+        datas=datas.view('int64'), meses=meses_linha.view('int64'), rfm=rfm_linha,
+        tipo=np.repeat(np.arange(len(TRANSACTION_TYPES), dtype=np.int8), contagens),
+        total=fact_all['total_value'].to_numpy(), quantidade=fact_all['Quantity'].to_numpy(),
+    )
+    partes = _executar(_agregados_particao, dados, n_particoes, workers)
+
+    rfm_estado = _rfm_combinado(partes, clientes, rfm_estado, meses)
+    most_purchased_products = rank_customer_products(_totais_combinados(partes, clientes, produtos), top_n)
+    vendas, tarifas, cancelamentos = np.sum([parte['somas'] for parte in partes], axis=0)
+    metrics = metrics_table(
+        vendas,
+        vendas + cancelamentos - tarifas,
+        len(pd.unique(np.concatenate([parte['faturas'] for parte in partes]))),
+        dim_customer['CustomerID'].nunique(),
+        dim_product['StockCode'].nunique(),
+        sum(parte['unidades'] for parte in partes)
+    )
+    return rfm_estado, most_purchased_products, metrics
+
+
+def _cubos_particao(p):
+    fatos = cube_facts(_DADOS['fact_all'].iloc[_linhas(p)], _DADOS['dim_date'])
+    return {nome: build_cube(fatos, grao) for nome, grao in CUBES.items()}
+
+
+def build_cubes_partitioned(fact_all, dim_date, anteriores=None, meses=None, workers=2):
+    """build_cubes com cada mês agregado em um processo do pool.
+
+    Como o grão de todos os cubos inclui o dia ou o mês, os cubos de cada
+    mês são só concatenados. No modo incremental só os `meses` alterados
+    viram partições.
+    """
+    incremental = anteriores is not None and meses is not None
+    _, mes_data = date_periods(dim_date)
+    mes = fact_all['DateID'].map(mes_data).to_numpy(dtype='datetime64[ns]')
+    if incremental:
+        alterado = np.isin(mes, pd.DatetimeIndex(meses).to_numpy())
+        fact_all, mes = fact_all[alterado], mes[alterado]
+
+    chave, n_particoes = _chave_mes(mes)
+    dados = _particionar(chave, n_particoes)
+    dados.update(fact_all=fact_all, dim_date=dim_date)
+    partes = _executar(_cubos_particao, dados, n_particoes, workers)
+
+    cubos = {nome: pd.concat([parte[nome] for parte in partes], ignore_index=True) for nome in CUBES}
+    return combine_cubes(cubos, anteriores if incremental else None, meses)
@@ -0,0 +1,340 @@
+# # Carga paralela da camada Gold no DW (LOAD_MODE=append, LOAD_METHOD=parallel)
+#
+# Para cargas grandes. As demais tabelas vão com COPY, como em
+# load_gold_copy. A fact_all é dividida em pedaços de um mês (DateID do mês
+# pela dim_date da gold; no parquet da gold, row groups de um mês, ver
+# etl/layout.py), e cada pedaço é copiado por um worker (LOAD_WORKERS,
+# padrão 4) com a sua conexão do pool do engine, para uma staging do
+# pedaço. A publicação é uma transação só, e as linhas da fact_all nos
+# meses carregados (ou as linhas a mais na tabela) são conferidas com as
+# copiadas antes do commit. Um worker que falha não deixa nada publicado.
+#
+# Com a fact_all particionada (etl/partitions.py) cada worker monta a
+# partição do mês fora da fact_all, já com a chave primária, os índices
+# secundários e as FKs do pai (validadas ali). A publicação só troca as
+# partições: o ATTACH associa os índices e as FKs prontos aos do pai, e os
+# meses que a carga não toca não perdem nem recriam nada. A fase é uma só
+# ("carga").
+#
+# Sem partições a carga tem três fases, medidas e impressas separadamente:
+# 1. carga: os índices secundários e as FKs da fact_all são removidos (as
+#    definições ficam guardadas), os workers copiam os pedaços e a
+#    publicação insere as stagings na tabela.
+# 2. índices: cada índice é recriado em paralelo.
+# 3. validação: as FKs voltam, validadas sobre as linhas carregadas.
+#
+# Se a carga falhar, as stagings e partições montadas são removidas (e, sem
+# partições, índices e FKs são recriados) antes de o erro subir; um índice
+# ou FK que não pôde ser recriado vira um erro com o DDL que falta. Com
+# partições, rodar de novo substitui os meses já carregados; sem partições
+# (como no modo append com COPY) as linhas se repetem.
+#
+# O pool padrão do SQLAlchemy tem 5 conexões + 10 extras: para mais
+# workers, get_engine(pool_size=LOAD_WORKERS).
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from etl.dataset import read_table
+from etl.gold import date_periods
+from etl.load import (
+    COPY_BATCH_SIZE,
+    copy_batches,
+    create_staging,
+    gold_files,
+    gold_sources,
+    load_gold_copy,
+    report_table,
+    source_batches,
+    target_columns,
+)
+from etl.partitions import (
+    FACT_TABLE,
+    build_partition,
+    drop_pending,
+    is_partitioned,
+    partition_name,
+    staged_months,
+    swap_partition,
+)
+from etl.telemetry import span
+
+WORKERS_PADRAO = 4
+
+# "CREATE INDEX nome ON [ONLY] tabela USING ..." de pg_get_indexdef
+INDEX_DDL = re.compile(r'^CREATE INDEX (\S+) ON (ONLY )?(\S+) ')
+
+
+def fact_chunks(gold, fonte):
+    """[(mês, fonte, filtros)]: a fact_all em pedaços de um mês.
+
+    Sem a dim_date na gold, um pedaço só (mês None) com a tabela inteira.
+    """
+    if isinstance(gold, dict):
+        dim_date = gold.get('dim_date')
+    else:
+        caminho = gold_files(gold, ['dim_date'])['dim_date']
+        dim_date = read_table(caminho, ['DateID', 'InvoiceDate'], nome='dim_date')
+    if dim_date is None:
+        return [(None, fonte, None)]
+    _, meses = date_periods(dim_date)
+    pedacos = []
+    for mes, ids in meses.groupby(meses.to_numpy()).groups.items():
+        ids = [int(date_id) for date_id in ids]
+        if isinstance(fonte, pd.DataFrame):
+            pedacos.append((mes, fonte[fonte['DateID'].isin(ids)], None))
+        else:
+            pedacos.append((mes, fonte, [('DateID', 'in', ids)]))
+    return pedacos
+
+
+def chunk_staging(mes):
+    """Staging de um pedaço de fact_chunks: stg_fact_all_pedaco_201012 (mês None: stg_fact_all_pedaco)."""
+    return f"stg_{FACT_TABLE}_pedaco" + (f"_{mes:%Y%m}" if mes is not None else "")
+
+
+def build_secondary(raw_conn, tabela, indices, fks):
+    """Cria em `tabela` (uma <partição>_nova) os índices e as FKs do pai, com commit.
+
+    Os índices recebem o nome <tabela>_<índice>. Cada FK entra NOT VALID e
+    é validada depois do commit: o ADD CONSTRAINT bloqueia a dimensão
+    referenciada contra os outros workers, a validação não.
+    """
+    with raw_conn.cursor() as cursor:
+        for nome, definicao in indices:
+            cursor.execute(INDEX_DDL.sub(f'CREATE INDEX {tabela}_{nome} ON {tabela} ', definicao))
+        for nome, definicao in fks:
+            cursor.execute(f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao} NOT VALID")
+    raw_conn.commit()
+    with raw_conn.cursor() as cursor:
+        for nome, _ in fks:
+            cursor.execute(f"ALTER TABLE {tabela} VALIDATE CONSTRAINT {nome}")
+    raw_conn.commit()
+
+
+def _copiar_pedaco(engine, mes, fonte, filtros, particionada, secundarios, batch_size):
+    # Roda em uma thread do pool: só usa a própria conexão (sem span).
+    # O commit só torna a staging (ou a <partição>_nova) visível à conexão
+    # que publica; a fact_all não muda aqui
+    raw_conn = engine.raw_connection()
+    try:
+        nomes, lotes = source_batches(fonte, batch_size, filtros)
+        colunas = target_columns(FACT_TABLE, nomes)
+        with raw_conn.cursor() as cursor:
+            staging = create_staging(cursor, FACT_TABLE, colunas, chunk_staging(mes))
+        linhas = copy_batches(raw_conn, FACT_TABLE, nomes, lotes, target=staging)
+        if not particionada:
+            raw_conn.commit()
+            return [], staging, colunas, linhas
+        with raw_conn.cursor() as cursor:
+            meses = [mes] if mes is not None else staged_months(cursor, staging)
+            montadas = sum(build_partition(cursor, staging, colunas, m, chave_primaria=True) for m in meses)
+            cursor.execute(f"DROP TABLE {staging}")
+        if montadas != linhas:
+            raise ValueError(f"{FACT_TABLE}: {linhas - montadas} linhas sem data na dim_date do banco")
+        raw_conn.commit()
+        for m in meses:
+            build_secondary(raw_conn, f"{partition_name(m)}_nova", *secundarios)
+        return meses, None, colunas, linhas
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+
+def publish_chunks(cursor, copias, particionada):
+    """Publica os pedaços de _copiar_pedaco na fact_all, sem commit.
+
+    Com partições, troca as partições dos meses copiados; sem, insere as
+    stagings na tabela. Levanta ValueError se as linhas da fact_all nos
+    meses carregados (sem partições: as linhas a mais na tabela) não são as
+    copiadas. Retorna as linhas copiadas.
+    """
+    linhas = sum(copiadas for *_, copiadas in copias)
+    if particionada:
+        # DETACH bloqueia a fact_all inteira: todas as trocas juntas, no fim
+        meses = sorted(mes for meses, *_ in copias for mes in meses)
+        for mes in meses:
+            swap_partition(cursor, mes)
+        # Só os meses carregados: o banco pode ter meses que a gold não tem
+        cursor.execute("SELECT " + (
+            " + ".join(f"(SELECT count(*) FROM {partition_name(mes)})" for mes in meses) or "0"
+        ))
+        no_banco = cursor.fetchone()[0]
+    else:
+        cursor.execute(f"SELECT count(*) FROM {FACT_TABLE}")
+        antes = cursor.fetchone()[0]
+        for _, staging, colunas, _ in copias:
+            lista = ', '.join(colunas)
+            cursor.execute(f"INSERT INTO {FACT_TABLE} ({lista}) SELECT {lista} FROM {staging}")
+            cursor.execute(f"DROP TABLE {staging}")
+        cursor.execute(f"SELECT count(*) FROM {FACT_TABLE}")
+        no_banco = cursor.fetchone()[0] - antes
+    if no_banco != linhas:
+        raise ValueError(f"{FACT_TABLE}: {no_banco} linhas publicadas, {linhas} copiadas")
+    return linhas
+
+
+def _executar(engine, sqls, workers):
+    # Um comando por conexão do pool, em paralelo, cada um com commit próprio
+    def executar(sql):
+        raw_conn = engine.raw_connection()
+        try:
+            with raw_conn.cursor() as cursor:
+                cursor.execute(sql)
+            raw_conn.commit()
+        finally:
+            raw_conn.close()
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(executar, sqls))
+
+
+def secondary_definitions(cursor, table=FACT_TABLE):
+    """(índices, fks) de `table` como (nome, definição): índices secundários e FKs."""
+    cursor.execute(
+        "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = to_regclass(%s) AND NOT indisprimary AND NOT indisunique ORDER BY 1",
+        (table,),
+    )
+    indices = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f' ORDER BY conname",
+        (table,),
+    )
+    return indices, cursor.fetchall()
+
+
+def drop_secondary(cursor, table=FACT_TABLE):
+    """Remove os índices secundários e as FKs de `table`. Retorna (índices, fks) de secondary_definitions."""
+    indices, fks = secondary_definitions(cursor, table)
+    for nome, _ in fks:
+        cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {nome}")
+    for nome, _ in indices:
+        cursor.execute(f"DROP INDEX {nome}")
+    return indices, fks
+
+
+def rebuild_indexes(engine, indices, workers):
+    """Recria os `indices` de drop_secondary em paralelo (fact_all sem partições)."""
+    _executar(engine, [definicao for _, definicao in indices], workers)
+
+
+def restore_constraints(cursor, fks, table=FACT_TABLE):
+    """Recria as FKs de drop_secondary; o Postgres valida as linhas existentes."""
+    for nome, definicao in fks:
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {nome} {definicao}")
+
+
+def missing_secondary(cursor, indices, fks, table=FACT_TABLE):
+    """DDL dos `indices` e `fks` de drop_secondary que `table` não tem."""
+    atuais = secondary_definitions(cursor, table)
+    nomes = [{nome for nome, _ in definicoes} for definicoes in atuais]
+    return (
+        [definicao for nome, definicao in indices if nome not in nomes[0]]
+        + [f"ALTER TABLE {table} ADD CONSTRAINT {nome} {definicao}" for nome, definicao in fks if nome not in nomes[1]]
+    )
+
+
+def load_fact_parallel(engine, gold, fonte, workers=WORKERS_PADRAO, batch_size=COPY_BATCH_SIZE):
+    """Carrega a fact_all em pedaços paralelos (ver o cabeçalho do módulo).
+
+    Retorna (linhas, {fase: segundos}): só "carga" com partições; sem
+    partições também "indices" e "validacao".
+    """
+    fases = {}
+    raw_conn = engine.raw_connection()
+    try:
+        with raw_conn.cursor() as cursor:
+            particionada = is_partitioned(cursor)
+            if particionada:
+                # Nada sai da fact_all: os workers criam os mesmos índices e FKs nas partições novas
+                secundarios = secondary_definitions(cursor)
+            else:
+                secundarios = drop_secondary(cursor)
+        raw_conn.commit()
+        pedacos = []
+        erro = None
+        try:
+            inicio = time.perf_counter()
+            with span("carga") as passo:
+                pedacos = fact_chunks(gold, fonte)
+                with ThreadPoolExecutor(workers) as pool:
+                    copias = list(pool.map(
+                        lambda pedaco: _copiar_pedaco(engine, *pedaco, particionada, secundarios, batch_size),
+                        pedacos,
+                    ))
+                with raw_conn.cursor() as cursor:
+                    linhas = passo.linhas_saida = publish_chunks(cursor, copias, particionada)
+                raw_conn.commit()
+            fases['carga'] = time.perf_counter() - inicio
+        except Exception as falha:
+            # Stagings e meses montados por workers que terminaram antes do erro
+            erro = falha
+            raw_conn.rollback()
+            with raw_conn.cursor() as cursor:
+                for mes, _, _ in pedacos:
+                    cursor.execute(f"DROP TABLE IF EXISTS {chunk_staging(mes)}")
+                drop_pending(cursor)
+            raw_conn.commit()
+        if not particionada:
+            # Mesmo com erro na carga a fact_all volta a ter índices e FKs
+            restore_secondary(engine, raw_conn, *secundarios, workers, fases, erro)
+        if erro is not None:
+            raise erro
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    return linhas, fases
+
+
+def restore_secondary(engine, raw_conn, indices, fks, workers, fases, erro=None):
+    """Fases "indices" e "validacao" de load_fact_parallel sem partições.
+
+    Se algo não puder ser recriado, levanta RuntimeError com o DDL que falta,
+    encadeado ao erro da carga (`erro`), se houve um, para não escondê-lo.
+    """
+    try:
+        inicio = time.perf_counter()
+        with span("indices", len(indices)):
+            rebuild_indexes(engine, indices, workers)
+        fases['indices'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with span("validacao", len(fks)):
+            with raw_conn.cursor() as cursor:
+                restore_constraints(cursor, fks)
+            raw_conn.commit()
+        fases['validacao'] = time.perf_counter() - inicio
+    except Exception as falha:
+        raw_conn.rollback()
+        with raw_conn.cursor() as cursor:
+            faltando = missing_secondary(cursor, indices, fks)
+        raise RuntimeError(
+            f"{FACT_TABLE} sem {len(faltando)} índices/FKs ({falha}); recriar com:\n" + ";\n".join(faltando)
+        ) from (erro or falha)
+
+
+def load_gold_parallel(engine, gold, tables, workers=WORKERS_PADRAO, batch_size=COPY_BATCH_SIZE):
+    """Modo append com a fact_all em paralelo (load_fact_parallel) e as demais tabelas com COPY.
+
+    Retorna {tabela: (linhas, segundos)}; o tempo da fact_all soma as três fases.
+    """
+    outras = [table for table in tables if table != FACT_TABLE]
+    resultados = load_gold_copy(engine, gold, outras, batch_size) if outras else {}
+    fontes = gold_sources(gold, [FACT_TABLE]) if FACT_TABLE in tables else {}
+    if FACT_TABLE in fontes:
+        with span(FACT_TABLE):
+            linhas, fases = load_fact_parallel(engine, gold, fontes[FACT_TABLE], workers, batch_size)
+        resultados[FACT_TABLE] = (linhas, sum(fases.values()))
+        report_table(FACT_TABLE, *resultados[FACT_TABLE])
+        print("  " + ", ".join(f"{fase}: {segundos:.2f}s" for fase, segundos in fases.items())
+              + f" ({workers} workers)")
+    return resultados
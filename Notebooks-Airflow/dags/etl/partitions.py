@@ -0,0 +1,258 @@
+# # Partições mensais da fact_all no Data Warehouse
+#
+# A fact_all é particionada por faixa (PARTITION BY RANGE) em InvoiceDate,
+# uma partição por mês: fact_all_p201012, fact_all_p201101... A data vem da
+# dim_date do banco pelo DateID, no momento da carga (a gold não a repete).
+#
+# Índices (SQL_CREATE_FACT em etl/warehouse.py), criados no pai e herdados
+# por cada partição:
+# - BRIN em InvoiceDate e DateID: as linhas de cada partição são gravadas
+#   em ordem de data, então um índice de poucas páginas resolve faixas de dias
+# - B-tree só nas colunas seletivas (InvoiceNo, CustomerID, StockCode); a
+#   CountryID (quase tudo Reino Unido) fica sem índice
+#
+# A carga não apaga nem insere linha a linha na fact_all: cada mês a
+# carregar é montado em uma tabela avulsa (sem índices durante o INSERT),
+# que substitui a partição do mês com DETACH/ATTACH. Meses sem mudanças não
+# são tocados.
+#
+# - Não há partição DEFAULT: toda carga cria a partição de cada mês que
+#   carrega (build_partition), e linhas sem data na dim_date são recusadas
+#   antes (check_staged_dates), então nenhuma linha carregada fica fora de
+#   uma faixa. Um INSERT avulso em um mês sem partição falha, em vez de
+#   cair em uma DEFAULT que o ATTACH de cada mês novo teria de varrer.
+# - fact_id é só a chave física da linha: as linhas da staging recebem
+#   fact_ids novos da sequência (a gold não tem fact_id). No merge por
+#   fatura (`faturas`) as linhas das demais faturas do mês passam da
+#   partição antiga para a nova com o mesmo fact_id e created_at. Nenhuma
+#   tabela referencia fact_id; a linha é identificada pelas colunas da
+#   gold (InvoiceNo, StockCode, DateID...). As linhas da staging são
+#   numeradas na ordem de data e, na mesma data, das colunas da gold: a
+#   mesma gold dá os mesmos fact_id (a partir do mesmo valor da sequência)
+#   em qualquer ordem de linhas, seja ela de um build completo ou de um
+#   incremental.
+
+from etl.warehouse import SQL_CREATE_FACT
+
+FACT_TABLE = 'fact_all'
+PARTITION_COLUMN = 'invoicedate'
+PRIMARY_KEY = ['fact_id', PARTITION_COLUMN]
+
+
+def list_partitions(cursor, table=FACT_TABLE):
+    """Nomes das partições de `table`."""
+    cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s) ORDER BY 1",
+                   (table,))
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def is_partitioned(cursor, table=FACT_TABLE):
+    """True se `table` existe e é uma tabela particionada."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    linha = cursor.fetchone()
+    return linha is not None and linha[0] == 'p'
+
+
+def partition_name(mes):
+    """Nome da partição de um mês (date/Timestamp do primeiro dia): fact_all_p201012."""
+    return f"{FACT_TABLE}_p{mes:%Y%m}"
+
+
+def month_bounds(mes):
+    """(início, fim) da faixa de um mês, como texto ISO: fim exclusivo."""
+    proximo = (mes.year + mes.month // 12, mes.month % 12 + 1)
+    return f"{mes:%Y-%m}-01", f"{proximo[0]:04d}-{proximo[1]:02d}-01"
+
+
+def _existe(cursor, tabela):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (tabela,))
+    return cursor.fetchone()[0]
+
+
+def check_staged_dates(cursor, staging):
+    """Levanta ValueError se alguma linha da staging tem DateID fora da dim_date.
+
+    Sem a data a linha não teria partição (e a FK fk_date a recusaria).
+    """
+    cursor.execute(
+        f"SELECT count(*) FROM {staging} s LEFT JOIN dim_date d USING (dateid) WHERE d.dateid IS NULL"
+    )
+    sem_data = cursor.fetchone()[0]
+    if sem_data:
+        raise ValueError(f"{sem_data} linhas de {staging} com DateID ausente da dim_date")
+
+
+def staged_months(cursor, staging):
+    """Meses (primeiro dia) das linhas da staging, pela dim_date do banco."""
+    check_staged_dates(cursor, staging)
+    cursor.execute(
+        f"SELECT DISTINCT date_trunc('month', d.invoicedate)::date FROM {staging} s JOIN dim_date d USING (dateid)"
+    )
+    return sorted(linha[0] for linha in cursor.fetchall())
+
+
+def invoice_months(cursor, staging, faturas):
+    """Meses com alguma fatura de `faturas` (tabela com invoiceno), na staging ou já na fact_all.
+
+    Uma fatura que mudou de mês tem as duas partições substituídas.
+    """
+    check_staged_dates(cursor, staging)
+    cursor.execute(
+        f"SELECT date_trunc('month', d.invoicedate)::date FROM {staging} s "
+        f"JOIN {faturas} c USING (invoiceno) JOIN dim_date d USING (dateid) "
+        f"UNION SELECT date_trunc('month', f.{PARTITION_COLUMN})::date FROM {FACT_TABLE} f "
+        f"JOIN {faturas} c USING (invoiceno)"
+    )
+    return sorted(linha[0] for linha in cursor.fetchall())
+
+
+def build_partition(cursor, staging, colunas, mes, chave_primaria=False, faturas=None):
+    """Monta em <partição>_nova as linhas de `mes` da staging, ainda fora da fact_all.
+
+    Com `faturas` (tabela com invoiceno) só as linhas da staging dessas
+    faturas entram, junto com as linhas das outras faturas que a partição
+    atual já tem (mesmo fact_id e created_at).
+
+    A tabela ganha um CHECK com a faixa do mês, para o ATTACH de
+    swap_partition não precisar varrê-la, antes de ser preenchida em ordem
+    de data (e das colunas, para os fact_id não dependerem da ordem da
+    staging): o CHECK é conferido linha a linha no INSERT, sem uma varredura
+    a mais da tabela cheia. Com `chave_primaria` a chave primária já é
+    criada aqui e o ATTACH só a associa à do pai. Retorna as linhas.
+    """
+    nova = f"{partition_name(mes)}_nova"
+    inicio, fim = month_bounds(mes)
+    lista = ', '.join(colunas)
+    cursor.execute(f"DROP TABLE IF EXISTS {nova}")
+    cursor.execute(f"CREATE TABLE {nova} (LIKE {FACT_TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"ALTER TABLE {nova} ADD CONSTRAINT {nova}_faixa "
+        f"CHECK ({PARTITION_COLUMN} IS NOT NULL "
+        f"AND {PARTITION_COLUMN} >= '{inicio}' AND {PARTITION_COLUMN} < '{fim}')"
+    )
+    if faturas is None:
+        cursor.execute(
+            f"INSERT INTO {nova} ({lista}, {PARTITION_COLUMN}) "
+            f"SELECT {', '.join('s.' + c for c in colunas)}, d.invoicedate "
+            f"FROM {staging} s JOIN dim_date d USING (dateid) "
+            f"WHERE d.invoicedate >= %s AND d.invoicedate < %s "
+            f"ORDER BY d.invoicedate, {', '.join('s.' + c for c in colunas)}",
+            (inicio, fim),
+        )
+    else:
+        novas = (
+            f"SELECT {', '.join('s.' + c for c in colunas)}, d.invoicedate, "
+            f"nextval(pg_get_serial_sequence('{FACT_TABLE}', 'fact_id')), CURRENT_TIMESTAMP "
+            f"FROM {staging} s JOIN {faturas} c USING (invoiceno) JOIN dim_date d USING (dateid) "
+            f"WHERE d.invoicedate >= %s AND d.invoicedate < %s"
+        )
+        particao = partition_name(mes)
+        if _existe(cursor, particao):
+            novas += (
+                f" UNION ALL SELECT {', '.join('p.' + c for c in colunas)}, p.{PARTITION_COLUMN}, "
+                f"p.fact_id, p.created_at FROM {particao} p "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {faturas} c WHERE c.invoiceno = p.invoiceno)"
+            )
+        cursor.execute(
+            f"INSERT INTO {nova} ({lista}, {PARTITION_COLUMN}, fact_id, created_at) "
+            f"SELECT * FROM ({novas}) m ORDER BY {PARTITION_COLUMN}",
+            (inicio, fim),
+        )
+    linhas = cursor.rowcount
+    if chave_primaria:
+        cursor.execute(f"ALTER TABLE {nova} ADD PRIMARY KEY ({', '.join(PRIMARY_KEY)})")
+    return linhas
+
+
+def swap_partition(cursor, mes):
+    """Troca a partição de `mes` pela <partição>_nova de build_partition.
+
+    Os índices do pai que a tabela nova ainda não tem são criados no ATTACH.
+    Os índices <partição>_nova_* perdem o "_nova", para a próxima
+    <partição>_nova do mês poder usar os mesmos nomes.
+    """
+    particao = partition_name(mes)
+    nova = f"{particao}_nova"
+    inicio, fim = month_bounds(mes)
+    if _existe(cursor, particao):
+        cursor.execute(f"ALTER TABLE {FACT_TABLE} DETACH PARTITION {particao}")
+        cursor.execute(f"DROP TABLE {particao}")
+    cursor.execute(f"ALTER TABLE {nova} RENAME TO {particao}")
+    cursor.execute(f"ALTER TABLE {FACT_TABLE} ATTACH PARTITION {particao} FOR VALUES FROM ('{inicio}') TO ('{fim}')")
+    cursor.execute(f"ALTER TABLE {particao} DROP CONSTRAINT {nova}_faixa")
+    cursor.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = to_regclass(%s) AND left(c.relname, %s) = %s",
+        (particao, len(nova), nova),
+    )
+    for (indice,) in cursor.fetchall():
+        cursor.execute(f"ALTER INDEX {indice} RENAME TO {particao}{indice[len(nova):]}")
+    cursor.execute(f"ANALYZE {particao}")
+
+
+def drop_pending(cursor):
+    """Remove as <partição>_nova de build_partition que não chegaram a swap_partition."""
+    cursor.execute(
+        "SELECT relname FROM pg_class WHERE relnamespace = current_schema()::regnamespace "
+        "AND relkind = 'r' AND relname LIKE %s",
+        (f"{FACT_TABLE}\\_p%\\_nova",),
+    )
+    for (tabela,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE {tabela}")
+
+
+def replace_partition(cursor, staging, colunas, mes, faturas=None):
+    """Substitui a partição de `mes` pelas linhas desse mês na staging. Retorna as linhas.
+
+    Com `faturas` só essas faturas são trocadas (ver build_partition).
+    """
+    linhas = build_partition(cursor, staging, colunas, mes, faturas=faturas)
+    swap_partition(cursor, mes)
+    return linhas
+
+
+def replace_partitions(cursor, staging, colunas, meses=None, faturas=None):
+    """Substitui as partições de `meses` (padrão: todos os meses da staging).
+
+    Retorna {mês: linhas}.
+    """
+    if meses is None:
+        meses = staged_months(cursor, staging)
+    return {mes: replace_partition(cursor, staging, colunas, mes, faturas) for mes in meses}
+
+
+def create_fact_table(cursor):
+    """Cria a fact_all particionada (SQL_CREATE_FACT).
+
+    Uma fact_all antiga, em uma única tabela, é migrada: as linhas vão para
+    as partições de cada mês, com os mesmos fact_id. Retorna as linhas
+    migradas (0 se não havia o que migrar).
+    """
+    antiga = None
+    if _existe(cursor, FACT_TABLE) and not is_partitioned(cursor):
+        antiga = f"{FACT_TABLE}_sem_particao"
+        # Nomes de índices são globais no schema: saem antes do CREATE do pai
+        cursor.execute(
+            "SELECT indexrelid::regclass::text FROM pg_index i "
+            "WHERE indrelid = to_regclass(%s) AND NOT indisprimary", (FACT_TABLE,)
+        )
+        for (indice,) in cursor.fetchall():
+            cursor.execute(f"DROP INDEX {indice}")
+        cursor.execute(f"ALTER TABLE {FACT_TABLE} RENAME TO {antiga}")
+        cursor.execute(f"ALTER INDEX IF EXISTS {FACT_TABLE}_pkey RENAME TO {antiga}_pkey")
+    cursor.execute(SQL_CREATE_FACT)
+    if antiga is None:
+        return 0
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = %s AND table_schema = current_schema() ORDER BY ordinal_position",
+        (antiga,),
+    )
+    colunas = [linha[0] for linha in cursor.fetchall()]
+    migradas = sum(replace_partitions(cursor, antiga, colunas).values())
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{FACT_TABLE}', 'fact_id'), "
+        f"(SELECT coalesce(max(fact_id), 0) + 1 FROM {FACT_TABLE}), false)"
+    )
+    cursor.execute(f"DROP TABLE {antiga}")
+    return migradas
@@ -0,0 +1,329 @@
+# Perfil de qualidade da silver em uma única passada (etapa quality).
+#
+# As métricas do 06_quality_report.ipynb (completude, duplicatas, valores
+# não positivos, cancelamentos, ajustes, tarifas e outliers pelo IQR) são
+# calculadas lote a lote sobre o parquet da silver, sem carregar a tabela
+# inteira e sem uma passada por métrica:
+# - contagens (linhas, não nulos por coluna, valores <= 0, prefixos, tarifas)
+#   são somadas entre os lotes
+# - duplicatas: impressão digital de 64 bits de cada linha (hash_linha,
+#   calculada na bronze; etl/schema.py); linhas duplicadas = linhas -
+#   impressões distintas. A contagem é exata, e é a única métrica cuja
+#   memória cresce com as linhas: 8 bytes por impressão distinta guardada,
+#   mais as pendentes (até o dobro) entre duas compactações, e um pico de
+#   cerca de 40 bytes por impressão na tabela hash do pd.unique de cada
+#   compactação. Na base original (~540 mil linhas) são uns 4 MB, com pico
+#   perto de 25 MB; com 100 milhões de linhas, 800 MB e pico de alguns GB.
+#   Um sketch combinável (HyperLogLog) teria memória fixa, mas erra ~1% das
+#   distintas, a mesma ordem das duplicatas que a métrica conta
+# - quartis e outliers: QuantileSketch (DDSketch), que guarda só contagens
+#   por balde logarítmico; quantis com erro relativo <= alpha e contagem de
+#   outliers exata a menos das linhas no balde de cada limite
+# Dois perfis se combinam com merge() (lotes processados em paralelo ou
+# partições separadas).
+#
+# O resultado vira duas tabelas em data/quality/: quality_metrics (métrica,
+# valor) e quality_score (dimensão, score, peso, mínimo, aprovado), com o
+# score ponderado do notebook. quality_gate() falha a etapa quando alguma
+# dimensão fica abaixo do mínimo configurado (QUALITY_MIN_SCORE e
+# QUALITY_THRESHOLDS), interrompendo o DAG antes da gold.
+#
+# Uso:
+#   perfil = profile_parquet("/opt/airflow/dags/data/silver/dados_limpos.parquet")
+#   tabelas = quality_tables(perfil, read_thresholds())
+#   quality_gate(tabelas['quality_score'])
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from etl.dataset import iter_batches
+from etl.schema import FINGERPRINT_COLUMN, row_fingerprint
+from etl.silver import STOCKCODE_FEES
+from etl.telemetry import span
+
+QUALITY_DIR = "quality"
+
+# Linhas por lote lidas do parquet
+BATCH_SIZE_PADRAO = 100_000
+
+# Erro relativo dos quantis aproximados
+ALPHA_PADRAO = 0.005
+
+# Colunas com outliers pelo IQR (quartis calculados só sobre valores > 0)
+OUTLIER_COLUMNS = ['Quantity', 'UnitPrice']
+
+# Pesos do score final (06_quality_report.ipynb)
+PESOS = {'Completude': 0.35, 'Unicidade': 0.25, 'Consistência': 0.20, 'Validade': 0.20}
+SCORE_FINAL = 'Score Final'
+
+# Score mínimo padrão: abaixo de 80 o notebook classifica como REGULAR
+MIN_SCORE_PADRAO = 80.0
+
+
+class QualityGateError(Exception):
+    """Alguma dimensão de qualidade ficou abaixo do mínimo configurado."""
+
+
+class QuantileSketch:
+    """Sketch de quantis combinável (DDSketch) com erro relativo <= alpha.
+
+    Cada valor cai em um balde logarítmico de razão gamma = (1 + alpha) /
+    (1 - alpha); só a contagem de cada balde é guardada. A memória depende
+    da faixa dos valores, não do número de linhas, e dois sketches se
+    combinam somando as contagens.
+    """
+
+    def __init__(self, alpha=ALPHA_PADRAO):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self.positivos = {}
+        self.negativos = {}
+        self.zeros = 0
+        self.n = 0
+
+    def add(self, valores):
+        valores = np.asarray(valores, dtype='float64')
+        valores = valores[np.isfinite(valores)]
+        self.n += len(valores)
+        self.zeros += int((valores == 0).sum())
+        for sinal, baldes in ((1, self.positivos), (-1, self.negativos)):
+            modulos = valores[valores * sinal > 0] * sinal
+            indices, contagens = np.unique(
+                np.ceil(np.log(modulos) / self._log_gamma).astype('int64'), return_counts=True
+            )
+            for indice, contagem in zip(indices.tolist(), contagens.tolist()):
+                baldes[indice] = baldes.get(indice, 0) + contagem
+
+    def merge(self, outro):
+        for baldes, outros in ((self.positivos, outro.positivos), (self.negativos, outro.negativos)):
+            for indice, contagem in outros.items():
+                baldes[indice] = baldes.get(indice, 0) + contagem
+        self.zeros += outro.zeros
+        self.n += outro.n
+        return self
+
+    def _valor(self, indices):
+        # Representante do balde: erro relativo <= alpha para qualquer valor dele
+        return 2 * self.gamma ** np.asarray(indices, dtype='float64') / (self.gamma + 1)
+
+    def distribution(self, somente_positivos=False):
+        """(valores representativos em ordem crescente, contagens)."""
+        positivos = sorted(self.positivos)
+        valores = [self._valor(positivos)]
+        contagens = [[self.positivos[i] for i in positivos]]
+        if not somente_positivos:
+            negativos = sorted(self.negativos, reverse=True)
+            valores = [-self._valor(negativos), [0.0]] + valores
+            contagens = [[self.negativos[i] for i in negativos], [self.zeros]] + contagens
+        return np.concatenate(valores), np.concatenate(contagens).astype('int64')
+
+    def quantile(self, q, somente_positivos=False):
+        valores, contagens = self.distribution(somente_positivos)
+        if not contagens.sum():
+            return np.nan
+        acumulado = np.cumsum(contagens)
+        return float(valores[np.searchsorted(acumulado, q * (acumulado[-1] - 1), side='right')])
+
+    def count_outside(self, minimo, maximo):
+        """Quantos valores ficam abaixo de `minimo` ou acima de `maximo`."""
+        valores, contagens = self.distribution()
+        return int(contagens[(valores < minimo) | (valores > maximo)].sum())
+
+
+class QualityProfile:
+    """Contadores de qualidade de uma passada pela silver; merge() combina dois perfis."""
+
+    def __init__(self, alpha=ALPHA_PADRAO, stockcode_fees=STOCKCODE_FEES):
+        self.stockcode_fees = stockcode_fees
+        self.linhas = 0
+        self.preenchidas = {}
+        self.contagens = {
+            'Quantity <= 0': 0, 'UnitPrice <= 0': 0, 'Cancelamentos': 0, 'Ajustes': 0, 'Tarifas': 0,
+        }
+        self.sketches = {coluna: QuantileSketch(alpha) for coluna in OUTLIER_COLUMNS}
+        # impressões digitais das linhas; deduplicadas quando acumulam
+        self._hashes = []
+        self._pendentes = 0
+
+    def update(self, lote):
+        self.linhas += len(lote)
+        if FINGERPRINT_COLUMN in lote.columns:
+            impressoes = lote[FINGERPRINT_COLUMN].to_numpy()
+            # Completude só das colunas de dados, como no notebook
+            lote = lote.drop(columns=FINGERPRINT_COLUMN)
+        else:
+            impressoes = row_fingerprint(lote)
+        for coluna, preenchidas in lote.count().items():
+            self.preenchidas[coluna] = self.preenchidas.get(coluna, 0) + int(preenchidas)
+        self.contagens['Quantity <= 0'] += int((lote['Quantity'] <= 0).sum())
+        self.contagens['UnitPrice <= 0'] += int((lote['UnitPrice'] <= 0).sum())
+        self.contagens['Cancelamentos'] += int((lote['InvoicePrefix'] == 'C').sum())
+        self.contagens['Ajustes'] += int((lote['InvoicePrefix'] == 'A').sum())
+        self.contagens['Tarifas'] += int(lote['StockCode'].isin(self.stockcode_fees).sum())
+        for coluna, sketch in self.sketches.items():
+            sketch.add(lote[coluna].to_numpy(dtype='float64', na_value=np.nan))
+        self._add_hashes(impressoes)
+        return self
+
+    def _add_hashes(self, hashes):
+        # Deduplica só quando os hashes pendentes passam do dobro dos já
+        # compactados: custo amortizado linear no número de linhas
+        self._hashes.append(hashes)
+        self._pendentes += len(hashes)
+        if self._pendentes > 2 * len(self._hashes[0]) + 4 * BATCH_SIZE_PADRAO:
+            self._hashes = [pd.unique(np.concatenate(self._hashes))]
+            self._pendentes = 0
+
+    def merge(self, outro):
+        self.linhas += outro.linhas
+        for coluna, preenchidas in outro.preenchidas.items():
+            self.preenchidas[coluna] = self.preenchidas.get(coluna, 0) + preenchidas
+        for nome, contagem in outro.contagens.items():
+            self.contagens[nome] += contagem
+        for coluna, sketch in self.sketches.items():
+            sketch.merge(outro.sketches[coluna])
+        for hashes in outro._hashes:
+            self._add_hashes(hashes)
+        return self
+
+    def hash_bytes(self):
+        """Bytes das impressões guardadas para a contagem exata de duplicatas."""
+        return sum(hashes.nbytes for hashes in self._hashes)
+
+    def distinct_rows(self):
+        if not self._hashes:
+            return 0
+        return len(pd.unique(np.concatenate(self._hashes)))
+
+    def outliers(self, coluna, fator=1.5):
+        """Outliers pelo IQR, com os quartis dos valores > 0 (como no notebook)."""
+        sketch = self.sketches[coluna]
+        q1 = sketch.quantile(0.25, somente_positivos=True)
+        q3 = sketch.quantile(0.75, somente_positivos=True)
+        iqr = q3 - q1
+        return q1, q3, sketch.count_outside(q1 - fator * iqr, q3 + fator * iqr)
+
+    def metrics(self):
+        """Métricas do perfil como dict {métrica: valor}."""
+        metricas = {'Linhas': self.linhas, 'Colunas': len(self.preenchidas)}
+        celulas = self.linhas * len(self.preenchidas)
+        metricas['Células preenchidas'] = sum(self.preenchidas.values())
+        metricas['Completude (%)'] = 100 * metricas['Células preenchidas'] / celulas if celulas else 100.0
+        for coluna, preenchidas in self.preenchidas.items():
+            metricas[f'Completude {coluna} (%)'] = 100 * preenchidas / self.linhas if self.linhas else 100.0
+        metricas['Duplicatas'] = self.linhas - self.distinct_rows()
+        metricas.update(self.contagens)
+        for coluna in OUTLIER_COLUMNS:
+            q1, q3, outliers = self.outliers(coluna)
+            metricas.update({f'Q1 {coluna}': q1, f'Q3 {coluna}': q3, f'Outliers {coluna}': outliers})
+        return metricas
+
+
+def iter_parquet(caminho, batch_size=BATCH_SIZE_PADRAO):
+    """Lotes do parquet (ou lista de parquets) como DataFrames (só um lote em memória por vez)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if not isinstance(caminho, str) and not caminho:
+        return
+    # Colunas de texto lidas como dicionário (categóricas): as contagens de
+    # nulos (e o hash das linhas de uma silver sem hash_linha) operam nos códigos
+    esquema = pq.read_schema(caminho if isinstance(caminho, str) else caminho[0])
+    texto = [campo.name for campo in esquema if pa.types.is_string(campo.type)]
+    _, lotes = iter_batches(caminho, batch_size=batch_size, dicionario=texto)
+    for lote in lotes:
+        yield lote.to_pandas()
+
+
+def iter_frame(df, batch_size=BATCH_SIZE_PADRAO):
+    """Fatias de um DataFrame já em memória (runner), no mesmo formato de iter_parquet."""
+    for inicio in range(0, len(df), batch_size):
+        yield df.iloc[inicio:inicio + batch_size]
+
+
+def profile_batches(lotes, alpha=ALPHA_PADRAO):
+    perfil = QualityProfile(alpha)
+    with span("profile") as passo:
+        for lote in lotes:
+            perfil.update(lote)
+        passo.linhas_entrada = perfil.linhas
+    return perfil
+
+
+def profile_parquet(caminho, batch_size=BATCH_SIZE_PADRAO, alpha=ALPHA_PADRAO):
+    """Perfil de qualidade do parquet da silver (ou das partições da silver incremental), em uma passada."""
+    return profile_batches(iter_parquet(caminho, batch_size), alpha)
+
+
+def profile_frame(df, batch_size=BATCH_SIZE_PADRAO, alpha=ALPHA_PADRAO):
+    return profile_batches(iter_frame(df, batch_size), alpha)
+
+
+def read_thresholds():
+    """Mínimos por dimensão: QUALITY_MIN_SCORE (score final) e
+    QUALITY_THRESHOLDS ("Completude=95,Validade=85")."""
+    limites = {SCORE_FINAL: float(os.environ.get("QUALITY_MIN_SCORE", MIN_SCORE_PADRAO))}
+    for item in filter(None, os.environ.get("QUALITY_THRESHOLDS", "").split(",")):
+        dimensao, valor = item.split("=")
+        limites[dimensao.strip()] = float(valor)
+    return limites
+
+
+def quality_tables(perfil, limites=None):
+    """quality_metrics e quality_score (score ponderado e mínimos) a partir do perfil."""
+    limites = limites if limites is not None else {SCORE_FINAL: MIN_SCORE_PADRAO}
+    metricas = perfil.metrics()
+    linhas = max(metricas['Linhas'], 1)
+    inconsistencias = metricas['Quantity <= 0'] + metricas['UnitPrice <= 0']
+    scores = {
+        'Completude': metricas['Completude (%)'],
+        'Unicidade': 100 * (metricas['Linhas'] - metricas['Duplicatas']) / linhas,
+        'Consistência': max(0, 100 - inconsistencias / linhas * 100),
+        'Validade': max(0, 100 - metricas['Outliers Quantity'] / linhas * 100),
+    }
+    scores[SCORE_FINAL] = sum(scores[dimensao] * peso for dimensao, peso in PESOS.items())
+
+    score = pd.DataFrame({
+        'Dimension': list(scores),
+        'Score': list(scores.values()),
+        'Weight': [PESOS.get(dimensao, 1.0) for dimensao in scores],
+        'Threshold': [limites.get(dimensao, np.nan) for dimensao in scores],
+    })
+    score['Passed'] = ~(score['Score'] < score['Threshold'])
+    return {
+        'quality_metrics': pd.DataFrame({'Metric': list(metricas), 'Value': list(metricas.values())}),
+        'quality_score': score,
+    }
+
+
+def classification(score_final):
+    """Classificação do notebook para o score final."""
+    if score_final >= 90:
+        return "EXCELENTE"
+    if score_final >= 80:
+        return "BOM"
+    if score_final >= 70:
+        return "REGULAR"
+    return "NECESSITA MELHORIAS"
+
+
+def write_quality(tabelas, data_path):
+    caminho = os.path.join(data_path, QUALITY_DIR)
+    os.makedirs(caminho, exist_ok=True)
+    with span("write_quality"):
+        for nome, tabela in tabelas.items():
+            tabela.to_parquet(os.path.join(caminho, f"{nome}.parquet"), index=False)
+    return caminho
+
+
+def quality_gate(score):
+    """Levanta QualityGateError se alguma dimensão ficou abaixo do mínimo."""
+    reprovadas = score[~score['Passed']]
+    if len(reprovadas):
+        detalhes = ", ".join(
+            f"{linha.Dimension} {linha.Score:.2f} < {linha.Threshold:.2f}" for linha in reprovadas.itertuples()
+        )
+        raise QualityGateError(f"qualidade da silver abaixo do mínimo: {detalhes}")
@@ -0,0 +1,236 @@
+# Runner em memória do pipeline Bronze > Silver > Quality > Gold > Load.
+#
+# Executa as camadas no mesmo processo, passando os DataFrames de uma etapa
+# para a seguinte sem reler parquet do disco. Os parquets de cada camada
+# (checkpoints) continuam sendo gravados por padrão, para que os scripts
+# 01..04 e as análises possam usá-los, mas podem ser desligados. No modo
+# incremental a bronze, a silver e a gold são o estado da próxima execução
+# e são gravadas sempre.
+#
+# Uso pela linha de comando (a partir da pasta dags):
+#   python -m etl.runner [--base-dir /opt/airflow/dags] [--no-checkpoints]
+#                        [--stages bronze silver quality gold load] [--csv data.csv]
+#                        [--workers 4] [--partition month|customer]
+#
+# No Airflow o pipeline_ecommerce.py chama run_pipeline() em um único
+# PythonOperator (PIPELINE_RUNNER=inprocess).
+
+import argparse
+import os
+
+from etl.bronze import (
+    BATCH_SIZE_PADRAO,
+    changed_months,
+    download_source,
+    read_bronze,
+    read_changed_partitions,
+    run_bronze,
+)
+from etl.cache import WAREHOUSE_SNAPSHOT, publish_snapshot
+from etl.dataset import READS, read_inputs
+from etl.gold import TOP_N_PADRAO, build_gold, read_cubes, read_rfm_state, read_star_schema, write_gold
+from etl.keys import KEYS_DIR, read_registries, write_registries
+from etl.quality import (
+    profile_frame,
+    profile_parquet,
+    quality_gate,
+    quality_tables,
+    read_thresholds,
+    write_quality,
+)
+from etl.schema import apply_schema
+from etl.silver import clean, clean_incremental, incremental_partitions, read_silver, silver_files
+from etl.telemetry import StageTelemetry, default_run_id, span
+
+BASE_DIR = "/opt/airflow/dags"
+STAGES = ['bronze', 'silver', 'quality', 'gold', 'load']
+
+
+def _ler_bronze(data_path, bronze_mode, particoes=None):
+    if bronze_mode == "incremental":
+        return read_bronze(f"{data_path}/bronze", particoes)
+    return apply_schema(read_inputs(data_path, 'silver')['bronze'])
+
+
+def run_pipeline(base_dir=BASE_DIR, stages=STAGES, checkpoints=True, csv_path=None,
+                 bronze_mode=None, batch_size=None, load_mode=None, load_method=None,
+                 gold_engine=None, workers=None, particao=None, load_workers=None):
+    """Executa as etapas pedidas em sequência, com handoff em memória.
+
+    Uma etapa cuja anterior não está em `stages` lê a entrada do checkpoint
+    em disco. Retorna {etapa: (registros, segundos)}.
+    """
+    data_path = f"{base_dir}/data"
+    bronze_mode = bronze_mode or os.environ.get("BRONZE_MODE", "full")
+    batch_size = batch_size or int(os.environ.get("BRONZE_BATCH_SIZE", BATCH_SIZE_PADRAO))
+    load_mode = load_mode or os.environ.get("LOAD_MODE", "merge")
+    load_method = load_method or os.environ.get("LOAD_METHOD", "copy")
+    # Conexões da carga com LOAD_METHOD=parallel (etl/parallel_load.py)
+    load_workers = load_workers or int(os.environ.get("LOAD_WORKERS", 4))
+    gold_engine = gold_engine or os.environ.get("GOLD_ENGINE", "pandas")
+    # Processos da silver e das agregações da gold (etl/parallel.py); 1 = serial
+    workers = workers or int(os.environ.get("PIPELINE_WORKERS", 1))
+    particao = particao or os.environ.get("PIPELINE_PARTITION", "month")
+
+    resultados = {}
+    # Mesmo run_id para todas as etapas na telemetria (etl/telemetry.py)
+    run_id = default_run_id()
+
+    def etapa(nome):
+        return StageTelemetry(nome, base_dir, run_id)
+
+    def concluir(nome, registros, telemetria, linhas_entrada=None):
+        # telemetry.db + linha do logs_pipeline.csv, como faziam os scripts 01..04
+        duracao = telemetria.finish(registros, linhas_entrada)
+        resultados[nome] = (registros, duracao)
+        print(f"{nome:<7} {registros:>9} registros em {duracao:.2f}s")
+
+    df_bronze = df_clean = tabelas_gold = None
+    # Partições da bronze limpas pela silver incremental (None = todas)
+    particoes = None
+
+    if 'bronze' in stages:
+        with etapa('bronze') as telemetria:
+            if csv_path is None:
+                with span("download"):
+                    csv_path = download_source()
+            df_bronze, registros = run_bronze(
+                csv_path,
+                f"{data_path}/bronze",
+                modo=bronze_mode,
+                batch_size=batch_size,
+                checkpoint=checkpoints,
+            )
+            concluir('bronze', registros, telemetria)
+
+    if 'silver' in stages:
+        with etapa('silver') as telemetria:
+            # Incremental: só as partições alteradas pelo último lote da
+            # bronze (todas na primeira execução), ver etl/silver.py
+            if bronze_mode == "incremental":
+                particoes = incremental_partitions(f"{data_path}/bronze", f"{data_path}/silver")
+            if df_bronze is None:
+                with span("read_bronze") as passo:
+                    df_bronze = _ler_bronze(data_path, bronze_mode, particoes)
+                    passo.linhas_saida = len(df_bronze)
+            linhas_bronze = len(df_bronze)
+            if bronze_mode == "incremental":
+                # O dataset da silver é o estado da camada: gravado mesmo sem checkpoints
+                df_clean = clean_incremental(df_bronze, f"{data_path}/silver", particoes, workers, particao)
+            else:
+                df_clean = clean(df_bronze, workers, particao)
+                if checkpoints:
+                    with span("write_silver", len(df_clean)):
+                        os.makedirs(f"{data_path}/silver", exist_ok=True)
+                        df_clean.to_parquet(f"{data_path}/silver/dados_limpos.parquet", index=False)
+            del df_bronze
+            concluir('silver', df_clean.shape[0], telemetria, linhas_bronze)
+
+    if 'quality' in stages:
+        # Perfil da silver em uma passada; um score abaixo do mínimo
+        # interrompe o pipeline antes da gold (etl/quality.py)
+        with etapa('quality') as telemetria:
+            if df_clean is None and bronze_mode == "incremental":
+                # As partições da silver reprocessadas pelo último lote
+                perfil = profile_parquet(silver_files(
+                    f"{data_path}/silver", read_changed_partitions(f"{data_path}/bronze")
+                ))
+            elif df_clean is None:
+                perfil = profile_parquet(f"{data_path}/silver/dados_limpos.parquet")
+            else:
+                perfil = profile_frame(df_clean)
+            # Incremental sem linhas novas na bronze: nada a avaliar
+            if perfil.linhas or bronze_mode != "incremental":
+                tabelas_qualidade = quality_tables(perfil, read_thresholds())
+                write_quality(tabelas_qualidade, data_path)
+                # Reprovada, a etapa fica registrada como falha na telemetria
+                quality_gate(tabelas_qualidade['quality_score'])
+            concluir('quality', perfil.linhas, telemetria, perfil.linhas)
+
+    if 'gold' in stages:
+        with etapa('gold') as telemetria:
+            # Incremental: o modelo estrela da execução anterior recebe só
+            # os meses alterados na bronze, e o RFM (estado por cliente e
+            # mês) e os cubos só reagregam esses meses
+            anterior = rfm_estado = cubos = meses = None
+            with span("read_state"):
+                if bronze_mode == "incremental":
+                    anterior = read_star_schema(f"{data_path}/gold")
+                    rfm_estado = read_rfm_state(f"{data_path}/gold")
+                    cubos = read_cubes(f"{data_path}/gold")
+                    meses = changed_months(f"{data_path}/bronze")
+                chaves = read_registries(f"{data_path}/{KEYS_DIR}")
+            if bronze_mode == "incremental" and df_clean is not None and particoes is None:
+                # A silver em memória tem todas as partições: gold inteira
+                anterior = None
+            elif bronze_mode == "incremental" and (df_clean is None or anterior is None):
+                with span("read_silver") as passo:
+                    # Só as partições alteradas; sem gold anterior, todas
+                    particoes = read_changed_partitions(f"{data_path}/bronze") if anterior is not None else None
+                    df_clean = read_silver(f"{data_path}/silver", particoes, READS['gold']['silver'][0])
+                    passo.linhas_saida = len(df_clean)
+            elif df_clean is None:
+                with span("read_silver") as passo:
+                    # Só as colunas usadas pela gold (etl/dataset.py)
+                    df_clean = read_inputs(data_path, 'gold')['silver']
+                    passo.linhas_saida = len(df_clean)
+            top_n = int(os.environ.get("GOLD_TOP_N", TOP_N_PADRAO))
+            tabelas_gold = build_gold(df_clean, rfm_estado, chaves, top_n, gold_engine, cubos, meses,
+                                      workers, particao, anterior)
+            linhas_silver = df_clean.shape[0]
+            del df_clean
+            # No incremental a gold gravada (modelo estrela, rfm_state e cubos)
+            # é o estado que a próxima execução emenda: gravada mesmo sem
+            # checkpoints, como a silver e o registro de chaves
+            if checkpoints or bronze_mode == "incremental":
+                write_gold(tabelas_gold, f"{data_path}/gold")
+            # O registro de chaves é gravado mesmo sem checkpoints: é ele que
+            # mantém os IDs estáveis entre execuções
+            with span("write_registries"):
+                write_registries(chaves, f"{data_path}/{KEYS_DIR}")
+            # Saída: linhas da fact_all (no incremental, o modelo emendado inteiro)
+            concluir('gold', len(tabelas_gold['fact_all']), telemetria, linhas_silver)
+
+    if 'load' in stages:
+        # Import tardio: sqlalchemy/psycopg2 só são necessários para a carga
+        from etl.load import GOLD_TABLES, load_gold
+        from etl.warehouse import get_engine
+
+        with etapa('load') as telemetria:
+            if tabelas_gold is None:
+                with span("read_gold"):
+                    # Só as tabelas carregadas no DW (e os digests da fact_all)
+                    tabelas_gold = read_inputs(data_path, 'load')
+            engine = get_engine(pool_size=load_workers)
+            carregadas = load_gold(engine, tabelas_gold, load_mode, load_method, GOLD_TABLES, load_workers)
+            # Invalida o cache das consultas ao DW (etl/cache.py)
+            os.makedirs(f"{data_path}/gold", exist_ok=True)
+            publish_snapshot(f"{data_path}/gold/{WAREHOUSE_SNAPSHOT}")
+            registros = carregadas.get('fact_all', (0,))[0]
+            concluir('load', registros, telemetria)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pipeline ecommerce em um único processo')
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--no-checkpoints', dest='checkpoints', action='store_false',
+                        help='não grava os parquets intermediários das camadas (o estado do incremental é gravado sempre)')
+    parser.add_argument('--csv', dest='csv_path', help='CSV de origem (padrão: download do Kaggle)')
+    parser.add_argument('--gold-engine', choices=['pandas', 'polars'],
+                        help='backend da camada gold (padrão: GOLD_ENGINE ou pandas)')
+    parser.add_argument('--workers', type=int,
+                        help='processos da silver e das agregações da gold (padrão: PIPELINE_WORKERS ou 1)')
+    parser.add_argument('--partition', dest='particao', choices=['month', 'customer'],
+                        help='partição dos workers (padrão: PIPELINE_PARTITION ou month)')
+    args = parser.parse_args()
+
+    # Mantém a ordem do pipeline mesmo que as etapas sejam passadas fora de ordem
+    stages = [etapa for etapa in STAGES if etapa in args.stages]
+    run_pipeline(args.base_dir, stages, args.checkpoints, args.csv_path, gold_engine=args.gold_engine,
+                 workers=args.workers, particao=args.particao)
+
+
+if __name__ == '__main__':
+    main()
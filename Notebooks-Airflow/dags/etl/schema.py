@@ -0,0 +1,183 @@
+# # Schema compacto compartilhado pelas camadas Bronze, Silver e Gold
+#
+# - Country / StockCode / Description: category
+# - Quantity: int32
+# - CustomerID: inteiro anulável (Int32)
+# - InvoiceNo: dividido em InvoicePrefix ('', 'A' ajuste, 'C' cancelamento)
+#   e InvoiceNum (int32)
+#
+# - hash_linha: impressão digital de 64 bits (uint64) das colunas de origem
+#   da linha, calculada uma vez na bronze e reaproveitada para duplicatas
+#   (silver, etapa quality), para pular linhas já ingeridas (bronze
+#   incremental) e para o digest das faturas na carga por merge
+#
+# Os tipos são gravados nos metadados pandas do parquet, então voltam iguais
+# na leitura (pd.read_parquet) sem precisar de nova conversão.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Prefixos possíveis de InvoiceNo ('' = venda normal)
+INVOICE_PREFIX_CATEGORIES = ['', 'A', 'C']
+
+CATEGORICAL_COLUMNS = ['StockCode', 'Description', 'Country', 'fonte_arquivos']
+
+# Colunas da linha de origem (sem os metadados de ingestão, que mudam a cada
+# execução) que entram na impressão digital
+SOURCE_COLUMNS = [
+    'InvoicePrefix', 'InvoiceNum', 'StockCode', 'Description', 'Quantity',
+    'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country',
+]
+FINGERPRINT_COLUMN = 'hash_linha'
+
+# hash_linha = soma dos hashes das colunas, cada um multiplicado por um peso
+# ímpar próprio (mod 2**64): trocar o valor de uma coluna só exige
+# recalcular o hash dela (refresh_fingerprint)
+_PESOS = {
+    coluna: np.uint64((2 * posicao + 1) * 0x9E3779B97F4A7C15 % 2 ** 64)
+    for posicao, coluna in enumerate(SOURCE_COLUMNS)
+}
+
+# Colunas da camada gold gravadas como category (textos repetidos)
+GOLD_CATEGORICAL_COLUMNS = [
+    'InvoiceNo', 'StockCode', 'CustomerID', 'Country', 'ProductDescription',
+    'TransactionType', 'Weekday', 'Criterion',
+]
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+# Schema Arrow equivalente (usado na escrita em lotes da bronze)
+ROW_SCHEMA = pa.schema([
+    ('InvoicePrefix', _DICT),
+    ('InvoiceNum', pa.int32()),
+    ('StockCode', _DICT),
+    ('Description', _DICT),
+    ('Quantity', pa.int32()),
+    ('InvoiceDate', pa.string()),
+    ('UnitPrice', pa.float64()),
+    ('CustomerID', pa.int32()),
+    ('Country', _DICT),
+    ('data_ingestao', pa.timestamp('us')),
+    ('fonte_arquivos', _DICT),
+    (FINGERPRINT_COLUMN, pa.uint64()),
+])
+
+
+def split_invoice_no(invoice_no):
+    """Divide InvoiceNo ('C536379') em (prefixo categórico, número int32)."""
+    # O texto é tratado só uma vez por fatura distinta e expandido pelos códigos
+    codigos, faturas = pd.factorize(invoice_no, use_na_sentinel=False)
+    texto = pd.Series(faturas).astype(str)
+    tem_prefixo = texto.str[0].str.isalpha()
+    prefixo = texto.str[0].where(tem_prefixo, '')
+    numero = texto.where(~tem_prefixo, texto.str[1:])
+    return (
+        pd.Categorical(prefixo, categories=INVOICE_PREFIX_CATEGORIES).take(codigos),
+        pd.to_numeric(numero).astype('int32').to_numpy().take(codigos),
+    )
+
+
+def apply_schema(df):
+    """Converte uma tabela de linhas (bronze/silver) para os tipos compactos.
+
+    É idempotente: colunas que já estão no tipo certo não são copiadas.
+    """
+    if 'InvoiceNo' in df.columns:
+        prefixo, numero = split_invoice_no(df['InvoiceNo'])
+        posicao = df.columns.get_loc('InvoiceNo')
+        df = df.drop(columns='InvoiceNo')
+        df.insert(posicao, 'InvoiceNum', numero)
+        df.insert(posicao, 'InvoicePrefix', prefixo)
+    # invoice_key depende dos códigos: um dataset particionado volta só com
+    # os prefixos presentes nos arquivos lidos
+    if 'InvoicePrefix' in df.columns and (
+        not isinstance(df['InvoicePrefix'].dtype, pd.CategoricalDtype)
+        or list(df['InvoicePrefix'].cat.categories) != INVOICE_PREFIX_CATEGORIES
+    ):
+        df['InvoicePrefix'] = df['InvoicePrefix'].astype(pd.CategoricalDtype(INVOICE_PREFIX_CATEGORIES))
+    if 'Quantity' in df.columns and df['Quantity'].dtype != 'int32':
+        df['Quantity'] = df['Quantity'].astype('int32')
+    if 'CustomerID' in df.columns and df['CustomerID'].dtype != 'Int32':
+        df['CustomerID'] = df['CustomerID'].astype('Int32')
+    for coluna in CATEGORICAL_COLUMNS:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    # Tabelas gravadas antes de hash_linha existir (ou concatenadas com elas)
+    if set(SOURCE_COLUMNS) <= set(df.columns) and (
+        FINGERPRINT_COLUMN not in df.columns or df[FINGERPRINT_COLUMN].dtype != 'uint64'
+    ):
+        df[FINGERPRINT_COLUMN] = row_fingerprint(df)
+    return df
+
+
+def _hash_coluna(serie):
+    # Hash pelo valor: categóricas só hasheiam as categorias e expandem pelos
+    # códigos, então o resultado não depende do dicionário de cada lote
+    return pd.util.hash_pandas_object(serie, index=False).to_numpy()
+
+
+def row_fingerprint(df):
+    """Impressão digital de 64 bits de cada linha, sobre SOURCE_COLUMNS já no schema compacto."""
+    impressao = np.zeros(len(df), dtype='uint64')
+    for coluna, peso in _PESOS.items():
+        impressao += _hash_coluna(df[coluna]) * peso
+    return impressao
+
+
+def refresh_fingerprint(df, coluna, anterior):
+    """hash_linha depois de `coluna` mudar, sem re-hashear as outras colunas.
+
+    `anterior` são os valores antigos da coluna, alinhados com `df`.
+    """
+    delta = (_hash_coluna(df[coluna]) - _hash_coluna(anterior)) * _PESOS[coluna]
+    return df[FINGERPRINT_COLUMN].to_numpy() + delta
+
+
+def compact_gold(df):
+    """Tipos compactos para as tabelas da camada gold."""
+    for coluna in GOLD_CATEGORICAL_COLUMNS:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    if 'Quantity' in df.columns and pd.api.types.is_integer_dtype(df['Quantity']):
+        df['Quantity'] = df['Quantity'].astype('int32')
+    return df
+
+
+def invoice_key(df):
+    """Chave inteira única por fatura (número + prefixo), para agrupar sem strings."""
+    return df['InvoiceNum'].astype('int64') * len(INVOICE_PREFIX_CATEGORIES) + df['InvoicePrefix'].cat.codes
+
+
+def invoice_labels(chaves):
+    """InvoiceNo textual ('C536379') de cada chave de invoice_key."""
+    chaves = pd.Index(chaves)
+    n = len(INVOICE_PREFIX_CATEGORIES)
+    return pd.Index(INVOICE_PREFIX_CATEGORIES).take(chaves % n) + pd.Index(chaves // n).astype(str)
+
+
+def invoice_no(df):
+    """Reconstrói InvoiceNo como texto (categórico), formatando só as faturas distintas."""
+    codigos, chaves = pd.factorize(invoice_key(df))
+    return pd.Series(pd.Categorical.from_codes(codigos, invoice_labels(chaves)), index=df.index)
+
+
+def customer_id_labels(customer_id, ausente='nan'):
+    """CustomerID como texto no formato histórico do gold ('17850.0').
+
+    As tabelas gold e o banco usam a representação textual do antigo float;
+    a conversão é feita só sobre os clientes distintos.
+    """
+    rotulos = customer_id.astype('category')
+    rotulos = rotulos.cat.rename_categories([str(float(c)) for c in rotulos.cat.categories])
+    if ausente not in rotulos.cat.categories:
+        rotulos = rotulos.cat.add_categories([ausente])
+    return rotulos.fillna(ausente)
+
+
+def memory_report(df, camada):
+    """Resumo do uso de memória (MB) por coluna, com o total na última linha."""
+    uso = df.memory_usage(deep=True, index=False) / 1024 ** 2
+    relatorio = pd.DataFrame({'camada': camada, 'coluna': uso.index, 'tipo': df.dtypes.astype(str).values, 'MB': uso.values})
+    total = pd.DataFrame({'camada': [camada], 'coluna': ['TOTAL'], 'tipo': [''], 'MB': [uso.sum()]})
+    return pd.concat([relatorio, total], ignore_index=True).round({'MB': 2})
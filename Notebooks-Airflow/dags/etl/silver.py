@@ -0,0 +1,246 @@
+# # Camada Silver - funções de limpeza vetorizadas
+#
+# Todas as funções operam sobre colunas inteiras (map / groupby-any / isin),
+# sem `apply(axis=1)` nem lambdas por grupo, e produzem o mesmo resultado
+# da versão original do 02_silver_layer.py.
+#
+# No modo incremental (BRONZE_MODE=incremental) a silver é um dataset
+# particionado como o da bronze:
+#
+#   silver/dataset/year=2011/month=12/dados_limpos.parquet
+#
+# e cada execução só limpa as partições da bronze alteradas pelo último
+# lote, substituindo as mesmas partições da silver (clean_incremental). O
+# mapeamento StockCode -> Description do histórico fica em
+# silver/_descricoes.parquet. Como _changed_partitions.json só guarda o
+# último lote, cada ingestão da bronze precisa ser seguida da silver.
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from etl.bronze import (
+    DATASET_DIR,
+    dataset_files,
+    parse_invoice_date,
+    partition_name,
+    read_changed_partitions,
+    read_dataset,
+)
+from etl.schema import FINGERPRINT_COLUMN, apply_schema, refresh_fingerprint
+from etl.telemetry import span
+
+DESCRIPTIONS_FILE = "_descricoes.parquet"
+SILVER_FILE = "dados_limpos.parquet"
+
+# Linhas de tarifas
+STOCKCODE_FEES = ['C2', 'DOT', 'POST', 'AMAZONFEE']
+
+# Prefixos de InvoiceNo: 'C' = cancelamento, 'A' = ajuste
+INVOICE_PREFIXES = ('C', 'A')
+
+
+def null_mix_by_key(df, key, col):
+    """Para cada valor de `key`, indica se `col` tem algum nulo e algum não nulo.
+
+    Equivale aos pares `groupby(key)[col].apply(lambda x: x.isnull().any())`
+    e `...notnull().any()`, mas agrega uma máscara booleana já calculada.
+    `key` pode ser o nome de uma coluna ou uma Series alinhada (ex.: invoice_key).
+    """
+    if isinstance(key, str):
+        key = df[key]
+    is_null = df[col].isna()
+    grupos = is_null.groupby(key, sort=False, observed=True)
+    null_any = grupos.any()
+    # "algum não nulo" <=> nem todos são nulos
+    notnull_any = ~grupos.all()
+    return null_any, notnull_any
+
+
+def build_description_map(df):
+    """Mapeamento StockCode -> primeira Description válida."""
+    return (
+        df.dropna(subset=['Description'])
+        .groupby('StockCode', sort=False, observed=True)['Description']
+        .first()
+    )
+
+
+def description_map(df, workers=1, particao='month'):
+    """build_description_map; com `workers` > 1, montado por partição (etl/parallel.py)."""
+    if workers > 1:
+        # Import tardio: etl.parallel depende de etl.gold, que importa este módulo
+        from etl.parallel import partitioned_description_map
+
+        return partitioned_description_map(df, workers, particao)
+    return build_description_map(df)
+
+
+def plain_description_map(mapa):
+    """Mapa StockCode -> Description com índice e valores object.
+
+    build_description_map devolve índice e valores categóricos, e
+    Series.map com um mapa categórico troca as descrições (usa os códigos
+    das categorias em vez dos valores).
+    """
+    mapa = mapa.astype(object)
+    mapa.index = mapa.index.astype(object)
+    return mapa
+
+
+def extend_description_map(anterior, novo):
+    """Mapa do histórico (`anterior`) com os StockCodes que só aparecem em `novo`.
+
+    Os produtos já mapeados mantêm a Description escolhida antes, então as
+    partições da silver que não são reprocessadas continuam coerentes.
+    """
+    novo = plain_description_map(novo)
+    if anterior is None:
+        return novo
+    return pd.concat([anterior, novo[~novo.index.isin(anterior.index)]])
+
+
+def read_description_map(silver_path):
+    """Mapa StockCode -> Description gravado pela silver incremental, ou None."""
+    caminho = os.path.join(silver_path, DESCRIPTIONS_FILE)
+    if not os.path.exists(caminho):
+        return None
+    tabela = pq.read_table(caminho).to_pandas()
+    indice = pd.Index(tabela['StockCode'].to_numpy(), name='StockCode')
+    return pd.Series(tabela['Description'].to_numpy(), index=indice, name='Description')
+
+
+def write_description_map(mapa, silver_path):
+    caminho = os.path.join(silver_path, DESCRIPTIONS_FILE)
+    tmp = f"{caminho}.tmp"
+    pq.write_table(pa.table({
+        'StockCode': pa.array(mapa.index.astype(str), pa.string()),
+        'Description': pa.array(mapa.to_numpy(), pa.string()),
+    }), tmp)
+    os.replace(tmp, caminho)
+
+
+def fill_descriptions(df, mapa_descricoes=None):
+    """Padroniza Description pelo StockCode, mantendo o valor original sem mapeamento."""
+    if mapa_descricoes is None:
+        mapa_descricoes = build_description_map(df)
+    mapa_descricoes = plain_description_map(mapa_descricoes)
+    descricao = df['Description']
+    preenchido = df['StockCode'].map(mapa_descricoes).astype(object).fillna(descricao.astype(object))
+    return preenchido.astype(descricao.dtype.name)
+
+
+def invoice_prefix_mask(df, prefixes=INVOICE_PREFIXES):
+    """Máscara das faturas que começam com algum dos prefixos (cancelamentos/ajustes)."""
+    if 'InvoicePrefix' in df.columns:
+        return df['InvoicePrefix'].isin(prefixes)
+    return df['InvoiceNo'].astype(str).str.startswith(prefixes)
+
+
+def inconsistency_mask(df, stockcode_fees=STOCKCODE_FEES):
+    """Cancelamentos, ajustes, Quantity/UnitPrice <= 0 e linhas de tarifas."""
+    return (
+        invoice_prefix_mask(df)
+        | (df['Quantity'] <= 0)
+        | (df['UnitPrice'] <= 0)
+        | df['StockCode'].isin(stockcode_fees)
+    )
+
+
+def iqr_outlier_mask(serie, fator=1.5):
+    """Outliers pelo intervalo interquartil (Q1 - 1.5*IQR, Q3 + 1.5*IQR)."""
+    q1, q3 = serie.quantile([0.25, 0.75])
+    iqr = q3 - q1
+    return (serie < (q1 - fator * iqr)) | (serie > (q3 + fator * iqr))
+
+
+def clean(df, workers=1, particao='month', mapa_descricoes=None):
+    """Aplica as transformações da camada Silver e devolve uma nova tabela.
+
+    Com `workers` > 1 o mapeamento de descrições é montado por partição
+    (`particao`: 'month' ou 'customer') em um pool de processos (etl/parallel.py).
+    `mapa_descricoes` substitui o mapeamento montado a partir de `df`.
+    """
+    with span("apply_schema", len(df)):
+        df_clean = apply_schema(df.copy())
+    with span("fill_descriptions", len(df_clean)):
+        if mapa_descricoes is None:
+            mapa_descricoes = description_map(df_clean, workers, particao)
+        anterior = df_clean['Description']
+        df_clean['Description'] = fill_descriptions(df_clean, mapa_descricoes)
+        # hash_linha passa a ser o da linha limpa: só o hash de Description muda
+        df_clean[FINGERPRINT_COLUMN] = refresh_fingerprint(df_clean, 'Description', anterior)
+    return df_clean
+
+
+def incremental_partitions(bronze_path, silver_path):
+    """Partições da bronze que a silver incremental processa.
+
+    As alteradas pelo último lote da bronze ou, na primeira execução (sem o
+    mapa de descrições da silver), todas (None).
+    """
+    if read_description_map(silver_path) is None:
+        return None
+    return read_changed_partitions(bronze_path)
+
+
+def write_silver_partitions(df_clean, silver_path):
+    """Substitui no dataset da silver as partições (mês de InvoiceDate) das linhas de df_clean.
+
+    Retorna as partições gravadas.
+    """
+    codigos, datas = pd.factorize(df_clean['InvoiceDate'])
+    datas = parse_invoice_date(pd.Series(datas.astype(object)))
+    mes = (datas.dt.year * 100 + datas.dt.month).to_numpy()[codigos]
+    particoes = []
+    for ano_mes, df_part in df_clean.groupby(mes, sort=True):
+        particao = partition_name(ano_mes // 100, ano_mes % 100)
+        destino = os.path.join(silver_path, DATASET_DIR, particao)
+        os.makedirs(destino, exist_ok=True)
+        # Cada arquivo só com as categorias do seu mês
+        df_part = df_part.copy()
+        for coluna in df_part.select_dtypes('category').columns:
+            df_part[coluna] = df_part[coluna].cat.remove_unused_categories()
+        caminho = os.path.join(destino, SILVER_FILE)
+        df_part.to_parquet(f"{caminho}.tmp", index=False)
+        os.replace(f"{caminho}.tmp", caminho)
+        particoes.append(particao)
+    return particoes
+
+
+def silver_files(silver_path, partitions=None):
+    """Parquets do dataset da silver incremental (padrão: todas as partições)."""
+    return dataset_files(os.path.join(silver_path, DATASET_DIR), partitions)
+
+
+def read_silver(silver_path, partitions=None, colunas=None):
+    """Lê o dataset da silver incremental (todas as partições ou apenas as informadas)."""
+    return apply_schema(read_dataset(os.path.join(silver_path, DATASET_DIR), partitions, colunas, nome="silver"))
+
+
+def clean_incremental(df, silver_path, particoes=None, workers=1, particao='month'):
+    """Silver incremental: limpa `df`, as partições `particoes` da bronze
+    (None = todas, ver incremental_partitions), e substitui essas partições
+    no dataset da silver.
+
+    Description é preenchida pelo mapa do histórico: só os StockCodes novos
+    entram nele (extend_description_map). O mapa é gravado depois das
+    partições. Devolve a silver das partições processadas.
+    """
+    if df.empty:
+        return df
+    anterior = read_description_map(silver_path) if particoes is not None else None
+    with span("description_map", len(df)):
+        mapa = extend_description_map(anterior, description_map(apply_schema(df), workers, particao))
+    df_clean = clean(df, workers, particao, mapa)
+    with span("write_silver", len(df_clean)):
+        write_silver_partitions(df_clean, silver_path)
+        write_description_map(mapa, silver_path)
+    return df_clean
+
+
+def duplicated_rows(df):
+    """Linhas duplicadas nas colunas de origem, pela hash_linha (sem re-hashear a tabela)."""
+    return int(df[FINGERPRINT_COLUMN].duplicated().sum())
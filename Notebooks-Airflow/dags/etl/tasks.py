@@ -0,0 +1,294 @@
+# Tarefas independentes da gold e da carga, para o DAG em leque
+# (PIPELINE_RUNNER=fanout no pipeline_ecommerce.py).
+#
+# Depois da silver a gold é dividida em:
+# - gold_model: chaves, dimensões e fact_all (a única que grava os registros
+#   de chaves)
+# - gold_rfm, gold_most_purchased_products, gold_metrics, gold_cubes: cada
+#   uma lê da camada gold só as tabelas, colunas e linhas de que precisa
+#   (etl.dataset.READS) e grava as suas
+# e a carga tem uma task por tabela do DW, que depende só da task gold que
+# produz a tabela e das cargas das dimensões referenciadas por chave
+# estrangeira (dim_customer -> dim_country; fact_all -> as quatro
+# dimensões). Cada carga é uma transação própria; a carga por merge é
+# idempotente, então uma task que falha pode ser repetida sozinha.
+#
+# task_graph() devolve o grafo {tarefa: (função, argumentos, dependências)}
+# usado para montar o DAG e por run_graph(), que executa o mesmo grafo fora
+# do Airflow com até `paralelismo` tarefas simultâneas. O tempo total fica
+# limitado pelo caminho crítico (gold_model > dimensões > fact_all), não
+# pela soma das tarefas.
+#
+# Este módulo não importa pandas/pyarrow no topo: o parse do DAG só precisa
+# do grafo.
+#
+# Uso (a partir da pasta dags, com a silver pronta):
+#   python -m etl.tasks [--base-dir /opt/airflow/dags] [--parallelism 4]
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from etl.telemetry import StageTelemetry, default_run_id, span
+
+BASE_DIR = "/opt/airflow/dags"
+
+# Tabelas gravadas por cada task da gold
+GOLD_TASK_OUTPUTS = {
+    'gold_model': ['dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'fact_all_digest'],
+    'gold_rfm': ['rfm', 'rfm_state'],
+    'gold_most_purchased_products': ['most_purchased_products'],
+    'gold_metrics': ['metrics'],
+    'gold_cubes': ['cube_daily_country', 'cube_monthly_country', 'cube_monthly_product'],
+}
+
+# Tabelas carregadas no DW (as de etl.load.GOLD_TABLES, repetidas aqui para
+# o parse do DAG não importar pyarrow) e as que precisam estar carregadas antes
+LOAD_TABLES = [
+    'dim_country', 'dim_date', 'dim_customer', 'dim_product', 'fact_all', 'metrics',
+    'cube_daily_country', 'cube_monthly_country', 'cube_monthly_product',
+]
+LOAD_FOREIGN_KEYS = {
+    'dim_customer': ['dim_country'],
+    'fact_all': ['dim_country', 'dim_date', 'dim_customer', 'dim_product'],
+}
+
+
+def _incremental():
+    return os.environ.get("BRONZE_MODE", "full") == "incremental"
+
+
+def _ler_gold(data_path, tarefa, filtros=None, tabelas=None):
+    # Tabelas, colunas e filtros que a tarefa declara em etl.dataset.READS
+    from etl.dataset import read_inputs
+
+    with span("read_gold"):
+        return read_inputs(data_path, tarefa, filtros, tabelas)
+
+
+def _gravar_gold(tabelas, gold_path):
+    from etl.gold import write_gold
+    from etl.schema import compact_gold
+
+    write_gold({nome: compact_gold(tabela) for nome, tabela in tabelas.items()}, gold_path)
+
+
+def run_gold_model(base_dir=BASE_DIR):
+    """Dimensões e fact_all, com as chaves do registro persistente.
+
+    No modo incremental só as partições da silver alteradas pelo último lote
+    são modeladas e emendadas ao modelo anterior (etl.gold.splice_star_schema).
+    """
+    from etl.bronze import changed_months, read_changed_partitions
+    from etl.dataset import READS, read_inputs
+    from etl.gold import build_star_schema, read_star_schema, splice_star_schema
+    from etl.keys import KEYS_DIR, read_registries, write_registries
+    from etl.silver import read_silver
+
+    data_path = f"{base_dir}/data"
+    with StageTelemetry("gold_model", base_dir) as telemetria:
+        anterior = read_star_schema(f"{data_path}/gold") if _incremental() else None
+        with span("read_silver") as passo:
+            if _incremental():
+                # Sem modelo anterior, todas as partições da silver
+                particoes = read_changed_partitions(f"{data_path}/bronze") if anterior is not None else None
+                df_clean = read_silver(f"{data_path}/silver", particoes, READS['gold']['silver'][0])
+            else:
+                df_clean = read_inputs(data_path, 'gold')['silver']
+            passo.linhas_saida = len(df_clean)
+        registros = read_registries(f"{data_path}/{KEYS_DIR}")
+        if anterior is None:
+            modelo = build_star_schema(df_clean, registros)
+        elif len(df_clean):
+            with span("splice", len(df_clean)):
+                modelo = splice_star_schema(anterior, build_star_schema(df_clean, registros),
+                                            changed_months(f"{data_path}/bronze"), registros)
+        else:
+            modelo = anterior
+        _gravar_gold(modelo, f"{data_path}/gold")
+        # O registro só é gravado depois da gold
+        with span("write_registries"):
+            write_registries(registros, f"{data_path}/{KEYS_DIR}")
+        return len(modelo['fact_all']), telemetria.finish(len(modelo['fact_all']), len(df_clean))
+
+
+def run_gold_rfm(base_dir=BASE_DIR):
+    """RFM e o seu estado; no modo incremental só os meses alterados na bronze são reagregados."""
+    from etl.bronze import changed_months
+    from etl.gold import RFM_STATE, month_date_ids, read_rfm_state, rfm_from_state, update_rfm_state
+
+    data_path = f"{base_dir}/data"
+    gold_path = f"{data_path}/gold"
+    with StageTelemetry("gold_rfm", base_dir) as telemetria:
+        modelo = _ler_gold(data_path, 'gold_rfm', tabelas=['dim_date'])
+        rfm_estado = meses = filtros = None
+        if _incremental():
+            rfm_estado = read_rfm_state(gold_path)
+            meses = changed_months(f"{data_path}/bronze")
+        if rfm_estado is not None:
+            # Só as vendas dos meses alterados (DateID desses meses)
+            filtros = {'fact_all': [('DateID', 'in', month_date_ids(modelo['dim_date'], meses).tolist())]}
+        # Só as vendas: os row groups sem vendas nem são lidos
+        modelo.update(_ler_gold(data_path, 'gold_rfm', filtros, ['fact_all']))
+        fact_sales = modelo['fact_all']
+        with span("rfm", len(fact_sales)) as passo:
+            rfm_estado = update_rfm_state(rfm_estado, fact_sales, modelo['dim_date'], meses)
+            rfm = rfm_from_state(rfm_estado)
+            passo.linhas_saida = len(rfm)
+        _gravar_gold({'rfm': rfm, RFM_STATE: rfm_estado}, gold_path)
+        return len(rfm), telemetria.finish(len(rfm), len(fact_sales))
+
+
+def run_gold_most_purchased_products(base_dir=BASE_DIR):
+    """Top N produtos por cliente (GOLD_TOP_N)."""
+    from etl.gold import TOP_N_PADRAO, build_most_purchased_products
+
+    gold_path = f"{base_dir}/data/gold"
+    top_n = int(os.environ.get("GOLD_TOP_N", TOP_N_PADRAO))
+    with StageTelemetry("gold_most_purchased_products", base_dir) as telemetria:
+        fact_sales = _ler_gold(f"{base_dir}/data", 'gold_most_purchased_products')['fact_all']
+        with span("most_purchased_products", len(fact_sales)) as passo:
+            top = build_most_purchased_products(fact_sales, top_n)
+            passo.linhas_saida = len(top)
+        _gravar_gold({'most_purchased_products': top}, gold_path)
+        return len(top), telemetria.finish(len(top), len(fact_sales))
+
+
+def run_gold_metrics(base_dir=BASE_DIR):
+    """Vendas, pedidos, clientes, produtos e unidades."""
+    from etl.gold import build_metrics, split_fact_all
+
+    gold_path = f"{base_dir}/data/gold"
+    with StageTelemetry("gold_metrics", base_dir) as telemetria:
+        modelo = _ler_gold(f"{base_dir}/data", 'gold_metrics')
+        with span("metrics"):
+            metrics = build_metrics(*split_fact_all(modelo['fact_all']), modelo['dim_customer'],
+                                    modelo['dim_product'])
+        _gravar_gold({'metrics': metrics}, gold_path)
+        return len(metrics), telemetria.finish(len(metrics), len(modelo['fact_all']))
+
+
+def run_gold_cubes(base_dir=BASE_DIR):
+    """Cubos dos dashboards; no modo incremental só os meses alterados na bronze."""
+    from etl.bronze import changed_months
+    from etl.gold import build_cubes, month_date_ids, read_cubes
+
+    data_path = f"{base_dir}/data"
+    gold_path = f"{data_path}/gold"
+    with StageTelemetry("gold_cubes", base_dir) as telemetria:
+        modelo = _ler_gold(data_path, 'gold_cubes', tabelas=['dim_date'])
+        cubos = meses = filtros = None
+        if _incremental():
+            cubos = read_cubes(gold_path)
+            meses = changed_months(f"{data_path}/bronze")
+        if cubos is not None and meses is not None:
+            # Só as linhas da fact_all dos meses alterados (DateID desses meses)
+            filtros = {'fact_all': [('DateID', 'in', month_date_ids(modelo['dim_date'], meses).tolist())]}
+        modelo.update(_ler_gold(data_path, 'gold_cubes', filtros, ['fact_all']))
+        with span("cubes", len(modelo['fact_all'])) as passo:
+            cubos = build_cubes(modelo['fact_all'], modelo['dim_date'], cubos, meses)
+            passo.linhas_saida = linhas = sum(len(cubo) for cubo in cubos.values())
+        _gravar_gold(cubos, gold_path)
+        return linhas, telemetria.finish(linhas, len(modelo['fact_all']))
+
+
+def run_load_table(base_dir=BASE_DIR, tabela=None):
+    """Carrega uma tabela da camada gold no DW (LOAD_MODE / LOAD_METHOD / LOAD_WORKERS).
+
+    Em uma transação própria, exceto a fact_all com LOAD_METHOD=parallel.
+    """
+    from etl.load import load_gold
+    from etl.warehouse import get_engine
+
+    workers = int(os.environ.get("LOAD_WORKERS", 4))
+    with StageTelemetry(f"load_{tabela}", base_dir) as telemetria:
+        carregadas = load_gold(
+            get_engine(pool_size=workers),
+            f"{base_dir}/data/gold",
+            os.environ.get("LOAD_MODE", "merge"),
+            os.environ.get("LOAD_METHOD", "copy"),
+            [tabela],
+            workers,
+        )
+        linhas = carregadas.get(tabela, (0,))[0]
+        return linhas, telemetria.finish(linhas)
+
+
+def publish_warehouse(base_dir=BASE_DIR):
+    """Novo snapshot do DW depois de todas as cargas (invalida o cache de etl/cache.py)."""
+    from etl.cache import WAREHOUSE_SNAPSHOT, publish_snapshot
+
+    return publish_snapshot(f"{base_dir}/data/gold/{WAREHOUSE_SNAPSHOT}")
+
+
+GOLD_TASKS = {
+    'gold_model': run_gold_model,
+    'gold_rfm': run_gold_rfm,
+    'gold_most_purchased_products': run_gold_most_purchased_products,
+    'gold_metrics': run_gold_metrics,
+    'gold_cubes': run_gold_cubes,
+}
+
+
+def task_graph(load_tables=LOAD_TABLES):
+    """Grafo do leque: {tarefa: (função, argumentos, dependências)}, em ordem topológica.
+
+    As funções recebem `base_dir` como primeiro argumento.
+    """
+    grafo = {}
+    for nome, funcao in GOLD_TASKS.items():
+        grafo[nome] = (funcao, {}, [] if nome == 'gold_model' else ['gold_model'])
+    produtora = {tabela: tarefa for tarefa, saidas in GOLD_TASK_OUTPUTS.items() for tabela in saidas}
+    for tabela in load_tables:
+        dependencias = [produtora[tabela]] + [f"load_{fk}" for fk in LOAD_FOREIGN_KEYS.get(tabela, [])]
+        grafo[f"load_{tabela}"] = (run_load_table, {'tabela': tabela}, dependencias)
+    grafo['publish_warehouse'] = (publish_warehouse, {}, [f"load_{tabela}" for tabela in load_tables])
+    return grafo
+
+
+def run_graph(base_dir=BASE_DIR, paralelismo=4, grafo=None):
+    """Executa o grafo fora do Airflow: cada tarefa roda em um processo do pool
+    assim que as suas dependências terminam. Retorna {tarefa: (resultado, segundos)}.
+    """
+    grafo = dict(grafo if grafo is not None else task_graph())
+    # Mesmo run_id na telemetria de todas as tarefas (como o do DAG run no Airflow)
+    os.environ.setdefault("PIPELINE_RUN_ID", default_run_id())
+    concluidas, em_andamento = {}, {}
+    with ProcessPoolExecutor(paralelismo, mp_context=multiprocessing.get_context('fork')) as pool:
+        while grafo or em_andamento:
+            prontas = [nome for nome, (_, _, dependencias) in grafo.items()
+                       if all(dependencia in concluidas for dependencia in dependencias)]
+            for nome in prontas:
+                funcao, argumentos, _ = grafo.pop(nome)
+                em_andamento[pool.submit(funcao, base_dir, **argumentos)] = (nome, time.perf_counter())
+            if not em_andamento:
+                raise ValueError(f"dependências não satisfeitas: {sorted(grafo)}")
+            feitas, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in feitas:
+                nome, inicio = em_andamento.pop(futuro)
+                # Uma tarefa que falha interrompe o grafo, como no Airflow sem retries
+                concluidas[nome] = (futuro.result(), time.perf_counter() - inicio)
+                print(f"{nome:<32} {concluidas[nome][1]:7.2f}s")
+    return concluidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gold e carga em leque (mesmo grafo do DAG fanout)')
+    parser.add_argument('--base-dir', default=BASE_DIR)
+    parser.add_argument('--parallelism', type=int, default=int(os.environ.get("PIPELINE_PARALLELISM", 4)),
+                        help='tarefas simultâneas (padrão: PIPELINE_PARALLELISM ou 4)')
+    parser.add_argument('--skip-load', action='store_true', help='só as tarefas da gold')
+    args = parser.parse_args()
+
+    grafo = task_graph([] if args.skip_load else LOAD_TABLES)
+    if args.skip_load:
+        del grafo['publish_warehouse']
+    inicio = time.perf_counter()
+    run_graph(args.base_dir, args.parallelism, grafo)
+    print(f"total: {time.perf_counter() - inicio:.2f}s com até {args.parallelism} tarefas simultâneas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+# Telemetria por etapa do pipeline (bronze, silver, gold, load).
+#
+# Cada etapa cria um StageTelemetry e marca os seus passos (leitura, cada
+# transformação, cada escrita) com `span(nome)`. Para cada passo e para a
+# etapa inteira são gravados: tempo, status (sucesso/falha + erro), linhas
+# de entrada e saída, bytes lidos e escritos pelo processo (/proc/self/io),
+# RSS ao fim do passo e pico de RSS do processo até ali. Bytes trocados
+# com o banco por socket (COPY do load) não entram no /proc/self/io.
+#
+# Os registros vão para uma tabela SQLite (<base_dir>/telemetry.db), uma
+# linha por passo, gravada assim que o passo termina; passos aninhados têm o
+# nome composto ("write_gold/fact_all"). O logs_pipeline.csv de 5 colunas
+# continua sendo escrito ao fim de cada etapa, agora também com falhas.
+#
+# As funções de etl/ chamam span() sem receber a telemetria por parâmetro:
+# sem etapa ativa no processo, span() não mede nada.
+#
+# Para ver qual passo mudou na última execução:
+#   python -m etl.telemetry --base-dir /opt/airflow/dags --camada gold
+
+import argparse
+import csv
+import os
+import resource
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TELEMETRY_DB = "telemetry.db"
+LOG_FILE = "logs_pipeline.csv"
+
+# Nome do passo que representa a etapa inteira
+TOTAL = "total"
+
+SQL_CREATE_SPANS = """
+CREATE TABLE IF NOT EXISTS spans (
+    run_id TEXT NOT NULL,
+    camada TEXT NOT NULL,
+    passo TEXT NOT NULL,
+    inicio TEXT NOT NULL,
+    tempo_segundos REAL NOT NULL,
+    status TEXT NOT NULL,
+    erro TEXT,
+    linhas_entrada INTEGER,
+    linhas_saida INTEGER,
+    bytes_lidos INTEGER,
+    bytes_escritos INTEGER,
+    rss_mb REAL,
+    pico_rss_mb REAL
+);
+CREATE INDEX IF NOT EXISTS idx_spans_camada_passo ON spans(camada, passo, inicio);
+CREATE INDEX IF NOT EXISTS idx_spans_run ON spans(run_id);
+"""
+
+COLUNAS = [
+    'run_id', 'camada', 'passo', 'inicio', 'tempo_segundos', 'status', 'erro',
+    'linhas_entrada', 'linhas_saida', 'bytes_lidos', 'bytes_escritos', 'rss_mb', 'pico_rss_mb',
+]
+
+# Etapa em andamento neste processo (usada por span())
+_ativa = None
+
+
+def append_log(base_dir, camada, duracao, registros, status="sucesso"):
+    """Grava uma linha no logs_pipeline.csv, no formato histórico de 5 colunas."""
+    with open(os.path.join(base_dir, LOG_FILE), "a", newline="") as f:
+        csv.writer(f).writerow([datetime.now(), camada, status, round(duracao, 2), registros])
+
+
+def default_run_id():
+    """Id da execução: o do DAG run no Airflow, PIPELINE_RUN_ID ou data + pid."""
+    return (
+        os.environ.get("AIRFLOW_CTX_DAG_RUN_ID")
+        or os.environ.get("PIPELINE_RUN_ID")
+        or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+    )
+
+
+def _io_bytes():
+    # rchar/wchar: bytes lidos/escritos pelo processo (arquivos, sockets, pipes)
+    try:
+        with open("/proc/self/io") as f:
+            campos = dict(linha.split(": ") for linha in f.read().splitlines())
+        return int(campos["rchar"]), int(campos["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return round(paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _pico_rss_mb():
+    # ru_maxrss em KB no Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _delta(fim, inicio):
+    return fim - inicio if fim is not None and inicio is not None else None
+
+
+class Span:
+    """Medidas de um passo; linhas_entrada/linhas_saida podem ser preenchidas dentro do `with`."""
+
+    def __init__(self, nome, linhas_entrada=None):
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+
+
+class StageTelemetry:
+    """Telemetria de uma etapa do pipeline; passa a ser a etapa ativa do processo."""
+
+    def __init__(self, camada, base_dir, run_id=None):
+        global _ativa
+        self.camada = camada
+        self.base_dir = base_dir
+        self.run_id = run_id or default_run_id()
+        self.finalizada = False
+        self._pilha = []
+        # bytes lidos/escritos pela própria telemetria (SQLite), descontados dos passos
+        self._proprio = [0, 0]
+        self._inicio = datetime.now()
+        self._t0 = time.perf_counter()
+        self._io0 = self._io_bytes()
+        # --base-dir novo (ex.: python -m etl.runner --base-dir /novo/dir)
+        os.makedirs(base_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(base_dir, TELEMETRY_DB), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SQL_CREATE_SPANS)
+        # Exceção não tratada fora de um passo (scripts 01..04) também vira falha
+        self._excepthook = sys.excepthook
+        sys.excepthook = self._nao_tratada
+        _ativa = self
+
+    def _nao_tratada(self, tipo, erro, tb):
+        self.fail(erro)
+        self._excepthook(tipo, erro, tb)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        # Sem exceção a etapa é concluída por finish(), que recebe as linhas
+        if erro is not None:
+            self.fail(erro)
+        else:
+            self.finish()
+        return False
+
+    def _io_bytes(self):
+        lidos, escritos = _io_bytes()
+        if lidos is None:
+            return None, None
+        return lidos - self._proprio[0], escritos - self._proprio[1]
+
+    def _gravar(self, passo, inicio, t0, io0, status, erro=None, linhas_entrada=None, linhas_saida=None):
+        lidos, escritos = self._io_bytes()
+        linha = (
+            self.run_id, self.camada, passo, inicio.isoformat(), time.perf_counter() - t0, status,
+            f"{type(erro).__name__}: {erro}" if erro is not None else None, linhas_entrada, linhas_saida,
+            _delta(lidos, io0[0]), _delta(escritos, io0[1]), _rss_mb(), _pico_rss_mb(),
+        )
+        if self._conn is None:
+            # Etapa já finalizada (ex.: finish() dentro de um passo): nada a gravar
+            return linha
+        antes = _io_bytes()
+        with self._conn:
+            self._conn.execute(f"INSERT INTO spans ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})",
+                               linha)
+        depois = _io_bytes()
+        if antes[0] is not None:
+            self._proprio[0] += depois[0] - antes[0]
+            self._proprio[1] += depois[1] - antes[1]
+        return linha
+
+    @contextmanager
+    def step(self, nome, linhas_entrada=None):
+        """Mede um passo da etapa; uma exceção grava o passo e a etapa como falha.
+
+        Em passos aninhados cada passo grava a própria falha ao propagar a
+        exceção, e a etapa só é finalizada pelo passo mais externo.
+        """
+        span = Span(nome, linhas_entrada)
+        self._pilha.append(nome)
+        passo = "/".join(self._pilha)
+        inicio, t0, io0 = datetime.now(), time.perf_counter(), self._io_bytes()
+        try:
+            yield span
+        except BaseException as erro:
+            self._pilha.pop()
+            self._gravar(passo, inicio, t0, io0, "falha", erro, span.linhas_entrada, span.linhas_saida)
+            if not self._pilha:
+                self.fail(erro)
+            raise
+        self._pilha.pop()
+        self._gravar(passo, inicio, t0, io0, "sucesso", None, span.linhas_entrada, span.linhas_saida)
+
+    def finish(self, linhas_saida=None, linhas_entrada=None, status="sucesso", erro=None):
+        """Grava a etapa inteira (passo 'total') e a linha do logs_pipeline.csv."""
+        global _ativa
+        if self.finalizada:
+            return
+        self.finalizada = True
+        linha = self._gravar(TOTAL, self._inicio, self._t0, self._io0, status, erro, linhas_entrada, linhas_saida)
+        self._conn.close()
+        self._conn = None
+        if sys.excepthook == self._nao_tratada:
+            sys.excepthook = self._excepthook
+        if _ativa is self:
+            _ativa = None
+        append_log(self.base_dir, self.camada, linha[4], linhas_saida if linhas_saida is not None else 0, status)
+        return linha[4]
+
+    def fail(self, erro):
+        return self.finish(status="falha", erro=erro)
+
+
+@contextmanager
+def _sem_medicao(nome, linhas_entrada):
+    yield Span(nome, linhas_entrada)
+
+
+def span(nome, linhas_entrada=None):
+    """Passo da etapa ativa (StageTelemetry); sem etapa ativa, não mede nada."""
+    if _ativa is None or _ativa.finalizada:
+        return _sem_medicao(nome, linhas_entrada)
+    return _ativa.step(nome, linhas_entrada)
+
+
+def read_spans(base_dir, camada=None):
+    """Todos os registros de telemetria (opcionalmente de uma camada) como DataFrame."""
+    import pandas as pd
+
+    caminho = os.path.join(base_dir, TELEMETRY_DB)
+    if not os.path.exists(caminho):
+        return pd.DataFrame(columns=COLUNAS)
+    with sqlite3.connect(caminho) as conn:
+        if camada is None:
+            return pd.read_sql("SELECT * FROM spans ORDER BY inicio", conn)
+        return pd.read_sql("SELECT * FROM spans WHERE camada = ? ORDER BY inicio", conn, params=(camada,))
+
+
+def compare_last_run(base_dir, camada, historico=10):
+    """Tempo de cada passo na última execução x mediana das `historico` anteriores."""
+    import pandas as pd
+
+    spans = read_spans(base_dir, camada)
+    if spans.empty:
+        return spans
+    execucoes = spans.groupby("run_id")["inicio"].min().sort_values()
+    ultima = execucoes.index[-1]
+    anteriores = execucoes.index[-historico - 1:-1]
+    atual = spans[spans["run_id"] == ultima].groupby("passo", sort=False).agg(
+        tempo_segundos=("tempo_segundos", "sum"),
+        status=("status", "last"),
+        pico_rss_mb=("pico_rss_mb", "max"),
+        bytes_lidos=("bytes_lidos", "sum"),
+        bytes_escritos=("bytes_escritos", "sum"),
+    )
+    mediana = (
+        spans[spans["run_id"].isin(anteriores)]
+        .groupby(["run_id", "passo"])["tempo_segundos"].sum()
+        .groupby("passo").median()
+        .rename("mediana_anterior")
+    )
+    comparacao = atual.join(mediana)
+    comparacao["variacao"] = comparacao["tempo_segundos"] / comparacao["mediana_anterior"] - 1
+    return pd.DataFrame(comparacao).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Passos da última execução x execuções anteriores')
+    parser.add_argument('--base-dir', default="/opt/airflow/dags")
+    parser.add_argument('--camada', required=True,
+                        help='bronze, silver, gold, load ou uma task do DAG em leque (gold_rfm, load_fact_all...)')
+    parser.add_argument('--historico', type=int, default=10, help='execuções anteriores na mediana')
+    args = parser.parse_args()
+
+    comparacao = compare_last_run(args.base_dir, args.camada, args.historico)
+    if comparacao.empty:
+        print(f"Sem telemetria de {args.camada} em {args.base_dir}")
+        return
+    print(comparacao.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == '__main__':
+    main()
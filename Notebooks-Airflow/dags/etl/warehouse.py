@@ -0,0 +1,162 @@
+# Configuração de conexão com o Data Warehouse (Postgres "postgres_dw").
+#
+# Os valores padrão são os do docker-compose; podem ser trocados por variáveis
+# de ambiente (DW_HOST, DW_PORT, ...) ou por uma string completa em
+# DW_CONNECTION_STRING, por exemplo para rodar os benchmarks em outro banco.
+
+import os
+
+from sqlalchemy import create_engine
+
+DB_TYPE = 'postgresql'
+DB_HOST = os.environ.get('DW_HOST', 'postgres_dw')
+DB_USER = os.environ.get('DW_USER', 'postgres')
+DB_PASSWORD = os.environ.get('DW_PASSWORD', 'postgres')
+DB_PORT = os.environ.get('DW_PORT', '5432')
+DB_NAME = os.environ.get('DW_NAME', 'ecommerce_dw')
+
+
+def connection_string():
+    if os.environ.get('DW_CONNECTION_STRING'):
+        return os.environ['DW_CONNECTION_STRING']
+    if DB_TYPE != 'postgresql':
+        raise ValueError("DB_TYPE deve ser 'postgresql'.")
+    return f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+
+def masked_connection_string():
+    return connection_string().replace(f':{DB_PASSWORD}@', ':***@')
+
+
+def get_engine(**kwargs):
+    return create_engine(connection_string(), **kwargs)
+
+
+# ==========================================
+#     SQL PARA CRIAÇÃO DO SCHEMA
+# ==========================================
+
+SQL_CREATE_DIMENSIONS = """
+CREATE TABLE IF NOT EXISTS dim_country (
+    CountryID SERIAL PRIMARY KEY,
+    Country VARCHAR(100) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dim_customer (
+    CustomerID VARCHAR(50) PRIMARY KEY,
+    CountryID INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_country_customer FOREIGN KEY (CountryID)
+        REFERENCES dim_country(CountryID)
+        ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_date (
+    DateID SERIAL PRIMARY KEY,
+    InvoiceDate TIMESTAMP NOT NULL UNIQUE,
+    year INT NOT NULL,
+    month INT NOT NULL,
+    day INT NOT NULL,
+    hour INT NOT NULL,
+    Weekday VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dim_product (
+    StockCode VARCHAR(50) PRIMARY KEY,
+    productdescription VARCHAR(500),
+    UnitPrice DECIMAL(10, 2),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Chaves substitutas estáveis do registro de chaves (etl/keys.py)
+ALTER TABLE dim_customer ADD COLUMN IF NOT EXISTS CustomerKey INT UNIQUE;
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS ProductKey INT UNIQUE;
+"""
+
+# fact_all particionada por mês em InvoiceDate (ver etl/partitions.py): a
+# chave primária inclui a coluna da partição, como o Postgres exige
+SQL_CREATE_FACT = """
+CREATE TABLE IF NOT EXISTS fact_all (
+    fact_id SERIAL,
+    InvoiceNo VARCHAR(50) NOT NULL,
+    StockCode VARCHAR(50) NOT NULL,
+    CustomerID VARCHAR(50),
+    CountryID INT,
+    DateID INT NOT NULL,
+    Quantity INT NOT NULL,
+    UnitPrice DECIMAL(10, 2) NOT NULL,
+    total_value DECIMAL(12, 2) NOT NULL,
+    TransactionType VARCHAR(20) NOT NULL,
+    InvoiceDate TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (fact_id, InvoiceDate),
+    CONSTRAINT fk_product FOREIGN KEY (StockCode) REFERENCES dim_product(StockCode),
+    CONSTRAINT fk_customer FOREIGN KEY (CustomerID) REFERENCES dim_customer(CustomerID),
+    CONSTRAINT fk_country FOREIGN KEY (CountryID) REFERENCES dim_country(CountryID),
+    CONSTRAINT fk_date FOREIGN KEY (DateID) REFERENCES dim_date(DateID)
+) PARTITION BY RANGE (InvoiceDate);
+
+-- Datas: BRIN (linhas de cada partição em ordem de data)
+CREATE INDEX IF NOT EXISTS idx_fact_invoice_date ON fact_all USING brin (InvoiceDate);
+CREATE INDEX IF NOT EXISTS idx_fact_date ON fact_all USING brin (DateID);
+
+-- B-tree por partição só nas colunas seletivas
+CREATE INDEX IF NOT EXISTS idx_fact_invoice ON fact_all(InvoiceNo);
+CREATE INDEX IF NOT EXISTS idx_fact_stock_code ON fact_all(StockCode);
+CREATE INDEX IF NOT EXISTS idx_fact_customer ON fact_all(CustomerID);
+"""
+
+SQL_CREATE_METRICS = """
+CREATE TABLE IF NOT EXISTS metrics (
+    metric_name VARCHAR(100) PRIMARY KEY,
+    metric_value DECIMAL(20, 2),
+    calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(metric_name);
+"""
+
+# Cubos agregados da gold (etl.gold.CUBES): consultas dos dashboards sem
+# varrer a fact_all. Contagens distintas são exatas só no grão de cada cubo.
+SQL_CREATE_CUBES = """
+CREATE TABLE IF NOT EXISTS cube_daily_country (
+    InvoiceDay DATE NOT NULL,
+    CountryID INT NOT NULL,
+    TransactionType VARCHAR(20) NOT NULL,
+    Revenue DECIMAL(14, 2) NOT NULL,
+    Quantity BIGINT NOT NULL,
+    Invoices INT NOT NULL,
+    Customers INT NOT NULL,
+    Lines INT NOT NULL,
+    PRIMARY KEY (InvoiceDay, CountryID, TransactionType)
+);
+
+CREATE TABLE IF NOT EXISTS cube_monthly_country (
+    InvoiceMonth DATE NOT NULL,
+    CountryID INT NOT NULL,
+    TransactionType VARCHAR(20) NOT NULL,
+    Revenue DECIMAL(14, 2) NOT NULL,
+    Quantity BIGINT NOT NULL,
+    Invoices INT NOT NULL,
+    Customers INT NOT NULL,
+    Lines INT NOT NULL,
+    PRIMARY KEY (InvoiceMonth, CountryID, TransactionType)
+);
+
+CREATE TABLE IF NOT EXISTS cube_monthly_product (
+    InvoiceMonth DATE NOT NULL,
+    StockCode VARCHAR(50) NOT NULL,
+    TransactionType VARCHAR(20) NOT NULL,
+    Revenue DECIMAL(14, 2) NOT NULL,
+    Quantity BIGINT NOT NULL,
+    Invoices INT NOT NULL,
+    Customers INT NOT NULL,
+    Lines INT NOT NULL,
+    PRIMARY KEY (InvoiceMonth, StockCode, TransactionType)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cube_monthly_product_stock ON cube_monthly_product(StockCode);
+"""
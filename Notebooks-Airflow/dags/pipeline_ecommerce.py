@@ -1,6 +1,46 @@
 from airflow import DAG
 from airflow.operators.bash import BashOperator
+from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
+import os
+
+# Modo de execução:
+# - "inprocess" (padrão): uma única task roda bronze > silver > quality >
+#   gold > load no mesmo processo, passando os DataFrames em memória
+#   (etl/runner.py)
+# - "scripts": uma BashOperator por camada (01, 02, 06, 03, 04), cada uma
+#   relendo os parquets da camada anterior
+# - "fanout": bronze, silver e quality pelos scripts e, depois, o grafo de
+#   etl/tasks.py: uma task por saída independente da gold (modelo, RFM,
+#   produtos, métricas, cubos) e uma task de carga por tabela do DW, com as
+#   dimensões antes da fact_all
+PIPELINE_RUNNER = os.environ.get("PIPELINE_RUNNER", "inprocess")
+
+# A etapa quality (etl/quality.py) falha quando o score da silver fica abaixo
+# de QUALITY_MIN_SCORE / QUALITY_THRESHOLDS, e a gold não roda
+
+# Tasks simultâneas do DAG; no modo "fanout" o tempo total fica limitado
+# pelo caminho crítico do grafo em vez da soma das tasks
+PIPELINE_PARALLELISM = int(os.environ.get("PIPELINE_PARALLELISM", 4))
+
+
+def run_inprocess():
+    # Import dentro da task: o parse do DAG não carrega pandas/pyarrow
+    from etl.runner import run_pipeline
+
+    run_pipeline()
+
+
+def run_monitoring():
+    # Só as linhas novas do logs_pipeline.csv: rollups diários e alertas de
+    # tempo/vazão em telemetry.db (etl/monitoring.py)
+    from etl.monitoring import format_alert, update_monitoring
+
+    novas, alertas = update_monitoring("/opt/airflow/dags")
+    print(f"Execuções novas no log: {novas}")
+    for alerta in alertas:
+        print(f"ALERTA {format_alert(alerta)}")
+    return len(alertas)
 
 default_args = {
     "owner": "luan",
@@ -14,45 +54,96 @@ default_args = {
 with DAG(
     dag_id="ecommerce_pipeline",
     default_args=default_args,
-    description="Pipeline ETL Ecommerce - Bronze > Silver > Gold > Load DB",
+    description="Pipeline ETL Ecommerce - Bronze > Silver > Quality > Gold > Load DB",
     schedule_interval="@daily",
     start_date=datetime(2025, 1, 1),
     catchup=False,
     max_active_runs=1,
-    concurrency=1,
+    concurrency=PIPELINE_PARALLELISM,
 ) as dag:
 
-    # ----------------------
-    # BRONZE LAYER
-    # ----------------------
-    bronze_task = BashOperator(
-        task_id="bronze_layer",
-        bash_command="python /opt/airflow/dags/01_bronze_layer.py",
-    )
+    if PIPELINE_RUNNER == "inprocess":
+        pipeline_task = PythonOperator(
+            task_id="pipeline_inprocess",
+            python_callable=run_inprocess,
+        )
+    else:
+        # ----------------------
+        # BRONZE LAYER
+        # ----------------------
+        bronze_task = BashOperator(
+            task_id="bronze_layer",
+            bash_command="python /opt/airflow/dags/01_bronze_layer.py",
+        )
 
-    # ----------------------
-    # SILVER LAYER
-    # ----------------------
-    silver_task = BashOperator(
-        task_id="silver_layer",
-        bash_command="python /opt/airflow/dags/02_silver_layer.py",
-    )
+        # ----------------------
+        # SILVER LAYER
+        # ----------------------
+        silver_task = BashOperator(
+            task_id="silver_layer",
+            bash_command="python /opt/airflow/dags/02_silver_layer.py",
+        )
 
-    # ----------------------
-    # GOLD LAYER
-    # ----------------------
-    gold_task = BashOperator(
-        task_id="gold_layer",
-        bash_command="python /opt/airflow/dags/03_gold_layer.py",
-    )
+        # ----------------------
+        # QUALITY GATE
+        # ----------------------
+        quality_task = BashOperator(
+            task_id="quality_report",
+            bash_command="python /opt/airflow/dags/06_quality_report.py",
+        )
+
+    if PIPELINE_RUNNER == "fanout":
+        # ----------------------
+        # GOLD + LOAD EM LEQUE
+        # ----------------------
+        # O grafo não importa pandas/pyarrow: só as funções das tasks o fazem
+        from etl.tasks import task_graph
+
+        tarefas = {}
+        for nome, (funcao, argumentos, dependencias) in task_graph().items():
+            tarefas[nome] = PythonOperator(
+                task_id=nome,
+                python_callable=funcao,
+                op_kwargs=argumentos,
+            )
+            for dependencia in dependencias:
+                tarefas[dependencia] >> tarefas[nome]
+
+        # ORDEM
+        bronze_task >> silver_task >> quality_task >> tarefas["gold_model"]
+        ultima_task = tarefas["publish_warehouse"]
+    elif PIPELINE_RUNNER != "inprocess":
+        # ----------------------
+        # GOLD LAYER
+        # ----------------------
+        gold_task = BashOperator(
+            task_id="gold_layer",
+            bash_command="python /opt/airflow/dags/03_gold_layer.py",
+        )
+
+        # ----------------------
+        # LOAD INTO DATABASE
+        # ----------------------
+        load_db_task = BashOperator(
+            task_id="load_database",
+            bash_command="python /opt/airflow/dags/04_load_database.py",
+        )
+
+        # ORDEM
+        bronze_task >> silver_task >> quality_task >> gold_task >> load_db_task
+        ultima_task = load_db_task
 
     # ----------------------
-    # LOAD INTO DATABASE
+    # MONITORAMENTO
     # ----------------------
-    load_db_task = BashOperator(
-        task_id="load_database",
-        bash_command="python /opt/airflow/dags/04_load_database.py",
+    # Roda também quando uma camada falha, para registrar a falha
+    monitoring_task = PythonOperator(
+        task_id="monitoring",
+        python_callable=run_monitoring,
+        trigger_rule="all_done",
     )
 
-    # ORDEM
-    bronze_task >> silver_task >> gold_task >> load_db_task
+    if PIPELINE_RUNNER == "inprocess":
+        pipeline_task >> monitoring_task
+    else:
+        ultima_task >> monitoring_task
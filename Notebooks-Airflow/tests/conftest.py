@@ -0,0 +1,40 @@
+# Os testes importam o pacote etl da pasta dags, como os scripts do DAG e
+# os benchmarks (que também acrescentam a pasta ao sys.path)
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(RAIZ, 'dags'))
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from etl.bronze import add_ingestion_metadata, iter_csv_batches  # noqa: E402
+from etl.schema import apply_schema  # noqa: E402
+from etl.silver import clean  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def csv_sintetico(tmp_path_factory):
+    """CSV de ~5 mil linhas sintéticas (benchmarks/synthetic_data.py), de dez/2010 a dez/2011."""
+    csv_path = tmp_path_factory.mktemp('dados') / 'data.csv'
+    generate(str(csv_path), escala=0.01, seed=7)
+    return csv_path
+
+
+@pytest.fixture(scope='session')
+def bruto(csv_sintetico):
+    """As linhas do CSV sintético como lidas pela bronze."""
+    return add_ingestion_metadata(pd.concat(iter_csv_batches(csv_sintetico), ignore_index=True))
+
+
+@pytest.fixture(scope='session')
+def bronze(bruto):
+    return apply_schema(bruto.copy())
+
+
+@pytest.fixture(scope='session')
+def silver(bronze):
+    return clean(bronze)
@@ -0,0 +1,133 @@
+import math
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from etl.bronze import (
+    CSV_DTYPES,
+    DATASET_DIR,
+    add_ingestion_metadata,
+    changed_months,
+    ingest_incremental,
+    iter_csv_batches,
+    prepare_batches,
+    read_bronze,
+    read_changed_partitions,
+    read_dataset,
+    read_watermark,
+    stream_to_parquet,
+)
+from etl.schema import apply_schema
+
+# Lote pequeno: o CSV sintético (~5 mil linhas) vira vários lotes
+LOTE = 700
+INGESTAO = pd.Timestamp('2024-01-01')
+
+
+def linhas_csv(n, data='12/1/2010 8:26', fatura='536365', inicio=0):
+    """Lote no formato do CSV de origem, com um StockCode distinto por linha."""
+    return pd.DataFrame({
+        'InvoiceNo': [fatura] * n,
+        'StockCode': [f'S{i}' for i in range(inicio, inicio + n)],
+        'Description': ['ITEM'] * n,
+        'Quantity': [1] * n,
+        'InvoiceDate': [data] * n,
+        'UnitPrice': [1.0] * n,
+        'CustomerID': [17850.0] * n,
+        'Country': ['United Kingdom'] * n,
+        'data_ingestao': pd.Timestamp('2024-01-01'),
+        'fonte_arquivos': 'carrie1/ecommerce-data',
+    })
+
+
+def test_primeiro_lote_cria_as_particoes(tmp_path):
+    lote = pd.concat([linhas_csv(3), linhas_csv(2, '1/5/2011 10:00', '540000')], ignore_index=True)
+    assert ingest_incremental(lote, tmp_path) == (5, ['year=2010/month=12', 'year=2011/month=1'])
+    assert read_changed_partitions(tmp_path) == ['year=2010/month=12', 'year=2011/month=1']
+    assert changed_months(tmp_path) == [pd.Timestamp('2010-12-01'), pd.Timestamp('2011-01-01')]
+    assert read_watermark(tmp_path)['max_invoice_date'] == pd.Timestamp('2011-01-05 10:00')
+    assert len(read_bronze(tmp_path)) == 5
+
+
+def test_lote_seguinte_so_acrescenta_linhas_novas(tmp_path):
+    ingest_incremental(linhas_csv(4, '12/1/2010 8:26'), tmp_path)
+
+    lote = pd.concat([
+        # Já ingeridas
+        linhas_csv(4, '12/1/2010 8:26'),
+        # Atrasadas no minuto da marca d'água: entram
+        linhas_csv(3, '12/1/2010 8:26', inicio=4),
+        # Anteriores à marca d'água: ignoradas
+        linhas_csv(5, '11/30/2010 17:00', '536000'),
+        # Depois da marca d'água, em outro mês
+        linhas_csv(2, '1/5/2011 10:00', '540000'),
+    ], ignore_index=True)
+    assert ingest_incremental(lote, tmp_path) == (5, ['year=2010/month=12', 'year=2011/month=1'])
+
+    bronze = read_bronze(tmp_path)
+    assert len(bronze) == 9
+    assert not bronze['hash_linha'].duplicated().any()
+    assert sorted(bronze['StockCode'].astype(str)) == sorted([f'S{i}' for i in range(7)] + ['S0', 'S1'])
+    assert (bronze['InvoiceNum'] != 536000).all()
+
+    # O mesmo lote de novo: nada a acrescentar e nenhuma partição alterada
+    assert ingest_incremental(lote, tmp_path) == (0, [])
+    assert read_changed_partitions(tmp_path) == []
+    assert len(read_bronze(tmp_path)) == 9
+    assert read_watermark(tmp_path)['batch_id'] == 2
+
+
+def test_linhas_repetidas_no_mesmo_csv_sao_mantidas(tmp_path):
+    lote = pd.concat([linhas_csv(2), linhas_csv(2)], ignore_index=True)
+    assert ingest_incremental(lote, tmp_path)[0] == 4
+    # No lote seguinte as duas cópias já são conhecidas
+    assert ingest_incremental(linhas_csv(2), tmp_path)[0] == 0
+    assert len(read_bronze(tmp_path)) == 4
+
+
+def test_lotes_em_iteravel(tmp_path):
+    lotes = [linhas_csv(2), linhas_csv(3, '12/2/2010 9:00', '536400')]
+    assert ingest_incremental(iter(lotes), tmp_path) == (5, ['year=2010/month=12'])
+    assert read_watermark(tmp_path)['max_invoice_date'] == pd.Timestamp('2010-12-02 09:00')
+
+
+def normalizar(df):
+    """Linhas sem dependência de ordem nem do dicionário de cada lote."""
+    df = df.astype({coluna: object for coluna in df.select_dtypes('category').columns})
+    df['data_ingestao'] = df['data_ingestao'].astype('datetime64[us]')
+    return df.sort_values(list(df.columns), ignore_index=True)
+
+
+def csv_inteiro(csv_path):
+    """O CSV lido de uma vez, no schema da bronze."""
+    df = pd.read_csv(csv_path, encoding='ISO-8859-1', dtype=CSV_DTYPES)
+    return apply_schema(add_ingestion_metadata(df, data_ingestao=INGESTAO))
+
+
+def test_iter_csv_batches_respeita_o_tamanho_do_lote(csv_sintetico):
+    tamanhos = [len(lote) for lote in iter_csv_batches(csv_sintetico, batch_size=LOTE)]
+    total = len(pd.read_csv(csv_sintetico, encoding='ISO-8859-1', dtype=CSV_DTYPES))
+    assert max(tamanhos) <= LOTE
+    assert sum(tamanhos) == total
+    assert len(tamanhos) == math.ceil(total / LOTE)
+
+
+def test_stream_to_parquet_grava_um_row_group_por_lote(tmp_path, csv_sintetico):
+    destino = tmp_path / 'dados_brutos.parquet'
+    total = stream_to_parquet(iter_csv_batches(csv_sintetico, batch_size=LOTE), destino, data_ingestao=INGESTAO)
+
+    metadados = pq.ParquetFile(destino).metadata
+    tamanhos = [metadados.row_group(i).num_rows for i in range(metadados.num_row_groups)]
+    assert max(tamanhos) <= LOTE
+    assert sum(tamanhos) == total
+
+    esperado = csv_inteiro(csv_sintetico)
+    pd.testing.assert_frame_equal(normalizar(apply_schema(pd.read_parquet(destino))), normalizar(esperado))
+
+
+def test_read_dataset_dos_lotes_igual_ao_csv_inteiro(tmp_path, csv_sintetico):
+    lotes = prepare_batches(iter_csv_batches(csv_sintetico, batch_size=LOTE), data_ingestao=INGESTAO)
+    ingest_incremental(lotes, tmp_path)
+
+    lido = apply_schema(read_dataset(tmp_path / DATASET_DIR))
+    pd.testing.assert_frame_equal(normalizar(lido), normalizar(csv_inteiro(csv_sintetico)))
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from etl.cache import GOLD_SNAPSHOT, WAREHOUSE_SNAPSHOT, QueryCache, normalize_query, params_key, publish_snapshot
+
+
+@pytest.mark.parametrize('sql, esperado', [
+    ("SELECT  *\n  FROM Fact_All;", "select * from fact_all"),
+    ("select * from fact_all ;  ", "select * from fact_all"),
+    # Literais e identificadores entre aspas ficam como estão
+    ("SELECT * FROM t WHERE Country = 'United  Kingdom'", "select * from t where country = 'United  Kingdom'"),
+    ("SELECT 'It''s  A' AS X", "select 'It''s  A' as x"),
+    ("SELECT E'It\\'s  A' FROM T", "select E'It\\'s  A' from t"),
+    ('SELECT "CustomerID" FROM T', 'select "CustomerID" from t'),
+    ('SELECT "A ""B""" FROM T', 'select "A ""B""" from t'),
+    ("SELECT $$ Ab  'C $$ FROM T", "select $$ Ab  'C $$ from t"),
+    ("SELECT $x$ Ab $x$, 'Y' FROM T", "select $x$ Ab $x$, 'Y' from t"),
+])
+def test_normalize_query(sql, esperado):
+    assert normalize_query(sql) == esperado
+
+
+def test_normalize_query_distingue_literais_e_identificadores():
+    assert normalize_query("SELECT * FROM t WHERE x = 'A'") != normalize_query("SELECT * FROM t WHERE x = 'a'")
+    assert normalize_query('SELECT "Foo" FROM t') != normalize_query('SELECT "foo" FROM t')
+    # Uma aspa dentro de um identificador não abre um literal
+    assert normalize_query('SELECT "it\'s" FROM T') == 'select "it\'s" from t'
+
+
+def test_params_key():
+    assert params_key({'b': 2, 'a': 1}) == params_key({'a': 1, 'b': 2})
+    assert params_key(['A', ['x', 'y']]) == params_key(['A', ['x', 'y']])
+    assert params_key(('A',)) != params_key(('B',))
+    assert params_key(None) == 'None'
+
+
+@pytest.fixture
+def banco(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'dw.db')
+    pd.DataFrame({'pais': ['UK', 'UK', 'France'], 'valor': [1.0, 2.0, 3.0]}).to_sql('vendas', conn, index=False)
+    yield conn
+    conn.close()
+
+
+def test_read_sql_com_parametros_em_lista(tmp_path, banco):
+    cache = QueryCache(str(tmp_path), banco)
+    sql = "SELECT SUM(valor) AS total FROM vendas WHERE pais = ?"
+    assert cache.read_sql(sql, ['UK'])['total'].iloc[0] == 3.0
+    assert cache.read_sql(sql, ['France'])['total'].iloc[0] == 3.0
+    assert cache.stats()['hits'] == 0
+    # Mesmo texto normalizado e mesmos parâmetros: vem do cache
+    assert cache.read_sql(sql.lower(), ['UK'])['total'].iloc[0] == 3.0
+    assert cache.stats()['hits'] == 1
+
+
+def test_read_sql_com_parametros_em_dict(tmp_path, banco):
+    cache = QueryCache(str(tmp_path), banco)
+    sql = "SELECT COUNT(*) AS n FROM vendas WHERE pais = :pais AND valor > :minimo"
+    assert cache.read_sql(sql, {'pais': 'UK', 'minimo': 0})['n'].iloc[0] == 2
+    assert cache.read_sql(sql, {'minimo': 0, 'pais': 'UK'})['n'].iloc[0] == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_snapshot_novo_invalida(tmp_path, banco):
+    cache = QueryCache(str(tmp_path), banco)
+    sql = "SELECT COUNT(*) AS n FROM vendas"
+    assert cache.read_sql(sql)['n'].iloc[0] == 3
+    banco.execute("INSERT INTO vendas VALUES ('Spain', 4.0)")
+    banco.commit()
+    # Sem snapshot novo o resultado guardado continua valendo
+    assert cache.read_sql(sql)['n'].iloc[0] == 3
+    publish_snapshot(str(tmp_path / WAREHOUSE_SNAPSHOT))
+    assert cache.read_sql(sql)['n'].iloc[0] == 4
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_read_gold(tmp_path):
+    pd.DataFrame({'DateID': [1, 2, 3], 'total_value': [1.0, 2.0, 3.0]}).to_parquet(tmp_path / 'fact_all.parquet')
+    cache = QueryCache(str(tmp_path))
+    filtros = [('DateID', '>=', 2)]
+    assert len(cache.read_gold('fact_all', ['total_value'], filtros)) == 2
+    assert len(cache.read_gold('fact_all', ['total_value'], filtros)) == 2
+    assert cache.stats()['hits'] == 1
+    publish_snapshot(str(tmp_path / GOLD_SNAPSHOT))
+    cache.read_gold('fact_all', ['total_value'], filtros)
+    assert cache.stats()['misses'] == 2
@@ -0,0 +1,95 @@
+# COPY FROM STDIN sem banco: o CSV gerado por ArrowCsvStream e as colunas
+# enviadas para cada tabela do DDL (etl/warehouse.py)
+import csv
+import io
+import re
+
+import pandas as pd
+import pytest
+
+from etl.gold import build_gold
+from etl.load import GOLD_TABLES, ArrowCsvStream, source_batches, target_columns
+from etl.warehouse import SQL_CREATE_CUBES, SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS
+
+
+def csv_de(df, batch_size=2):
+    stream = ArrowCsvStream(source_batches(df, batch_size)[1])
+    # Leituras pequenas, como as do cursor durante o COPY
+    partes = iter(lambda: stream.read(7), b'')
+    return b''.join(partes), stream.rows
+
+
+def colunas_ddl():
+    """{tabela: {coluna: obrigatória}} do DDL do create_database.py, em minúsculas.
+
+    Obrigatória: NOT NULL sem DEFAULT nem SERIAL.
+    """
+    sql = '\n'.join([SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS, SQL_CREATE_CUBES])
+    tabelas = {}
+    for tabela, corpo in re.findall(r'CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\)', sql, re.S):
+        tabelas[tabela] = {
+            linha.split()[0].lower(): 'NOT NULL' in linha and 'DEFAULT' not in linha and 'SERIAL' not in linha
+            for linha in corpo.strip().splitlines()
+            if linha.strip() and linha.split()[0] not in ('PRIMARY', 'CONSTRAINT', 'REFERENCES', 'ON')
+        }
+    for tabela, coluna in re.findall(r'ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+)', sql):
+        tabelas[tabela][coluna.lower()] = False
+    return tabelas
+
+
+def test_csv_com_aspas_nulos_e_categoricas():
+    df = pd.DataFrame({
+        'texto': ['a,b', 'diz "oi"', 'linha\nquebrada', '', None],
+        'categoria': pd.Categorical(['x', None, 'y', 'x', 'y']),
+        'inteiro': pd.array([1, None, 3, 4, 5], dtype='Int32'),
+        'real': [1.5, float('nan'), 2.25, 0.1, 3.0],
+    })
+    dados, linhas = csv_de(df)
+    assert linhas == 5
+    # Texto vazio vem entre aspas; nulo é um campo vazio sem aspas (NULL no COPY csv)
+    assert dados == (
+        b'"a,b","x",1,1.5\n'
+        b'"diz ""oi""",,,\n'
+        b'"linha\nquebrada","y",3,2.25\n'
+        b'"","x",4,0.1\n'
+        b',"y",5,3\n'
+    )
+    lidas = list(csv.reader(io.StringIO(dados.decode())))
+    assert [linha[0] for linha in lidas] == ['a,b', 'diz "oi"', 'linha\nquebrada', '', '']
+
+
+def test_lotes_vazios_e_leitura_inteira():
+    df = pd.DataFrame({'a': [1, 2, 3]})
+    stream = ArrowCsvStream(list(source_batches(df.iloc[:0])[1]) + list(source_batches(df, 2)[1]))
+    assert stream.readall() == b'1\n2\n3\n'
+    assert stream.rows == 3
+    assert stream.read() == b''
+
+
+@pytest.fixture(scope='module')
+def gold(silver):
+    return build_gold(silver)
+
+
+@pytest.mark.parametrize('tabela', GOLD_TABLES)
+def test_colunas_enviadas_existem_no_ddl(gold, tabela):
+    nomes = source_batches(gold[tabela])[0]
+    colunas = target_columns(tabela, nomes)
+    assert len(set(colunas)) == len(colunas)
+    ddl = colunas_ddl()[tabela]
+    assert set(colunas) <= set(ddl)
+    obrigatorias = {coluna for coluna, obrigatoria in ddl.items() if obrigatoria}
+    if tabela == 'fact_all':
+        # InvoiceDate vem da dim_date na staging das partições (etl/partitions.py)
+        obrigatorias.discard('invoicedate')
+    assert obrigatorias <= set(colunas)
+
+    # Os campos de cada linha do CSV seguem a lista de colunas do COPY
+    dados, linhas = csv_de(gold[tabela], batch_size=1000)
+    lidas = list(csv.reader(io.StringIO(dados.decode())))
+    assert linhas == len(lidas) == len(gold[tabela])
+    assert all(len(linha) == len(colunas) for linha in lidas)
+    primeira = gold[tabela].iloc[0]
+    for coluna, campo in zip(nomes, lidas[0]):
+        if isinstance(primeira[coluna], str):
+            assert campo == primeira[coluna]
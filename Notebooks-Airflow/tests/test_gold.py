@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+from etl.gold import (
+    CUBES,
+    RFM_STATE,
+    STAR_SCHEMA,
+    build_dim_date,
+    build_facts,
+    build_gold,
+    build_rfm,
+    build_rfm_state,
+    fact_periods,
+    prepare,
+    resolve_keys,
+    rfm_from_state,
+    update_rfm_state,
+)
+from etl.keys import read_registries
+
+# Um mês do meio (reprocessado com linhas que faltavam) e o último
+MESES = [pd.Timestamp('2011-03-01'), pd.Timestamp('2011-12-01')]
+
+
+def meses_silver(silver):
+    return pd.to_datetime(silver['InvoiceDate'], format='%m/%d/%Y %H:%M').dt.to_period('M').dt.to_timestamp()
+
+
+def normalizar(tabela):
+    """Tabela sem dependência de ordem de linhas nem de dicionário das categóricas."""
+    tabela = tabela.astype({
+        coluna: object for coluna in tabela.columns if isinstance(tabela[coluna].dtype, pd.CategoricalDtype)
+    })
+    return tabela.sort_values(list(tabela.columns), ignore_index=True)
+
+
+def test_rfm_incremental_igual_ao_completo(silver):
+    df_clean, cancelada = prepare(silver)
+    df_clean = resolve_keys(df_clean, read_registries())
+    dim_date = build_dim_date(df_clean)
+    fact_sales, _, _ = build_facts(df_clean, cancelada)
+
+    _, mes = fact_periods(fact_sales, dim_date)
+    estado = build_rfm_state(fact_sales[~mes.isin(MESES)], dim_date)
+    incremental = rfm_from_state(update_rfm_state(estado, fact_sales, dim_date, MESES))
+
+    colunas = ['CustomerID', 'Recency', 'Frequency', 'Monetary']
+    pd.testing.assert_frame_equal(
+        normalizar(incremental[colunas]), normalizar(build_rfm(fact_sales, dim_date)[colunas]), check_dtype=False
+    )
+
+
+@pytest.fixture(scope='module')
+def gold_incremental(silver):
+    """(gold incremental, gold completa) com o mesmo registro de chaves.
+
+    A execução anterior não viu parte das faturas de MESES; a incremental
+    recebe a silver inteira desses meses e emenda o modelo anterior.
+    """
+    registros = read_registries()
+    mes = meses_silver(silver)
+    faltando = mes.isin(MESES) & (silver['InvoiceNum'] % 3 == 0)
+    anterior = build_gold(silver[~faltando].reset_index(drop=True), registros=registros)
+
+    incremental = build_gold(
+        silver[mes.isin(MESES)].reset_index(drop=True),
+        rfm_estado=anterior[RFM_STATE],
+        registros=registros,
+        cubos={nome: anterior[nome] for nome in CUBES},
+        meses=MESES,
+        anterior={nome: anterior[nome] for nome in STAR_SCHEMA},
+    )
+    return incremental, build_gold(silver, registros=registros)
+
+
+@pytest.mark.parametrize('tabela', STAR_SCHEMA)
+def test_modelo_emendado_igual_ao_completo(gold_incremental, tabela):
+    incremental, completa = gold_incremental
+    pd.testing.assert_frame_equal(normalizar(incremental[tabela]), normalizar(completa[tabela]), check_dtype=False)
+
+
+def test_agregacoes_incrementais_iguais_as_completas(gold_incremental):
+    incremental, completa = gold_incremental
+    assert set(incremental) == set(completa)
+    for nome in set(completa) - set(STAR_SCHEMA):
+        pd.testing.assert_frame_equal(
+            normalizar(incremental[nome]), normalizar(completa[nome]), check_dtype=False, obj=nome
+        )
+
+
+def test_fact_all_incremental_na_ordem_da_completa(gold_incremental):
+    incremental, completa = gold_incremental
+    pd.testing.assert_frame_equal(
+        incremental['fact_all'].astype(object), completa['fact_all'].astype(object), check_dtype=False
+    )
+    # Agrupada por tipo e, dentro do tipo, em ordem de DateID
+    tipos = completa['fact_all']['TransactionType'].astype(object)
+    assert (tipos != tipos.shift()).sum() == tipos.nunique()
+    for _, datas in completa['fact_all'].groupby(tipos, sort=False)['DateID']:
+        assert datas.is_monotonic_increasing
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from etl.gold import RFM_STATE, build_gold
+
+pytest.importorskip('polars')
+
+MESES = [pd.Timestamp('2011-11-01'), pd.Timestamp('2011-12-01')]
+
+
+def normalizar(df):
+    # Como em benchmarks/bench_gold_engines.py: categóricas e textos como object, nulos como None
+    df = df.reset_index(drop=True).copy()
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype) or df[coluna].dtype == object:
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), None)
+    return df
+
+
+def conferir_paridade(esperado, obtido):
+    assert esperado.keys() == obtido.keys()
+    for nome in esperado:
+        # Somas em float com tolerância: o Polars soma em paralelo, em outra ordem
+        pd.testing.assert_frame_equal(
+            normalizar(esperado[nome]), normalizar(obtido[nome]), check_dtype=False, rtol=1e-9, obj=nome
+        )
+
+
+def test_polars_igual_ao_pandas(silver):
+    conferir_paridade(build_gold(silver, engine='pandas'), build_gold(silver, engine='polars'))
+
+
+def test_polars_igual_ao_pandas_com_rfm_incremental(silver):
+    # Estado dos meses anteriores; os dois últimos são reagregados por cada backend
+    mes = pd.to_datetime(silver['InvoiceDate'], format='%m/%d/%Y %H:%M').dt.to_period('M').dt.to_timestamp()
+    estado = build_gold(silver[~mes.isin(MESES)].reset_index(drop=True))[RFM_STATE]
+    conferir_paridade(
+        build_gold(silver, rfm_estado=estado, engine='pandas', meses=MESES),
+        build_gold(silver, rfm_estado=estado, engine='polars', meses=MESES),
+    )
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from etl.keys import KeyRegistry, read_registries, write_registries
+
+
+def test_assign_numera_membros_novos_na_ordem_de_aparicao():
+    registro = KeyRegistry()
+    np.testing.assert_array_equal(registro.assign(pd.Series(['UK', 'France', 'UK'])), [1, 2, 1])
+    # Membros já registrados mantêm a chave; os novos recebem max + 1
+    np.testing.assert_array_equal(registro.assign(pd.Series(['Spain', 'UK', 'EIRE', None])), [3, 1, 4, -1])
+    assert len(registro) == 4
+    assert registro.novos == 4
+
+
+def test_assign_continua_do_maior_id():
+    registro = KeyRegistry(['UK', 'France'], [10, 3])
+    np.testing.assert_array_equal(registro.assign(pd.Series(['France', 'EIRE'])), [3, 11])
+
+
+def test_lookup_categorico_igual_ao_texto():
+    registro = KeyRegistry(['85123A', '71053', 'D'], [1, 2, 3])
+    valores = pd.Series(['D', '71053', None, 'X', '85123A'])
+    esperado = registro.lookup(valores)
+    np.testing.assert_array_equal(esperado, [3, 2, -1, -1, 1])
+    categorico = valores.astype(pd.CategoricalDtype(['X', 'D', '85123A', '71053', 'Y']))
+    np.testing.assert_array_equal(registro.lookup(categorico), esperado)
+
+
+def test_registros_gravados_e_lidos(tmp_path):
+    registros = read_registries(tmp_path / 'keys')
+    assert all(len(registro) == 0 for registro in registros.values())
+    registros['country'].assign(pd.Series(['UK', 'France']))
+    registros['customer'].assign(pd.array([17850, 14527], dtype='Int32'))
+    write_registries(registros, tmp_path / 'keys')
+
+    lidos = read_registries(tmp_path / 'keys')
+    np.testing.assert_array_equal(lidos['country'].lookup(['France', 'UK']), [2, 1])
+    np.testing.assert_array_equal(lidos['customer'].lookup(pd.array([14527], dtype='Int32')), [2])
+    # Uma execução seguinte não renumera nada
+    np.testing.assert_array_equal(lidos['country'].assign(pd.Series(['EIRE', 'UK'])), [3, 1])
@@ -0,0 +1,185 @@
+# Carga incremental (merge) no Postgres apontado por DW_CONNECTION_STRING,
+# em um schema descartável, como o benchmarks/bench_load.py. Sem a variável
+# (ou sem sqlalchemy/psycopg2) os testes são pulados.
+import os
+
+import pandas as pd
+import pytest
+
+from etl.gold import build_gold
+from etl.keys import read_registries
+from etl.schema import FINGERPRINT_COLUMN, invoice_no, refresh_fingerprint
+
+if not os.environ.get('DW_CONNECTION_STRING'):
+    pytest.skip('DW_CONNECTION_STRING não definida', allow_module_level=True)
+pytest.importorskip('psycopg2')
+sqlalchemy = pytest.importorskip('sqlalchemy')
+
+from etl.load import FACT_DIGEST_TABLE, load_gold  # noqa: E402
+from etl.warehouse import (  # noqa: E402
+    SQL_CREATE_CUBES,
+    SQL_CREATE_DIMENSIONS,
+    SQL_CREATE_FACT,
+    SQL_CREATE_METRICS,
+    get_engine,
+)
+
+SCHEMA = 'test_load'
+
+# Fatura removida e linha alterada em meses diferentes
+MES_REMOVIDA = pd.Timestamp('2011-03-01')
+MES_ALTERADA = pd.Timestamp('2011-11-01')
+
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = get_engine()
+
+    @sqlalchemy.event.listens_for(engine, 'connect')
+    def usar_schema(dbapi_conn, _):
+        with dbapi_conn.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {SCHEMA}")
+
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(sqlalchemy.text(f"CREATE SCHEMA {SCHEMA}"))
+        for sql in (SQL_CREATE_DIMENSIONS, SQL_CREATE_FACT, SQL_CREATE_METRICS, SQL_CREATE_CUBES):
+            conn.execute(sqlalchemy.text(sql))
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    engine.dispose()
+
+
+def consultar(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(sqlalchemy.text(sql)).fetchall()
+
+
+def particoes(engine):
+    """{partição: oid}; uma partição substituída ganha outro oid."""
+    return dict(consultar(engine, (
+        "SELECT c.relname, c.oid FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('fact_all')"
+    )))
+
+
+def conferir(engine, gold):
+    fact_all = gold['fact_all']
+    linhas, quantidade = consultar(engine, "SELECT count(*), sum(quantity) FROM fact_all")[0]
+    assert linhas == len(fact_all)
+    assert quantidade == fact_all['Quantity'].sum()
+    digests = dict(consultar(engine, f"SELECT invoiceno, digest FROM {FACT_DIGEST_TABLE}"))
+    esperados = gold['fact_all_digest']
+    assert digests == dict(zip(esperados['InvoiceNo'].astype(str), esperados['Digest'].astype(str)))
+
+
+def test_merge_substitui_so_as_faturas_e_particoes_alteradas(engine, silver):
+    registros = read_registries()
+    gold = build_gold(silver, registros=registros)
+    load_gold(engine, gold, 'merge')
+    conferir(engine, gold)
+    antes = particoes(engine)
+    assert len(antes) == 13
+
+    mes = pd.to_datetime(silver['InvoiceDate'], format='%m/%d/%Y %H:%M').dt.to_period('M').dt.to_timestamp()
+    faturas = invoice_no(silver)
+    removida = faturas[mes == MES_REMOVIDA].iloc[0]
+    alterada = silver.index[(mes == MES_ALTERADA) & (faturas != removida)][0]
+    silver2 = silver[faturas != removida].copy()
+    quantidade = silver2['Quantity'].copy()
+    silver2.loc[alterada, 'Quantity'] += 1
+    silver2[FINGERPRINT_COLUMN] = refresh_fingerprint(silver2, 'Quantity', quantidade)
+    gold2 = build_gold(silver2.reset_index(drop=True), registros=registros)
+
+    fatura_alterada = invoice_no(silver2).loc[alterada]
+    ids = f"SELECT invoiceno, stockcode, fact_id FROM fact_all WHERE invoiceno <> '{fatura_alterada}' ORDER BY 1, 2, 3"
+    ids_antes = consultar(engine, ids)
+    resultados = load_gold(engine, gold2, 'merge')
+    conferir(engine, gold2)
+    # Só as linhas da fatura alterada vão para a staging; as demais mantêm o fact_id
+    assert resultados['fact_all'][0] == (gold2['fact_all']['InvoiceNo'].astype(str) == fatura_alterada).sum()
+    assert consultar(engine, ids) == [
+        linha for linha in ids_antes if linha[0] != removida
+    ]
+    assert consultar(engine, f"SELECT count(*) FROM fact_all WHERE invoiceno = '{removida}'")[0][0] == 0
+    depois = particoes(engine)
+    assert set(depois) == set(antes)
+    trocadas = {nome for nome in antes if antes[nome] != depois[nome]}
+    assert trocadas == {f"fact_all_p{MES_REMOVIDA:%Y%m}", f"fact_all_p{MES_ALTERADA:%Y%m}"}
+
+    # A mesma gold de novo: nada vai para a staging e nenhuma partição é substituída
+    assert load_gold(engine, gold2, 'merge')['fact_all'][:2] == (0, 0)
+    conferir(engine, gold2)
+    assert particoes(engine) == depois
+
+
+def indices_do_pai(engine):
+    return dict(consultar(engine, (
+        "SELECT c.relname, c.oid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = to_regclass('fact_all')"
+    )))
+
+
+def test_parallel_so_monta_as_particoes_carregadas(engine, silver):
+    from etl.gold import date_periods
+
+    gold = build_gold(silver, registros=read_registries())
+    load_gold(engine, gold, 'merge')
+    antes, indices = particoes(engine), indices_do_pai(engine)
+
+    # Só um mês na gold: só a partição dele é montada de novo
+    _, meses = date_periods(gold['dim_date'])
+    dim_date = gold['dim_date'][(meses == MES_ALTERADA).to_numpy()]
+    fact_all = gold['fact_all'][gold['fact_all']['DateID'].isin(dim_date['DateID'])]
+    parcial = {'dim_date': dim_date, 'fact_all': fact_all}
+    for _ in range(2):
+        linhas, fases = load_gold(engine, parcial, 'append', 'parallel', tables=['fact_all'], workers=2)['fact_all']
+        assert linhas == len(fact_all)
+        conferir(engine, gold)
+        depois = particoes(engine)
+        assert {nome for nome in antes if antes[nome] != depois[nome]} == {f"fact_all_p{MES_ALTERADA:%Y%m}"}
+        assert indices_do_pai(engine) == indices
+
+    # Cada índice e FK do pai está em todas as partições, sem o nome "_nova"
+    presos = consultar(engine, (
+        "SELECT i.inhparent::regclass::text, count(*), count(*) FILTER (WHERE c.relname LIKE '%nova%') "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent IN (SELECT indexrelid FROM pg_index WHERE indrelid = to_regclass('fact_all')) "
+        "GROUP BY 1"
+    ))
+    assert {nome: (len(depois), 0) for nome in indices} == {nome: tuple(contagens) for nome, *contagens in presos}
+    fks = consultar(engine, (
+        "SELECT conname, count(*) FROM pg_constraint WHERE contype = 'f' AND conparentid IN "
+        "(SELECT oid FROM pg_constraint WHERE conrelid = to_regclass('fact_all')) GROUP BY 1"
+    ))
+    assert fks and all(quantidade == len(depois) for _, quantidade in fks)
+
+
+def test_restore_secondary_lista_o_ddl_que_falta(engine):
+    from etl.parallel_load import restore_secondary
+
+    indices = [('idx_fact_inexistente', 'CREATE INDEX idx_fact_inexistente ON fact_all (coluna_inexistente)')]
+    carga = ValueError('falha na carga')
+    raw_conn = engine.raw_connection()
+    try:
+        with pytest.raises(RuntimeError, match='coluna_inexistente') as erro:
+            restore_secondary(engine, raw_conn, indices, [], 1, {}, carga)
+    finally:
+        raw_conn.close()
+    assert indices[0][1] in str(erro.value)
+    assert erro.value.__cause__ is carga
+
+
+def test_fact_id_nao_depende_da_ordem_da_gold(engine, silver):
+    gold = build_gold(silver, registros=read_registries())
+    embaralhada = {**gold, 'fact_all': gold['fact_all'].sample(frac=1, random_state=0).reset_index(drop=True)}
+    colunas = "invoiceno, stockcode, customerid, dateid, quantity, unitprice, transactiontype, fact_id"
+    numeradas = []
+    for fonte in (gold, embaralhada):
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text(f"TRUNCATE fact_all, {FACT_DIGEST_TABLE} RESTART IDENTITY"))
+        load_gold(engine, fonte, 'append', tables=['fact_all'])
+        numeradas.append(consultar(engine, f"SELECT {colunas} FROM fact_all ORDER BY fact_id"))
+    assert len(numeradas[0]) == len(gold['fact_all'])
+    assert numeradas[0] == numeradas[1]
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from etl.bronze import CSV_DTYPES, parse_invoice_date
+from etl.gold import read_star_schema
+from etl.runner import run_pipeline
+
+ETAPAS = ['bronze', 'silver', 'gold']
+
+
+def fact_all(base_dir):
+    return read_star_schema(f"{base_dir}/data/gold")['fact_all']
+
+
+def test_incremental_sem_checkpoints_mantem_o_estado_da_gold(tmp_path, csv_sintetico):
+    # Primeiro arquivo só até maio; o segundo é o arquivo inteiro
+    completo = pd.read_csv(csv_sintetico, dtype=CSV_DTYPES, encoding='ISO-8859-1')
+    parte1 = tmp_path / 'parte1.csv'
+    completo[parse_invoice_date(completo['InvoiceDate']) < '2011-06-01'].to_csv(parte1, index=False)
+
+    esperado = tmp_path / 'full'
+    run_pipeline(str(esperado), ETAPAS, csv_path=str(csv_sintetico), bronze_mode='full')
+
+    incremental = tmp_path / 'incremental'
+    run_pipeline(str(incremental), ETAPAS, csv_path=str(parte1), bronze_mode='incremental')
+    run_pipeline(str(incremental), ETAPAS, checkpoints=False, csv_path=str(csv_sintetico),
+                 bronze_mode='incremental')
+    # Sem linhas novas: a gold continua a do arquivo inteiro
+    run_pipeline(str(incremental), ETAPAS, csv_path=str(csv_sintetico), bronze_mode='incremental')
+
+    obtido, completo_gold = fact_all(incremental), fact_all(esperado)
+    assert len(obtido) == len(completo_gold)
+    assert obtido['total_value'].sum() == pytest.approx(completo_gold['total_value'].sum())
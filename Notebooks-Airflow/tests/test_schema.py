@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from etl.schema import FINGERPRINT_COLUMN, apply_schema, refresh_fingerprint, row_fingerprint
+
+
+def linhas():
+    return apply_schema(pd.DataFrame({
+        'InvoiceNo': ['536365', '536365', 'C536379', '536400'],
+        'StockCode': ['85123A', '71053', 'D', '85123A'],
+        'Description': ['WHITE HANGING', 'WHITE METAL LANTERN', 'Discount', None],
+        'Quantity': [6, 6, -1, 2],
+        'InvoiceDate': ['12/1/2010 8:26', '12/1/2010 8:26', '12/1/2010 9:41', '12/2/2010 9:00'],
+        'UnitPrice': [2.55, 3.39, 27.5, 2.55],
+        'CustomerID': [17850.0, 17850.0, 14527.0, np.nan],
+        'Country': ['United Kingdom', 'United Kingdom', 'France', 'United Kingdom'],
+    }))
+
+
+def test_impressao_nao_depende_das_categorias():
+    df = linhas()
+    esperado = row_fingerprint(df)
+
+    # Mesmas linhas com as categorias em outra ordem e com categorias a mais
+    reordenado = df.copy()
+    for coluna in ['StockCode', 'Description', 'Country']:
+        categorias = list(reordenado[coluna].cat.categories)
+        reordenado[coluna] = reordenado[coluna].cat.set_categories(categorias[::-1] + ['OUTRA'])
+    np.testing.assert_array_equal(row_fingerprint(reordenado), esperado)
+
+    # Cada linha sozinha (lotes com dicionários diferentes)
+    for posicao in range(len(df)):
+        sozinha = apply_schema(df.iloc[[posicao]].astype({'StockCode': str, 'Country': str}))
+        assert row_fingerprint(sozinha)[0] == esperado[posicao]
+
+
+def test_impressao_distingue_linhas():
+    df = linhas()
+    assert len(set(row_fingerprint(df))) == len(df)
+    alterado = df.copy()
+    alterado['Quantity'] = alterado['Quantity'].where(alterado.index != 0, 7).astype('int32')
+    impressoes = row_fingerprint(alterado)
+    assert impressoes[0] != df[FINGERPRINT_COLUMN].iloc[0]
+    np.testing.assert_array_equal(impressoes[1:], df[FINGERPRINT_COLUMN].to_numpy()[1:])
+
+
+def test_refresh_fingerprint_igual_ao_recalculo():
+    df = linhas()
+    anterior = df['Description'].copy()
+    df['Description'] = df['Description'].cat.add_categories(['WHITE HANGING HEART']).fillna('WHITE HANGING HEART')
+    df['Description'] = df['Description'].where(df.index != 0, 'WHITE HANGING HEART')
+    np.testing.assert_array_equal(refresh_fingerprint(df, 'Description', anterior), row_fingerprint(df))
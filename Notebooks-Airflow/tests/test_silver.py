@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from etl.schema import invoice_key, row_fingerprint
+from etl.silver import STOCKCODE_FEES, clean, fill_descriptions, inconsistency_mask, null_mix_by_key
+
+
+def descricoes_legado(df):
+    """Description como no 02_silver_layer.py original (groupby().first() + apply por linha)."""
+    mapa = df.dropna(subset=['Description']).groupby('StockCode')['Description'].first().to_dict()
+    return df.apply(lambda row: mapa.get(row['StockCode'], row['Description']), axis=1)
+
+
+def test_clean_preenche_descricoes_como_o_original(bruto, bronze):
+    # Entrada categórica (schema compacto), como nos caminhos do pipeline
+    silver = clean(bronze)
+    pd.testing.assert_series_equal(
+        silver['Description'].astype(object), descricoes_legado(bruto), check_names=False
+    )
+    assert (silver['hash_linha'].to_numpy() == row_fingerprint(silver)).all()
+
+
+def test_fill_descriptions_em_texto_como_o_original(bruto):
+    pd.testing.assert_series_equal(
+        fill_descriptions(bruto).astype(object), descricoes_legado(bruto), check_names=False
+    )
+
+
+@pytest.mark.parametrize('chave, coluna', [('InvoiceNo', 'CustomerID'), ('StockCode', 'Description')])
+def test_null_mix_by_key_como_o_original(bruto, chave, coluna):
+    # groupby().apply com lambda por grupo, como no 02_silver_layer.py original
+    grupos = bruto.groupby(chave)[coluna]
+    esperado_nulo = grupos.apply(lambda x: x.isnull().any())
+    esperado_preenchido = grupos.apply(lambda x: x.notnull().any())
+
+    nulo, preenchido = null_mix_by_key(bruto, chave, coluna)
+    pd.testing.assert_series_equal(nulo.sort_index(), esperado_nulo, check_names=False)
+    pd.testing.assert_series_equal(preenchido.sort_index(), esperado_preenchido, check_names=False)
+
+
+def test_null_mix_by_key_categorico_e_por_invoice_key(bruto, bronze):
+    # Caminho do 02_silver_layer.py: schema compacto e chave inteira por fatura
+    def contagens(nulo, preenchido):
+        return int((nulo & preenchido).sum()), int(nulo.sum()), int(preenchido.sum())
+
+    assert contagens(*null_mix_by_key(bronze, invoice_key(bronze), 'CustomerID')) == contagens(
+        *null_mix_by_key(bruto, 'InvoiceNo', 'CustomerID')
+    )
+    nulo, preenchido = null_mix_by_key(bronze, 'StockCode', 'Description')
+    esperado_nulo, esperado_preenchido = null_mix_by_key(bruto, 'StockCode', 'Description')
+    assert nulo.to_dict() == esperado_nulo.to_dict()
+    assert preenchido.to_dict() == esperado_preenchido.to_dict()
+    assert nulo.sum() > 0
+
+
+def test_inconsistency_mask_como_o_original(bruto, bronze):
+    fatura = bruto['InvoiceNo'].astype(str)
+    esperado = (
+        fatura.str.startswith('C') | fatura.str.startswith('A')
+        | (bruto['Quantity'] <= 0) | (bruto['UnitPrice'] <= 0) | bruto['StockCode'].isin(STOCKCODE_FEES)
+    )
+    pd.testing.assert_series_equal(inconsistency_mask(bruto), esperado)
+    pd.testing.assert_series_equal(inconsistency_mask(bronze), esperado)
@@ -0,0 +1,36 @@
+import pytest
+
+from etl.telemetry import StageTelemetry, read_spans, span
+
+
+def test_falha_em_passo_aninhado_grava_todos_os_passos(tmp_path):
+    telemetria = StageTelemetry('gold', str(tmp_path), 'run-1')
+    with pytest.raises(ValueError, match='quebrou'):
+        with telemetria.step('externo'):
+            with span('meio'):
+                with span('interno'):
+                    raise ValueError('quebrou')
+    assert telemetria.finalizada
+
+    spans = read_spans(str(tmp_path), 'gold').set_index('passo')
+    assert set(spans.index) == {'externo/meio/interno', 'externo/meio', 'externo', 'total'}
+    assert (spans['status'] == 'falha').all()
+    assert (spans['erro'] == 'ValueError: quebrou').all()
+    # A etapa finalizada não mede mais nada
+    with span('depois'):
+        pass
+    assert len(read_spans(str(tmp_path), 'gold')) == 4
+
+
+def test_etapa_concluida_grava_passos_e_total(tmp_path):
+    base_dir = tmp_path / 'novo' / 'dir'
+    with StageTelemetry('silver', str(base_dir), 'run-1') as telemetria:
+        with span('ler', 10) as passo:
+            passo.linhas_saida = 8
+        telemetria.finish(8, 10)
+
+    spans = read_spans(str(base_dir), 'silver').set_index('passo')
+    assert set(spans.index) == {'ler', 'total'}
+    assert (spans['status'] == 'sucesso').all()
+    assert spans.loc['ler', ['linhas_entrada', 'linhas_saida']].tolist() == [10, 8]
+    assert (base_dir / 'logs_pipeline.csv').read_text().count('\n') == 1